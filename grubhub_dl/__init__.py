@@ -16,6 +16,7 @@ DEFAULT_CACHE_DIR = str(Path(os.path.expanduser('~/.cache/grubhub-dl')))
 DEFAULT_KEYRING_SERVICE = 'grubhub-dl'
 DEFAULT_KEYRING_USERNAME = 'email-api-access-token'
 DEFAULT_DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+DEFAULT_COMPRESSION = models.Compression.none
 DEFAULT_GMAIL_QUERY = 'from:grubhub.com'
 ERROR_MESSAGE_FATAL = 'Unable to continue, quitting.'
 GMAIL_SCOPES = ['https://www.googleapis.com/auth/gmail.readonly']
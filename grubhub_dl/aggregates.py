@@ -0,0 +1,516 @@
+"""Maintains spending rollups in the cache directory, and prints them. The entrypoint for
+``grubhub-dl report``.
+
+The rollups are kept in a SQLite database (``aggregates.sqlite`` in the cache directory):
+
+- ``monthly_spending``: Orders, totals, refunds, fees, taxes and tips per month
+- ``restaurant_spending``: Orders, totals and refunds per restaurant
+- ``monthly_credits``: Credits received per month and category
+
+They're updated incrementally. What each reconciled order (and each credit) added to the
+rollups is saved with it, so when an order changes (eg it was refunded or canceled), only
+the difference between its old and new values is applied, and nothing is recomputed from
+the rest of the history. Fees and taxes are only in the order confirmation, so when an
+order changes in a later run, they're kept from its saved contribution.
+"""
+
+import os
+import csv
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import logging
+from pathlib import Path
+from datetime import timedelta
+
+from grubhub_dl import (
+    models,
+    metrics,
+    tracing,
+    __appname__,
+    DEFAULT_CACHE_DIR,
+    ERROR_MESSAGE_FATAL,
+)
+from grubhub_dl.models.records import EPOCH, TimestampColumn
+from grubhub_dl.export.table import fit_cell, COLUMN_SEPARATOR
+
+logger = logging.getLogger(__name__)
+
+AGGREGATES_FILE_NAME = 'aggregates.sqlite'
+
+# Rolled up in place of a missing month, restaurant or category
+UNKNOWN = 'unknown'
+
+MICROSECONDS_PER_DAY = 86_400_000_000
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS order_contributions (
+    order_number        TEXT PRIMARY KEY,
+    month               TEXT,
+    restaurant_name     TEXT,
+    canceled_count      INTEGER,
+    order_total         INTEGER,
+    refunded_amount     INTEGER,
+    net_paid            INTEGER,
+    service_fees        INTEGER,
+    delivery_fees       INTEGER,
+    sales_tax           INTEGER,
+    tips                INTEGER
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS credit_contributions (
+    email_id            TEXT PRIMARY KEY,
+    month               TEXT,
+    category            TEXT,
+    amount              INTEGER
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS monthly_spending (
+    month               TEXT PRIMARY KEY,
+    order_count         INTEGER NOT NULL DEFAULT 0,
+    canceled_count      INTEGER NOT NULL DEFAULT 0,
+    order_total         INTEGER NOT NULL DEFAULT 0,
+    refunded_amount     INTEGER NOT NULL DEFAULT 0,
+    net_paid            INTEGER NOT NULL DEFAULT 0,
+    service_fees        INTEGER NOT NULL DEFAULT 0,
+    delivery_fees       INTEGER NOT NULL DEFAULT 0,
+    sales_tax           INTEGER NOT NULL DEFAULT 0,
+    tips                INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS restaurant_spending (
+    restaurant_name     TEXT PRIMARY KEY,
+    order_count         INTEGER NOT NULL DEFAULT 0,
+    canceled_count      INTEGER NOT NULL DEFAULT 0,
+    order_total         INTEGER NOT NULL DEFAULT 0,
+    refunded_amount     INTEGER NOT NULL DEFAULT 0,
+    net_paid            INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS monthly_credits (
+    month               TEXT,
+    category            TEXT,
+    credit_count        INTEGER NOT NULL DEFAULT 0,
+    amount              INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (month, category)
+) WITHOUT ROWID;
+'''
+
+# The columns of each contribution, after its key
+ORDER_CONTRIBUTION_FIELDS = [
+    'month',
+    'restaurant_name',
+    'canceled_count',
+    'order_total',
+    'refunded_amount',
+    'net_paid',
+    'service_fees',
+    'delivery_fees',
+    'sales_tax',
+    'tips',
+]
+CREDIT_CONTRIBUTION_FIELDS = [
+    'month',
+    'category',
+    'amount',
+]
+
+UPDATE_MONTHLY_SPENDING = '''
+INSERT INTO monthly_spending (
+    month, order_count, canceled_count, order_total, refunded_amount, net_paid,
+    service_fees, delivery_fees, sales_tax, tips
+) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (month) DO UPDATE SET
+    order_count = order_count + excluded.order_count,
+    canceled_count = canceled_count + excluded.canceled_count,
+    order_total = order_total + excluded.order_total,
+    refunded_amount = refunded_amount + excluded.refunded_amount,
+    net_paid = net_paid + excluded.net_paid,
+    service_fees = service_fees + excluded.service_fees,
+    delivery_fees = delivery_fees + excluded.delivery_fees,
+    sales_tax = sales_tax + excluded.sales_tax,
+    tips = tips + excluded.tips
+'''
+UPDATE_RESTAURANT_SPENDING = '''
+INSERT INTO restaurant_spending (
+    restaurant_name, order_count, canceled_count, order_total, refunded_amount, net_paid
+) VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (restaurant_name) DO UPDATE SET
+    order_count = order_count + excluded.order_count,
+    canceled_count = canceled_count + excluded.canceled_count,
+    order_total = order_total + excluded.order_total,
+    refunded_amount = refunded_amount + excluded.refunded_amount,
+    net_paid = net_paid + excluded.net_paid
+'''
+UPDATE_MONTHLY_CREDITS = '''
+INSERT INTO monthly_credits (month, category, credit_count, amount) VALUES (?, ?, ?, ?)
+ON CONFLICT (month, category) DO UPDATE SET
+    credit_count = credit_count + excluded.credit_count,
+    amount = amount + excluded.amount
+'''
+
+# The query that each report runs, and the columns that are amounts of money
+REPORTS = {
+    'monthly': (
+        'SELECT * FROM monthly_spending WHERE order_count != 0 ORDER BY month DESC',
+        {'order_total', 'refunded_amount', 'net_paid', 'service_fees', 'delivery_fees',
+         'sales_tax', 'tips'},
+    ),
+    'restaurants': (
+        'SELECT * FROM restaurant_spending WHERE order_count != 0 '
+        'ORDER BY net_paid DESC',
+        {'order_total', 'refunded_amount', 'net_paid'},
+    ),
+    'credits': (
+        'SELECT * FROM monthly_credits WHERE credit_count != 0 '
+        'ORDER BY month DESC, category',
+        {'amount'},
+    ),
+}
+OUTPUT_FORMATS = ['table', 'csv', 'json']
+
+
+def connect(cache_dir: str) -> sqlite3.Connection:
+    """Open the aggregates database in the cache directory, and create its schema if
+    needed
+    """
+
+    Path(cache_dir).mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(os.path.join(cache_dir, AGGREGATES_FILE_NAME))
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = NORMAL')
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def months_of(column: TimestampColumn) -> list[str]:
+    """Get the month (eg ``2025-03``) of each value of a timestamp column
+
+    The month is only formatted once per day, from the raw values of the column, instead
+    of once per timestamp.
+    """
+
+    months = {}
+    result = []
+    for value, valid in zip(column.values, column.validity):
+        if not valid:
+            result.append(UNKNOWN)
+            continue
+        day = value // MICROSECONDS_PER_DAY
+        month = months.get(day)
+        if month is None:
+            month = months[day] = (EPOCH + timedelta(days=day)).strftime('%Y-%m')
+        result.append(month)
+    return result
+
+
+def order_contributions(
+    grubhub_data: dict[str, models.RecordBatch]
+) -> dict[str, tuple]:
+    """Get what each reconciled order adds to the rollups, by order number
+
+    The fees and taxes of orders whose confirmation isn't in ``grubhub_data`` are None
+    (see ``fill_missing_fees``).
+    """
+
+    # Fees and taxes are only in the order confirmation
+    orders = grubhub_data['orders']
+    fees = {
+        email_id: (service_fee or 0, delivery_fee or 0, sales_tax or 0)
+        for email_id, service_fee, delivery_fee, sales_tax in zip(
+            orders.column('email_id'),
+            orders.column('order_service_fee_actual'),
+            orders.column('order_delivery_fee_actual'),
+            orders.column('order_sales_tax'),
+        )
+    }
+
+    contributions = {}
+    reconciled_orders = grubhub_data['reconciled_orders']
+    columns = [months_of(reconciled_orders.columns['sent_at'])] + [
+        reconciled_orders.column(field)
+        for field in (
+            'order_number', 'email_id', 'restaurant_name', 'is_canceled',
+            'order_total', 'refunded_amount', 'net_paid', 'order_delivery_tip',
+            'tip_adjusted_amount',
+        )
+    ]
+    for (
+        month, order_number, email_id, restaurant_name, is_canceled, order_total,
+        refunded_amount, net_paid, delivery_tip, tip_adjusted_amount,
+    ) in zip(*columns):
+        if order_number is None:
+            continue
+        tip = tip_adjusted_amount if tip_adjusted_amount is not None else delivery_tip
+        contributions[order_number] = (
+            month,
+            restaurant_name or UNKNOWN,
+            1 if is_canceled else 0,
+            order_total or 0,
+            refunded_amount or 0,
+            net_paid or 0,
+            *fees.get(email_id, (None, None, None)),
+            tip or 0,
+        )
+    return contributions
+
+
+def credit_contributions(
+    grubhub_data: dict[str, models.RecordBatch]
+) -> dict[str, tuple]:
+    """Get what each credit adds to the rollups, by email ID
+    """
+
+    credits = grubhub_data['credits']
+    return {
+        email_id: (
+            month,
+            getattr(category, 'name', category) or UNKNOWN,
+            amount or 0,
+        )
+        for email_id, month, category, amount in zip(
+            credits.column('email_id'),
+            months_of(credits.columns['sent_at']),
+            credits.column('category'),
+            credits.column('amount'),
+        )
+    }
+
+
+def saved_contributions(conn: sqlite3.Connection, table: str) -> dict[str, tuple]:
+    """Get the contributions that were saved in the given table, by key"""
+
+    return {
+        row[0]: row[1:]
+        for row in conn.execute(f'SELECT * FROM {table}')
+    }
+
+
+def fill_missing_fees(contributions: dict[str, tuple], saved: dict[str, tuple]):
+    """Replace the missing fees and taxes of the order contributions with the ones that
+    were saved with them (eg when only a refund of the order was extracted)
+    """
+
+    start = ORDER_CONTRIBUTION_FIELDS.index('service_fees')
+    stop = ORDER_CONTRIBUTION_FIELDS.index('sales_tax') + 1
+    for order_number, contribution in contributions.items():
+        if contribution[start] is not None:
+            continue
+        old = saved.get(order_number)
+        fees = old[start:stop] if old else (0,) * (stop - start)
+        contributions[order_number] = contribution[:start] + tuple(fees) + (
+            contribution[stop:]
+        )
+
+
+def changed_contributions(
+    saved: dict[str, tuple],
+    contributions: dict[str, tuple]
+) -> list[tuple]:
+    """Compare the contributions with the ones that were saved, and get the ones that are
+    new or have changed
+
+    :returns: A list of ``(key, old contribution or None, new contribution)``
+    """
+
+    return [
+        (contribution_key, saved.get(contribution_key), contribution)
+        for contribution_key, contribution in contributions.items()
+        if saved.get(contribution_key) != contribution
+    ]
+
+
+def order_deltas(old: tuple | None, new: tuple) -> tuple[list, list]:
+    """Get the rows to add to ``monthly_spending`` and ``restaurant_spending`` to
+    replace an order's old contribution with its new one
+    """
+
+    monthly_rows = []
+    restaurant_rows = []
+    for sign, contribution in ((-1, old), (1, new)):
+        if contribution is None:
+            continue
+        month, restaurant_name, *counts = contribution
+        # The order itself is counted once, as well as its other counts and amounts
+        counts = [sign] + [sign * count for count in counts]
+        monthly_rows.append((month, *counts))
+        # Restaurants don't have fees, taxes and tips
+        restaurant_rows.append((restaurant_name, *counts[:5]))
+    return monthly_rows, restaurant_rows
+
+
+@tracing.traced()
+@metrics.timed('aggregates')
+def update_aggregates(
+    params: models.Parameters,
+    grubhub_data: dict[str, models.RecordBatch]
+):
+    """Apply the new and changed orders and credits to the rollups in the cache directory
+    """
+
+    started_at = time.perf_counter()
+    conn = connect(params.cache_dir)
+    try:
+        saved_orders = saved_contributions(conn, 'order_contributions')
+        contributions = order_contributions(grubhub_data)
+        fill_missing_fees(contributions, saved_orders)
+        changed_orders = changed_contributions(saved_orders, contributions)
+        changed_credits = changed_contributions(
+            saved_contributions(conn, 'credit_contributions'),
+            credit_contributions(grubhub_data)
+        )
+
+        monthly_rows = []
+        restaurant_rows = []
+        for _, old, new in changed_orders:
+            monthly_deltas, restaurant_deltas = order_deltas(old, new)
+            monthly_rows += monthly_deltas
+            restaurant_rows += restaurant_deltas
+
+        credit_rows = []
+        for _, old, new in changed_credits:
+            if old is not None:
+                credit_rows.append((old[0], old[1], -1, -old[2]))
+            credit_rows.append((new[0], new[1], 1, new[2]))
+
+        with conn:
+            conn.executemany(UPDATE_MONTHLY_SPENDING, monthly_rows)
+            conn.executemany(UPDATE_RESTAURANT_SPENDING, restaurant_rows)
+            conn.executemany(UPDATE_MONTHLY_CREDITS, credit_rows)
+            conn.executemany(
+                f'INSERT OR REPLACE INTO order_contributions VALUES '
+                f'({", ".join("?" * (len(ORDER_CONTRIBUTION_FIELDS) + 1))})',
+                [(key, *new) for key, _, new in changed_orders]
+            )
+            conn.executemany(
+                f'INSERT OR REPLACE INTO credit_contributions VALUES '
+                f'({", ".join("?" * (len(CREDIT_CONTRIBUTION_FIELDS) + 1))})',
+                [(key, *new) for key, _, new in changed_credits]
+            )
+    finally:
+        conn.close()
+
+    logger.info(
+        'Updated the aggregates with %s new or changed orders and %s credits in %.2fs',
+        len(changed_orders),
+        len(changed_credits),
+        time.perf_counter() - started_at
+    )
+
+
+def format_report_value(column: str, value, money_columns: set[str]) -> str:
+    """Format one value of a report for display"""
+
+    if value is None:
+        return ''
+    if column in money_columns:
+        return f'${value / 100:,.2f}'
+    return str(value)
+
+
+def print_report(
+    conn: sqlite3.Connection,
+    report: str,
+    output_format: str,
+    limit: int = None
+):
+    """Print one of the reports in ``REPORTS`` to stdout in the given format
+    """
+
+    query, money_columns = REPORTS[report]
+    if limit is not None:
+        query += f' LIMIT {int(limit)}'
+    cursor = conn.execute(query)
+    columns = [column[0] for column in cursor.description]
+    rows = cursor.fetchall()
+
+    if output_format == 'csv':
+        writer = csv.writer(sys.stdout)
+        writer.writerow(columns)
+        writer.writerows(rows)
+        return
+    if output_format == 'json':
+        sys.stdout.writelines(json.dumps(dict(zip(columns, row))) + '\n' for row in rows)
+        return
+
+    cells = [
+        [format_report_value(column, value, money_columns)
+         for column, value in zip(columns, row)]
+        for row in rows
+    ]
+    widths = [
+        max([len(column)] + [len(row[i]) for row in cells])
+        for i, column in enumerate(columns)
+    ]
+    right_aligned = [column not in ('month', 'restaurant_name', 'category')
+                     for column in columns]
+    lines = [
+        COLUMN_SEPARATOR.join(
+            fit_cell(cell, width, align_right)
+            for cell, width, align_right in zip(row, widths, right_aligned)
+        ).rstrip()
+        for row in [columns] + cells
+    ]
+    lines.insert(1, COLUMN_SEPARATOR.join('-' * width for width in widths))
+    sys.stdout.write('\n'.join(lines) + '\n')
+
+
+def get_arguments(args: list = None) -> argparse.Namespace:
+    """Parse the user-provided arguments of the ``report`` command
+    """
+
+    parser = argparse.ArgumentParser(
+        prog=f'{__appname__} report',
+        description=('Print spending rollups, which are updated every time Grubhub data '
+                     'is extracted')
+    )
+    parser.add_argument(
+        'report',
+        choices=list(REPORTS),
+        nargs='?',
+        default='monthly',
+        help='The report to print'
+    )
+    parser.add_argument(
+        '--cache-dir',
+        action='store',
+        type=str,
+        default=DEFAULT_CACHE_DIR,
+        help='Read the rollups from this cache directory'
+    )
+    parser.add_argument(
+        '--format',
+        dest='output_format',
+        choices=OUTPUT_FORMATS,
+        default='table',
+        help='Print the report in this format'
+    )
+    parser.add_argument(
+        '--limit',
+        metavar='N',
+        action='store',
+        type=int,
+        help='Only print the first N rows of the report'
+    )
+    return parser.parse_args(args)
+
+
+def main(args: list = None):
+    namespace = get_arguments(args)
+
+    if not os.path.exists(os.path.join(namespace.cache_dir, AGGREGATES_FILE_NAME)):
+        logger.error(
+            'No rollups found in %s. Run %s to extract your Grubhub data first.',
+            namespace.cache_dir,
+            __appname__
+        )
+        logger.error(ERROR_MESSAGE_FATAL)
+        exit(1)
+
+    conn = connect(namespace.cache_dir)
+    try:
+        print_report(conn, namespace.report, namespace.output_format, namespace.limit)
+    finally:
+        conn.close()
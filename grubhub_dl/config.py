@@ -13,12 +13,28 @@ from grubhub_dl import (
 	DEFAULT_KEYRING_SERVICE,
 	DEFAULT_KEYRING_USERNAME,
 	DEFAULT_DATETIME_FORMAT,
+	DEFAULT_COMPRESSION,
 )
 
-from grubhub_dl.validation import validate_enum
+from grubhub_dl.validation import validate_enum, validate_enums
 
 logger = logging.getLogger(__name__)
 
+POSTGRES_SECTION = 'postgres'
+
+
+def postgres_section_to_dsn(section: configparser.SectionProxy) -> str:
+	"""Build a PostgreSQL connection string from the keys of the ``[postgres]`` section
+	of a config file (eg ``host``, ``port``, ``dbname``, ``user``, ``password``), which
+	can be any libpq connection parameters.
+	"""
+
+	def quote(value: str) -> str:
+		value = value.replace('\\', '\\\\').replace("'", "\\'")
+		return f"'{value}'"
+
+	return ' '.join(f'{key}={quote(value)}' for key, value in section.items())
+
 
 def config_to_params(config_file: str) -> models.Parameters:
 	config = configparser.ConfigParser()
@@ -50,17 +66,42 @@ def config_to_params(config_file: str) -> models.Parameters:
 	# For parameters whose values are enums, we need to convert the string value of the
 	# enum item to the actual Enum object.
 	params.source = validate_enum(params.source, models.Source)
-	params.destination = validate_enum(params.destination, models.Destination)
+	params.destination = validate_enums(params.destination, models.Destination)
+	params.compression = validate_enum(params.compression, models.Compression)
+
+	# PostgreSQL connection parameters can be given as separate keys in their own section
+	# instead of as a single connection string.
+	if not params.postgres_dsn and POSTGRES_SECTION in config:
+		params.postgres_dsn = postgres_section_to_dsn(config[POSTGRES_SECTION])
+
+	# Likewise, parameters whose values are booleans need to be converted from strings.
+	boolean_fields = [
+		'full_export',
+		'profile_memory',
+	]
+	for field in boolean_fields:
+		if isinstance(getattr(params, field), str):
+			setattr(params, field, config.getboolean(__appname__, field))
+
+	# And parameters whose values are integers.
+	integer_fields = [
+		'limit',
+	]
+	for field in integer_fields:
+		value = getattr(params, field)
+		if isinstance(value, str):
+			setattr(params, field, config.getint(__appname__, field) if value else None)
 
 	# Ensure that default values are set on any parameters that have default values but
 	# were not provided in the user's config file.
 	fields_with_defaults = {
 		'source':			DEFAULT_SOURCE,
-		'destination':		DEFAULT_DESTINATION,
+		'destination':		[DEFAULT_DESTINATION],
 		'cache_dir':		DEFAULT_CACHE_DIR,
 		'keyring_service':	DEFAULT_KEYRING_SERVICE,
 		'keyring_username':	DEFAULT_KEYRING_USERNAME,
 		'datetime_format':	DEFAULT_DATETIME_FORMAT,
+		'compression':		DEFAULT_COMPRESSION,
 	}
 	for field, default in fields_with_defaults.items():
 		if getattr(params, field) is None:
@@ -2,6 +2,14 @@
 """
 
 from .cache import emails_to_json_files, json_files_to_emails
-from .gmail import get_emails_from_gmail_api
 
 __all__ = ['emails_to_json_files', 'json_files_to_emails', 'get_emails_from_gmail_api']
+
+
+def __getattr__(name: str):
+    # The Gmail API client takes a long time to import, so it's only imported when it's
+    # used
+    if name == 'get_emails_from_gmail_api':
+        from .gmail import get_emails_from_gmail_api
+        return get_emails_from_gmail_api
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -1,54 +1,226 @@
 """Caches EmailMessages to JSON files, and retrieves EmailMessages from cache files.
+
+Cached emails are also added to the full-text search index in ``emails.index``.
+
+Each cache file records the version of the format that it was written in
+(``cache_version``). Files without one were written by older versions of ``grubhub-dl``:
+their ``sent_at`` is in the user's ``datetime_format`` without a UTC offset, and they're
+named after it. Those timestamps were formatted in the timezone of the email's Date
+header, which is always UTC for Grubhub emails. They're converted to the current format
+the first time the cache is used (see ``migrate_cache``).
 """
 
 import os
 import json
 import glob
+import sqlite3
 import logging
 from pathlib import Path
+from datetime import timezone
 from dataclasses import asdict
 
-from grubhub_dl import models
+from grubhub_dl import models, metrics, tracing, DEFAULT_DATETIME_FORMAT
+from grubhub_dl.timestamps import parse_timestamp, format_timestamp
+from grubhub_dl.emails import index
 
 logger = logging.getLogger(__name__)
 
+# The version of the format that emails are cached in
+CACHE_VERSION = 2
+
+# Marks that the emails in the cache directory have been migrated to ``CACHE_VERSION``
+VERSION_FILE_NAME = '.version'
+
+
+def write_email_file(
+    output_dir: str,
+    email: models.EmailMessage,
+    overwrite: bool = False
+) -> bool:
+    """Cache the email in ``output_dir``, in a file named after its UTC ``sent_at`` and
+    its subject
+
+    :param overwrite: Whether to replace the file if it already exists
+    :returns: Whether the file was written
+    """
+
+    sent_at = format_timestamp(email.sent_at, DEFAULT_DATETIME_FORMAT)
+    file_name = f'{sent_at}_{email.subject}.json'
+    file_path = os.path.join(output_dir, file_name)
+    email.cache_file = file_name
+    if not overwrite and os.path.exists(file_path):
+        return False
+
+    # Written to a temporary file first, so that readers (eg ``grubhub-dl watch``) never
+    # see a partly written email
+    temp_path = os.path.join(output_dir, f'.{file_name}.tmp')
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        json.dump(
+            asdict(email) | {'sent_at': sent_at, 'cache_version': CACHE_VERSION},
+            file
+        )
+    os.replace(temp_path, file_path)
+    return True
+
+
+def load_email(params: models.Parameters, data: dict) -> models.EmailMessage:
+    """Load an email from the contents of its cache file, in any version of the format
+    """
+
+    version = data.pop('cache_version', 1)
+    email = models.EmailMessage(**data)
+    if not isinstance(email.sent_at, str):
+        return email
+
+    # Cached timestamps don't include a UTC offset, but they're always in UTC
+    if version >= 2:
+        template = DEFAULT_DATETIME_FORMAT
+    else:
+        template = params.datetime_format or DEFAULT_DATETIME_FORMAT
+    try:
+        email.sent_at = parse_timestamp(email.sent_at, template, naive_tz=timezone.utc)
+    except ValueError:
+        logger.warning(
+            'Unable to parse the timestamp of cached email %s: %s',
+            email.cache_file,
+            email.sent_at
+        )
+        email.sent_at = None
+    return email
+
+
+def migrate_cache(params: models.Parameters):
+    """Convert the emails that were cached in an older format to ``CACHE_VERSION``, and
+    remove the emails that were cached more than once (by ``email_id``)
 
+    This is only done once per cache directory. Callers that list the cache files
+    themselves should call it before they do.
+    """
+
+    email_file_dir = os.path.join(params.cache_dir, 'emails')
+    version_file = os.path.join(email_file_dir, VERSION_FILE_NAME)
+    if os.path.exists(version_file) or not os.path.isdir(email_file_dir):
+        return
+
+    cached = {}
+    legacy = []
+    duplicates = 0
+    for file_name in sorted(os.listdir(email_file_dir)):
+        if not file_name.endswith('.json'):
+            continue
+        file_path = os.path.join(email_file_dir, file_name)
+        try:
+            data = json.loads(Path(file_path).read_bytes())
+        except (OSError, ValueError) as err:
+            logger.warning('Unable to read cached email %s: %s', file_path, err)
+            continue
+        if data.get('cache_version', 1) < CACHE_VERSION:
+            legacy.append((file_name, data))
+        elif data['email_id'] in cached:
+            os.remove(file_path)
+            duplicates += 1
+        else:
+            cached[data['email_id']] = file_name
+
+    migrated = 0
+    for file_name, data in legacy:
+        email = load_email(params, data)
+        if email.email_id in cached:
+            os.remove(os.path.join(email_file_dir, file_name))
+            duplicates += 1
+            continue
+        if email.sent_at is None:
+            # It's still read with the legacy format, but isn't renamed
+            continue
+        write_email_file(email_file_dir, email, overwrite=True)
+        if email.cache_file != file_name:
+            os.remove(os.path.join(email_file_dir, file_name))
+        cached[email.email_id] = email.cache_file
+        migrated += 1
+
+    Path(version_file).write_text(str(CACHE_VERSION))
+    if migrated or duplicates:
+        logger.info(
+            'Converted %s cached emails to the current format, and removed %s duplicates',
+            migrated,
+            duplicates
+        )
+
+
+@tracing.traced()
+@metrics.timed('cache_write')
 def emails_to_json_files(params: models.Parameters, emails: list[models.EmailMessage]):
     """Cache each EmailMessage as a JSON object in the user's cache directory
-    
+
+    Timestamps are always cached in UTC using ``DEFAULT_DATETIME_FORMAT``, regardless of
+    the user's ``datetime_format``, so that the cache can always be read back.
+
     :param params: The user-provided app parameters
     :param emails: A list of EmailMessage objects that were retrieved from an email API
     """
 
     output_dir = os.path.join(params.cache_dir, 'emails')
     Path(output_dir).mkdir(parents=True, exist_ok=True)
+    migrate_cache(params)
 
     for i, email in enumerate(emails, start=1):
         if isinstance(email, models.EmailMessage):
-            email.sent_at = email.sent_at.strftime(params.datetime_format)
-            file_name = f'{email.sent_at}_{email.subject}.json'
-            file_path = str(Path(output_dir) / file_name)
-            email.cache_file = file_name
-
-            if not os.path.exists(file_path):
-                with open(file_path, 'w', encoding='utf-8') as file:
-                    json.dump(asdict(email), file)
-                    logger.debug(
-                        'Saved email message %s of %s: %s',
-                        i,
-                        len(emails),
-                        file_path,
-                    )
+            if write_email_file(output_dir, email):
+                metrics.inc('grubhub_dl_emails_cached')
+                logger.debug(
+                    'Saved email message %s of %s: %s',
+                    i,
+                    len(emails),
+                    email.cache_file,
+                )
     logger.info('Saved %s emails to %s', len(emails), output_dir)
 
+    try:
+        with tracing.span('cache.update_search_index'):
+            index.update_search_index(
+                params,
+                [email for email in emails if isinstance(email, models.EmailMessage)]
+            )
+    except sqlite3.Error as err:
+        logger.warning('Unable to update the search index: %s', err)
 
-def json_files_to_emails(params: models.Parameters):
+
+@tracing.traced()
+@metrics.timed('cache_read')
+def json_files_to_emails(params: models.Parameters, file_names: list[str] = None):
     """Retrieve EmailMessages from cached JSON files
+
+    Emails that are cached more than once are only retrieved once, by ``email_id``.
+
+    :param params: The user-provided app parameters
+    :param file_names: Only retrieve the emails in these cache files (by default, every
+        cached email is retrieved)
     """
 
     email_file_dir = os.path.join(params.cache_dir, 'emails')
-    email_files = glob.glob(os.path.join(email_file_dir, '*.json'))
-    emails = [json.loads(Path(file).read_text()) for file in email_files]
-    emails = [models.EmailMessage(**email) for email in emails]
+    with tracing.span('cache.glob'):
+        if file_names is None:
+            migrate_cache(params)
+            email_files = glob.glob(os.path.join(email_file_dir, '*.json'))
+        else:
+            email_files = [os.path.join(email_file_dir, name) for name in file_names]
+    with tracing.span('cache.read', files=len(email_files)):
+        emails = []
+        email_ids = set()
+        bytes_read = 0
+        for file in email_files:
+            data = Path(file).read_bytes()
+            bytes_read += len(data)
+            email = load_email(params, json.loads(data))
+            # The file may have been renamed since it was written
+            email.cache_file = os.path.basename(file)
+            if email.email_id in email_ids:
+                logger.debug('Skipping duplicate cached email %s', file)
+                continue
+            email_ids.add(email.email_id)
+            emails.append(email)
+    metrics.inc('grubhub_dl_emails_read', len(emails))
+    metrics.inc('grubhub_dl_bytes_read', bytes_read, source='cache')
+
     logger.info('Retrieved %s emails from cached JSON files', len(emails))
     return emails
@@ -5,120 +5,288 @@ Dependencies
 - keyring
 - google-api-python-client
 - google-auth-oauthlib
-- google-auth openpyxl
+- google-auth
 """
 
 import os
+import re
 import json
 import base64
 import logging
-from datetime import datetime
+from email.utils import parsedate_to_datetime
 
+import httplib2
 import keyring
-from googleapiclient.discovery import build, Resource
+from googleapiclient import discovery_cache, version as client_version
+from googleapiclient.discovery import build, build_from_document, Resource
+from googleapiclient.errors import HttpError
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
+from google.auth.exceptions import RefreshError
 from google.auth.transport.requests import Request
-from openpyxl.utils.escape import unescape
 
 from grubhub_dl import (
     models,
+    metrics,
+    tracing,
+    DEFAULT_CACHE_DIR,
     DEFAULT_KEYRING_SERVICE,
     DEFAULT_KEYRING_USERNAME,
     DEFAULT_GMAIL_QUERY,
     GMAIL_SCOPES,
 )
+from grubhub_dl.timestamps import parse_timestamp, to_utc, TEMPLATE_EMAIL_DATE_HEADER
 
 logger = logging.getLogger(__name__)
 
+# Requests that fail with a 429 or 5xx error (eg when the user's quota is exceeded) are
+# retried this many times, with exponential backoff
+NUM_RETRIES = 5
 
+# Where the Gmail API's discovery document is downloaded from, if it isn't bundled with
+# the Google API client
+DISCOVERY_URL = 'https://gmail.googleapis.com/$discovery/rest?version=v1'
+
+# Characters that are escaped like ``_x000a_`` (the way that OOXML escapes them)
+ESCAPED_CHARACTER = re.compile('_x([0-9A-Fa-f]{4})_')
+
+
+def count_retries(record: logging.LogRecord) -> bool:
+    """Count the retries that the Google API client logs before it retries a request
+    """
+
+    if isinstance(record.msg, str) and record.msg.startswith('Sleeping'):
+        metrics.inc('grubhub_dl_gmail_api_retries')
+    return True
+
+
+logging.getLogger('googleapiclient.http').addFilter(count_retries)
+
+
+def unescape(value: str) -> str:
+    """Unescape the characters that are escaped like ``_x000a_``"""
+
+    if '_x' not in value:
+        return value
+    return ESCAPED_CHARACTER.sub(lambda match: chr(int(match.group(1), 16)), value)
+
+
+def get_discovery_document(cache_dir: str) -> dict | None:
+    """Get the discovery document that describes the Gmail API's methods
+
+    It's cached in ``cache_dir`` (per version of the Google API client), so that it only
+    needs to be downloaded once if it isn't bundled with the client, and building the
+    service doesn't depend on the network.
+
+    :returns: The discovery document, or None if it couldn't be downloaded
+    """
+
+    file_path = os.path.join(
+        cache_dir,
+        'discovery',
+        f'gmail.v1.{client_version.__version__}.json'
+    )
+    try:
+        with open(file_path, encoding='utf-8') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError) as err:
+        logger.warning('Unable to load the cached Gmail API discovery document: %s', err)
+
+    content = discovery_cache.get_static_doc('gmail', 'v1')
+    if content is None:
+        try:
+            response, content = httplib2.Http().request(DISCOVERY_URL)
+        except (OSError, httplib2.HttpLib2Error) as err:
+            logger.warning('Unable to download the Gmail API discovery document: %s', err)
+            return None
+        if response.status != 200:
+            logger.warning(
+                'Unable to download the Gmail API discovery document: HTTP %s',
+                response.status
+            )
+            return None
+
+    document = json.loads(content)
+    try:
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, 'w', encoding='utf-8') as file:
+            json.dump(document, file)
+    except OSError as err:
+        logger.warning('Unable to cache the Gmail API discovery document: %s', err)
+    return document
+
+
+def load_credentials(params: models.Parameters) -> Credentials | None:
+    """Get the user's cached Gmail API credentials from the system keyring"""
+
+    token = keyring.get_password(
+        params.keyring_service or DEFAULT_KEYRING_SERVICE,
+        params.keyring_username or DEFAULT_KEYRING_USERNAME
+    )
+    if not token:
+        return None
+    try:
+        creds = Credentials.from_authorized_user_info(json.loads(token))
+    except (ValueError, KeyError) as err:
+        logger.warning('Unable to load cached credentials: %s', err)
+        return None
+    logger.info('Got Gmail API access token from keyring')
+    return creds
+
+
+def save_credentials(params: models.Parameters, creds: Credentials):
+    """Cache the user's Gmail API credentials in the system keyring"""
+
+    keyring.set_password(
+        params.keyring_service or DEFAULT_KEYRING_SERVICE,
+        params.keyring_username or DEFAULT_KEYRING_USERNAME,
+        creds.to_json()
+    )
+
+
+@tracing.traced()
 def get_gmail_service(params: models.Parameters) -> Resource:
     """Authenticate with Google in the browser, and cache credentials in the system
     keyring to avoid needing to open the browser and attempting to authenticate every time
     this module is run.
+
+    The cached access token is only refreshed when it's about to expire (google-auth
+    considers it expired a few minutes early), and the refreshed token is cached again.
     """
 
     creds_file = params.email_creds_file
-    creds = None
-    token = keyring.get_password(DEFAULT_KEYRING_SERVICE, DEFAULT_KEYRING_USERNAME)
-    if token:
+    creds = load_credentials(params)
+
+    if creds and creds.expired and creds.refresh_token:
         try:
-            creds = Credentials.from_authorized_user_info(json.loads(token))
-            logger.info('Got Gmail API access token from keyring')
-        except (ValueError, KeyError) as err:
-            logger.warning('Unable to load cached credentials: %s', err)
+            creds.refresh(Request())
+            save_credentials(params, creds)
+            logger.info('Refreshed the Gmail API access token')
+        except RefreshError as err:
+            logger.warning('Unable to refresh the Gmail API access token: %s', err)
+            creds = None
 
     if not creds or not creds.valid:
-        if creds and not creds.expired and creds.refresh_token:
-            creds.refresh(Request())
+        if creds_file and os.path.exists(creds_file):
+            app_flow = InstalledAppFlow.from_client_secrets_file(
+                creds_file,
+                GMAIL_SCOPES
+            )
+            creds = app_flow.run_local_server(port=0)
+            save_credentials(params, creds)
         else:
-            if os.path.exists(creds_file):
-                app_flow = InstalledAppFlow.from_client_secrets_file(
-                    creds_file,
-                    GMAIL_SCOPES
-                )
-                creds = app_flow.run_local_server(port=0)
-
-                if hasattr(creds, 'expiry'):
-                    expiry = creds.expiry.isoformat()
-                else:
-                    expiry = None
-                
-                token = {
-                    'token':            creds.token,
-                    'refresh_token':    creds.refresh_token,
-                    'token_uri':        creds.token_uri,
-                    'client_id':        creds.client_id,
-                    'client_secret':    creds.client_secret,
-                    'scopes':           creds.scopes,
-                    'expiry':           expiry,
-                }
-                keyring.set_password(
-                    DEFAULT_KEYRING_SERVICE,
-                    DEFAULT_KEYRING_USERNAME,
-                    json.dumps(token)
-                )
-
-            else:
-                logger.error(
-                    "Credentials file doesn't exist (%s) Quitting...",
-                    creds_file
-                )
-                exit(1)
+            logger.error(
+                "Credentials file doesn't exist (%s) Quitting...",
+                creds_file
+            )
+            exit(1)
 
+    document = get_discovery_document(params.cache_dir or DEFAULT_CACHE_DIR)
+    if document is None:
+        service = build('gmail', 'v1', credentials=creds)
+    else:
+        service = build_from_document(document, credentials=creds)
     logger.info('Initialized Gmail API service')
-    return build('gmail', 'v1', credentials=creds)
+    return service
+
+
+@tracing.traced()
+def get_history_id(service: Resource) -> str:
+    """Get the ID of the latest change to the user's mailbox"""
+
+    metrics.inc('grubhub_dl_gmail_api_calls', method='getProfile')
+    profile = service.users().getProfile(userId='me').execute(num_retries=NUM_RETRIES)
+    return profile['historyId']
+
+
+@tracing.traced()
+def has_new_messages(service: Resource, history_id: str) -> tuple[bool, str]:
+    """Check whether any messages were added to the user's mailbox after the change
+    identified by ``history_id``
+
+    Only the changes are listed, which costs less quota than listing the messages.
+
+    :returns: Whether any messages were added, and the ID of the latest change
+    """
+
+    added = False
+    page_token = None
+    while True:
+        metrics.inc('grubhub_dl_gmail_api_calls', method='history.list')
+        try:
+            response = service.users().history().list(
+                userId='me',
+                startHistoryId=history_id,
+                historyTypes='messageAdded',
+                pageToken=page_token
+            ).execute(num_retries=NUM_RETRIES)
+        except HttpError as err:
+            # Gmail only keeps about a week of history, so if ``history_id`` is older than
+            # that, the messages have to be listed again
+            if err.status_code != 404:
+                raise
+            logger.info('The mailbox history has expired, listing the emails again')
+            return True, get_history_id(service)
+
+        added = added or any(
+            'messagesAdded' in record for record in response.get('history', [])
+        )
+        if 'nextPageToken' not in response:
+            return added, response['historyId']
+        page_token = response['nextPageToken']
 
 
+@tracing.traced()
 def get_grubhub_emails(
     service: Resource,
-    query: str = DEFAULT_GMAIL_QUERY
+    query: str = DEFAULT_GMAIL_QUERY,
+    known_ids: set[str] = None
 ) -> list | None:
-    """Get a listing of all Grubhub emails in the user's Gmail inbox"""
+    """Get a listing of all Grubhub emails in the user's Gmail inbox
 
-    response = service.users().messages().list(userId='me', q=query).execute()
+    :param known_ids: Stop listing after the first page that contains one of these
+        message IDs. Messages are listed newest first, so the rest of them are known too.
+    """
+
+    metrics.inc('grubhub_dl_gmail_api_calls', method='messages.list')
+    response = (
+        service.users().messages().list(userId='me', q=query)
+            .execute(num_retries=NUM_RETRIES)
+    )
     messages = []
 
     if 'messages' in response:
         messages.extend(response['messages'])
     
     while 'nextPageToken' in response:
+        if known_ids and any(
+            message['id'] in known_ids for message in response.get('messages', [])
+        ):
+            break
         page_token = response['nextPageToken']
+        metrics.inc('grubhub_dl_gmail_api_calls', method='messages.list')
         response = service.users().messages().list(
             userId='me',
             q=query,
             pageToken=page_token
-        ).execute()
+        ).execute(num_retries=NUM_RETRIES)
         if 'messages' in response:
             messages.extend(response['messages'])
 
     return messages
 
 
+@tracing.traced()
 def get_grubhub_email_contents(service: Resource, message_id: str):
     """Get the contents of the email identified by ``message_id``"""
 
-    message = service.users().messages().get(userId='me', id=message_id).execute()
+    metrics.inc('grubhub_dl_gmail_api_calls', method='messages.get')
+    message = (
+        service.users().messages().get(userId='me', id=message_id)
+            .execute(num_retries=NUM_RETRIES)
+    )
     headers = message['payload']['headers']
 
     def get_header_value(headers: list, name: str) -> str | None:
@@ -136,15 +304,18 @@ def get_grubhub_email_contents(service: Resource, message_id: str):
     sent_at = get_header_value(headers, 'date')
 
     if sent_at:
-        sent_at = sent_at.replace('(UTC)', '').strip()
-        sent_at = datetime.strptime(sent_at, '%a, %d %b %Y %H:%M:%S %z')
+        try:
+            sent_at = parse_timestamp(sent_at, TEMPLATE_EMAIL_DATE_HEADER)
+        except ValueError:
+            # Some mail servers leave out the day of the week, or use an obsolete
+            # RFC 822 format, so fall back to the more lenient (but slower) parser
+            sent_at = to_utc(parsedate_to_datetime(sent_at))
     body = None
 
     if 'body' in message['payload'] and 'data' in message['payload']['body']:
-        body = (
-            base64.urlsafe_b64decode(message['payload']['body']['data'])
-                .decode('utf-8')
-        )
+        data = base64.urlsafe_b64decode(message['payload']['body']['data'])
+        metrics.inc('grubhub_dl_bytes_read', len(data), source='gmail')
+        body = data.decode('utf-8')
 
     email = models.EmailMessage(
         email_id=message_id,
@@ -155,6 +326,8 @@ def get_grubhub_email_contents(service: Resource, message_id: str):
     )
     return email
 
+@tracing.traced()
+@metrics.timed('fetch')
 def get_emails_from_gmail_api(params: models.Parameters) -> list:
     service = get_gmail_service(params)
     messages = get_grubhub_emails(service)
@@ -163,9 +336,11 @@ def get_emails_from_gmail_api(params: models.Parameters) -> list:
     for i, email in enumerate(messages, start=1):
         content = get_grubhub_email_contents(service, message_id=email['id'])
         emails.append(content)
-        logger.info(
-            'Retrieved email %s: %s: %s',
+        metrics.inc('grubhub_dl_emails_fetched')
+        logger.debug(
+            'Retrieved email %s of %s: %s: %s',
             i,
+            len(messages),
             content.sent_at,
             content.subject
         )
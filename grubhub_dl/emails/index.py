@@ -0,0 +1,175 @@
+"""Maintains a full-text search index of the cached emails.
+
+The index is a SQLite database (``search.sqlite`` in the cache directory) with an FTS5
+table over the subject and the text of each email body (with its HTML markup stripped).
+Emails are added to it as they're cached, so it never has to be rebuilt.
+
+Each email is indexed once, by ``email_id``, along with the name of the file it's cached
+in. When an indexed email is cached in another file (eg when the cache is migrated), its
+file name is updated.
+"""
+
+import os
+import re
+import sqlite3
+import logging
+from pathlib import Path
+from html.parser import HTMLParser
+
+from grubhub_dl import models, DEFAULT_DATETIME_FORMAT
+from grubhub_dl.timestamps import format_timestamp
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE_NAME = 'search.sqlite'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS indexed_emails (
+    id                  INTEGER PRIMARY KEY,
+    email_id            TEXT UNIQUE,
+    cache_file          TEXT,
+    sent_at             TEXT,
+    subject             TEXT
+);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS email_text USING fts5(
+    subject,
+    body,
+    tokenize = 'porter unicode61 remove_diacritics 2'
+);
+'''
+
+# Tags whose text isn't displayed
+IGNORED_TAGS = {'script', 'style', 'head', 'title'}
+
+# Tags that separate the text before and after them
+BLOCK_TAGS = {
+    'br', 'p', 'div', 'table', 'tr', 'td', 'th', 'li', 'ul', 'ol', 'h1', 'h2', 'h3',
+    'h4', 'h5', 'h6', 'hr',
+}
+
+WHITESPACE = re.compile(r'\s+')
+
+
+class TextExtractor(HTMLParser):
+    """Collect the text of an HTML document, without its markup"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.ignored_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in IGNORED_TAGS:
+            self.ignored_depth += 1
+        elif tag in BLOCK_TAGS:
+            self.parts.append(' ')
+
+    def handle_endtag(self, tag):
+        if tag in IGNORED_TAGS:
+            self.ignored_depth = max(0, self.ignored_depth - 1)
+        elif tag in BLOCK_TAGS:
+            self.parts.append(' ')
+
+    def handle_data(self, data):
+        if not self.ignored_depth:
+            self.parts.append(data)
+
+
+def html_to_text(html: str) -> str:
+    """Strip the markup from an email body, and collapse its whitespace"""
+
+    if not html:
+        return ''
+    parser = TextExtractor()
+    parser.feed(html)
+    parser.close()
+    return WHITESPACE.sub(' ', ''.join(parser.parts)).strip()
+
+
+def connect(cache_dir: str) -> sqlite3.Connection:
+    """Open the search index in the cache directory, and create its schema if needed
+    """
+
+    Path(cache_dir).mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(os.path.join(cache_dir, INDEX_FILE_NAME))
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = NORMAL')
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def indexed_cache_files(conn: sqlite3.Connection) -> set[str]:
+    """Get the names of the cache files of the emails that are already indexed"""
+
+    return {row[0] for row in conn.execute('SELECT cache_file FROM indexed_emails')}
+
+
+def index_emails(conn: sqlite3.Connection, emails: list[models.EmailMessage]) -> int:
+    """Add the emails that aren't indexed yet to the search index, and update the cache
+    file of the ones that are
+
+    :returns: The number of emails that were added
+    """
+
+    indexed = dict(conn.execute('SELECT email_id, cache_file FROM indexed_emails'))
+    added = 0
+    with conn:
+        for email in emails:
+            if email.email_id in indexed:
+                if email.cache_file and indexed[email.email_id] != email.cache_file:
+                    conn.execute(
+                        'UPDATE indexed_emails SET cache_file = ? WHERE email_id = ?',
+                        (email.cache_file, email.email_id)
+                    )
+                    indexed[email.email_id] = email.cache_file
+                continue
+            indexed[email.email_id] = email.cache_file
+            sent_at = email.sent_at
+            if sent_at is not None and not isinstance(sent_at, str):
+                sent_at = format_timestamp(sent_at, DEFAULT_DATETIME_FORMAT)
+            cursor = conn.execute(
+                'INSERT INTO indexed_emails (email_id, cache_file, sent_at, subject) '
+                'VALUES (?, ?, ?, ?)',
+                (email.email_id, email.cache_file, sent_at, email.subject)
+            )
+            conn.execute(
+                'INSERT INTO email_text (rowid, subject, body) VALUES (?, ?, ?)',
+                (cursor.lastrowid, email.subject or '', html_to_text(email.body))
+            )
+            added += 1
+    return added
+
+
+def remove_cache_files(conn: sqlite3.Connection, cache_files: set[str]) -> int:
+    """Remove the emails that are cached in the given files from the search index (eg
+    because the files were removed from the cache)
+
+    :returns: The number of emails that were removed
+    """
+
+    removed = 0
+    with conn:
+        for cache_file in cache_files:
+            conn.execute(
+                'DELETE FROM email_text WHERE rowid IN '
+                '(SELECT id FROM indexed_emails WHERE cache_file = ?)',
+                (cache_file,)
+            )
+            removed += conn.execute(
+                'DELETE FROM indexed_emails WHERE cache_file = ?',
+                (cache_file,)
+            ).rowcount
+    return removed
+
+
+def update_search_index(params: models.Parameters, emails: list[models.EmailMessage]):
+    """Add the emails that aren't indexed yet to the search index in the cache directory
+    """
+
+    conn = connect(params.cache_dir)
+    try:
+        added = index_emails(conn, emails)
+    finally:
+        conn.close()
+    logger.debug('Added %s emails to the search index', added)
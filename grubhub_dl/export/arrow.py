@@ -0,0 +1,146 @@
+"""Converts extracted Grubhub data to Apache Arrow, and exports it to Arrow IPC files.
+
+The typed columns of a ``RecordBatch`` already use Arrow's memory layout for their values,
+so the values of integer and timestamp columns are wrapped without copying them.
+
+Dependencies
+============
+- pyarrow
+"""
+
+import os
+import typing as t
+import logging
+from pathlib import Path
+from datetime import datetime
+
+import pyarrow as pa
+
+from grubhub_dl import models
+from grubhub_dl.models.records import BoolColumn, IntColumn
+
+logger = logging.getLogger(__name__)
+
+# Low-cardinality string fields, which are dictionary-encoded
+DICTIONARY_FIELDS = {
+    'category',
+    'restaurant_name',
+    'sent_by',
+}
+
+# The Arrow type of each Python type that's used in ``models.grubhub``
+ARROW_TYPES = {
+    int:            pa.int64(),
+    bool:           pa.bool_(),
+    str:            pa.string(),
+    list[str]:      pa.list_(pa.string()),
+}
+ARROW_TIMESTAMP = pa.timestamp('us', tz='UTC')
+
+
+def arrow_schema(record_type: type) -> pa.Schema:
+    """Get the Arrow schema of the records of the given dataclass type
+    """
+
+    type_hints = t.get_type_hints(record_type)
+    arrow_fields = []
+    for name, type_hint in type_hints.items():
+        if name in DICTIONARY_FIELDS:
+            arrow_type = pa.dictionary(pa.int32(), pa.string())
+        elif type_hint is datetime:
+            arrow_type = ARROW_TIMESTAMP
+        else:
+            # Enum fields (eg "category") have been replaced by their names by the time
+            # they're exported, so anything unknown is stored as a string
+            arrow_type = ARROW_TYPES.get(type_hint, pa.string())
+        arrow_fields.append(pa.field(name, arrow_type))
+    return pa.schema(arrow_fields)
+
+
+def validity_bitmap(column: IntColumn) -> pa.Buffer | None:
+    """Pack the validity bytes of a typed column into an Arrow validity bitmap
+    """
+
+    if not column.null_count:
+        return None
+    validity = pa.Array.from_buffers(
+        pa.uint8(),
+        len(column),
+        [None, pa.py_buffer(column.validity)]
+    )
+    return validity.cast(pa.bool_()).buffers()[1]
+
+
+def column_to_arrow(column, arrow_type: pa.DataType) -> pa.Array:
+    """Convert one column of a ``RecordBatch`` to an Arrow array
+
+    The values of integer and timestamp columns are wrapped without copying them.
+    """
+
+    if isinstance(column, BoolColumn):
+        validity = validity_bitmap(column)
+        return pa.Array.from_buffers(
+            pa.int8(),
+            len(column),
+            [validity, pa.py_buffer(column.values)],
+            null_count=column.null_count,
+        ).cast(pa.bool_())
+
+    if isinstance(column, IntColumn):
+        validity = validity_bitmap(column)
+        return pa.Array.from_buffers(
+            arrow_type,
+            len(column),
+            [validity, pa.py_buffer(column.values)],
+            null_count=column.null_count,
+        )
+
+    if pa.types.is_dictionary(arrow_type):
+        return pa.array(column.values, type=pa.string()).dictionary_encode()
+
+    return pa.array(column.values, type=arrow_type)
+
+
+def record_batch_to_arrow(batch: models.RecordBatch) -> pa.RecordBatch:
+    """Convert a ``RecordBatch`` to an Arrow record batch
+    """
+
+    schema = arrow_schema(batch.record_type)
+    arrays = [
+        column_to_arrow(batch.columns[field.name], field.type)
+        for field in schema
+    ]
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def grubhub_data_to_arrow(
+    grubhub_data: dict[str, models.RecordBatch]
+) -> dict[str, pa.Table]:
+    """Convert every table of extracted Grubhub data to an Arrow table
+    """
+
+    return {
+        name: pa.Table.from_batches([record_batch_to_arrow(batch)])
+        for name, batch in grubhub_data.items()
+    }
+
+
+def grubhub_data_to_arrow_file(
+    params: models.Parameters,
+    grubhub_data: dict[str, models.RecordBatch]
+):
+    """Export each table to an Arrow IPC file named ``<table>.arrow`` in the directory
+    ``params.output_path``
+
+    The IPC file format can be memory-mapped by other processes (eg with
+    ``pyarrow.memory_map`` or ``pyarrow.ipc.open_file``) without parsing it again.
+    """
+
+    Path(params.output_path).mkdir(parents=True, exist_ok=True)
+
+    for name, table in grubhub_data_to_arrow(grubhub_data).items():
+        file_path = os.path.join(params.output_path, f'{name}.arrow')
+        with pa.OSFile(file_path, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        logger.info('Exported %s %s to %s', table.num_rows, name, file_path)
@@ -0,0 +1,68 @@
+"""Exports extracted Grubhub data to one CSV file per table.
+
+Rows are streamed through ``csv.writer`` a chunk at a time, and the tables are written
+concurrently. The columns are in the same order as the fields of the dataclasses in
+``models.grubhub``.
+"""
+
+import os
+import csv
+import time
+import logging
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+from grubhub_dl import models, DEFAULT_DATETIME_FORMAT
+from grubhub_dl.export.rows import iter_rows
+from grubhub_dl.export.files import output_file_path, open_output_file
+
+logger = logging.getLogger(__name__)
+
+
+def batch_to_csv_file(
+    params: models.Parameters,
+    name: str,
+    batch: models.RecordBatch
+) -> str:
+    """Write one table to a CSV file in the directory ``params.output_path``
+
+    :returns: The path of the CSV file
+    """
+
+    path = output_file_path(params, name, '.csv')
+    datetime_format = params.datetime_format or DEFAULT_DATETIME_FORMAT
+    with open_output_file(path, params.compression, text=True) as file:
+        writer = csv.writer(file)
+        writer.writerow(batch.field_names)
+        writer.writerows(iter_rows(batch, datetime_format))
+    logger.info('Exported %s %s to %s', len(batch), name, path)
+    return path
+
+
+def grubhub_data_to_csv_file(
+    params: models.Parameters,
+    grubhub_data: dict[str, models.RecordBatch]
+):
+    """Write each table to a CSV file in the directory ``params.output_path``, eg
+    ``orders.csv`` (or ``orders.csv.gz`` when compressed)
+    """
+
+    started_at = time.perf_counter()
+    Path(params.output_path).mkdir(parents=True, exist_ok=True)
+
+    # Compression and writes release the GIL, so writing the tables in parallel overlaps
+    # them with the conversion of the other tables
+    max_workers = max(1, min(len(grubhub_data), os.cpu_count() or 1))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(batch_to_csv_file, params, name, batch)
+            for name, batch in grubhub_data.items()
+        ]
+        for future in futures:
+            future.result()
+
+    logger.info(
+        'Exported %s records to CSV in %.2fs',
+        sum(len(batch) for batch in grubhub_data.values()),
+        time.perf_counter() - started_at
+    )
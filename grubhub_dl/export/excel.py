@@ -0,0 +1,190 @@
+"""Exports extracted Grubhub data to an Excel workbook, with one worksheet per table.
+
+The workbook is written with xlsxwriter's ``constant_memory`` mode, which flushes each
+row to disk as soon as the next one is written, so memory use doesn't grow with the size
+of the workbook.
+
+Cells can't hold more than 32,767 characters, so longer strings (usually email bodies)
+are truncated, and the truncated cells are logged.
+
+Dependencies
+============
+- xlsxwriter
+"""
+
+import os
+import json
+import time
+import typing as t
+import logging
+from enum import Enum
+from pathlib import Path
+
+import xlsxwriter
+from xlsxwriter.utility import xl_rowcol_to_cell
+
+from grubhub_dl import models
+from grubhub_dl.models.records import BoolColumn, IntColumn, TimestampColumn
+from grubhub_dl.export.files import open_output_file
+from grubhub_dl.export.rows import CHUNK_SIZE
+
+logger = logging.getLogger(__name__)
+
+WORKBOOK_FILE_NAME = 'grubhub_data.xlsx'
+
+# Worksheets can't have more rows than this (including the header row), so larger tables
+# are continued on another worksheet
+MAX_ROWS = 1_048_576
+
+# Excel doesn't support timezone-aware datetimes, so timestamps are written in UTC
+EXCEL_DATETIME_FORMAT = 'yyyy-mm-dd hh:mm:ss'
+
+# What xlsxwriter returns when a string is longer than a cell can hold, and was truncated
+STRING_TRUNCATED = -2
+
+# The number of truncated cells that are listed in the warning for each worksheet
+MAX_LOGGED_CELLS = 10
+
+
+def convert_value(value):
+    """Convert a value of a non-numeric column to a string"""
+
+    if isinstance(value, Enum):
+        return value.name
+    if isinstance(value, (list, tuple, dict)):
+        return json.dumps(value)
+    if isinstance(value, str) or value is None:
+        return value
+    return str(value)
+
+
+def convert_column(column, start: int, stop: int) -> list:
+    """Convert the values of one column (from ``start`` up to ``stop``) to values that
+    can be written to a worksheet
+    """
+
+    values = column.to_list(start, stop)
+    if isinstance(column, TimestampColumn):
+        return [None if value is None else value.replace(tzinfo=None) for value in values]
+    if isinstance(column, IntColumn):
+        return values
+    return [convert_value(value) for value in values]
+
+
+def iter_excel_rows(batch: models.RecordBatch) -> t.Iterator[tuple]:
+    """Iterate over the records in the batch as tuples of values that can be written to
+    a worksheet
+    """
+
+    for start in range(0, len(batch), CHUNK_SIZE):
+        yield from zip(*(
+            convert_column(column, start, start + CHUNK_SIZE)
+            for column in batch.columns.values()
+        ))
+
+
+def column_writers(worksheet, batch: models.RecordBatch) -> list:
+    """Get the worksheet method that writes the values of each column
+
+    Calling the method for the column's type directly skips the type detection (and the
+    URL and number matching of strings) that ``worksheet.write`` does for every cell.
+    """
+
+    writers = []
+    for column in batch.columns.values():
+        if isinstance(column, TimestampColumn):
+            writers.append(worksheet.write_datetime)
+        elif isinstance(column, BoolColumn):
+            writers.append(worksheet.write_boolean)
+        elif isinstance(column, IntColumn):
+            writers.append(worksheet.write_number)
+        else:
+            writers.append(worksheet.write_string)
+    return writers
+
+
+def add_worksheet(
+    workbook: xlsxwriter.Workbook,
+    name: str,
+    field_names: list[str],
+    header_format
+):
+    """Add a worksheet with a header row"""
+
+    worksheet = workbook.add_worksheet(name[:31])
+    worksheet.freeze_panes(1, 0)
+    worksheet.write_row(0, 0, field_names, header_format)
+    return worksheet
+
+
+def log_truncated_cells(worksheet_name: str, cells: list[str]):
+    """Warn that the strings in the given cells of a worksheet were truncated"""
+
+    if not cells:
+        return
+    listed = ', '.join(cells[:MAX_LOGGED_CELLS])
+    if len(cells) > MAX_LOGGED_CELLS:
+        listed += f' and {len(cells) - MAX_LOGGED_CELLS} more'
+    logger.warning(
+        'Truncated %s cells of worksheet "%s" to 32,767 characters (the most that Excel '
+        'allows): %s',
+        len(cells),
+        worksheet_name,
+        listed
+    )
+
+
+def grubhub_data_to_excel_file(
+    params: models.Parameters,
+    grubhub_data: dict[str, models.RecordBatch]
+):
+    """Write every table to a worksheet of the workbook ``grubhub_data.xlsx`` in the
+    directory ``params.output_path``
+    """
+
+    started_at = time.perf_counter()
+    Path(params.output_path).mkdir(parents=True, exist_ok=True)
+    path = os.path.join(params.output_path, WORKBOOK_FILE_NAME)
+
+    with open_output_file(path) as file:
+        workbook = xlsxwriter.Workbook(
+            file,
+            {'constant_memory': True, 'default_date_format': EXCEL_DATETIME_FORMAT}
+        )
+        header_format = workbook.add_format({'bold': True})
+
+        for name, batch in grubhub_data.items():
+            worksheet = add_worksheet(workbook, name, batch.field_names, header_format)
+            writers = column_writers(worksheet, batch)
+            truncated = []
+            sheet_number = 1
+            row_number = 1
+            for row in iter_excel_rows(batch):
+                if row_number == MAX_ROWS:
+                    log_truncated_cells(worksheet.name, truncated)
+                    truncated = []
+                    sheet_number += 1
+                    worksheet = add_worksheet(
+                        workbook,
+                        f'{name} ({sheet_number})',
+                        batch.field_names,
+                        header_format
+                    )
+                    writers = column_writers(worksheet, batch)
+                    row_number = 1
+                for column_number, (write, value) in enumerate(zip(writers, row)):
+                    if value is None:
+                        continue
+                    if write(row_number, column_number, value) == STRING_TRUNCATED:
+                        truncated.append(xl_rowcol_to_cell(row_number, column_number))
+                row_number += 1
+            log_truncated_cells(worksheet.name, truncated)
+
+        workbook.close()
+
+    logger.info(
+        'Exported %s records to %s in %.2fs',
+        sum(len(batch) for batch in grubhub_data.values()),
+        path,
+        time.perf_counter() - started_at
+    )
@@ -1,40 +1,27 @@
 """Exports EmailMessage objects to various different formats.
 """
 
-import os
-import json
 import logging
 
 import pandas as pd
 
 from grubhub_dl import models
+from grubhub_dl.export.arrow import grubhub_data_to_arrow
 
 logger = logging.getLogger(__name__)
 
 
-def grubhub_data_to_table(params: models.Parameters, grubhub_data):
-    pass
+def grubhub_data_to_dataframe(
+    params: models.Parameters,
+    grubhub_data
+) -> dict[str, pd.DataFrame]:
+    """Get a DataFrame for each table of extracted Grubhub data
 
+    The DataFrames are backed by the Arrow arrays that the data was converted to, so
+    building them doesn't copy the data again.
+    """
 
-def grubhub_data_to_json(params: models.Parameters, grubhub_data):
-    pass
-
-
-def grubhub_data_to_json_file(params: models.Parameters, grubhub_data):
-    pass
-
-
-def grubhub_data_to_csv_file(params: models.Parameters, grubhub_data):
-    pass
-
-
-def grubhub_data_to_sqlite(params: models.Parameters, grubhub_data):
-    pass
-
-
-def grubhub_data_to_postgres(params: models.Parameters, grubhub_data):
-    pass
-
-
-def grubhub_data_to_dataframe(params: models.Parameters, grubhub_data) -> pd.DataFrame:
-    pass
+    return {
+        name: table.to_pandas(types_mapper=pd.ArrowDtype)
+        for name, table in grubhub_data_to_arrow(grubhub_data).items()
+    }
@@ -0,0 +1,114 @@
+"""Opens the files that extracted Grubhub data is exported to.
+
+Files are written to a temporary path and renamed into place once they're complete, so
+an interrupted export never leaves a truncated file behind. Files that are appended to
+are truncated back to their original size if the export is interrupted, and files whose
+records have changed are rewritten. They can optionally be compressed with gzip or zstd
+(each append adds a gzip member or a zstd frame, which readers decompress as one stream).
+
+Dependencies
+============
+- zstandard (optional, only needed for zstd compression)
+"""
+
+import io
+import os
+import gzip
+import typing as t
+import logging
+from contextlib import contextmanager
+
+from grubhub_dl import models, ERROR_MESSAGE_FATAL
+
+logger = logging.getLogger(__name__)
+
+COMPRESSION_SUFFIXES = {
+    models.Compression.none:    '',
+    models.Compression.gzip:    '.gz',
+    models.Compression.zstd:    '.zst',
+}
+
+
+def output_file_path(params: models.Parameters, name: str, extension: str) -> str:
+    """Get the path of the file that the table ``name`` is exported to, eg
+    ``<output_path>/orders.csv.gz``
+    """
+
+    compression = params.compression or models.Compression.none
+    return os.path.join(
+        params.output_path,
+        f'{name}{extension}{COMPRESSION_SUFFIXES[compression]}'
+    )
+
+
+def open_compressed_file(
+    path: str,
+    compression: models.Compression,
+    mode: str = 'wb'
+) -> t.BinaryIO:
+    """Open a binary file for writing (or appending, if ``mode`` is ``ab``), compressing
+    what's written to it if needed, or for reading (if ``mode`` is ``rb``), decompressing
+    it if needed
+    """
+
+    match compression:
+        case models.Compression.gzip:
+            return gzip.open(path, mode, compresslevel=6)
+        case models.Compression.zstd:
+            try:
+                import zstandard
+            except ImportError:
+                logger.error('The "zstandard" package is needed for zstd compression')
+                logger.error(ERROR_MESSAGE_FATAL)
+                exit(1)
+            file = zstandard.open(path, mode)
+            # zstd readers can't be iterated over line by line without a buffer
+            return io.BufferedReader(file) if mode == 'rb' else file
+        case _:
+            return open(path, mode)
+
+
+@contextmanager
+def open_output_file(
+    path: str,
+    compression: models.Compression = None,
+    text: bool = False
+) -> t.Iterator[t.IO]:
+    """Open the file at ``path`` for writing, in text mode (UTF-8, with newlines left
+    as-is for the csv module) if ``text`` is true, otherwise in binary mode
+
+    The file only replaces ``path`` if the block exits without an exception.
+    """
+
+    temp_path = f'{path}.tmp'
+    file = open_compressed_file(temp_path, compression or models.Compression.none)
+    if text:
+        file = io.TextIOWrapper(file, encoding='utf-8', newline='')
+    try:
+        with file:
+            yield file
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    os.replace(temp_path, path)
+
+
+@contextmanager
+def append_output_file(
+    path: str,
+    compression: models.Compression = None
+) -> t.Iterator[t.BinaryIO]:
+    """Open the file at ``path`` for appending in binary mode, creating it if needed
+
+    If the block exits with an exception, the file is truncated back to what it was.
+    """
+
+    size = os.path.getsize(path) if os.path.exists(path) else 0
+    file = open_compressed_file(path, compression or models.Compression.none, 'ab')
+    try:
+        with file:
+            yield file
+    except BaseException:
+        with open(path, 'r+b') as original:
+            original.truncate(size)
+        raise
@@ -0,0 +1,199 @@
+"""Exports extracted Grubhub data as JSON Lines (one JSON object per record per line).
+
+Records are serialized and written a chunk at a time, so memory use doesn't grow with
+the size of the export. Files can optionally be compressed with gzip or zstd.
+
+Once a table has been exported to a file, only the records that are new are appended to
+it. If any of its records have changed, the file is rewritten with the old lines of those
+records replaced, so each record always has exactly one line.
+
+Dependencies
+============
+- orjson (optional, records are serialized with ``json`` if it's not installed)
+"""
+
+import sys
+import json
+import typing as t
+import logging
+from enum import Enum
+from pathlib import Path
+
+from grubhub_dl import models, DEFAULT_DATETIME_FORMAT
+from grubhub_dl.models.records import TimestampColumn
+from grubhub_dl.export.files import (
+    output_file_path,
+    open_compressed_file,
+    open_output_file,
+    append_output_file,
+)
+from grubhub_dl.export.state import record_key
+from grubhub_dl.timestamps import format_timestamp
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# The number of records that are serialized before they're written out together
+CHUNK_SIZE = 4096
+
+
+def default(value):
+    """Serialize values that JSON doesn't support natively"""
+
+    if isinstance(value, Enum):
+        return value.name
+    return str(value)
+
+
+if orjson:
+    def dumps(record: dict) -> bytes:
+        return orjson.dumps(record, default=default)
+
+    loads = orjson.loads
+else:
+    def dumps(record: dict) -> bytes:
+        return json.dumps(record, default=default, separators=(',', ':')).encode('utf-8')
+
+    loads = json.loads
+
+
+def iter_json_lines(
+    batch: models.RecordBatch,
+    datetime_format: str,
+    extra_fields: dict = None
+) -> t.Iterator[bytes]:
+    """Serialize the records in the batch as JSON lines, yielding one chunk of lines at a
+    time
+    """
+
+    names = batch.field_names
+    timestamp_fields = [
+        i for i, column in enumerate(batch.columns.values())
+        if isinstance(column, TimestampColumn)
+    ]
+    # orjson serializes enums as their values without calling ``default``, so they're
+    # replaced by their names first
+    field_types = t.get_type_hints(batch.record_type)
+    enum_fields = [
+        i for i, name in enumerate(names)
+        if isinstance(field_types.get(name), type) and issubclass(field_types[name], Enum)
+    ]
+    extra_fields = extra_fields or {}
+
+    for start in range(0, len(batch), CHUNK_SIZE):
+        lines = []
+        for row in batch.rows(start, start + CHUNK_SIZE):
+            record = extra_fields | dict(zip(names, row))
+            for i in timestamp_fields:
+                record[names[i]] = format_timestamp(row[i], datetime_format)
+            for i in enum_fields:
+                if isinstance(row[i], Enum):
+                    record[names[i]] = row[i].name
+            lines.append(dumps(record))
+        lines.append(b'')
+        yield b'\n'.join(lines)
+
+
+def grubhub_data_to_json(
+    params: models.Parameters,
+    grubhub_data: dict[str, models.RecordBatch]
+):
+    """Write every record to stdout as JSON lines, with a ``table`` field that has the
+    name of the table the record is from
+    """
+
+    datetime_format = params.datetime_format or DEFAULT_DATETIME_FORMAT
+    output = sys.stdout.buffer
+    for name, batch in grubhub_data.items():
+        for chunk in iter_json_lines(batch, datetime_format, {'table': name}):
+            output.write(chunk)
+    output.flush()
+
+
+def replace_json_lines(
+    path: str,
+    compression: models.Compression,
+    batch: models.RecordBatch,
+    primary_key: tuple[str],
+    keys: set[str],
+    datetime_format: str
+) -> int:
+    """Rewrite the JSON lines file at ``path`` with the records in the batch, replacing
+    the existing lines of the records whose keys are in ``keys``
+
+    :param primary_key: The fields that ``keys`` are made of
+    :returns: The number of existing lines that were replaced
+    """
+
+    replaced = 0
+    with open_output_file(path, compression) as file:
+        with open_compressed_file(path, compression, 'rb') as existing:
+            for line in existing:
+                record = loads(line)
+                if record_key(record[field] for field in primary_key) in keys:
+                    replaced += 1
+                    continue
+                file.write(line if line.endswith(b'\n') else line + b'\n')
+        for chunk in iter_json_lines(batch, datetime_format):
+            file.write(chunk)
+    return replaced
+
+
+def grubhub_data_to_json_file(
+    params: models.Parameters,
+    grubhub_data: dict[str, models.RecordBatch],
+    exported: dict[str, t.Collection[str]] = None
+):
+    """Write each table to a JSON lines file in the directory ``params.output_path``,
+    eg ``orders.jsonl.gz``
+
+    :param exported: The keys (see ``state.record_key``) of the records that each table
+        already has in its file, eg ``ExportState.fingerprints``. New records are
+        appended to those files, and the files with records that have changed are
+        rewritten. The files of the other tables are replaced.
+    """
+
+    datetime_format = params.datetime_format or DEFAULT_DATETIME_FORMAT
+    Path(params.output_path).mkdir(parents=True, exist_ok=True)
+    exported = exported or {}
+
+    for name, batch in grubhub_data.items():
+        path = output_file_path(params, name, '.jsonl')
+        if exported.get(name):
+            if not len(batch):
+                continue
+            primary_key = models.PRIMARY_KEYS[name]
+            indexes = [batch.field_names.index(field) for field in primary_key]
+            keys = {record_key(row[i] for i in indexes) for row in batch.rows()}
+            if any(key in exported[name] for key in keys):
+                replaced = replace_json_lines(
+                    path,
+                    params.compression,
+                    batch,
+                    primary_key,
+                    keys,
+                    datetime_format
+                )
+                logger.info(
+                    'Rewrote %s with %s new and %s changed %s',
+                    path,
+                    len(batch) - replaced,
+                    replaced,
+                    name
+                )
+                continue
+
+            with append_output_file(path, params.compression) as file:
+                for chunk in iter_json_lines(batch, datetime_format):
+                    file.write(chunk)
+            logger.info('Appended %s %s to %s', len(batch), name, path)
+            continue
+
+        with open_output_file(path, params.compression) as file:
+            for chunk in iter_json_lines(batch, datetime_format):
+                file.write(chunk)
+        logger.info('Exported %s %s to %s', len(batch), name, path)
@@ -0,0 +1,179 @@
+"""Exports extracted Grubhub data to a partitioned Parquet dataset per table.
+
+Each table is written to ``<output_path>/<table>/``, partitioned by the year and month of
+``sent_at`` (eg ``orders/year=2025/month=3/part-0.parquet``), so readers can skip the
+months and columns they don't need. Low-cardinality strings are dictionary-encoded.
+
+When only some records are new or have changed, only the partitions that contain them
+are rewritten.
+
+Dependencies
+============
+- pyarrow
+"""
+
+import os
+import shutil
+import logging
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from grubhub_dl import models
+from grubhub_dl.export.arrow import record_batch_to_arrow
+
+logger = logging.getLogger(__name__)
+
+PARTITIONING = ds.partitioning(
+    pa.schema([('year', pa.int32()), ('month', pa.int32())]),
+    flavor='hive'
+)
+PARQUET_FORMAT = ds.ParquetFileFormat()
+PARQUET_OPTIONS = PARQUET_FORMAT.make_write_options(
+    compression='zstd',
+    use_dictionary=True,
+)
+
+
+def add_partition_columns(table: pa.Table) -> pa.Table:
+    """Add the ``year`` and ``month`` of ``sent_at`` to the table as columns
+    """
+
+    return (
+        table
+            .append_column('year', pc.year(table['sent_at']).cast(pa.int32()))
+            .append_column('month', pc.month(table['sent_at']).cast(pa.int32()))
+    )
+
+
+def primary_key_values(table: pa.Table, primary_key: tuple[str]) -> pa.Array:
+    """Get the primary key of every row of the table as a single array
+    """
+
+    if len(primary_key) == 1:
+        return table[primary_key[0]]
+    return pc.binary_join_element_wise(
+        *[table[field].cast(pa.string()) for field in primary_key],
+        '\x1f'
+    )
+
+
+def replace_rows(existing: pa.Table, table: pa.Table, primary_key: tuple[str]) -> pa.Table:
+    """Combine the existing rows with the new and changed rows, keeping only the new
+    version of the rows that have changed
+    """
+
+    is_changed = pc.is_in(
+        primary_key_values(existing, primary_key),
+        value_set=primary_key_values(table, primary_key)
+    )
+    existing = existing.filter(pc.invert(is_changed))
+    existing = existing.select(table.column_names).cast(table.schema)
+    return pa.concat_tables([existing, table])
+
+
+def merge_existing_partitions(
+    table_dir: str,
+    table: pa.Table,
+    primary_key: tuple[str]
+) -> pa.Table:
+    """Combine the new and changed rows with the existing rows of the partitions they
+    belong to, so that those partitions can be rewritten
+
+    Rows without a ``sent_at`` belong to the partition where ``year`` and ``month`` are
+    null.
+    """
+
+    partitions = pc.unique(
+        pc.binary_join_element_wise(
+            table['year'].cast(pa.string()),
+            table['month'].cast(pa.string()),
+            '-'
+        )
+    ).to_pylist()
+
+    partition_filter = None
+    for partition in partitions:
+        if partition is None:
+            expression = ds.field('year').is_null()
+        else:
+            year, month = partition.split('-')
+            expression = (
+                (ds.field('year') == int(year)) & (ds.field('month') == int(month))
+            )
+        partition_filter = (
+            expression if partition_filter is None else partition_filter | expression
+        )
+    if partition_filter is None:
+        return table
+
+    existing = ds.dataset(
+        table_dir,
+        format=PARQUET_FORMAT,
+        partitioning=PARTITIONING
+    ).to_table(filter=partition_filter)
+    return replace_rows(existing, table, primary_key)
+
+
+def table_to_parquet(
+    table_dir: str,
+    table: pa.Table,
+    primary_key: tuple[str],
+    full_export: bool
+):
+    """Write one table to a Parquet dataset in ``table_dir``
+    """
+
+    if full_export and os.path.exists(table_dir):
+        shutil.rmtree(table_dir)
+
+    if 'sent_at' not in table.column_names:
+        # Restaurants and menu items are small and unpartitioned, so they're always
+        # rewritten in full
+        if os.path.exists(table_dir):
+            existing = ds.dataset(table_dir, format=PARQUET_FORMAT).to_table()
+            table = replace_rows(existing, table, primary_key)
+        ds.write_dataset(
+            table,
+            table_dir,
+            format=PARQUET_FORMAT,
+            file_options=PARQUET_OPTIONS,
+            existing_data_behavior='delete_matching',
+        )
+        return
+
+    table = add_partition_columns(table)
+    if os.path.exists(table_dir):
+        table = merge_existing_partitions(table_dir, table, primary_key)
+
+    # Only the partitions that are written to are replaced, and the others are left as
+    # they are
+    ds.write_dataset(
+        table,
+        table_dir,
+        format=PARQUET_FORMAT,
+        file_options=PARQUET_OPTIONS,
+        partitioning=PARTITIONING,
+        existing_data_behavior='delete_matching',
+    )
+
+
+def grubhub_data_to_parquet(
+    params: models.Parameters,
+    grubhub_data: dict[str, models.RecordBatch]
+):
+    """Export each table to a Parquet dataset in the directory ``params.output_path``
+    """
+
+    for name, batch in grubhub_data.items():
+        if not len(batch) and not params.full_export:
+            continue
+        table_dir = os.path.join(params.output_path, name)
+        table_to_parquet(
+            table_dir,
+            pa.Table.from_batches([record_batch_to_arrow(batch)]),
+            models.PRIMARY_KEYS[name],
+            params.full_export
+        )
+        logger.info('Exported %s %s to %s', len(batch), name, table_dir)
@@ -0,0 +1,130 @@
+"""Exports extracted Grubhub data to a PostgreSQL database.
+
+Each table is streamed into a temporary staging table with ``COPY ... FROM STDIN``, and
+then merged into the target table with ``INSERT ... ON CONFLICT DO UPDATE``. Everything
+happens in a single transaction, so the target tables are never partially loaded.
+
+``ON CONFLICT DO UPDATE`` can't update the same row twice in one statement, so when the
+staging table has more than one row with the same primary key (eg the same restaurant
+from several emails), only the most recently sent one is merged.
+
+Dependencies
+============
+- psycopg
+"""
+
+import time
+import logging
+from pathlib import Path
+
+import psycopg
+from psycopg import sql
+
+from grubhub_dl import models
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_FILE = Path(__file__).parent / 'schemas' / 'postgres.sql'
+
+
+def copy_to_staging_table(
+    cursor: psycopg.Cursor,
+    name: str,
+    batch: models.RecordBatch
+) -> str:
+    """Create a staging table like the target table ``name``, and copy the batch into it
+
+    :returns: The name of the staging table
+    """
+
+    staging_table = f'staging_{name}'
+    cursor.execute(
+        sql.SQL('CREATE TEMPORARY TABLE {} (LIKE {} INCLUDING DEFAULTS) ON COMMIT DROP')
+            .format(sql.Identifier(staging_table), sql.Identifier(name))
+    )
+
+    columns = sql.SQL(', ').join(map(sql.Identifier, batch.field_names))
+    statement = sql.SQL('COPY {} ({}) FROM STDIN').format(
+        sql.Identifier(staging_table),
+        columns
+    )
+    with cursor.copy(statement) as copy:
+        for row in batch.rows():
+            copy.write_row(row)
+
+    return staging_table
+
+
+def merge_statement(
+    name: str,
+    staging_table: str,
+    columns: list[str],
+    primary_key: tuple[str]
+) -> sql.Composed:
+    """Get an INSERT statement that merges the staging table into the target table,
+    keeping only the most recently sent row of each primary key
+    """
+
+    updates = sql.SQL(', ').join(
+        sql.SQL('{} = excluded.{}').format(sql.Identifier(column), sql.Identifier(column))
+        for column in columns
+        if column not in primary_key
+    )
+    column_list = sql.SQL(', ').join(map(sql.Identifier, columns))
+    key_list = sql.SQL(', ').join(map(sql.Identifier, primary_key))
+    order_by = key_list
+    if 'sent_at' in columns and 'sent_at' not in primary_key:
+        order_by = sql.SQL('{}, {} DESC NULLS LAST').format(
+            key_list,
+            sql.Identifier('sent_at')
+        )
+    return sql.SQL(
+        'INSERT INTO {table} ({columns}) '
+        'SELECT DISTINCT ON ({primary_key}) {columns} FROM {staging_table} '
+        'ORDER BY {order_by} '
+        'ON CONFLICT ({primary_key}) DO UPDATE SET {updates}'
+    ).format(
+        table=sql.Identifier(name),
+        columns=column_list,
+        staging_table=sql.Identifier(staging_table),
+        primary_key=key_list,
+        order_by=order_by,
+        updates=updates,
+    )
+
+
+def grubhub_data_to_postgres(
+    params: models.Parameters,
+    grubhub_data: dict[str, models.RecordBatch]
+):
+    """Merge every table of extracted Grubhub data into the PostgreSQL database at
+    ``params.postgres_dsn``, in a single transaction
+    """
+
+    started_at = time.perf_counter()
+
+    # Leaving the connection's context manager commits the transaction, or rolls it back
+    # if an exception was raised
+    with psycopg.connect(params.postgres_dsn) as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(SCHEMA_FILE.read_text())
+
+            for name, batch in grubhub_data.items():
+                if not len(batch):
+                    continue
+                staging_table = copy_to_staging_table(cursor, name, batch)
+                cursor.execute(
+                    merge_statement(
+                        name,
+                        staging_table,
+                        batch.field_names,
+                        models.PRIMARY_KEYS[name]
+                    )
+                )
+                logger.debug('Merged %s rows into table "%s"', cursor.rowcount, name)
+
+    logger.info(
+        'Exported %s records to PostgreSQL in %.2fs',
+        sum(len(batch) for batch in grubhub_data.values()),
+        time.perf_counter() - started_at
+    )
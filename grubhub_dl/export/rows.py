@@ -0,0 +1,69 @@
+"""Converts the columns of extracted Grubhub data into rows of plain values.
+
+Exporters that write text or SQL (SQLite, PostgreSQL, CSV, JSON, ...) can't store
+datetimes, enums or lists directly. So the columns are converted a chunk at a time (with
+one pass over each column), and then the converted chunks are zipped into rows.
+"""
+
+import json
+import typing as t
+from enum import Enum
+
+from grubhub_dl import models
+from grubhub_dl.models.records import BoolColumn, TimestampColumn
+from grubhub_dl.timestamps import format_timestamp
+
+# The number of records that are converted at a time
+CHUNK_SIZE = 4096
+
+
+def convert_column(
+    column,
+    datetime_format: str,
+    start: int = 0,
+    stop: int = None
+) -> list:
+    """Convert the values of one column (from ``start`` up to ``stop``) to strings,
+    integers and None
+
+    - Timestamps are formatted with ``datetime_format``
+    - Booleans are converted to 1 or 0
+    - Enums are replaced by their names
+    - Lists are encoded as JSON arrays
+    """
+
+    values = column.to_list(start, stop)
+
+    if isinstance(column, TimestampColumn):
+        return [format_timestamp(value, datetime_format) for value in values]
+    if isinstance(column, BoolColumn):
+        return [None if value is None else int(value) for value in values]
+
+    first = next((value for value in values if value is not None), None)
+    if isinstance(first, Enum):
+        return [value.name if isinstance(value, Enum) else value for value in values]
+    if isinstance(first, (list, tuple, dict)):
+        return [None if value is None else json.dumps(value) for value in values]
+    return values
+
+
+def iter_rows(
+    batch: models.RecordBatch,
+    datetime_format: str
+) -> t.Iterator[tuple]:
+    """Iterate over the records in the batch as tuples of plain values, in the order of
+    ``batch.field_names``
+
+    Records are converted ``CHUNK_SIZE`` at a time, so memory use doesn't grow with the
+    size of the batch.
+
+    :param datetime_format: The format of timestamps
+    """
+
+    if not batch.columns:
+        return
+    for start in range(0, len(batch), CHUNK_SIZE):
+        yield from zip(*(
+            convert_column(column, datetime_format, start, start + CHUNK_SIZE)
+            for column in batch.columns.values()
+        ))
@@ -0,0 +1,133 @@
+--
+-- TABLES
+--
+
+CREATE TABLE IF NOT EXISTS emails
+(
+    email_id    TEXT PRIMARY KEY,
+    subject     TEXT,
+    sent_by     TEXT,
+    sent_at     TIMESTAMPTZ,
+    body        TEXT,
+    category    TEXT,
+    cache_file  TEXT
+);
+
+CREATE TABLE IF NOT EXISTS credits
+(
+    email_id                TEXT PRIMARY KEY,
+    sent_at                 TIMESTAMPTZ,
+    amount                  BIGINT, -- USD in cents
+    percent_off             BIGINT,
+    percent_off_max_value   BIGINT, -- USD in cents
+    code                    TEXT,
+    expires                 TIMESTAMPTZ,
+    category                TEXT
+);
+
+CREATE TABLE IF NOT EXISTS orders
+(
+    email_id                    TEXT PRIMARY KEY,
+    sent_at                     TIMESTAMPTZ,
+    restaurant_id               BIGINT,
+    restaurant_name             TEXT,
+    restaurant_phone            TEXT,
+    ordered_at                  TIMESTAMPTZ,
+    order_number                TEXT,
+    order_subtotal              BIGINT, -- USD in cents
+    order_total                 BIGINT, -- USD in cents
+    order_service_fee_original  BIGINT, -- USD in cents
+    order_service_fee_actual    BIGINT, -- USD in cents
+    order_delivery_fee_original BIGINT, -- USD in cents
+    order_delivery_fee_actual   BIGINT, -- USD in cents
+    order_sales_tax             BIGINT, -- USD in cents
+    order_delivery_tip          BIGINT, -- USD in cents
+    order_payment_method        TEXT,
+    order_has_free_delivery     BOOLEAN,
+    order_has_promo_code        BOOLEAN
+);
+
+CREATE TABLE IF NOT EXISTS order_updates
+(
+    email_id            TEXT PRIMARY KEY,
+    sent_at             TIMESTAMPTZ,
+    order_number        TEXT,
+    refund_amount       BIGINT, -- USD in cents
+    refund_item         TEXT,
+    refund_reason       TEXT,
+    refund_item_amount  BIGINT, -- USD in cents
+    refund_fees_amount  BIGINT, -- USD in cents
+    tip_adjusted_amount BIGINT  -- USD in cents
+);
+
+CREATE TABLE IF NOT EXISTS order_cancellations
+(
+    email_id        TEXT PRIMARY KEY,
+    sent_at         TIMESTAMPTZ,
+    order_number    TEXT,
+    amount          BIGINT, -- USD in cents
+    reason          TEXT
+);
+
+CREATE TABLE IF NOT EXISTS order_items
+(
+    email_id        TEXT,
+    sent_at         TIMESTAMPTZ,
+    order_number    TEXT,
+    line_number     BIGINT,
+    restaurant_id   BIGINT,
+    item_id         BIGINT,
+    quantity        BIGINT,
+    options         TEXT,
+    price           BIGINT, -- USD in cents
+    PRIMARY KEY (email_id, line_number)
+);
+
+CREATE TABLE IF NOT EXISTS reconciled_orders
+(
+    order_number            TEXT PRIMARY KEY,
+    email_id                TEXT,
+    sent_at                 TIMESTAMPTZ,
+    ordered_at              TIMESTAMPTZ,
+    restaurant_id           BIGINT,
+    restaurant_name         TEXT,
+    order_total             BIGINT, -- USD in cents
+    order_delivery_tip      BIGINT, -- USD in cents
+    refunded_amount         BIGINT, -- USD in cents
+    tip_adjusted_amount     BIGINT, -- USD in cents
+    tip_adjusted_total      BIGINT, -- USD in cents
+    net_paid                BIGINT, -- USD in cents
+    is_canceled             BOOLEAN,
+    update_email_ids        TEXT[],
+    cancellation_email_id   TEXT
+);
+
+CREATE TABLE IF NOT EXISTS restaurants
+(
+    restaurant_id   BIGINT PRIMARY KEY,
+    restaurant_name TEXT
+);
+
+CREATE TABLE IF NOT EXISTS menu_items
+(
+    item_id         BIGINT PRIMARY KEY,
+    restaurant_id   BIGINT,
+    item_name       TEXT
+);
+
+--
+-- INDEXES
+--
+
+CREATE INDEX IF NOT EXISTS ix_emails_sent_at ON emails (sent_at);
+CREATE INDEX IF NOT EXISTS ix_emails_category ON emails (category);
+CREATE INDEX IF NOT EXISTS ix_credits_sent_at ON credits (sent_at);
+CREATE INDEX IF NOT EXISTS ix_orders_order_number ON orders (order_number);
+CREATE INDEX IF NOT EXISTS ix_orders_sent_at ON orders (sent_at);
+CREATE INDEX IF NOT EXISTS ix_orders_restaurant_id ON orders (restaurant_id);
+CREATE INDEX IF NOT EXISTS ix_order_updates_order_number ON order_updates (order_number);
+CREATE INDEX IF NOT EXISTS ix_order_cancellations_order_number ON order_cancellations (order_number);
+CREATE INDEX IF NOT EXISTS ix_order_items_order_number ON order_items (order_number);
+CREATE INDEX IF NOT EXISTS ix_order_items_item_id ON order_items (item_id);
+CREATE INDEX IF NOT EXISTS ix_reconciled_orders_sent_at ON reconciled_orders (sent_at);
+CREATE INDEX IF NOT EXISTS ix_menu_items_restaurant_id ON menu_items (restaurant_id);
@@ -4,95 +4,194 @@
 
 CREATE TABLE IF NOT EXISTS emails
 (
-    email_id    TEXT,
+    email_id    TEXT PRIMARY KEY,
     subject     TEXT,
     sent_by     TEXT,
-    sent_at     TEXT, -- ISO8601 timestamp
+    sent_at     TEXT, -- ISO8601 timestamp (UTC)
     body        TEXT,
-    category    TEXT
-);
+    category    TEXT,
+    cache_file  TEXT
+) WITHOUT ROWID;
 
 CREATE TABLE IF NOT EXISTS credits
 (
-    email_id    TEXT,
-    amount      TEXT, -- USD in cents
-    code        TEXT,
-    expires     TEXT, -- ISO8601 timestamp
-    category    TEXT
-);
+    email_id                TEXT PRIMARY KEY,
+    sent_at                 TEXT,    -- ISO8601 timestamp (UTC)
+    amount                  INTEGER, -- USD in cents
+    percent_off             INTEGER,
+    percent_off_max_value   INTEGER, -- USD in cents
+    code                    TEXT,
+    expires                 TEXT,    -- ISO8601 timestamp (UTC)
+    category                TEXT
+) WITHOUT ROWID;
 
 CREATE TABLE IF NOT EXISTS orders
 (
-    email_id                TEXT,
-    ordered_at              TEXT, -- ISO8601 timestamp
-    restaurant_name         TEXT,
-    restaurant_phone        TEXT,
-    order_number            TEXT,
-    order_subtotal          TEXT, -- USD in cents
-    order_service_fee       TEXT, -- USD in cents
-    order_delivery_fee      TEXT, -- USD in cents
-    order_sales_tax         TEXT, -- USD in cents
-    order_delivery_tip      TEXT, -- USD in cents
-    order_total             TEXT, -- USD in cents
-    order_payment_method    TEXT
-);
+    email_id                    TEXT PRIMARY KEY,
+    sent_at                     TEXT,    -- ISO8601 timestamp (UTC)
+    restaurant_id               INTEGER,
+    restaurant_name             TEXT,
+    restaurant_phone            TEXT,
+    ordered_at                  TEXT,    -- ISO8601 timestamp (UTC)
+    order_number                TEXT,
+    order_subtotal              INTEGER, -- USD in cents
+    order_total                 INTEGER, -- USD in cents
+    order_service_fee_original  INTEGER, -- USD in cents
+    order_service_fee_actual    INTEGER, -- USD in cents
+    order_delivery_fee_original INTEGER, -- USD in cents
+    order_delivery_fee_actual   INTEGER, -- USD in cents
+    order_sales_tax             INTEGER, -- USD in cents
+    order_delivery_tip          INTEGER, -- USD in cents
+    order_payment_method        TEXT,
+    order_has_free_delivery     INTEGER, -- Boolean
+    order_has_promo_code        INTEGER  -- Boolean
+) WITHOUT ROWID;
 
 CREATE TABLE IF NOT EXISTS order_updates
 (
-    email_id            TEXT,
+    email_id            TEXT PRIMARY KEY,
+    sent_at             TEXT,    -- ISO8601 timestamp (UTC)
     order_number        TEXT,
-    refund_amount       TEXT, -- USD in cents
+    refund_amount       INTEGER, -- USD in cents
     refund_item         TEXT,
     refund_reason       TEXT,
-    refund_item_amount  TEXT, -- USD in cents
-    refund_fees_amount  TEXT, -- USD in cents
-    tip_adjusted_amount TEXT
-);
+    refund_item_amount  INTEGER, -- USD in cents
+    refund_fees_amount  INTEGER, -- USD in cents
+    tip_adjusted_amount INTEGER  -- USD in cents
+) WITHOUT ROWID;
 
 CREATE TABLE IF NOT EXISTS order_cancellations
 (
-    email_id        TEXT,
+    email_id        TEXT PRIMARY KEY,
+    sent_at         TEXT,    -- ISO8601 timestamp (UTC)
     order_number    TEXT,
-    amount          TEXT, -- USD in cents
+    amount          INTEGER, -- USD in cents
     reason          TEXT
-);
-
+) WITHOUT ROWID;
 
 CREATE TABLE IF NOT EXISTS order_items
 (
-
-);
-
---
--- VIEWS
---
-
-CREATE VIEW IF NOT EXISTS vw_orders
-(
-
-);
-
-CREATE VIEW IF NOT EXISTS vw_credits
+    email_id        TEXT,
+    sent_at         TEXT,    -- ISO8601 timestamp (UTC)
+    order_number    TEXT,
+    line_number     INTEGER,
+    restaurant_id   INTEGER,
+    item_id         INTEGER,
+    quantity        INTEGER,
+    options         TEXT,
+    price           INTEGER, -- USD in cents
+    PRIMARY KEY (email_id, line_number)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS reconciled_orders
 (
-
-);
-
-CREATE VIEW IF NOT EXISTS vw_emails_not_processed
+    order_number            TEXT PRIMARY KEY,
+    email_id                TEXT,
+    sent_at                 TEXT,    -- ISO8601 timestamp (UTC)
+    ordered_at              TEXT,    -- ISO8601 timestamp (UTC)
+    restaurant_id           INTEGER,
+    restaurant_name         TEXT,
+    order_total             INTEGER, -- USD in cents
+    order_delivery_tip      INTEGER, -- USD in cents
+    refunded_amount         INTEGER, -- USD in cents
+    tip_adjusted_amount     INTEGER, -- USD in cents
+    tip_adjusted_total      INTEGER, -- USD in cents
+    net_paid                INTEGER, -- USD in cents
+    is_canceled             INTEGER, -- Boolean
+    update_email_ids        TEXT,    -- JSON array
+    cancellation_email_id   TEXT
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS restaurants
 (
-
+    restaurant_id   INTEGER PRIMARY KEY,
+    restaurant_name TEXT
 );
 
-CREATE VIEW IF NOT EXISTS vw_order_cancellations_no_order_number
+CREATE TABLE IF NOT EXISTS menu_items
 (
-
+    item_id         INTEGER PRIMARY KEY,
+    restaurant_id   INTEGER,
+    item_name       TEXT
 );
 
-CREATE VIEW IF NOT EXISTS vw_order_updates_no_order_number
-(
+--
+-- INDEXES
+--
 
-);
+CREATE INDEX IF NOT EXISTS ix_emails_sent_at ON emails (sent_at);
+CREATE INDEX IF NOT EXISTS ix_emails_category ON emails (category);
+CREATE INDEX IF NOT EXISTS ix_credits_sent_at ON credits (sent_at);
+CREATE INDEX IF NOT EXISTS ix_orders_order_number ON orders (order_number);
+CREATE INDEX IF NOT EXISTS ix_orders_sent_at ON orders (sent_at);
+CREATE INDEX IF NOT EXISTS ix_orders_restaurant_id ON orders (restaurant_id);
+CREATE INDEX IF NOT EXISTS ix_order_updates_order_number ON order_updates (order_number);
+CREATE INDEX IF NOT EXISTS ix_order_cancellations_order_number ON order_cancellations (order_number);
+CREATE INDEX IF NOT EXISTS ix_order_items_order_number ON order_items (order_number);
+CREATE INDEX IF NOT EXISTS ix_order_items_item_id ON order_items (item_id);
+CREATE INDEX IF NOT EXISTS ix_reconciled_orders_sent_at ON reconciled_orders (sent_at);
+CREATE INDEX IF NOT EXISTS ix_menu_items_restaurant_id ON menu_items (restaurant_id);
 
-CREATE VIEW IF NOT EXISTS vw_order_items_no_order_number
-(
+--
+-- VIEWS
+--
 
-);
+CREATE VIEW IF NOT EXISTS vw_orders AS
+SELECT
+    r.order_number,
+    r.ordered_at,
+    r.restaurant_name,
+    o.restaurant_phone,
+    o.order_subtotal,
+    o.order_service_fee_actual,
+    o.order_delivery_fee_actual,
+    o.order_sales_tax,
+    o.order_delivery_tip,
+    r.order_total,
+    r.refunded_amount,
+    r.tip_adjusted_total,
+    r.net_paid,
+    r.is_canceled,
+    o.order_payment_method,
+    e.subject,
+    e.sent_at
+FROM reconciled_orders AS r
+JOIN orders AS o ON o.email_id = r.email_id
+LEFT JOIN emails AS e ON e.email_id = r.email_id;
+
+CREATE VIEW IF NOT EXISTS vw_credits AS
+SELECT
+    c.*,
+    e.subject
+FROM credits AS c
+LEFT JOIN emails AS e ON e.email_id = c.email_id;
+
+CREATE VIEW IF NOT EXISTS vw_emails_not_processed AS
+SELECT e.email_id, e.subject, e.sent_at, e.category, e.cache_file
+FROM emails AS e
+WHERE e.category = 'uncategorized'
+    OR (e.category = 'order_confirmation'
+        AND NOT EXISTS (SELECT 1 FROM orders AS o WHERE o.email_id = e.email_id))
+    OR (e.category = 'order_updated'
+        AND NOT EXISTS (SELECT 1 FROM order_updates AS u WHERE u.email_id = e.email_id))
+    OR (e.category = 'order_canceled'
+        AND NOT EXISTS (SELECT 1 FROM order_cancellations AS c WHERE c.email_id = e.email_id))
+    OR (e.category LIKE 'credit_%'
+        AND NOT EXISTS (SELECT 1 FROM credits AS c WHERE c.email_id = e.email_id));
+
+CREATE VIEW IF NOT EXISTS vw_order_cancellations_no_order_number AS
+SELECT c.*
+FROM order_cancellations AS c
+WHERE c.order_number IS NULL
+    OR NOT EXISTS (SELECT 1 FROM orders AS o WHERE o.order_number = c.order_number);
+
+CREATE VIEW IF NOT EXISTS vw_order_updates_no_order_number AS
+SELECT u.*
+FROM order_updates AS u
+WHERE u.order_number IS NULL
+    OR NOT EXISTS (SELECT 1 FROM orders AS o WHERE o.order_number = u.order_number);
+
+CREATE VIEW IF NOT EXISTS vw_order_items_no_order_number AS
+SELECT i.*
+FROM order_items AS i
+WHERE i.order_number IS NULL;
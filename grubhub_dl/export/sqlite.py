@@ -0,0 +1,97 @@
+"""Exports extracted Grubhub data to a SQLite database.
+
+The database is created from ``schemas/sqlite.sql``. Every table has a primary key, and
+records are upserted, so exporting the same data again updates the existing rows instead
+of duplicating them.
+
+Timestamps are always stored as ISO 8601 strings in UTC (``DEFAULT_DATETIME_FORMAT``),
+regardless of the user's ``datetime_format``, so that they sort correctly and can be
+parsed back by ``grubhub-dl query``.
+"""
+
+import time
+import logging
+import sqlite3
+from pathlib import Path
+
+from grubhub_dl import models, DEFAULT_DATETIME_FORMAT
+from grubhub_dl.export.rows import iter_rows
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_FILE = Path(__file__).parent / 'schemas' / 'sqlite.sql'
+
+# The database is only written by one process at a time, and can always be rebuilt from
+# the cache, so durability is traded for load speed
+PRAGMAS = [
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA cache_size = -131072',
+    'PRAGMA mmap_size = 268435456',
+]
+
+
+def connect(sqlite_path: str) -> sqlite3.Connection:
+    """Open the SQLite database at the given path, and create its schema if needed
+    """
+
+    Path(sqlite_path).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(sqlite_path)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    conn.executescript(SCHEMA_FILE.read_text())
+    return conn
+
+
+def upsert_statement(table: str, columns: list[str], primary_key: tuple[str]) -> str:
+    """Get an INSERT statement that updates the existing row if the primary key of the
+    new row already exists
+    """
+
+    updates = [
+        f'{column} = excluded.{column}'
+        for column in columns
+        if column not in primary_key
+    ]
+    return (
+        f'INSERT INTO {table} ({", ".join(columns)}) '
+        f'VALUES ({", ".join("?" * len(columns))}) '
+        f'ON CONFLICT ({", ".join(primary_key)}) DO UPDATE SET {", ".join(updates)}'
+    )
+
+
+def grubhub_data_to_sqlite(
+    params: models.Parameters,
+    grubhub_data: dict[str, models.RecordBatch]
+):
+    """Upsert every table of extracted Grubhub data into the SQLite database at
+    ``params.sqlite_path``, in a single transaction
+    """
+
+    started_at = time.perf_counter()
+    conn = connect(params.sqlite_path)
+    try:
+        with conn:
+            for name, batch in grubhub_data.items():
+                if not len(batch):
+                    continue
+                statement = upsert_statement(
+                    name,
+                    batch.field_names,
+                    models.PRIMARY_KEYS[name]
+                )
+                conn.executemany(
+                    statement,
+                    iter_rows(batch, DEFAULT_DATETIME_FORMAT)
+                )
+                logger.debug('Upserted %s rows into table "%s"', len(batch), name)
+    finally:
+        conn.close()
+
+    logger.info(
+        'Exported %s records to %s in %.2fs',
+        sum(len(batch) for batch in grubhub_data.values()),
+        params.sqlite_path,
+        time.perf_counter() - started_at
+    )
@@ -0,0 +1,254 @@
+"""Tracks what has already been exported to each destination, so that later exports only
+need to write the records that are new or have changed.
+
+The state of each destination is saved in the cache directory as a JSON file with:
+
+- ``high_water_mark``: The ``sent_at`` of the newest email that has been exported
+- ``fingerprints``: For each table, the primary key of every exported record mapped to a
+  checksum of its values. The keys of the ``emails`` table are the exported email IDs.
+
+When every destination has a state, the emails that every destination has already
+exported aren't extracted again (see ``select_new_emails``). The state is
+only trusted while what was exported still exists (eg if the SQLite DB was deleted, the
+state is reset and everything is exported again).
+"""
+
+import os
+import json
+import zlib
+import hashlib
+import logging
+import typing as t
+from pathlib import Path
+from datetime import datetime, timezone
+
+from grubhub_dl import models, DEFAULT_DATETIME_FORMAT
+from grubhub_dl.timestamps import parse_timestamp, format_timestamp
+from grubhub_dl.export.files import output_file_path
+
+logger = logging.getLogger(__name__)
+
+# Fields that are left out of fingerprints, because they never change once a record has
+# been exported (and are expensive to checksum)
+UNFINGERPRINTED_FIELDS = {'body'}
+
+# Destinations that only export the records that are new or have changed
+STATEFUL_DESTINATIONS = [
+    models.Destination.sqlite,
+    models.Destination.postgres,
+    models.Destination.json_file,
+    models.Destination.parquet_file,
+]
+
+
+def export_target(params: models.Parameters, destination: models.Destination) -> str:
+    """Get the path or connection string that the given destination exports to
+    """
+
+    if destination == models.Destination.sqlite:
+        return os.path.abspath(params.sqlite_path)
+    if destination == models.Destination.postgres:
+        return params.postgres_dsn
+    return os.path.abspath(params.output_path or '')
+
+
+def target_exists(
+    params: models.Parameters,
+    destination: models.Destination,
+    name: str
+) -> bool:
+    """Check whether the table ``name`` that was exported to the given destination still
+    exists
+
+    PostgreSQL tables can't be checked without connecting, so they're assumed to exist.
+    """
+
+    match destination:
+        case models.Destination.sqlite:
+            return os.path.exists(params.sqlite_path)
+        case models.Destination.json_file:
+            return os.path.exists(output_file_path(params, name, '.jsonl'))
+        case models.Destination.parquet_file:
+            return os.path.isdir(os.path.join(params.output_path, name))
+    return True
+
+
+def record_key(values: t.Iterable) -> str:
+    """Get the key that a record is tracked by in the fingerprints, from the values of
+    its primary key
+    """
+
+    return '\x1f'.join(str(value) for value in values)
+
+
+def select_new_emails(
+    emails: list[models.EmailMessage],
+    export_states: list['ExportState']
+) -> list[models.EmailMessage]:
+    """Leave out the emails that every destination has already exported, since every
+    record extracted from them has already been exported too
+
+    Emails that were sent after the oldest high-water mark are kept without looking them
+    up. Older emails are only left out if their ID is in the ``emails`` fingerprints of
+    every destination, since an email can be fetched after newer ones were exported.
+    Emails without a ``sent_at`` are always kept.
+    """
+
+    high_water_marks = [state.high_water_mark for state in export_states]
+    if not high_water_marks or None in high_water_marks:
+        return emails
+
+    high_water_mark = min(high_water_marks)
+    exported_ids = [state.fingerprints.get('emails', {}) for state in export_states]
+    new_emails = [
+        email for email in emails
+        if email.sent_at is None
+        or email.sent_at > high_water_mark
+        or any(email.email_id not in exported for exported in exported_ids)
+    ]
+    logger.info(
+        'Skipping %s emails that were already exported (the last one was sent at %s)',
+        len(emails) - len(new_emails),
+        format_timestamp(high_water_mark, DEFAULT_DATETIME_FORMAT)
+    )
+    return new_emails
+
+
+class ExportState:
+    """The high-water mark and the fingerprints of the records that have been exported to
+    one destination
+    """
+
+    def __init__(self, path: str, high_water_mark: datetime = None, fingerprints=None):
+        self.path = path
+        self.high_water_mark = high_water_mark
+        self.fingerprints = fingerprints or {}
+        self.pending = {}
+
+    @classmethod
+    def load(
+        cls,
+        params: models.Parameters,
+        destination: models.Destination
+    ) -> 'ExportState':
+        """Load the state of the given destination from the cache directory
+
+        If the user asked for a full export, the saved state is ignored (and replaced once
+        the export is done). If a table that was exported no longer exists, the saved
+        state is ignored too, so that everything is exported again.
+        """
+
+        target = export_target(params, destination)
+        digest = hashlib.sha1(target.encode('utf-8')).hexdigest()[:12]
+        path = os.path.join(
+            params.cache_dir,
+            'export_state',
+            f'{destination.name}-{digest}.json'
+        )
+
+        if params.full_export or not os.path.exists(path):
+            return cls(path)
+
+        try:
+            data = json.loads(Path(path).read_text())
+            high_water_mark = data.get('high_water_mark')
+            if high_water_mark:
+                high_water_mark = parse_timestamp(
+                    high_water_mark,
+                    DEFAULT_DATETIME_FORMAT,
+                    naive_tz=timezone.utc
+                )
+            fingerprints = data.get('fingerprints') or {}
+        except (ValueError, KeyError, TypeError) as err:
+            logger.warning(
+                'Unable to load the export state from %s, exporting everything: %s',
+                path,
+                err
+            )
+            return cls(path)
+
+        missing = [
+            name
+            for name, exported in fingerprints.items()
+            if exported and not target_exists(params, destination, name)
+        ]
+        if missing:
+            logger.warning(
+                'The %s that were exported to %s no longer exist, exporting everything',
+                ', '.join(missing),
+                destination.name
+            )
+            return cls(path)
+        return cls(path, high_water_mark, fingerprints)
+
+    def select_changes(
+        self,
+        grubhub_data: dict[str, models.RecordBatch]
+    ) -> dict[str, models.RecordBatch]:
+        """Get only the records that haven't been exported yet, or that have changed since
+        they were exported
+
+        The fingerprints of the selected records are only added to the state when
+        ``save`` is called, which should be done after the export succeeds.
+        """
+
+        changes = {}
+        for name, batch in grubhub_data.items():
+            exported = self.fingerprints.get(name, {})
+            pending = self.pending.setdefault(name, {})
+            primary_key = [
+                batch.field_names.index(field)
+                for field in models.PRIMARY_KEYS[name]
+            ]
+            fingerprinted = [
+                i for i, field in enumerate(batch.field_names)
+                if field not in UNFINGERPRINTED_FIELDS
+            ]
+
+            indexes = []
+            for i, row in enumerate(batch.rows()):
+                key = record_key(row[j] for j in primary_key)
+                fingerprint = zlib.crc32(repr([row[j] for j in fingerprinted]).encode())
+                if exported.get(key) != fingerprint:
+                    indexes.append(i)
+                    pending[key] = fingerprint
+
+            changes[name] = batch if len(indexes) == len(batch) else batch.take(indexes)
+
+        latest = max(
+            (value for value in grubhub_data['emails'].column('sent_at') if value),
+            default=None
+        )
+        if latest and (self.high_water_mark is None or latest > self.high_water_mark):
+            self.high_water_mark = latest
+
+        logger.info(
+            'Found %s new or changed records (%s were already exported)',
+            sum(len(batch) for batch in changes.values()),
+            sum(len(batch) - len(changes[name]) for name, batch in grubhub_data.items()),
+        )
+        return changes
+
+    def save(self):
+        """Add the fingerprints of the exported records to the state, and save it
+        """
+
+        for name, pending in self.pending.items():
+            self.fingerprints.setdefault(name, {}).update(pending)
+        self.pending = {}
+
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        temp_path = f'{self.path}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(
+                {
+                    'high_water_mark': format_timestamp(
+                        self.high_water_mark,
+                        DEFAULT_DATETIME_FORMAT
+                    ),
+                    'fingerprints': self.fingerprints,
+                },
+                file
+            )
+        os.replace(temp_path, self.path)
+        logger.debug('Saved export state to %s', self.path)
@@ -0,0 +1,207 @@
+"""Prints the reconciled Grubhub orders to the terminal as a table.
+
+Rows are formatted lazily, one page at a time, so the first page is printed right away
+no matter how many orders there are. Column widths are computed from a sample of the
+rows, and longer values are truncated.
+"""
+
+import sys
+import heapq
+import shutil
+import typing as t
+import logging
+import threading
+
+from grubhub_dl import models, DEFAULT_DATETIME_FORMAT, ERROR_MESSAGE_FATAL
+from grubhub_dl.timestamps import format_timestamp
+
+logger = logging.getLogger(__name__)
+
+TABLE_NAME = 'reconciled_orders'
+TABLE_FIELDS = [
+    'sent_at',
+    'order_number',
+    'restaurant_name',
+    'order_total',
+    'refunded_amount',
+    'net_paid',
+    'is_canceled',
+]
+MONEY_FIELDS = {
+    'order_total',
+    'order_delivery_tip',
+    'refunded_amount',
+    'tip_adjusted_amount',
+    'tip_adjusted_total',
+    'net_paid',
+}
+SORT_FIELDS = ['sent_at', 'order_total']
+DEFAULT_SORT_FIELD = 'sent_at'
+
+# Used instead of the default datetime format, which is too long for a table
+TABLE_DATETIME_FORMAT = '%Y-%m-%d %H:%M'
+
+# The number of rows that column widths are computed from
+SAMPLE_SIZE = 200
+MAX_COLUMN_WIDTH = 40
+COLUMN_SEPARATOR = '  '
+
+
+def format_cell(field: str, value, datetime_format: str) -> str:
+    """Format one value of the table for display"""
+
+    if value is None:
+        return ''
+    if field in MONEY_FIELDS:
+        return f'${value / 100:,.2f}'
+    if field == 'sent_at':
+        return format_timestamp(value, datetime_format)
+    if isinstance(value, bool):
+        return 'yes' if value else 'no'
+    return str(value)
+
+
+def fit_cell(cell: str, width: int, align_right: bool) -> str:
+    """Pad the cell to the width of its column, or truncate it if it's too long"""
+
+    if len(cell) > width:
+        cell = cell[:width - 1] + '…'
+    return cell.rjust(width) if align_right else cell.ljust(width)
+
+
+def sorted_indexes(
+    batch: models.RecordBatch,
+    sort_by: str,
+    limit: int = None
+) -> list[int]:
+    """Get the indexes of the rows in descending order of ``sort_by`` (the most recent
+    or most expensive orders first)
+
+    The rows are sorted by the raw values of the integer column, which is much faster
+    than decoding them. Missing values are stored as zeroes, so they come last.
+
+    When only the first ``limit`` rows are needed, they're selected with a heap instead
+    of sorting every row.
+    """
+
+    key = batch.columns[sort_by].values.__getitem__
+
+    if limit is not None and limit < len(batch):
+        return heapq.nlargest(limit, range(len(batch)), key=key)
+    return sorted(range(len(batch)), key=key, reverse=True)
+
+
+def iter_pages(
+    batch: models.RecordBatch,
+    indexes: list[int],
+    datetime_format: str,
+    page_size: int
+) -> t.Iterator[list[str]]:
+    """Format the rows at ``indexes`` into lines of text, one page at a time, starting
+    with a header
+    """
+
+    columns = [batch.columns[field] for field in TABLE_FIELDS]
+
+    def format_row(i: int) -> list[str]:
+        return [
+            format_cell(field, column[i], datetime_format)
+            for field, column in zip(TABLE_FIELDS, columns)
+        ]
+
+    sample = [format_row(i) for i in indexes[:SAMPLE_SIZE]]
+    widths = [
+        min(MAX_COLUMN_WIDTH, max([len(field)] + [len(row[j]) for row in sample]))
+        for j, field in enumerate(TABLE_FIELDS)
+    ]
+    right_aligned = [field in MONEY_FIELDS for field in TABLE_FIELDS]
+
+    def format_line(cells: list[str]) -> str:
+        return COLUMN_SEPARATOR.join(
+            fit_cell(cell, width, align_right)
+            for cell, width, align_right in zip(cells, widths, right_aligned)
+        ).rstrip()
+
+    header = [
+        format_line(TABLE_FIELDS),
+        COLUMN_SEPARATOR.join('-' * width for width in widths),
+    ]
+    for start in range(0, len(indexes), page_size):
+        page = indexes[start:start + page_size]
+        # The rows in the sample have already been formatted
+        rows = [
+            sample[start + j] if start + j < len(sample) else format_row(i)
+            for j, i in enumerate(page)
+        ]
+        yield header + [format_line(row) for row in rows]
+
+
+def is_interactive() -> bool:
+    """Check whether the table can be shown one page at a time
+
+    The user can only be asked for the next page when stdin and stdout are both
+    terminals, and only from the main thread (which is the one that gets Ctrl-C).
+    """
+
+    return (
+        threading.current_thread() is threading.main_thread()
+        and sys.stdout.isatty()
+        and sys.stdin.isatty()
+    )
+
+
+def grubhub_data_to_table(
+    params: models.Parameters,
+    grubhub_data: dict[str, models.RecordBatch]
+):
+    """Print the reconciled orders as a table, sorted by ``params.sort_by`` and limited
+    to ``params.limit`` rows
+
+    When the output is a terminal (see ``is_interactive``), the table is shown one page
+    at a time.
+    """
+
+    batch = grubhub_data[TABLE_NAME]
+    if not len(batch):
+        logger.warning('There are no orders to display')
+        return
+
+    datetime_format = params.datetime_format
+    if not datetime_format or datetime_format == DEFAULT_DATETIME_FORMAT:
+        datetime_format = TABLE_DATETIME_FORMAT
+
+    sort_by = params.sort_by or DEFAULT_SORT_FIELD
+    if sort_by not in SORT_FIELDS:
+        logger.error(
+            'Invalid sort field: %s. Orders can be sorted by: %s',
+            sort_by,
+            ', '.join(SORT_FIELDS)
+        )
+        logger.error(ERROR_MESSAGE_FATAL)
+        exit(1)
+
+    indexes = sorted_indexes(batch, sort_by, params.limit)
+    if params.limit is not None:
+        indexes = indexes[:params.limit]
+
+    interactive = is_interactive()
+    # Leave room for the header and the prompt
+    page_size = max(1, shutil.get_terminal_size().lines - 3) if interactive else 1000
+
+    for page_number, lines in enumerate(
+        iter_pages(batch, indexes, datetime_format, page_size)
+    ):
+        if page_number and not interactive:
+            # The header is only repeated when paging through the table
+            lines = lines[2:]
+        sys.stdout.write('\n'.join(lines) + '\n')
+        sys.stdout.flush()
+
+        is_last_page = (page_number + 1) * page_size >= len(indexes)
+        if interactive and not is_last_page:
+            try:
+                answer = input('-- More (Enter for the next page, q to quit) --')
+            except EOFError:
+                break
+            if answer.strip().lower() == 'q':
+                break
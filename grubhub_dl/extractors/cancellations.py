@@ -9,7 +9,7 @@ import logging
 
 from bs4 import BeautifulSoup
 
-from grubhub_dl import models
+from grubhub_dl import models, metrics, tracing
 
 logger = logging.getLogger(__name__)
 
@@ -19,32 +19,38 @@ def extract_order_cancellation(email: models.EmailMessage) -> models.OrderCancel
     """
     
     if email.category == models.EmailCategory.order_canceled:
-        cancellation = models.OrderCancellation(email_id=email.email_id)
-        soup = BeautifulSoup(email.body, 'html.parser')
+        cancellation = models.OrderCancellation(
+            email_id=email.email_id,
+            sent_at=email.sent_at
+        )
+        with tracing.span('cancellations.parse_html'):
+            soup = BeautifulSoup(email.body, 'html.parser')
         try:
-            table = soup.find_all('table')[5].find_all('td')
-            cancellation.order_number = table[1].text.strip()
-            cancellation.amount = int(
-                table[5]
-                    .text
-                    .strip()
-                    .replace('$', '')
-                    .replace('.', '')
-            )
-            cancellation.reason = table[3].text.strip()
-            return cancellation
+            with metrics.strategy('cancellations.extract_order_cancellation', 1):
+                table = soup.find_all('table')[5].find_all('td')
+                cancellation.order_number = table[1].text.strip()
+                cancellation.amount = int(
+                    table[5]
+                        .text
+                        .strip()
+                        .replace('$', '')
+                        .replace('.', '')
+                )
+                cancellation.reason = table[3].text.strip()
+                return cancellation
         except Exception:
-            table = soup.find_all('table')[3].find_all('td')
-            cancellation.order_number = table[2].text.strip()
-            cancellation.amount = int(
-                table[6]
-                    .text
-                    .strip()
-                    .replace('$', '')
-                    .replace('.', '')
-            )
-            cancellation.reason = table[4].text.strip()
-            return cancellation
+            with metrics.strategy('cancellations.extract_order_cancellation', 2):
+                table = soup.find_all('table')[3].find_all('td')
+                cancellation.order_number = table[2].text.strip()
+                cancellation.amount = int(
+                    table[6]
+                        .text
+                        .strip()
+                        .replace('$', '')
+                        .replace('.', '')
+                )
+                cancellation.reason = table[4].text.strip()
+                return cancellation
         except Exception as err:
             logger.warning(
                 ('Unable to extract cancellation data from file due to an unexpected '
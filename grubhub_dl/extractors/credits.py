@@ -5,11 +5,15 @@ Dependencies
 - beautifulsoup4
 """
 
-from datetime import datetime
-
 from bs4 import BeautifulSoup
 
-from grubhub_dl import models
+from grubhub_dl import models, tracing
+from grubhub_dl.timestamps import (
+    parse_timestamp,
+    TEMPLATE_CREDIT_DOLLARS_OFF,
+    TEMPLATE_CREDIT_GUARANTEE_PERK,
+    TEMPLATE_CREDIT_DISCOUNTED,
+)
 
 
 def extract_credit_dollars_off(email: models.EmailMessage) -> models.Credit | None:
@@ -19,9 +23,11 @@ def extract_credit_dollars_off(email: models.EmailMessage) -> models.Credit | No
     if email.category == models.EmailCategory.credit_dollars_off:
         credit = models.Credit(
             email_id=email.email_id,
+            sent_at=email.sent_at,
             category=models.CreditCategory.dollars_off
         )
-        soup = BeautifulSoup(email.body, 'html.parser')
+        with tracing.span('credits.parse_html'):
+            soup = BeautifulSoup(email.body, 'html.parser')
         table = soup.find_all('table')[0].find_all('td')
         credit.amount = int(
             table[3]
@@ -31,9 +37,9 @@ def extract_credit_dollars_off(email: models.EmailMessage) -> models.Credit | No
                 .replace('$', '')
                 .replace('.', '')
         )
-        credit.expires = datetime.strptime(
+        credit.expires = parse_timestamp(
             table[4].text.strip(),
-            'Expires %B %d, %Y %I:%M%p'
+            TEMPLATE_CREDIT_DOLLARS_OFF
         )
         return credit
 
@@ -45,9 +51,11 @@ def extract_credit_guarantee_perk(email: models.EmailMessage) -> models.Credit |
     if email.category == models.EmailCategory.credit_guarantee_perk:
         credit = models.Credit(
             email_id=email.email_id,
+            sent_at=email.sent_at,
             category=models.CreditCategory.guarantee_perk
         )
-        soup = BeautifulSoup(email.body, 'html.parser')
+        with tracing.span('credits.parse_html'):
+            soup = BeautifulSoup(email.body, 'html.parser')
         table = soup.find_all('table')[6].find_all('td')
         credit.amount = int(
             table[2]
@@ -58,9 +66,9 @@ def extract_credit_guarantee_perk(email: models.EmailMessage) -> models.Credit |
                 .replace('.', '')
         )
         credit.code = table[4].text.strip()
-        credit.expires = datetime.strptime(
+        credit.expires = parse_timestamp(
             table[8].text.strip(),
-            '%B %d, %Y %I:%M%p'
+            TEMPLATE_CREDIT_GUARANTEE_PERK
         )
         return credit
 
@@ -72,28 +80,23 @@ def extract_credit_discounted(email: models.EmailMessage) -> models.Credit | Non
     if email.category == models.EmailCategory.credit_discounted:
         credit = models.Credit(
             email_id=email.email_id,
+            sent_at=email.sent_at,
             category=models.CreditCategory.discount
         )
-        soup = BeautifulSoup(email.body, 'html.parser')
+        with tracing.span('credits.parse_html'):
+            soup = BeautifulSoup(email.body, 'html.parser')
         body = soup.find_all('body')[0].text
         data = []
         [data.append(line) for line in body.split('\n') if line not in data]
         for i, line in enumerate(data):
             if 'Expires:' in line or 'Expiration Date:' in line:
-                credit.expires = datetime.strptime(
-                    # "%b %d, %Y %I:%M%p %Z" should be the correct format for this date
-                    # string: "Oct 22, 2021 2:15am EDT", but strptime doesn't agree, and
-                    # the timezone abbreviation at the end seems to be the culprit.
-                    #
-                    # I'm just taking the abbreviation off the date string for now with
-                    # [:-4]. So this may break if the timezone abbreviation is not exactly
-                    # three characters.
-                    #
-                    # UPDATE 2025-3-16: The timezone is implementation dependent, and on
-                    # Windows the timezone is "Eastern Daylight Time", not "EDT". So
-                    # strptime will fail on Windows unless we remove the timezone first.
-                    line.split(': ')[1][:-4],
-                    '%b %d, %Y %I:%M%p'
+                # The date string looks like "Oct 22, 2021 2:15am EDT". The timezone
+                # is implementation dependent, and on Windows it's rendered as
+                # "Eastern Daylight Time" instead of "EDT". ``parse_timestamp`` knows
+                # both forms, and converts the result to UTC.
+                credit.expires = parse_timestamp(
+                    line.split(': ')[1].strip(),
+                    TEMPLATE_CREDIT_DISCOUNTED
                 )
             if 'Amount:' in line:
                 credit.amount = int(
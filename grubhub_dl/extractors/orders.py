@@ -5,16 +5,41 @@ Dependencies
 - beautifulsoup4
 """
 
+import re
 import logging
-from datetime import datetime
+from functools import lru_cache
 from dataclasses import replace
 
 from bs4 import BeautifulSoup, element
 
-from grubhub_dl import models
+from grubhub_dl import models, metrics, tracing
+from grubhub_dl.timestamps import parse_timestamp, TEMPLATE_ORDERED_AT
 
 logger = logging.getLogger(__name__)
 
+ITEM_QUANTITY = re.compile(r'^(\d+)\s*[x\u00d7]?$', re.IGNORECASE)
+ITEM_PRICE = re.compile(r'^\$[\d,]+\.\d{2}$')
+ITEM_LINE = re.compile(
+    r'^(\d+)\s*[x\u00d7]\s+(.+?)\s+(\$[\d,]+\.\d{2})$',
+    re.IGNORECASE | re.DOTALL
+)
+
+
+@lru_cache(maxsize=1)
+def get_soup(body: str) -> BeautifulSoup:
+    """Parse an email body
+
+    The order and its line items are extracted from the same body one after the other,
+    so the most recently parsed body is kept to avoid parsing it twice.
+    """
+
+    with tracing.span('orders.parse_html'):
+        return BeautifulSoup(body, 'html.parser')
+
+
+def price_to_cents(value: str) -> int:
+    return int(value.strip().replace('$', '').replace(',', '').replace('.', ''))
+
 
 # Needed fields
 # [x] email_id
@@ -32,12 +57,13 @@ logger = logging.getLogger(__name__)
 # [x] order_payment_method
 # [x] order_has_free_delivery
 # [x] order_has_promo_code
-# [ ] order_items
+# [x] order_items
 # [ ] order_subtype
 # [ ] subject
 # [ ] category
 # [ ] cache_file
 
+@tracing.traced()
 def extract_order_payment_method_details(
     soup: BeautifulSoup,
     order: models.Order
@@ -50,26 +76,27 @@ def extract_order_payment_method_details(
     """
 
     try:
-        table = soup.find_all('table')[1].find_all('td')
-        for i in range(13, len(table)):
-            if 'Payment Method' in table[i].text and '$' in table[i].text:
-                payment_method_data = table[i].text
-
-                # TODO: Parse out payment method, card number, and charged amount
-                order.order_payment_method = payment_method_data
-
-                if any([
-                    'PROMO CODE' in payment_method_data.upper(),
-                    'REWARD' in payment_method_data.upper()
-                ]):
-                    order.order_has_promo_code = True
+        with metrics.strategy('orders.extract_order_payment_method_details', 1):
+            table = soup.find_all('table')[1].find_all('td')
+            for i in range(13, len(table)):
+                if 'Payment Method' in table[i].text and '$' in table[i].text:
+                    payment_method_data = table[i].text
+
+                    # TODO: Parse out payment method, card number, and charged amount
+                    order.order_payment_method = payment_method_data
+
+                    if any([
+                        'PROMO CODE' in payment_method_data.upper(),
+                        'REWARD' in payment_method_data.upper()
+                    ]):
+                        order.order_has_promo_code = True
                 
-                if any([
-                    'GH+ $0 DELIVERY' in payment_method_data.upper(),
-                    'FREE DELIVERY' in payment_method_data.upper(),
-                ]):
-                    order.order_has_free_delivery = True
-        return order
+                    if any([
+                        'GH+ $0 DELIVERY' in payment_method_data.upper(),
+                        'FREE DELIVERY' in payment_method_data.upper(),
+                    ]):
+                        order.order_has_free_delivery = True
+            return order
     except Exception:
         pass
 
@@ -84,60 +111,66 @@ def extract_order_payment_method_details(
         pass
 
     logger.debug('Failed to get payment method details from order confirmation email')
+    metrics.inc('grubhub_dl_extraction_failures', field='order_payment_method')
     return order
 
 
+@tracing.traced()
 def extract_order_total(soup: BeautifulSoup, order: models.Order) -> models.Order:
     """Try to extract the data for the ``order_total`` field.
     """
 
     try:
-        order_total = (
-            soup
-                .find_all('table')[1]
-                .find_all('td')[8]
-                .text
-                .split(':')[1]
-                .strip()
-                .replace('$', '')
-                .replace('.', '')
-        )
-        order.order_total = int(order_total)
-        return order
+        with metrics.strategy('orders.extract_order_total', 1):
+            order_total = (
+                soup
+                    .find_all('table')[1]
+                    .find_all('td')[8]
+                    .text
+                    .split(':')[1]
+                    .strip()
+                    .replace('$', '')
+                    .replace('.', '')
+            )
+            order.order_total = int(order_total)
+            return order
     except Exception:
         pass
 
     try:
-        order_total = (
-            soup
-                .find_all('table')[15]
-                .find_all('td')[1]
-                .text
-                .strip()
-                .replace('$', '')
-                .replace('.', '')
-        )
-        order.order_total = int(order_total)
-        return order
+        with metrics.strategy('orders.extract_order_total', 2):
+            order_total = (
+                soup
+                    .find_all('table')[15]
+                    .find_all('td')[1]
+                    .text
+                    .strip()
+                    .replace('$', '')
+                    .replace('.', '')
+            )
+            order.order_total = int(order_total)
+            return order
     except Exception:
         pass
 
     try:
-        order_total = (
-            soup
-                .find_all('table')[11]
-                .find_all('td')[1]
-                .text
-                .strip()
-                .replace('$', '')
-                .replace('.', '')
-        )
-        order.order_total = int(order_total)
-        return order
+        with metrics.strategy('orders.extract_order_total', 3):
+            order_total = (
+                soup
+                    .find_all('table')[11]
+                    .find_all('td')[1]
+                    .text
+                    .strip()
+                    .replace('$', '')
+                    .replace('.', '')
+            )
+            order.order_total = int(order_total)
+            return order
     except Exception:
         pass
     
     logger.debug('Failed to get "order_total" from order confirmation email')
+    metrics.inc('grubhub_dl_extraction_failures', field='order_total')
     return order
 
 
@@ -195,6 +228,7 @@ def add_summary_data_to_order(summary_data: dict, order: models.Order) -> models
     return order
     
 
+@tracing.traced()
 def extract_order_summary(soup: BeautifulSoup, order: models.Order) -> models.Order:
     """Try to extract the data for the following fields:
     
@@ -207,202 +241,228 @@ def extract_order_summary(soup: BeautifulSoup, order: models.Order) -> models.Or
     """
 
     try:
-        summary = soup.find_all('table')[1].find_all('td')
-        summary_data = process_summary_lines(summary, start=13)
-        order = add_summary_data_to_order(summary_data, order)
-        return order
+        with metrics.strategy('orders.extract_order_summary', 1):
+            summary = soup.find_all('table')[1].find_all('td')
+            summary_data = process_summary_lines(summary, start=13)
+            order = add_summary_data_to_order(summary_data, order)
+            return order
     except Exception as err:
         #logger.warning('EXTRACT SUMMARY: ATTEMPT 1 FAIL: %s', err)
         pass
 
     try:
-        summary = soup.find_all('table')[14].find_all('td')
-        summary_data = process_summary_lines(summary)
-        order = add_summary_data_to_order(summary_data, order)
-        return order
+        with metrics.strategy('orders.extract_order_summary', 2):
+            summary = soup.find_all('table')[14].find_all('td')
+            summary_data = process_summary_lines(summary)
+            order = add_summary_data_to_order(summary_data, order)
+            return order
     except Exception as err:
         #logger.warning('EXTRACT SUMMARY: ATTEMPT 2 FAIL: %s', err)
         pass
 
     try:
-        summary = soup.find_all('table')[10].find_all('td')
-        summary_data = process_summary_lines(summary)
-        order = add_summary_data_to_order(summary_data, order)
-        return order
+        with metrics.strategy('orders.extract_order_summary', 3):
+            summary = soup.find_all('table')[10].find_all('td')
+            summary_data = process_summary_lines(summary)
+            order = add_summary_data_to_order(summary_data, order)
+            return order
     except Exception as err:
         #logger.warning('EXTRACT SUMMARY: ATTEMPT 3 FAIL: %s', err)
         pass
     
     logger.debug('Failed to get order summary fields from order confirmation email')
+    metrics.inc('grubhub_dl_extraction_failures', field='order_summary')
     return order
 
 
+@tracing.traced()
 def extract_restaurant_phone(soup: BeautifulSoup, order: models.Order) -> models.Order:
     """Try to extract the data for the ``restaurant_phone`` field.
     """
     
     try:
-        order.restaurant_phone = (
-            soup
-                .find_all('table')[1]
-                .find_all('td')[10]
-                .text
-                .split(': ')[2]
-                .strip()
-        )
+        with metrics.strategy('orders.extract_restaurant_phone', 1):
+            order.restaurant_phone = (
+                soup
+                    .find_all('table')[1]
+                    .find_all('td')[10]
+                    .text
+                    .split(': ')[2]
+                    .strip()
+            )
     except Exception:
         pass
 
     try:
-        order.restaurant_phone = (
-            soup
-                .find_all('table')[6]
-                .find_all('td')[3]
-                .text
-                .split('Contact Restaurant:')[1]
-                .strip()
-        )
+        with metrics.strategy('orders.extract_restaurant_phone', 2):
+            order.restaurant_phone = (
+                soup
+                    .find_all('table')[6]
+                    .find_all('td')[3]
+                    .text
+                    .split('Contact Restaurant:')[1]
+                    .strip()
+            )
     except Exception:
         pass
     
     # TODO: Is a third method needed? Find out
 
-    logger.debug('Failed to get "restaurant_phone" from order confirmation email')
+    # The last strategy doesn't return early, so check whether any of them worked
+    if order.restaurant_phone is None:
+        logger.debug('Failed to get "restaurant_phone" from order confirmation email')
+        metrics.inc('grubhub_dl_extraction_failures', field='restaurant_phone')
     return order
 
 
+@tracing.traced()
 def extract_restaurant_name(soup: BeautifulSoup, order: models.Order) -> models.Order:
     """Try to extract the data for the ``restaurant_name`` field.
     """
     
     try:
-        order.restaurant_name = (
-            soup
-                .find_all('table')[1]
-                .find_all('td')[7]
-                .text
-                .strip()
-        )
-        return order
+        with metrics.strategy('orders.extract_restaurant_name', 1):
+            order.restaurant_name = (
+                soup
+                    .find_all('table')[1]
+                    .find_all('td')[7]
+                    .text
+                    .strip()
+            )
+            return order
     except Exception:
         pass
 
     try:
-        order.restaurant_name = (
-            soup
-                .find_all('table')[6]
-                .find_all('td')[0]
-                .text
-                .strip()
-        )
+        with metrics.strategy('orders.extract_restaurant_name', 2):
+            order.restaurant_name = (
+                soup
+                    .find_all('table')[6]
+                    .find_all('td')[0]
+                    .text
+                    .strip()
+            )
     except Exception:
         pass
 
     # TODO: Is a third method needed? Find out
 
-    logger.debug('Failed to get "restaurant_name" from order confirmation email')
+    # The last strategy doesn't return early, so check whether any of them worked
+    if order.restaurant_name is None:
+        logger.debug('Failed to get "restaurant_name" from order confirmation email')
+        metrics.inc('grubhub_dl_extraction_failures', field='restaurant_name')
     return order
 
 
+@tracing.traced()
 def extract_order_number(soup: BeautifulSoup, order: models.Order) -> models.Order:
     """Try to extract the data for the ``order_number`` field.
     """
     
     try:
-        order.order_number = (
-            soup
-                .find_all('table')[1]
-                .find_all('td')[10]
-                .text
-                .split(': ')[1]
-                .split('  ')[1]
-                .replace('#', '')
-                .strip()
-        )
-        return order
+        with metrics.strategy('orders.extract_order_number', 1):
+            order.order_number = (
+                soup
+                    .find_all('table')[1]
+                    .find_all('td')[10]
+                    .text
+                    .split(': ')[1]
+                    .split('  ')[1]
+                    .replace('#', '')
+                    .strip()
+            )
+            return order
     except Exception:
         pass
 
     try:
-        order.order_number = (
-            soup
-                .find_all('table')[11]
-                .find_all('td')[0]
-                .text
-                .split('#')[1]
-                .replace('#', '')
-                .strip()
-        )
-        return order
+        with metrics.strategy('orders.extract_order_number', 2):
+            order.order_number = (
+                soup
+                    .find_all('table')[11]
+                    .find_all('td')[0]
+                    .text
+                    .split('#')[1]
+                    .replace('#', '')
+                    .strip()
+            )
+            return order
     except Exception:
         pass
 
     try:
-        order.order_number = (
-            soup
-                .find_all('table')[6]
-                .find_all('td')[3]
-                .text
-                .split('Order number:')[1]
-                .split('Contact Restaurant:')[1]
-                .replace('#', '')
-                .strip()
-        )
-        return order
+        with metrics.strategy('orders.extract_order_number', 3):
+            order.order_number = (
+                soup
+                    .find_all('table')[6]
+                    .find_all('td')[3]
+                    .text
+                    .split('Order number:')[1]
+                    .split('Contact Restaurant:')[1]
+                    .replace('#', '')
+                    .strip()
+            )
+            return order
     except Exception:
         pass
 
     logger.debug('Failed to get "order_number" from order confirmation email')
+    metrics.inc('grubhub_dl_extraction_failures', field='order_number')
     return order
 
 
+@tracing.traced()
 def extract_ordered_at(soup: BeautifulSoup, order: models.Order) -> models.Order:
     """Try to extract the data for the ``ordered_at`` field.
     """
     
     try:
-        value = (
-            soup
-                .find_all('table')[1]
-                .find_all('td')[9]
-                .text
-                .split('Ordered:')[1]
-                .strip()
-        )
-        order.ordered_at = datetime.strptime(value, '%b %d, %Y %I:%M:%S%p')
-        return order
+        with metrics.strategy('orders.extract_ordered_at', 1):
+            value = (
+                soup
+                    .find_all('table')[1]
+                    .find_all('td')[9]
+                    .text
+                    .split('Ordered:')[1]
+                    .strip()
+            )
+            order.ordered_at = parse_timestamp(value, TEMPLATE_ORDERED_AT)
+            return order
     except Exception:
         pass
 
     try:
-        value = (
-            soup
-                .find_all('table')[11]
-                .find_all('td')[0]
-                .text
-                .split('#')[0]
-                .split('Order Details')[1]
-                .strip()
-        )
-        order.ordered_at = datetime.strptime(value, '%b %d, %Y %I:%M:%S%p')
-        return order
+        with metrics.strategy('orders.extract_ordered_at', 2):
+            value = (
+                soup
+                    .find_all('table')[11]
+                    .find_all('td')[0]
+                    .text
+                    .split('#')[0]
+                    .split('Order Details')[1]
+                    .strip()
+            )
+            order.ordered_at = parse_timestamp(value, TEMPLATE_ORDERED_AT)
+            return order
     except Exception:
         pass
 
     try:
-        value = (
-            soup
-                .find_all('table')[6]
-                .find_all('td')[2]
-                .split('Ordered:')[1]
-                .strip()
-        )
-        order.ordered_at = datetime.strptime(value, '%b %d, %Y %I:%M:%S%p')
-        return order
+        with metrics.strategy('orders.extract_ordered_at', 3):
+            value = (
+                soup
+                    .find_all('table')[6]
+                    .find_all('td')[2]
+                    .split('Ordered:')[1]
+                    .strip()
+            )
+            order.ordered_at = parse_timestamp(value, TEMPLATE_ORDERED_AT)
+            return order
     except Exception:
         pass
 
     logger.debug('Failed to get "ordered_at" from order confirmation email')
+    metrics.inc('grubhub_dl_extraction_failures', field='ordered_at')
     return order
 
 
@@ -411,8 +471,8 @@ def extract_order_confirmation(email: models.EmailMessage) -> models.Order:
     """
 
     if email.category == models.EmailCategory.order_confirmation:
-        soup = BeautifulSoup(email.body, 'html.parser')
-        order = models.Order(email_id=email.email_id)
+        soup = get_soup(email.body)
+        order = models.Order(email_id=email.email_id, sent_at=email.sent_at)
         order = extract_ordered_at(soup, order)
         order = extract_order_number(soup, order)
         order = extract_restaurant_name(soup, order)
@@ -420,5 +480,81 @@ def extract_order_confirmation(email: models.EmailMessage) -> models.Order:
         order = extract_order_summary(soup, order)
         order = extract_order_total(soup, order)
         order = extract_order_payment_method_details(soup, order)
-        # order = extract_order_items(soup, order)
         return order
+
+
+def process_item_cells(cells: list[str]) -> list[models.LineItem]:
+    """Helper function used by ``extract_order_items``
+
+    Find each sequence of three cells that contains a quantity, an item, and a price. The
+    first line of the item cell is the name of the item, and any other lines are the
+    options that were chosen for it.
+    """
+
+    items = []
+    i = 0
+    while i < len(cells) - 2:
+        if 'items subtotal' in cells[i].lower():
+            break
+
+        quantity = ITEM_QUANTITY.match(cells[i])
+        if quantity and ITEM_PRICE.match(cells[i+2]):
+            lines = [line.strip() for line in cells[i+1].splitlines() if line.strip()]
+            if lines:
+                items.append(models.LineItem(
+                    item_name=lines[0],
+                    quantity=int(quantity.group(1)),
+                    options='; '.join(lines[1:]) or None,
+                    price=price_to_cents(cells[i+2]),
+                ))
+                i += 3
+                continue
+        i += 1
+
+    return items
+
+
+def extract_order_items(email: models.EmailMessage) -> list[models.LineItem]:
+    """Try to extract the line items of an order (name, quantity, options and price).
+    """
+
+    if email.category != models.EmailCategory.order_confirmation:
+        return []
+
+    soup = get_soup(email.body)
+
+    try:
+        with metrics.strategy('orders.extract_order_items', 1):
+            # Each line item is a row of separate cells for the quantity, item and price
+            cells = [cell.get_text('\n').strip() for cell in soup.find_all('td')]
+            items = process_item_cells(cells)
+            if items:
+                return items
+    except Exception:
+        pass
+
+    try:
+        with metrics.strategy('orders.extract_order_items', 2):
+            # Each line item is a single cell that looks like "1x Pad Thai $12.95"
+            items = []
+            for cell in soup.find_all('td'):
+                if 'items subtotal' in cell.text.lower():
+                    break
+                match = ITEM_LINE.match(cell.get_text('\n').strip())
+                if match and not cell.find('td'):
+                    lines = [line.strip() for line in match.group(2).splitlines()]
+                    lines = [line for line in lines if line]
+                    items.append(models.LineItem(
+                        item_name=lines[0],
+                        quantity=int(match.group(1)),
+                        options='; '.join(lines[1:]) or None,
+                        price=price_to_cents(match.group(3)),
+                    ))
+            if items:
+                return items
+    except Exception:
+        pass
+
+    logger.debug('Failed to get order items from order confirmation email')
+    metrics.inc('grubhub_dl_extraction_failures', field='order_items')
+    return []
@@ -7,7 +7,7 @@ Dependencies
 
 from bs4 import BeautifulSoup
 
-from grubhub_dl import models
+from grubhub_dl import models, tracing
 
 
 # TODO: Find a way to eliminate the need for this helper function, if possible
@@ -37,8 +37,9 @@ def reduce_order_update_lists(update_list: list) -> list:
 
 def extract_order_updates(email: models.EmailMessage) -> models.OrderUpdate:
     if email.category == models.EmailCategory.order_updated:
-        update = models.OrderUpdate(email_id=email.email_id)
-        soup = BeautifulSoup(email.body, 'html.parser')
+        update = models.OrderUpdate(email_id=email.email_id, sent_at=email.sent_at)
+        with tracing.span('updates.parse_html'):
+            soup = BeautifulSoup(email.body, 'html.parser')
 
         # TODO: Figure out a better and more reliable way to get the order update details
         items = []
@@ -2,23 +2,33 @@
 
 Dependencies
 ============
-- pandas
+- pandas (only for the ``dataframe`` destination)
+
+Dependencies that take a long time to import (eg pandas, pyarrow and the Gmail API client)
+are only imported by the commands, sources and destinations that use them, so that the CLI
+starts quickly.
 """
 
 import os
+import re
 import sys
 import argparse
 import logging
 import pprint
-from dataclasses import asdict
+import importlib
+import typing as t
 from datetime import datetime, timedelta
-
-import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 
 from grubhub_dl import (
+    aggregates,
     process,
     models,
     config,
+    memory,
+    metrics,
+    reconciliation,
+    tracing,
     __version__,
     __appname__,
     DEFAULT_SOURCE,
@@ -27,12 +37,26 @@ from grubhub_dl import (
     DEFAULT_KEYRING_SERVICE,
     DEFAULT_KEYRING_USERNAME,
     DEFAULT_DATETIME_FORMAT,
+    DEFAULT_COMPRESSION,
     ERROR_MESSAGE_FATAL,
 )
 
-from grubhub_dl.export import export
-from grubhub_dl.validation import validate_enum
-from grubhub_dl.emails import cache, gmail
+from grubhub_dl.export import (
+    jsonl,
+    csv_file,
+    table,
+    sqlite,
+)
+from grubhub_dl.export.state import (
+    ExportState,
+    STATEFUL_DESTINATIONS,
+    select_new_emails,
+)
+from grubhub_dl.validation import validate_enum, validate_enums
+from grubhub_dl.emails import cache
+
+if t.TYPE_CHECKING:
+    import pandas as pd
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(
@@ -41,8 +65,12 @@ logging.basicConfig(
     datefmt='%Y-%m-%d %I:%M:%S %p'
 )
 
+# Destinations that write to stdout
+STDOUT_DESTINATIONS = [models.Destination.json, models.Destination.table]
+
 
-def get_grubhub_data(params: models.Parameters) -> pd.DataFrame | None:
+@tracing.traced('main.get_grubhub_data')
+def get_grubhub_data(params: models.Parameters) -> 'dict[str, pd.DataFrame] | None':
     """Run the app's logic
 
     1. Get all Grubhub emails from the given source (cached JSON file or an email API)
@@ -53,30 +81,50 @@ def get_grubhub_data(params: models.Parameters) -> pd.DataFrame | None:
     1. Export the dataclasses to the desired output destination
     
     :param params: The user-provided app parameters
-    :returns: A dataframe if the requested output format is a dataframe, otherwise None
+    :returns: A dict of dataframes (one per table) if the requested output format is a
+        dataframe, otherwise None
     """
 
     # Get email messages
-    match params.source:
-        case models.Source.cache:
-            emails = cache.json_files_to_emails(params)
-        case models.Source.gmail:
-            emails = gmail.get_emails_from_gmail_api(params)
-            cache.emails_to_json_files(params, emails)
-        case _:
-            logger.error(
-                'Unknown data source (%s). This is unexpected! Please report it!',
-                params.source
-            )
-            logger.error(ERROR_MESSAGE_FATAL)
-            return None
+    with memory.stage('get_emails'):
+        match params.source:
+            case models.Source.cache:
+                emails = cache.json_files_to_emails(params)
+            case models.Source.gmail:
+                from grubhub_dl.emails import gmail
+                emails = gmail.get_emails_from_gmail_api(params)
+                cache.emails_to_json_files(params, emails)
+            case _:
+                logger.error(
+                    'Unknown data source (%s). This is unexpected! Please report it!',
+                    params.source
+                )
+                logger.error(ERROR_MESSAGE_FATAL)
+                return None
 
     if not emails:
         logger.warning('No emails to extract data from. Quitting.')
         return None
 
+    # Emails that were exported to every destination before don't need to be extracted
+    # again. Destinations without a state always get every record.
+    export_states = {
+        destination: ExportState.load(params, destination)
+        for destination in params.destination
+        if destination in STATEFUL_DESTINATIONS
+    }
+    if len(export_states) == len(params.destination):
+        emails = select_new_emails(emails, list(export_states.values()))
+        if not emails:
+            logger.info('No new emails since the last export. Quitting.')
+            return None
+
     # Transform email messages into a list of dataclasses
-    grubhub_data = process.extract_data_from_emails(params, emails)
+    with memory.stage('extract'):
+        grubhub_data = process.extract_data_from_emails(params, emails, reconcile=False)
+        reconciliation.reconcile(params, grubhub_data)
+    with memory.stage('aggregates'):
+        aggregates.update_aggregates(params, grubhub_data)
     
 #    grubhub_data = {
 #        'emails':               [],
@@ -87,68 +135,133 @@ def get_grubhub_data(params: models.Parameters) -> pd.DataFrame | None:
 #        'credits':              [],
 #    }
 
-    records_emails = [asdict(r) for r in grubhub_data['emails']]
-    records_orders = [asdict(r) for r in grubhub_data['orders']]
-    records_order_items = [asdict(r) for r in grubhub_data['order_items']]
-    records_order_updates = [asdict(r) for r in grubhub_data['order_updates']]
-    records_order_cancellations = [asdict(r) for r in grubhub_data['order_cancellations']]
-    records_credits = [asdict(r) for r in grubhub_data['credits']]
-
-    df_emails = pd.DataFrame.from_dict(records_emails)
-    df_orders = pd.DataFrame.from_dict(records_orders)
-    df_order_items = pd.DataFrame.from_dict(records_order_items)
-    df_order_updates = pd.DataFrame.from_dict(records_order_updates)
-    df_order_cancellations = pd.DataFrame.from_dict(records_order_cancellations)
-    df_credits = pd.DataFrame.from_dict(records_credits)
-
-    orders_field_subset = [
-        'email_id',
-        'order_number',
+    # Export the extracted data to every destination at once. The batches are only read
+    # from here on, so they're shared by all the exporters. Destinations that write to
+    # stdout are exported one after the other on the main thread instead, so that their
+    # output isn't interleaved (and so that the table can ask the user to page).
+    background_destinations = [
+        destination
+        for destination in params.destination
+        if destination not in STDOUT_DESTINATIONS
     ]
-    df_emails = df_emails.merge(df_orders[orders_field_subset], how='left', on='email_id')
+    dataframes = None
+    errors = []
+    with memory.stage('export'), ThreadPoolExecutor(
+        max_workers=max(1, len(background_destinations)),
+        thread_name_prefix='export'
+    ) as executor:
+        futures = {
+            executor.submit(
+                export_grubhub_data,
+                params,
+                destination,
+                grubhub_data,
+                export_states.get(destination)
+            ): destination
+            for destination in background_destinations
+        }
+        for destination in params.destination:
+            if destination in STDOUT_DESTINATIONS:
+                try:
+                    export_grubhub_data(params, destination, grubhub_data)
+                except Exception as err:
+                    logger.error('Unable to export to %s: %s', destination.name, err)
+                    errors.append(err)
+
+        # Every destination is exported even if another one fails, and all of their
+        # errors are reported
+        for future, destination in futures.items():
+            try:
+                result = future.result()
+            except Exception as err:
+                logger.error('Unable to export to %s: %s', destination.name, err)
+                errors.append(err)
+                continue
+            if destination == models.Destination.dataframe:
+                dataframes = result
+
+    if len(errors) == 1:
+        raise errors[0]
+    if errors:
+        raise ExceptionGroup(f'Unable to export to {len(errors)} destinations', errors)
+    return dataframes
+
+
+def export_grubhub_data(
+    params: models.Parameters,
+    destination: models.Destination,
+    grubhub_data: dict[str, models.RecordBatch],
+    export_state: ExportState = None
+) -> 'dict[str, pd.DataFrame] | None':
+    """Export the extracted Grubhub data to one destination
+
+    :param export_state: The state of the destination, if it's already loaded (eg by
+        ``watch``, which keeps it between exports). By default, it's loaded from the
+        cache directory.
+    :returns: A dict of dataframes (one per table) if the destination is a dataframe,
+        otherwise None
+    """
 
-    emails_field_subset = [
-        'email_id',
-        'subject',
-        'category',
-        'cache_file',
-    ]
-    df_orders = df_orders.merge(df_emails[emails_field_subset], how='left', on='email_id')
-
-    today = datetime.now().strftime('%Y-%m-%d_%I%M%S%p')
-    output_dir = '/home/nick/grubhub_data_debug/'
-    debug_file = os.path.join(output_dir, f'grubhub_dl_debug_{today}.xlsx')
-    with pd.ExcelWriter(debug_file, engine='xlsxwriter') as writer:
-        df_emails.to_excel(writer, index=False, sheet_name='emails')
-        df_orders.to_excel(writer, index=False, sheet_name='orders')
-        df_order_items.to_excel(writer, index=False, sheet_name='order_items')
-        df_order_updates.to_excel(writer, index=False, sheet_name='order_updates')
-        df_order_cancellations.to_excel(writer, index=False, sheet_name='order_cancellations')
-        df_credits.to_excel(writer, index=False, sheet_name='credits')
-
-    #exit(0)
-
-    # Load the dataclasses
-    match params.destination:
-        case models.Destination.json:
-            export.grubhub_data_to_json(params, grubhub_data)
-        case models.Destination.table:
-            export.grubhub_data_to_table(params, grubhub_data)
-        case models.Destination.json_file:
-            export.grubhub_data_to_json_file(params, grubhub_data)
-        case models.Destination.csv_file:
-            export.grubhub_data_to_csv_file(params, grubhub_data)
-        case models.Destination.sqlite:
-            export.grubhub_data_to_sqlite(params, grubhub_data)
-        case models.Destination.dataframe:
-            return export.grubhub_data_to_dataframe(params, grubhub_data)
-        case _:
-            logger.error(
-                'Unknown destination type (%s). This is unexpected! Please report it!',
-                params.import_from
-            )
-            logger.error(ERROR_MESSAGE_FATAL)
-            return None
+    with (
+        tracing.span(f'export.{destination.name}'),
+        metrics.timer('export', destination=destination.name),
+    ):
+        match destination:
+            case models.Destination.json:
+                jsonl.grubhub_data_to_json(params, grubhub_data)
+            case models.Destination.table:
+                table.grubhub_data_to_table(params, grubhub_data)
+            case models.Destination.json_file:
+                export_state = export_state or ExportState.load(params, destination)
+                # Tables that were exported before are appended to, or rewritten if
+                # any of their records have changed
+                jsonl.grubhub_data_to_json_file(
+                    params,
+                    export_state.select_changes(grubhub_data),
+                    exported=export_state.fingerprints
+                )
+                export_state.save()
+            case models.Destination.csv_file:
+                csv_file.grubhub_data_to_csv_file(params, grubhub_data)
+            case models.Destination.sqlite:
+                export_state = export_state or ExportState.load(params, destination)
+                sqlite.grubhub_data_to_sqlite(
+                    params,
+                    export_state.select_changes(grubhub_data)
+                )
+                export_state.save()
+            case models.Destination.postgres:
+                from grubhub_dl.export import postgres
+                export_state = export_state or ExportState.load(params, destination)
+                postgres.grubhub_data_to_postgres(
+                    params,
+                    export_state.select_changes(grubhub_data)
+                )
+                export_state.save()
+            case models.Destination.excel_file:
+                from grubhub_dl.export import excel
+                excel.grubhub_data_to_excel_file(params, grubhub_data)
+            case models.Destination.arrow_file:
+                from grubhub_dl.export import arrow
+                arrow.grubhub_data_to_arrow_file(params, grubhub_data)
+            case models.Destination.parquet_file:
+                from grubhub_dl.export import parquet
+                export_state = export_state or ExportState.load(params, destination)
+                parquet.grubhub_data_to_parquet(
+                    params,
+                    export_state.select_changes(grubhub_data)
+                )
+                export_state.save()
+            case models.Destination.dataframe:
+                from grubhub_dl.export import export
+                return export.grubhub_data_to_dataframe(params, grubhub_data)
+            case _:
+                logger.error(
+                    'Unknown destination type (%s). This is unexpected! Please report it!',
+                    destination
+                )
+                logger.error(ERROR_MESSAGE_FATAL)
+    return None
 
 
 def get_arguments(args: list = None) -> argparse.Namespace:
@@ -178,10 +291,11 @@ def get_arguments(args: list = None) -> argparse.Namespace:
     )
     parser.add_argument(
         '--destination',
-        action='store',
-        type=lambda dest: validate_enum(dest, models.Destination),
-        default=DEFAULT_DESTINATION,
-        help='Export processed Grubhub data in this format'
+        nargs='+',
+        action='extend',
+        type=str,
+        help=('Export processed Grubhub data in these formats (eg "sqlite parquet_file" '
+              'or "sqlite,parquet_file")')
     )
     parser.add_argument(
         '--output-path',
@@ -197,6 +311,14 @@ def get_arguments(args: list = None) -> argparse.Namespace:
         type=str,
         help='When exporting Grubhub data to SQLite, export it to the DB at this path'
     )
+    parser.add_argument(
+        '--postgres-dsn',
+        metavar='DSN',
+        action='store',
+        type=str,
+        help=('When exporting Grubhub data to PostgreSQL, connect to the DB with this '
+              'connection string (eg "host=localhost dbname=grubhub user=me")')
+    )
     parser.add_argument(
         '--email-address',
         action='store',
@@ -237,6 +359,49 @@ def get_arguments(args: list = None) -> argparse.Namespace:
         default=DEFAULT_DATETIME_FORMAT,
         help='Format all timestamps using this format string'
     )
+    parser.add_argument(
+        '--compression',
+        action='store',
+        type=lambda comp: validate_enum(comp, models.Compression),
+        default=DEFAULT_COMPRESSION,
+        help='When exporting Grubhub data to a file, compress it with this format'
+    )
+    parser.add_argument(
+        '--limit',
+        metavar='N',
+        action='store',
+        type=int,
+        help='When displaying Grubhub data as a table, only display the first N orders'
+    )
+    parser.add_argument(
+        '--sort-by',
+        action='store',
+        choices=table.SORT_FIELDS,
+        default=table.DEFAULT_SORT_FIELD,
+        help=('When displaying Grubhub data as a table, display the orders in descending '
+              'order of this field')
+    )
+    parser.add_argument(
+        '--full-export',
+        action='store_true',
+        help=('Export all Grubhub data, instead of only the records that are new or '
+              'have changed since the last export to the same destination')
+    )
+    parser.add_argument(
+        '--profile-memory',
+        action='store_true',
+        help=('Report the peak memory of each stage, and what the memory was allocated '
+              'for (this makes the run several times slower)')
+    )
+    parser.add_argument(
+        '--trace',
+        metavar='FILE',
+        dest='trace_file',
+        action='store',
+        type=str,
+        help=('Record how long each stage takes, and save the recording to this file as '
+              'a Chrome trace (open it in https://ui.perfetto.dev)')
+    )
 
     namespace, unknown = parser.parse_known_args(args)
 
@@ -258,40 +423,82 @@ def get_parameters(args: list) -> models.Parameters:
 
     if namespace.config_file and os.path.exists(namespace.config_file):
         params = config.config_to_params(namespace.config_file)
+        validate_parameters(params)
         return params
     
-    if namespace.source == models.Source.gmail:
-        if not namespace.email_address:
-            logger.error('An email address must be provided when the source is "gmail".')
-            exit(1)
-        if not namespace.email_creds_file:
-            logger.error(
-                ('A JSON file containing your credentials for accessing the Gmail API '
-                'must be provided when the source is "gmail".')
-            )
-            exit(1)
-    
-    if namespace.destination and 'file' in namespace.destination.name:
-        if not namespace.output_path:
-            logger.error(
-                'An output path must be specified when the destination is "%s"',
-                namespace.destination
-            )
-            exit(1)
+    # Destinations can be given as separate arguments, or as a comma-separated list
+    destinations = validate_enums(namespace.destination, models.Destination)
+    namespace.destination = destinations or [DEFAULT_DESTINATION]
 
-    return models.Parameters(
+    params = models.Parameters(
         source=namespace.source,
         config_file=namespace.config_file,
         destination=namespace.destination,
         output_path=namespace.output_path,
         sqlite_path=namespace.sqlite_path,
+        postgres_dsn=namespace.postgres_dsn,
         email_address=namespace.email_address,
         email_creds_file=namespace.email_creds_file,
         cache_dir=namespace.cache_dir,
         keyring_service=namespace.keyring_service,
         keyring_username=namespace.keyring_username,
         datetime_format=namespace.datetime_format,
+        full_export=namespace.full_export,
+        compression=namespace.compression,
+        limit=namespace.limit,
+        sort_by=namespace.sort_by,
+        profile_memory=namespace.profile_memory,
+        trace_file=namespace.trace_file,
     )
+    validate_parameters(params)
+    return params
+
+
+def validate_parameters(params: models.Parameters):
+    """Check that the parameters that the source and the destinations need were given,
+    whether they're from the arguments or from a config file
+    """
+
+    if params.source == models.Source.gmail:
+        if not params.email_address:
+            logger.error('An email address must be provided when the source is "gmail".')
+            exit(1)
+        if not params.email_creds_file:
+            logger.error(
+                ('A JSON file containing your credentials for accessing the Gmail API '
+                'must be provided when the source is "gmail".')
+            )
+            exit(1)
+
+    for destination in params.destination:
+        if 'file' in destination.name and not params.output_path:
+            logger.error(
+                'An output path must be specified when the destination is "%s"',
+                destination.name
+            )
+            exit(1)
+
+    if models.Destination.sqlite in params.destination and not params.sqlite_path:
+        logger.error('A SQLite path must be specified when the destination is "sqlite"')
+        exit(1)
+
+    if models.Destination.postgres in params.destination and not params.postgres_dsn:
+        logger.error(
+            'A PostgreSQL connection string must be specified when the destination is '
+            '"postgres" (with --postgres-dsn, or postgres_dsn or a [postgres] section in '
+            'the config file)'
+        )
+        exit(1)
+
+
+def redact_dsn(dsn: str | None) -> str | None:
+    """Hide the password in a PostgreSQL connection string, so that it can be logged
+    """
+
+    if not dsn:
+        return dsn
+    dsn = re.sub(r"(password\s*=\s*)('(?:[^'\\]|\\.)*'|\S+)", r'\1***', dsn)
+    return re.sub(r'(://[^:/@]*:)[^@]*(@)', r'\1***\2', dsn)
 
 
 def get_runtime(duration: timedelta) -> str:
@@ -302,8 +509,25 @@ def get_runtime(duration: timedelta) -> str:
     return f'{hours:02d}h {mins:02d}m {secs:02d}s {milisecs}ms'
 
 
+# Commands that are run instead of the export, eg ``grubhub-dl query "SELECT ..."``, and
+# the modules whose ``main`` function runs them
+COMMANDS = {
+    'query': 'grubhub_dl.query',
+    'report': 'grubhub_dl.aggregates',
+    'search': 'grubhub_dl.search',
+    'watch': 'grubhub_dl.watch',
+}
+
+
 def main(args: list = None):
+    if args is None:
+        args = sys.argv[1:]
+    if args and args[0] in COMMANDS:
+        return importlib.import_module(COMMANDS[args[0]]).main(args[1:])
+
     df = None
+    params = None
+    succeeded = False
     
     try:
         started_at = datetime.now()
@@ -316,21 +540,46 @@ def main(args: list = None):
         )
         logger.info('source            = %s', params.source)
         logger.info('config_file       = %s', params.config_file)
-        logger.info('destination       = %s', params.destination)
+        logger.info(
+            'destination       = %s',
+            ', '.join(destination.name for destination in params.destination)
+        )
         logger.info('output_path       = %s', params.output_path)
         logger.info('sqlite_path       = %s', params.sqlite_path)
+        logger.info('postgres_dsn      = %s', redact_dsn(params.postgres_dsn))
         logger.info('email_address     = %s', params.email_address)
         logger.info('email_creds_file  = %s', params.email_creds_file)
         logger.info('cache_dir         = %s', params.cache_dir)
         logger.info('keyring_service   = %s', params.keyring_service)
         logger.info('keyring_username  = %s', params.keyring_username)
         logger.info('datetime_format   = %s', params.datetime_format)
-
+        logger.info('full_export       = %s', params.full_export)
+        logger.info('compression       = %s', params.compression)
+        logger.info('limit             = %s', params.limit)
+        logger.info('sort_by           = %s', params.sort_by)
+        logger.info('profile_memory    = %s', params.profile_memory)
+        logger.info('trace_file        = %s', params.trace_file)
+
+        if params.profile_memory:
+            memory.start()
+        if params.trace_file:
+            tracing.start()
         df = get_grubhub_data(params)
+        succeeded = True
 
     except KeyboardInterrupt:
         logger.warning('Received Ctrl-C from user. Quitting...')
 
+    finally:
+        # The trace is saved even if the run was interrupted, since it shows where the
+        # time went
+        if tracing.is_enabled():
+            tracing.stop(params.trace_file)
+        if memory.is_enabled():
+            memory.stop()
+        if params and params.cache_dir:
+            metrics.write_textfile(params.cache_dir, succeeded)
+
     duration = (datetime.now() - started_at)
 
     logger.info('Finished in %s', get_runtime(duration))
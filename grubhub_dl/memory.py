@@ -0,0 +1,253 @@
+"""Profiles how much memory each stage of the pipeline uses (eg with ``--profile-memory``).
+
+For each stage, the resident set size (RSS) of the process is sampled in the background to
+get its peak, and ``tracemalloc`` records the peak of the memory that Python allocated.
+When the stage ends, a snapshot of the memory that's still allocated is taken, to report:
+
+- how much of it is email bodies, BeautifulSoup trees, records, ``asdict`` copies and
+  DataFrames, based on the file that allocated it
+- the lines that allocated the most memory during the stage, and still hold it
+
+Memory that's allocated outside of Python's allocator (eg by pyarrow for DataFrames) isn't
+seen by ``tracemalloc``, and only shows up in the RSS.
+
+``tracemalloc`` makes the run several times slower, so profiling is disabled unless
+``start`` is called. While it's disabled, ``stage`` returns a shared no-op context
+manager.
+"""
+
+import os
+import sys
+import logging
+import threading
+import tracemalloc
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+
+logger = logging.getLogger(__name__)
+
+# Only the line that made each allocation is kept, since keeping more frames of its
+# traceback makes extraction many times slower (eg 27x with 8 frames instead of 5x)
+TRACEBACK_FRAMES = 1
+
+# How often the RSS of the process is sampled, in seconds
+SAMPLE_INTERVAL = 0.005
+
+# How many allocation sites are reported for each stage
+TOP_ALLOCATION_SITES = 10
+
+# Kinds of allocations, and the source files that allocate them. Everything that
+# BeautifulSoup allocates counts as soups, including the text that extractors get from
+# them (which is often kept in records).
+ALLOCATION_KINDS = {
+    'dataframes': (f'{os.sep}pandas{os.sep}', f'{os.sep}pyarrow{os.sep}'),
+    'asdict copies': (f'{os.sep}dataclasses.py',),
+    'soups': (f'{os.sep}bs4{os.sep}', os.path.join('html', 'parser.py')),
+    'bodies': (
+        os.path.join('grubhub_dl', 'emails', ''),
+        f'{os.sep}json{os.sep}',
+        f'{os.sep}base64.py',
+    ),
+    'records': (
+        os.path.join('grubhub_dl', 'models', ''),
+        os.path.join('grubhub_dl', 'extractors', ''),
+        os.path.join('grubhub_dl', 'process.py'),
+    ),
+}
+
+# The profiler, or None when profiling is disabled
+_profiler = None
+
+# Returned by ``stage`` when profiling is disabled
+NULL_STAGE = nullcontext()
+
+
+def get_rss() -> int | None:
+    """Get the current resident set size of the process, in bytes (only on Linux)"""
+
+    try:
+        with open('/proc/self/statm', 'rb') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def get_peak_rss() -> int | None:
+    """Get the peak resident set size of the process since it started, in bytes"""
+
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # It's in bytes on macOS, and kilobytes everywhere else
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def format_memory(value: int | None) -> str:
+    return '' if value is None else f'{value / 2**20:,.1f} MiB'
+
+
+def allocation_kind(file_name: str) -> str:
+    for kind, patterns in ALLOCATION_KINDS.items():
+        if any(pattern in file_name for pattern in patterns):
+            return kind
+    return 'other'
+
+
+def is_profiler_allocation(traceback: tracemalloc.Traceback) -> bool:
+    """Whether the memory was allocated for the snapshots that the profiler keeps"""
+
+    return traceback[0].filename == tracemalloc.__file__
+
+
+@dataclass
+class StageProfile:
+    name: str
+    rss_before: int | None = None
+    rss_peak: int | None = None
+    rss_after: int | None = None
+    traced_peak: int = 0
+    traced_after: int = 0
+    kinds: dict[str, int] = field(default_factory=dict)
+    top_sites: list[tracemalloc.StatisticDiff] = field(default_factory=list)
+
+
+class Profiler:
+    """Samples the RSS of the process in a background thread, and profiles each stage"""
+
+    def __init__(self):
+        self.stages = []
+        self.current = None
+        self.snapshot = None
+        self.stopped = threading.Event()
+        self.sampler = threading.Thread(
+            target=self.sample_rss,
+            name='memory-profiler',
+            daemon=True
+        )
+
+    def start(self):
+        tracemalloc.start(TRACEBACK_FRAMES)
+        self.snapshot = tracemalloc.take_snapshot()
+        self.sampler.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.sampler.join()
+        tracemalloc.stop()
+
+    def sample_rss(self):
+        while not self.stopped.wait(SAMPLE_INTERVAL):
+            stage = self.current
+            rss = get_rss()
+            if stage is not None and rss is not None:
+                stage.rss_peak = max(stage.rss_peak or 0, rss)
+
+    def enter_stage(self, name: str):
+        stage = StageProfile(name, rss_before=get_rss())
+        stage.rss_peak = stage.rss_before
+        tracemalloc.reset_peak()
+        self.current = stage
+
+    def exit_stage(self):
+        stage, self.current = self.current, None
+        stage.traced_after, stage.traced_peak = tracemalloc.get_traced_memory()
+        stage.rss_after = get_rss()
+        if stage.rss_after is not None:
+            stage.rss_peak = max(stage.rss_peak or 0, stage.rss_after)
+
+        snapshot = tracemalloc.take_snapshot()
+        for statistic in snapshot.statistics('filename'):
+            if not is_profiler_allocation(statistic.traceback):
+                kind = allocation_kind(statistic.traceback[0].filename)
+                stage.kinds[kind] = stage.kinds.get(kind, 0) + statistic.size
+        stage.top_sites = [
+            diff
+            for diff in snapshot.compare_to(self.snapshot, 'lineno')
+            if diff.size_diff > 0 and not is_profiler_allocation(diff.traceback)
+        ][:TOP_ALLOCATION_SITES]
+        self.snapshot = snapshot
+        self.stages.append(stage)
+
+    def report(self) -> list[str]:
+        """Summarize the profile of each stage"""
+
+        lines = [
+            f'Memory profile (peak RSS of the run: {format_memory(get_peak_rss())})',
+            (f'{"stage":<12} {"RSS before":>12} {"RSS peak":>12} {"RSS after":>12} '
+             f'{"traced peak":>12} {"traced after":>12}'),
+        ]
+        for stage in self.stages:
+            lines.append(
+                f'{stage.name:<12} {format_memory(stage.rss_before):>12} '
+                f'{format_memory(stage.rss_peak):>12} {format_memory(stage.rss_after):>12} '
+                f'{format_memory(stage.traced_peak):>12} '
+                f'{format_memory(stage.traced_after):>12}'
+            )
+
+        for stage in self.stages:
+            lines.append(f'Memory still allocated after "{stage.name}", by kind:')
+            for kind, size in sorted(stage.kinds.items(), key=lambda item: -item[1]):
+                lines.append(f'    {kind:<14} {format_memory(size):>12}')
+            lines.append(f'Lines that allocated the most memory during "{stage.name}":')
+            for diff in stage.top_sites:
+                frame = diff.traceback[0]
+                lines.append(
+                    f'    {format_memory(diff.size_diff):>12} {diff.count_diff:>+10,} blocks'
+                    f'  {frame.filename}:{frame.lineno}'
+                )
+        return lines
+
+
+class Stage:
+    __slots__ = ('profiler', 'name')
+
+    def __init__(self, profiler: Profiler, name: str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.profiler.enter_stage(self.name)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.profiler.exit_stage()
+        return False
+
+
+def stage(name: str):
+    """Profile the memory used by a stage of the pipeline in a ``with`` block
+
+    Stages shouldn't overlap, since the peak that ``tracemalloc`` records is shared.
+    """
+
+    profiler = _profiler
+    if profiler is None:
+        return NULL_STAGE
+    return Stage(profiler, name)
+
+
+def is_enabled() -> bool:
+    return _profiler is not None
+
+
+def start():
+    """Start profiling memory"""
+
+    global _profiler
+    _profiler = Profiler()
+    _profiler.start()
+
+
+def stop():
+    """Stop profiling memory, and log the profile of each stage"""
+
+    global _profiler
+    profiler, _profiler = _profiler, None
+    if profiler is None:
+        return
+
+    profiler.stop()
+    for line in profiler.report():
+        logger.info(line)
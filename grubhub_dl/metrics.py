@@ -0,0 +1,332 @@
+"""Counts what happened during a run, and writes the counts as a Prometheus textfile.
+
+The textfile is written to the cache directory at the end of every run, so that when
+``grubhub-dl`` is run from cron, node-exporter's textfile collector can scrape it and
+regressions can be alerted on. For example::
+
+    node_exporter --collector.textfile.directory ~/.cache/grubhub-dl
+
+Every metric is declared in ``METRICS``. Counters and histograms are always collected,
+since incrementing them is much cheaper than the work that they count. Histograms only
+keep a count per bucket, so their memory use doesn't grow with the number of
+observations.
+"""
+
+import os
+import time
+import bisect
+import logging
+import tempfile
+import threading
+import functools
+import typing as t
+from dataclasses import dataclass
+
+from grubhub_dl import tracing
+
+logger = logging.getLogger(__name__)
+
+METRICS_FILE_NAME = 'grubhub_dl.prom'
+
+# Stage durations in seconds, from a few milliseconds (eg a small export) up to a full
+# download of a large inbox
+DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 3600)
+
+
+@dataclass(frozen=True)
+class Metric:
+    type: str
+    help: str
+    buckets: tuple[float, ...] = None
+
+
+METRICS = {
+    'grubhub_dl_emails_fetched': Metric(
+        'counter', 'Emails retrieved from the Gmail API'
+    ),
+    'grubhub_dl_emails_cached': Metric(
+        'counter', 'Emails saved to new files in the cache directory'
+    ),
+    'grubhub_dl_emails_read': Metric(
+        'counter', 'Emails read from files in the cache directory'
+    ),
+    'grubhub_dl_emails_categorized': Metric(
+        'counter', 'Emails categorized by their subject line, by category'
+    ),
+    'grubhub_dl_bytes_read': Metric(
+        'counter', 'Bytes of email read, by source'
+    ),
+    'grubhub_dl_gmail_api_calls': Metric(
+        'counter', 'Calls made to the Gmail API (not counting retries), by method'
+    ),
+    'grubhub_dl_gmail_api_retries': Metric(
+        'counter', 'Gmail API calls that were retried after an error'
+    ),
+    'grubhub_dl_extractor_strategies': Metric(
+        'counter',
+        'Extraction strategies that were tried, by extractor, strategy and result'
+    ),
+    'grubhub_dl_extraction_failures': Metric(
+        'counter', 'Fields that no extraction strategy could extract, by field'
+    ),
+    'grubhub_dl_stage_duration_seconds': Metric(
+        'histogram', 'How long each stage of the run took', DURATION_BUCKETS
+    ),
+    'grubhub_dl_last_run_timestamp_seconds': Metric(
+        'gauge', 'When the last run finished'
+    ),
+    'grubhub_dl_last_run_success': Metric(
+        'gauge', 'Whether the last run finished without an error (1) or not (0)'
+    ),
+}
+
+
+class Histogram:
+    """The number of observations in each bucket of a histogram, and their sum
+
+    ``counts`` has one more item than the metric's buckets, for the observations that are
+    greater than every bucket (``+Inf``). The counts aren't cumulative.
+    """
+
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self, buckets: tuple[float, ...]):
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, buckets: tuple[float, ...], value: float):
+        self.counts[bisect.bisect_left(buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def copy(self) -> 'Histogram':
+        histogram = Histogram(())
+        histogram.counts = list(self.counts)
+        histogram.sum = self.sum
+        histogram.count = self.count
+        return histogram
+
+
+_lock = threading.Lock()
+
+# Values keyed by (metric name, labels)
+_values = {}
+
+
+def labels_key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+def inc(name: str, value: float = 1, **labels):
+    """Increment a counter"""
+
+    key = (name, labels_key(labels))
+    with _lock:
+        _values[key] = _values.get(key, 0) + value
+
+
+def gauge(name: str, value: float, **labels):
+    """Set a gauge"""
+
+    with _lock:
+        _values[(name, labels_key(labels))] = value
+
+
+def observe(name: str, value: float, **labels):
+    """Add an observation to a histogram"""
+
+    key = (name, labels_key(labels))
+    buckets = METRICS[name].buckets
+    with _lock:
+        histogram = _values.get(key)
+        if histogram is None:
+            histogram = _values[key] = Histogram(buckets)
+        histogram.observe(buckets, value)
+
+
+def value(name: str, **labels) -> float | Histogram | None:
+    """Get the current value of a metric (a copy, for histograms)"""
+
+    with _lock:
+        current = _values.get((name, labels_key(labels)))
+        return current.copy() if isinstance(current, Histogram) else current
+
+
+def reset():
+    with _lock:
+        _values.clear()
+
+
+class Timer:
+    """Observes the time between entering and exiting it in
+    ``grubhub_dl_stage_duration_seconds``
+    """
+
+    __slots__ = ('labels', 'start')
+
+    def __init__(self, labels: dict):
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        observe(
+            'grubhub_dl_stage_duration_seconds',
+            time.perf_counter() - self.start,
+            **self.labels
+        )
+        return False
+
+
+def timer(stage: str, **labels) -> Timer:
+    """Time a stage of the run in a ``with`` block"""
+
+    return Timer({'stage': stage} | labels)
+
+
+def timed(stage: str) -> t.Callable:
+    """Time each call of the decorated function as a stage of the run"""
+
+    def decorator(func: t.Callable) -> t.Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with Timer({'stage': stage}):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class Strategy:
+    """Counts whether an extraction strategy raised an error, and traces it"""
+
+    __slots__ = ('extractor', 'number', 'span')
+
+    def __init__(self, extractor: str, number: int):
+        self.extractor = extractor
+        self.number = number
+
+    def __enter__(self):
+        if tracing.is_enabled():
+            self.span = tracing.span(f'{self.extractor} #{self.number}')
+        else:
+            self.span = tracing.NULL_SPAN
+        self.span.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        inc(
+            'grubhub_dl_extractor_strategies',
+            extractor=self.extractor,
+            strategy=str(self.number),
+            result='ok' if exc_type is None else 'error',
+        )
+        return self.span.__exit__(exc_type, exc_value, traceback)
+
+
+def strategy(extractor: str, number: int) -> Strategy:
+    """Try an extraction strategy in a ``with`` block
+
+    :param extractor: The extractor that the strategy belongs to, eg
+        ``orders.extract_order_total``
+    :param number: Which of the extractor's strategies it is, starting from 1
+    """
+
+    return Strategy(extractor, number)
+
+
+def format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def format_labels(labels: tuple) -> str:
+    if not labels:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+        for name, value in labels
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def to_prometheus() -> str:
+    """Format the metrics in the Prometheus text format, which node-exporter's textfile
+    collector parses
+    """
+
+    with _lock:
+        values = {
+            key: value.copy() if isinstance(value, Histogram) else value
+            for key, value in _values.items()
+        }
+
+    lines = []
+    for name, metric in METRICS.items():
+        samples = sorted(
+            (
+                (labels, value)
+                for (key, labels), value in values.items()
+                if key == name
+            ),
+            key=lambda sample: sample[0]
+        )
+        if not samples:
+            continue
+        # The comments name the samples exactly, except for histograms, whose samples
+        # have the suffixes ``_bucket``, ``_count`` and ``_sum``
+        family = f'{name}_total' if metric.type == 'counter' else name
+        lines.append(f'# HELP {family} {metric.help}')
+        lines.append(f'# TYPE {family} {metric.type}')
+
+        for labels, value in samples:
+            if metric.type == 'histogram':
+                count = 0
+                for bound, bucket_count in zip(
+                    metric.buckets + (float('inf'),),
+                    value.counts
+                ):
+                    count += bucket_count
+                    bucket_labels = labels + (('le', format_value(float(bound))),)
+                    lines.append(f'{name}_bucket{format_labels(bucket_labels)} {count}')
+                lines.append(f'{name}_count{format_labels(labels)} {value.count}')
+                lines.append(
+                    f'{name}_sum{format_labels(labels)} {format_value(value.sum)}'
+                )
+            else:
+                lines.append(f'{family}{format_labels(labels)} {format_value(value)}')
+
+    return '\n'.join(lines) + '\n'
+
+
+def write_textfile(cache_dir: str, succeeded: bool):
+    """Write the metrics of the run to the textfile in ``cache_dir``
+
+    The file is replaced atomically, so that it's never scraped while half-written.
+    """
+
+    gauge('grubhub_dl_last_run_timestamp_seconds', round(time.time(), 3))
+    gauge('grubhub_dl_last_run_success', int(succeeded))
+
+    file_path = os.path.join(cache_dir, METRICS_FILE_NAME)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            'w',
+            encoding='utf-8',
+            dir=cache_dir,
+            prefix=f'.{METRICS_FILE_NAME}.',
+            delete=False
+        ) as file:
+            file.write(to_prometheus())
+        os.chmod(file.name, 0o644)
+        os.replace(file.name, file_path)
+    except OSError as err:
+        logger.warning('Unable to save metrics to %s: %s', file_path, err)
+        return
+    logger.debug('Saved metrics to %s', file_path)
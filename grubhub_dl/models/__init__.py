@@ -5,32 +5,51 @@ from .grubhub import (
     EmailCategory,
     CreditCategory,
     EmailMessage,
+    LineItem,
     OrderItem,
+    Restaurant,
+    MenuItem,
     OrderUpdate,
     OrderCancellation,
     Order,
     Credit,
+    ReconciledOrder,
+    GRUBHUB_TABLES,
+    PRIMARY_KEYS,
 )
+from .records import RecordBatch, Dimension
 from .params import (
     Source,
     Destination,
+    Compression,
     Parameters,
     VALID_SOURCES,
     VALID_DESTINATIONS,
+    VALID_COMPRESSIONS,
 )
 
 __all__ = [
     'EmailCategory',
     'CreditCategory',
     'EmailMessage',
+    'LineItem',
     'OrderItem',
+    'Restaurant',
+    'MenuItem',
     'OrderUpdate',
     'OrderCancellation',
     'Order',
     'Credit',
+    'ReconciledOrder',
+    'GRUBHUB_TABLES',
+    'PRIMARY_KEYS',
+    'RecordBatch',
+    'Dimension',
     'Source',
     'Destination',
+    'Compression',
     'Parameters',
     'VALID_SOURCES',
     'VALID_DESTINATIONS',
+    'VALID_COMPRESSIONS',
 ]
@@ -23,7 +23,7 @@ class CreditCategory(Enum):
     order_refund = auto()
 
 
-@dataclass
+@dataclass(slots=True)
 class EmailMessage:
     email_id: str
     subject: str
@@ -34,58 +34,139 @@ class EmailMessage:
     cache_file: str = None
 
 
-@dataclass
+@dataclass(slots=True)
+class LineItem:
+    """A line item as it appears in an order confirmation email, before its names are
+    interned into the ``restaurants`` and ``menu_items`` tables"""
+    item_name: str = None
+    quantity: int = None
+    options: str = None
+    price: int = None
+
+
+@dataclass(slots=True)
 class OrderItem:
-    pass
+    email_id: str = None
+    sent_at: datetime = None
+    order_number: str = None
+    line_number: int = None
+    restaurant_id: int = None
+    item_id: int = None
+    quantity: int = None
+    options: str = None
+    price: int = None
+
+
+@dataclass(slots=True)
+class Restaurant:
+    restaurant_id: int = None
+    restaurant_name: str = None
+
 
+@dataclass(slots=True)
+class MenuItem:
+    item_id: int = None
+    restaurant_id: int = None
+    item_name: str = None
 
-@dataclass
+
+@dataclass(slots=True)
 class OrderUpdate:
     email_id: str = None
+    sent_at: datetime = None
     order_number: str = None
-    refund_amount: str = None
+    refund_amount: int = None
     refund_item: str = None
     refund_reason: str = None
-    refund_item_amount: str = None
-    refund_fees_amount: str = None
-    tip_adjusted_amount: str = None
+    refund_item_amount: int = None
+    refund_fees_amount: int = None
+    tip_adjusted_amount: int = None
 
 
-@dataclass
+@dataclass(slots=True)
 class OrderCancellation:
     email_id: str = None
+    sent_at: datetime = None
     order_number: str = None
-    amount: str = None
+    amount: int = None
     reason: str = None
 
 
-@dataclass
+@dataclass(slots=True)
 class Order:
     email_id: str = None
+    sent_at: datetime = None
+    restaurant_id: int = None
     restaurant_name: str = None
     restaurant_phone: str = None
     ordered_at: datetime = None
     order_number: str = None
-    order_subtotal: str = None
-    order_total: str = None
-    order_service_fee_original: str = None
-    order_service_fee_actual: str = None
-    order_delivery_fee_original: str = None
-    order_delivery_fee_actual: str = None
-    order_sales_tax: str = None
-    order_delivery_tip: str = None
+    order_subtotal: int = None
+    order_total: int = None
+    order_service_fee_original: int = None
+    order_service_fee_actual: int = None
+    order_delivery_fee_original: int = None
+    order_delivery_fee_actual: int = None
+    order_sales_tax: int = None
+    order_delivery_tip: int = None
     order_payment_method: str = None
     order_has_free_delivery: bool = None
     order_has_promo_code: bool = None
-    order_items: list[str] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class Credit:
     email_id: str = None
-    amount: str = None
+    sent_at: datetime = None
+    amount: int = None
     percent_off: int = None
     percent_off_max_value: int = None
     code: str = None
     expires: datetime = None
     category: CreditCategory = None
+
+
+@dataclass(slots=True)
+class ReconciledOrder:
+    order_number: str = None
+    email_id: str = None
+    sent_at: datetime = None
+    ordered_at: datetime = None
+    restaurant_id: int = None
+    restaurant_name: str = None
+    order_total: int = None
+    order_delivery_tip: int = None
+    refunded_amount: int = None
+    tip_adjusted_amount: int = None
+    tip_adjusted_total: int = None
+    net_paid: int = None
+    is_canceled: bool = None
+    update_email_ids: list[str] = None
+    cancellation_email_id: str = None
+
+
+# The tables that extracted records are grouped into, and the type of their records
+GRUBHUB_TABLES = {
+    'emails':               EmailMessage,
+    'orders':               Order,
+    'order_items':          OrderItem,
+    'order_updates':        OrderUpdate,
+    'order_cancellations':  OrderCancellation,
+    'credits':              Credit,
+    'reconciled_orders':    ReconciledOrder,
+    'restaurants':          Restaurant,
+    'menu_items':           MenuItem,
+}
+
+# The fields that uniquely identify a record in each table
+PRIMARY_KEYS = {
+    'emails':               ('email_id',),
+    'orders':               ('email_id',),
+    'order_items':          ('email_id', 'line_number'),
+    'order_updates':        ('email_id',),
+    'order_cancellations':  ('email_id',),
+    'credits':              ('email_id',),
+    'reconciled_orders':    ('order_number',),
+    'restaurants':          ('restaurant_id',),
+    'menu_items':           ('item_id',),
+}
@@ -19,6 +19,17 @@ class Destination(Enum):
     csv_file = auto()
     dataframe = auto()
     sqlite = auto()
+    arrow_file = auto()
+    postgres = auto()
+    parquet_file = auto()
+    excel_file = auto()
+
+
+class Compression(Enum):
+    """Supported compression formats for file destinations"""
+    none = auto() # default
+    gzip = auto()
+    zstd = auto()
 
 
 @dataclass
@@ -26,16 +37,24 @@ class Parameters:
     """User-provided parameters"""
     source: Source = None
     config_file: str = None
-    destination: Destination = None
+    destination: list[Destination] = None
     output_path: str = None
     sqlite_path: str = None
+    postgres_dsn: str = None
     email_address: str = None
     email_creds_file: str = None
     cache_dir: str = None
     keyring_service: str = None
     keyring_username: str = None
     datetime_format: str = None
+    full_export: bool = None
+    compression: Compression = None
+    limit: int = None
+    sort_by: str = None
+    profile_memory: bool = None
+    trace_file: str = None
 
 
 VALID_SOURCES = [src.name for src in Source]
 VALID_DESTINATIONS = [dest.name for dest in Destination]
+VALID_COMPRESSIONS = [comp.name for comp in Compression]
@@ -0,0 +1,289 @@
+"""Defines a compact, columnar container for the records extracted from Grubhub emails.
+
+Instead of keeping a list of dataclass instances (each with its own attribute storage),
+a ``RecordBatch`` keeps one column per dataclass field. Integer, boolean and timestamp
+fields are stored in typed arrays (with the same memory layout that Apache Arrow uses for
+their values), and every other field is stored in a plain list.
+"""
+
+import sys
+import typing as t
+import hashlib
+from array import array
+from operator import attrgetter
+from dataclasses import fields
+from datetime import datetime, timedelta, timezone
+
+from grubhub_dl.timestamps import to_utc
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+
+class Column:
+    """Stores the values of one field in a list"""
+
+    __slots__ = ('values',)
+
+    def __init__(self):
+        self.values = []
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __getitem__(self, index: int):
+        return self.values[index]
+
+    def append(self, value):
+        self.values.append(value)
+
+    def to_list(self, start: int = 0, stop: int = None) -> list:
+        return self.values[start:stop]
+
+    def take(self, indexes: list[int]) -> 'Column':
+        """Get a new column that contains the values at the given indexes"""
+
+        column = type(self)()
+        values = self.values
+        column.values = [values[i] for i in indexes]
+        return column
+
+
+class IntColumn(Column):
+    """Stores the values of one integer field in a typed array
+
+    Missing values are stored as zeroes, and tracked in ``validity``, which holds one
+    byte per value (1 if the value is not None, otherwise 0).
+    """
+
+    __slots__ = ('validity', 'null_count')
+    typecode = 'q'
+
+    def __init__(self):
+        self.values = array(self.typecode)
+        self.validity = bytearray()
+        self.null_count = 0
+
+    def __getitem__(self, index: int):
+        if not self.validity[index]:
+            return None
+        return self.decode(self.values[index])
+
+    def encode(self, value) -> int:
+        return value
+
+    def decode(self, value: int):
+        return value
+
+    def append(self, value):
+        if value is None:
+            self.values.append(0)
+            self.validity.append(0)
+            self.null_count += 1
+        else:
+            self.values.append(self.encode(value))
+            self.validity.append(1)
+
+    def to_list(self, start: int = 0, stop: int = None) -> list:
+        values = self.values[start:stop].tolist()
+        # Plain integers don't need to be decoded, which saves a call per value
+        if type(self).decode is not IntColumn.decode:
+            decode = self.decode
+            values = [decode(value) for value in values]
+        if not self.null_count:
+            return values
+        return [
+            value if valid else None
+            for value, valid in zip(values, self.validity[start:stop])
+        ]
+
+    def take(self, indexes: list[int]) -> 'IntColumn':
+        column = type(self)()
+        values = self.values
+        validity = self.validity
+        column.values = array(self.typecode, [values[i] for i in indexes])
+        column.validity = bytearray([validity[i] for i in indexes])
+        column.null_count = len(indexes) - sum(column.validity)
+        return column
+
+
+class BoolColumn(IntColumn):
+    """Stores the values of one boolean field in a typed array"""
+
+    __slots__ = ()
+    typecode = 'b'
+
+    def encode(self, value) -> int:
+        return 1 if value else 0
+
+    def decode(self, value: int) -> bool:
+        return bool(value)
+
+
+class TimestampColumn(IntColumn):
+    """Stores the values of one datetime field as microseconds since the UNIX epoch (UTC)
+    """
+
+    __slots__ = ()
+
+    def encode(self, value: datetime) -> int:
+        return (to_utc(value) - EPOCH) // MICROSECOND
+
+    def decode(self, value: int) -> datetime:
+        return EPOCH + timedelta(microseconds=value)
+
+
+COLUMN_TYPES = {
+    int:        IntColumn,
+    bool:       BoolColumn,
+    datetime:   TimestampColumn,
+}
+
+
+class RecordBatch:
+    """Stores records of one dataclass type as a set of columns
+
+    Records are appended one at a time as they're extracted, and can be read back either
+    as dataclass instances, as rows (tuples in field order), or as whole columns.
+    """
+
+    __slots__ = ('record_type', 'columns', 'length', '_get_values', '_appenders')
+
+    def __init__(self, record_type: type):
+        self.record_type = record_type
+        type_hints = t.get_type_hints(record_type)
+        self.columns = {
+            field.name: COLUMN_TYPES.get(type_hints[field.name], Column)()
+            for field in fields(record_type)
+        }
+        self.length = 0
+
+        self._bind_columns()
+
+    def _bind_columns(self):
+        # Getting all the field values of a record at once, and appending them with bound
+        # methods, is a lot faster than looking up each field and column by name
+        names = list(self.columns)
+        self._get_values = attrgetter(*names) if len(names) > 1 else (
+            lambda record: tuple(getattr(record, name) for name in names)
+        )
+        self._appenders = [column.append for column in self.columns.values()]
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __iter__(self) -> t.Iterator:
+        record_type = self.record_type
+        for row in self.rows():
+            yield record_type(*row)
+
+    def __repr__(self) -> str:
+        return f'RecordBatch({self.record_type.__name__}, length={self.length})'
+
+    @property
+    def field_names(self) -> list[str]:
+        return list(self.columns)
+
+    def append(self, record):
+        """Append a dataclass instance to the batch"""
+
+        for append, value in zip(self._appenders, self._get_values(record)):
+            append(value)
+        self.length += 1
+
+    def extend(self, records: t.Iterable):
+        for record in records:
+            self.append(record)
+
+    def take(self, indexes: list[int]) -> 'RecordBatch':
+        """Get a new batch that contains the records at the given indexes"""
+
+        batch = RecordBatch(self.record_type)
+        batch.columns = {
+            name: column.take(indexes)
+            for name, column in self.columns.items()
+        }
+        batch.length = len(indexes)
+        batch._bind_columns()
+        return batch
+
+    def record(self, index: int):
+        """Get the record at ``index`` as a dataclass instance"""
+
+        return self.record_type(
+            **{name: column[index] for name, column in self.columns.items()}
+        )
+
+    def column(self, name: str) -> list:
+        """Get all the values of the field ``name``"""
+
+        return self.columns[name].to_list()
+
+    def rows(self, start: int = 0, stop: int = None) -> t.Iterator[tuple]:
+        """Iterate over the records as tuples, in the order of ``field_names``
+
+        Only the records from ``start`` up to ``stop`` are materialized if given, so a
+        large batch can be read in chunks.
+        """
+
+        if not self.columns:
+            return iter([()] * len(range(self.length)[start:stop]))
+        return zip(*(column.to_list(start, stop) for column in self.columns.values()))
+
+    def to_pydict(self) -> dict[str, list]:
+        """Get all the columns as a dict of lists, eg to build a DataFrame"""
+
+        return {name: column.to_list() for name, column in self.columns.items()}
+
+
+# Keys are at most this many bits, so that they're exact when they're stored as doubles
+# (eg in Excel, or by JSON readers in JavaScript)
+KEY_BITS = 53
+
+
+def stable_key(*values) -> int:
+    """Derive an integer key from the given values
+
+    The key only depends on the values, so the same restaurant or menu item gets the same
+    key in every run, and keys can be used to join exports from different runs.
+    """
+
+    digest = hashlib.blake2b(
+        '\x1f'.join(str(value) for value in values).encode('utf-8'),
+        digest_size=7
+    ).digest()
+    return int.from_bytes(digest, 'big') >> (56 - KEY_BITS)
+
+
+class Dimension:
+    """Interns the distinct values of one or more fields into a dimension table
+
+    The first time a combination of values is seen, it's assigned a key with
+    ``stable_key`` and appended to ``batch`` as a new record (the key, followed by the
+    values). Strings are interned with ``sys.intern``, so each one is stored once no
+    matter how many orders it appears in.
+    """
+
+    __slots__ = ('batch', 'keys')
+
+    def __init__(self, batch: RecordBatch):
+        self.batch = batch
+        self.keys = {}
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def intern(self, *values) -> int:
+        """Get the key of the given values, adding them to the dimension table if needed
+        """
+
+        key = self.keys.get(values)
+        if key is None:
+            values = tuple(
+                sys.intern(value) if isinstance(value, str) else value
+                for value in values
+            )
+            key = stable_key(*values)
+            self.keys[values] = key
+            self.batch.append(self.batch.record_type(key, *values))
+        return key
@@ -2,11 +2,13 @@
 and produces a set of dataclasses that contain the extracted and cleaned data.
 """
 
+import sys
 import pprint
 import logging
 from datetime import datetime
 
-from grubhub_dl import models, Dataclass
+from grubhub_dl import models, metrics, tracing, Dataclass
+from grubhub_dl.timestamps import to_utc
 from grubhub_dl.extractors import (
     cancellations,
     credits,
@@ -19,12 +21,168 @@ logger = logging.getLogger(__name__)
 
 def build_grubhub_order(
     order: models.Order,
-    order_updates: models.OrderUpdate,
-    order_cancellations: models.OrderCancellation
-):
+    order_updates: list[models.OrderUpdate],
+    order_cancellation: models.OrderCancellation | None
+) -> models.ReconciledOrder:
+    """Combine an order with its updates and cancellation, and compute what was
+    actually paid for it
+
+    - ``refunded_amount`` is the sum of the refunds from every update, plus the amount of
+      the cancellation
+    - ``net_paid`` is the order total minus ``refunded_amount``
+    - ``tip_adjusted_amount`` is the tip from the latest update that adjusted it, and
+      ``tip_adjusted_total`` is ``net_paid`` with the original tip replaced by it
+
+    :param order: The order, from an order confirmation email
+    :param order_updates: The updates that reference the order, sorted by ``sent_at``
+    :param order_cancellation: The cancellation that references the order, if any
+    """
+
+    refunded_amount = sum(update.refund_amount or 0 for update in order_updates)
+    if order_cancellation:
+        refunded_amount += order_cancellation.amount or 0
+
+    tip_adjusted_amount = None
+    for update in order_updates:
+        if update.tip_adjusted_amount is not None:
+            tip_adjusted_amount = update.tip_adjusted_amount
+
+    net_paid = None
+    tip_adjusted_total = None
+    if order.order_total is not None:
+        net_paid = order.order_total - refunded_amount
+        tip_adjusted_total = net_paid
+        if tip_adjusted_amount is not None:
+            tip_adjusted_total += tip_adjusted_amount - (order.order_delivery_tip or 0)
+
+    return models.ReconciledOrder(
+        order_number=order.order_number,
+        email_id=order.email_id,
+        sent_at=order.sent_at,
+        ordered_at=order.ordered_at,
+        restaurant_id=order.restaurant_id,
+        restaurant_name=order.restaurant_name,
+        order_total=order.order_total,
+        order_delivery_tip=order.order_delivery_tip,
+        refunded_amount=refunded_amount,
+        tip_adjusted_amount=tip_adjusted_amount,
+        tip_adjusted_total=tip_adjusted_total,
+        net_paid=net_paid,
+        is_canceled=order_cancellation is not None,
+        update_email_ids=[update.email_id for update in order_updates],
+        cancellation_email_id=(
+            order_cancellation.email_id if order_cancellation else None
+        ),
+    )
+
+
+def index_by_order_number(batch: models.RecordBatch) -> dict[str, list[int]]:
+    """Map each order number in the given batch to the indexes of its records, in order
+    of ``sent_at``
     """
+
+    sent_at = batch.columns['sent_at']
+    index = {}
+    for i, order_number in enumerate(batch.column('order_number')):
+        if order_number is not None:
+            index.setdefault(order_number, []).append(i)
+    for positions in index.values():
+        if len(positions) > 1:
+            positions.sort(key=lambda i: sent_at.values[i])
+    return index
+
+
+@tracing.traced()
+def reconcile_orders(grubhub_data: dict[str, models.RecordBatch]) -> dict[str, list[str]]:
+    """Attach the updates and cancellations of each order to it, and add the results to
+    the ``reconciled_orders`` table
+
+    Updates and cancellations are joined to orders on the normalized ``order_number``
+    using hash indexes, so this takes linear time and memory.
+
+    :param grubhub_data: The extracted Grubhub data
+    :returns: The email IDs of the updates and cancellations that reference an order
+        number that isn't in the ``orders`` table, keyed by table name
     """
-    pass
+
+    orders_batch = grubhub_data['orders']
+    updates_batch = grubhub_data['order_updates']
+    cancellations_batch = grubhub_data['order_cancellations']
+    reconciled = grubhub_data['reconciled_orders']
+
+    updates_index = index_by_order_number(updates_batch)
+    cancellations_index = index_by_order_number(cancellations_batch)
+    order_updates = list(updates_batch)
+    order_cancellations = list(cancellations_batch)
+
+    order_numbers = set()
+    for order in orders_batch:
+        order_number = order.order_number
+        if order_number is None or order_number in order_numbers:
+            continue
+        order_numbers.add(order_number)
+
+        order_cancellation = None
+        if order_number in cancellations_index:
+            order_cancellation = order_cancellations[cancellations_index[order_number][-1]]
+        reconciled.append(
+            build_grubhub_order(
+                order,
+                [order_updates[j] for j in updates_index.get(order_number, [])],
+                order_cancellation
+            )
+        )
+
+    unmatched = {}
+    for name, batch, index in [
+        ('order_updates', updates_batch, updates_index),
+        ('order_cancellations', cancellations_batch, cancellations_index),
+    ]:
+        email_ids = batch.columns['email_id']
+        unmatched[name] = [
+            email_ids[i]
+            for order_number, positions in index.items()
+            if order_number not in order_numbers
+            for i in positions
+        ]
+        if unmatched[name]:
+            logger.warning(
+                'Found %s %s that reference an unknown order',
+                len(unmatched[name]),
+                name
+            )
+            logger.debug('Email IDs of the unmatched %s: %s', name, unmatched[name])
+
+    logger.info('Reconciled %s orders', len(reconciled))
+    return unmatched
+
+
+def add_order_items(
+    grubhub_data: dict[str, models.RecordBatch],
+    menu_items: models.Dimension,
+    order: models.Order,
+    line_items: list[models.LineItem]
+):
+    """Normalize the line items of an order into the ``order_items`` table
+
+    Item names are interned into the ``menu_items`` table (per restaurant), so each
+    order item only refers to its menu item by key.
+    """
+
+    for line_number, line_item in enumerate(line_items, start=1):
+        grubhub_data['order_items'].append(
+            models.OrderItem(
+                email_id=order.email_id,
+                sent_at=order.sent_at,
+                order_number=order.order_number,
+                line_number=line_number,
+                restaurant_id=order.restaurant_id,
+                item_id=menu_items.intern(order.restaurant_id, line_item.item_name),
+                quantity=line_item.quantity,
+                options=sys.intern(line_item.options) if line_item.options else None,
+                price=line_item.price,
+            )
+        )
 
 
 def categorize_email(email: models.EmailMessage) -> models.EmailMessage:
@@ -66,13 +224,16 @@ def clean_dataclass_fields(params: models.Parameters, obj: Dataclass):
     if hasattr(obj, 'category'):
         obj.category = obj.category.name
 
-    if hasattr(obj, 'order_number'):
+    if getattr(obj, 'order_number', None) is not None:
         order_number = str(obj.order_number)
         order_number = order_number.replace('#', '')
         if '-' not in order_number:
             order_number = order_number[:8] + '-' + order_number[8:]
         obj.order_number = order_number
     
+    # Timestamps stay datetimes (normalized to UTC) so that they can be sorted and joined
+    # without parsing them again. They're only formatted with ``params.datetime_format``
+    # when they're exported.
     timestamp_fields = [
         'expires',
         'ordered_at',
@@ -82,8 +243,7 @@ def clean_dataclass_fields(params: models.Parameters, obj: Dataclass):
         if hasattr(obj, field):
             new_value = getattr(obj, field)
             if isinstance(new_value, datetime):
-                new_value = new_value.strftime(params.datetime_format)
-                setattr(obj, field, new_value)
+                setattr(obj, field, to_utc(new_value))
 
     integer_fields = [
         'amount',
@@ -111,33 +271,42 @@ def clean_dataclass_fields(params: models.Parameters, obj: Dataclass):
 
     return obj
 
+@tracing.traced()
+@metrics.timed('extract')
 def extract_data_from_emails(
     params: models.Parameters,
-    emails: list[models.EmailMessage]
-) -> tuple[list[models.Order], list[models.Credit]]:
-    """
+    emails: list[models.EmailMessage],
+    reconcile: bool = True
+) -> dict[str, models.RecordBatch]:
+    """Extract the data from each email, and append the resulting records to a
+    ``RecordBatch`` for each table in ``models.GRUBHUB_TABLES``
+
+    :param reconcile: Whether to reconcile the extracted orders with their updates and
+        cancellations. Callers that reconcile them with the records of earlier runs too
+        (see ``reconciliation``) leave it to themselves.
     """
     
     grubhub_data = {
-        'emails':               [],
-        'orders':               [],
-        'order_items':          [],
-        'order_updates':        [],
-        'order_cancellations':  [],
-        'credits':              [],
+        name: models.RecordBatch(record_type)
+        for name, record_type in models.GRUBHUB_TABLES.items()
     }
+    restaurants = models.Dimension(grubhub_data['restaurants'])
+    menu_items = models.Dimension(grubhub_data['menu_items'])
 
     for i, email in enumerate(emails, start=1):
         email = categorize_email(email)
+        metrics.inc('grubhub_dl_emails_categorized', category=email.category.name)
         if not email.body:
             continue
         
-        order = orders.extract_order_confirmation(email)
-        order_updates = updates.extract_order_updates(email)
-        order_cancellation = cancellations.extract_order_cancellation(email)
-        credit_dollars_off = credits.extract_credit_dollars_off(email)
-        credit_guarantee_perk = credits.extract_credit_guarantee_perk(email)
-        credit_discount = credits.extract_credit_discounted(email)
+        with tracing.span('process.extract_email', category=email.category.name):
+            order = orders.extract_order_confirmation(email)
+            line_items = orders.extract_order_items(email)
+            order_updates = updates.extract_order_updates(email)
+            order_cancellation = cancellations.extract_order_cancellation(email)
+            credit_dollars_off = credits.extract_credit_dollars_off(email)
+            credit_guarantee_perk = credits.extract_credit_guarantee_perk(email)
+            credit_discount = credits.extract_credit_discounted(email)
         
         if email:
             email = clean_dataclass_fields(params, email)
@@ -145,7 +314,11 @@ def extract_data_from_emails(
 
         if order:
             order = clean_dataclass_fields(params, order)
+            if order.restaurant_name:
+                order.restaurant_name = sys.intern(order.restaurant_name)
+                order.restaurant_id = restaurants.intern(order.restaurant_name)
             grubhub_data['orders'].append(order)
+            add_order_items(grubhub_data, menu_items, order, line_items)
         
         if order_updates:
             order_updates = clean_dataclass_fields(params, order_updates)
@@ -167,4 +340,6 @@ def extract_data_from_emails(
             credit_guarantee_perk = clean_dataclass_fields(params, credit_discount)
             grubhub_data['credits'].append(credit_discount)
 
+    if reconcile:
+        reconcile_orders(grubhub_data)
     return grubhub_data
@@ -0,0 +1,387 @@
+"""Runs SQL queries over extracted Grubhub data with DuckDB. The entrypoint for
+``grubhub-dl query``.
+
+The tables in ``models.GRUBHUB_TABLES`` can be queried from any of these sources:
+
+- ``cache``: The cached emails are extracted, and the tables are queried in memory (as
+  Arrow tables, without copying them). The tables are also saved as Arrow IPC files in
+  the cache directory (``query_snapshot``), and later queries memory-map them instead of
+  extracting the emails again, until emails are added to the cache.
+- ``parquet``: The Parquet datasets exported to ``--output-path``. Only the columns and
+  partitions that a query needs are read.
+- ``sqlite``: The SQLite database exported to ``--sqlite-path``. SQLite stores timestamps
+  as text (always ISO 8601 in UTC, regardless of the ``--datetime-format`` they were
+  exported with), so they're parsed into TIMESTAMPs.
+
+Amounts of money are stored in cents, and timestamps are in UTC. For example::
+
+    grubhub-dl query "SELECT restaurant_name, date_trunc('month', sent_at) AS month,
+        sum(net_paid) / 100 AS spent FROM reconciled_orders GROUP BY ALL ORDER BY month"
+
+Dependencies
+============
+- duckdb
+- pyarrow
+"""
+
+import os
+import csv
+import sys
+import json
+import time
+import hashlib
+import sqlite3
+import argparse
+import logging
+from datetime import date, datetime
+
+import duckdb
+import pyarrow as pa
+
+from grubhub_dl import (
+    process,
+    models,
+    __version__,
+    __appname__,
+    DEFAULT_CACHE_DIR,
+    DEFAULT_DATETIME_FORMAT,
+    ERROR_MESSAGE_FATAL,
+)
+from grubhub_dl.models.records import TimestampColumn
+from grubhub_dl.emails import cache
+from grubhub_dl.export.arrow import grubhub_data_to_arrow
+
+logger = logging.getLogger(__name__)
+
+QUERY_SOURCES = ['cache', 'parquet', 'sqlite']
+OUTPUT_FORMATS = ['table', 'csv', 'json']
+
+# The number of rows of a query result that are fetched at a time
+FETCH_SIZE = 10000
+
+SNAPSHOT_DIR_NAME = 'query_snapshot'
+SNAPSHOT_MANIFEST_NAME = 'manifest.json'
+
+
+def cache_fingerprint(params: models.Parameters) -> str:
+    """Get a checksum of the names of the cached emails and of the version of
+    ``grubhub-dl`` that extracts them
+
+    Cached emails are never changed once they're written, so the fingerprint only
+    changes when emails are added or removed (or when the extraction may have changed).
+    """
+
+    email_file_dir = os.path.join(params.cache_dir, 'emails')
+    try:
+        file_names = sorted(
+            entry.name for entry in os.scandir(email_file_dir)
+            if entry.name.endswith('.json')
+        )
+    except FileNotFoundError:
+        file_names = []
+    digest = hashlib.sha1(f'{__version__}\x1f{cache.CACHE_VERSION}'.encode('utf-8'))
+    for file_name in file_names:
+        digest.update(f'\x1f{file_name}'.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def load_snapshot(snapshot_dir: str, fingerprint: str) -> dict[str, pa.Table] | None:
+    """Memory-map the tables of the snapshot in ``snapshot_dir``
+
+    :returns: The tables, or None if there's no snapshot of the cache as it is now
+    """
+
+    try:
+        with open(os.path.join(snapshot_dir, SNAPSHOT_MANIFEST_NAME)) as file:
+            manifest = json.load(file)
+        if manifest.get('fingerprint') != fingerprint:
+            return None
+        return {
+            name: pa.ipc.open_file(
+                pa.memory_map(os.path.join(snapshot_dir, f'{name}.arrow'))
+            ).read_all()
+            for name in models.GRUBHUB_TABLES
+        }
+    except (OSError, ValueError, pa.ArrowException):
+        return None
+
+
+def save_snapshot(snapshot_dir: str, fingerprint: str, tables: dict[str, pa.Table]):
+    """Save the tables as Arrow IPC files in ``snapshot_dir``
+
+    The manifest is written last, so a snapshot that was only partly written is never
+    loaded.
+    """
+
+    os.makedirs(snapshot_dir, exist_ok=True)
+    manifest_path = os.path.join(snapshot_dir, SNAPSHOT_MANIFEST_NAME)
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+
+    for name, table in tables.items():
+        with pa.OSFile(os.path.join(snapshot_dir, f'{name}.arrow'), 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+
+    temp_path = f'{manifest_path}.tmp'
+    with open(temp_path, 'w') as file:
+        json.dump({'fingerprint': fingerprint}, file)
+    os.replace(temp_path, manifest_path)
+
+
+def register_cache_tables(conn: duckdb.DuckDBPyConnection, cache_dir: str):
+    """Register each table of the data extracted from the cached emails with DuckDB
+
+    The snapshot of the tables in the cache directory is used if the cache hasn't
+    changed since it was saved. Otherwise the emails are extracted, and the snapshot is
+    saved again.
+    """
+
+    params = models.Parameters(
+        source=models.Source.cache,
+        cache_dir=cache_dir,
+        datetime_format=DEFAULT_DATETIME_FORMAT,
+    )
+    # Migrating the cache may rename the cached emails
+    cache.migrate_cache(params)
+    snapshot_dir = os.path.join(cache_dir, SNAPSHOT_DIR_NAME)
+    fingerprint = cache_fingerprint(params)
+
+    tables = load_snapshot(snapshot_dir, fingerprint)
+    if tables is None:
+        emails = cache.json_files_to_emails(params)
+        if not emails:
+            logger.warning('No cached emails found in %s', cache_dir)
+        grubhub_data = process.extract_data_from_emails(params, emails or [])
+        tables = grubhub_data_to_arrow(grubhub_data)
+        try:
+            if emails:
+                save_snapshot(snapshot_dir, fingerprint, tables)
+        except OSError as err:
+            logger.warning('Unable to save the tables to %s: %s', snapshot_dir, err)
+    else:
+        logger.debug('Loaded the tables from the snapshot in %s', snapshot_dir)
+
+    for name, table in tables.items():
+        conn.register(name, table)
+
+
+def register_parquet_tables(conn: duckdb.DuckDBPyConnection, output_path: str):
+    """Create a view of each Parquet dataset in ``output_path``
+    """
+
+    for name in models.GRUBHUB_TABLES:
+        table_dir = os.path.join(output_path, name)
+        if not os.path.isdir(table_dir):
+            logger.debug('No Parquet dataset found for table "%s"', name)
+            continue
+        pattern = os.path.join(table_dir, '**', '*.parquet').replace("'", "''")
+        conn.execute(
+            f'CREATE VIEW {name} AS SELECT * FROM '
+            f"read_parquet('{pattern}', hive_partitioning = true)"
+        )
+
+
+def timestamp_fields(name: str) -> list[str]:
+    """Get the names of the timestamp columns of the table ``name``"""
+
+    batch = models.RecordBatch(models.GRUBHUB_TABLES[name])
+    return [
+        field for field, column in batch.columns.items()
+        if isinstance(column, TimestampColumn)
+    ]
+
+
+def create_timestamp_view(conn: duckdb.DuckDBPyConnection, name: str, source: str):
+    """Create a view named after the table ``name`` of the relation ``source``, with the
+    timestamp columns (which are ``DEFAULT_DATETIME_FORMAT`` text in ``source``) parsed
+    as TIMESTAMPs
+    """
+
+    timestamps = [
+        f"strptime({field}, '{DEFAULT_DATETIME_FORMAT}') AS {field}"
+        for field in timestamp_fields(name)
+    ]
+    replace = f' REPLACE ({", ".join(timestamps)})' if timestamps else ''
+    conn.execute(f'CREATE VIEW {name} AS SELECT *{replace} FROM {source}')
+
+
+def register_sqlite_tables(conn: duckdb.DuckDBPyConnection, sqlite_path: str):
+    """Create a view of each table in the SQLite database at ``sqlite_path``, with its
+    timestamps parsed as TIMESTAMPs
+
+    DuckDB's sqlite extension reads the tables directly. If the extension can't be
+    loaded (eg it can't be downloaded), the tables are read into memory instead.
+    """
+
+    try:
+        escaped_path = sqlite_path.replace("'", "''")
+        conn.execute(f"ATTACH '{escaped_path}' AS grubhub_sqlite (TYPE sqlite, READ_ONLY)")
+        for name in models.GRUBHUB_TABLES:
+            create_timestamp_view(conn, name, f'grubhub_sqlite.{name}')
+        return
+    except duckdb.Error as err:
+        logger.debug('Unable to attach the SQLite database with DuckDB: %s', err)
+
+    sqlite_conn = sqlite3.connect(f'file:{sqlite_path}?mode=ro', uri=True)
+    try:
+        for name in models.GRUBHUB_TABLES:
+            cursor = sqlite_conn.execute(f'SELECT * FROM {name}')
+            columns = [column[0] for column in cursor.description]
+            rows = cursor.fetchall()
+            # Typed explicitly, in case every timestamp in a column is missing
+            timestamps = set(timestamp_fields(name))
+            conn.register(
+                f'sqlite_{name}',
+                pa.Table.from_pydict({
+                    column: pa.array(
+                        [row[i] for row in rows],
+                        pa.string() if column in timestamps else None
+                    )
+                    for i, column in enumerate(columns)
+                })
+            )
+            create_timestamp_view(conn, name, f'sqlite_{name}')
+    finally:
+        sqlite_conn.close()
+
+
+def to_json_value(value):
+    """Convert a value that JSON doesn't support natively"""
+
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def print_result(relation: duckdb.DuckDBPyRelation, output_format: str):
+    """Print the result of a query to stdout in the given format
+
+    Results are fetched as Arrow record batches, so large results are streamed instead
+    of being loaded into memory all at once.
+    """
+
+    if output_format == 'table':
+        relation.show(max_rows=sys.maxsize, max_width=sys.maxsize)
+        return
+
+    columns = relation.columns
+    writer = csv.writer(sys.stdout)
+    if output_format == 'csv':
+        writer.writerow(columns)
+
+    for batch in relation.to_arrow_reader(FETCH_SIZE):
+        records = batch.to_pylist()
+        if output_format == 'csv':
+            writer.writerows(
+                [
+                    json.dumps(value, default=to_json_value)
+                    if isinstance(value, (list, dict)) else value
+                    for value in record.values()
+                ]
+                for record in records
+            )
+        else:
+            sys.stdout.writelines(
+                json.dumps(record, default=to_json_value) + '\n'
+                for record in records
+            )
+
+
+def get_arguments(args: list = None) -> argparse.Namespace:
+    """Parse the user-provided arguments of the ``query`` command
+    """
+
+    parser = argparse.ArgumentParser(
+        prog=f'{__appname__} query',
+        description='Run a SQL query over extracted Grubhub data'
+    )
+    parser.add_argument(
+        'sql',
+        nargs='?',
+        help='The SQL query to run. If not given, the query is read from stdin.'
+    )
+    parser.add_argument(
+        '--verbose',
+        action='store_true',
+        help='Display more verbose debugging information in the output log'
+    )
+    parser.add_argument(
+        '--from',
+        dest='query_source',
+        choices=QUERY_SOURCES,
+        default='cache',
+        help='Query the data in the email cache, or in a Parquet or SQLite export'
+    )
+    parser.add_argument(
+        '--cache-dir',
+        action='store',
+        type=str,
+        default=DEFAULT_CACHE_DIR,
+        help='Query the emails cached in this directory'
+    )
+    parser.add_argument(
+        '--output-path',
+        metavar='PATH',
+        action='store',
+        type=str,
+        help='Query the Parquet datasets that were exported to this directory'
+    )
+    parser.add_argument(
+        '--sqlite-path',
+        metavar='PATH',
+        action='store',
+        type=str,
+        help='Query the SQLite database at this path'
+    )
+    parser.add_argument(
+        '--format',
+        dest='output_format',
+        choices=OUTPUT_FORMATS,
+        default='table',
+        help='Print the result of the query in this format'
+    )
+    return parser.parse_args(args)
+
+
+def main(args: list = None):
+    namespace = get_arguments(args)
+
+    if namespace.verbose:
+        logging.getLogger().setLevel(logging.DEBUG)
+
+    sql = namespace.sql or sys.stdin.read()
+    if not sql.strip():
+        logger.error('No query was given')
+        exit(1)
+
+    conn = duckdb.connect()
+    conn.execute("SET TimeZone = 'UTC'")
+    started_at = time.perf_counter()
+    match namespace.query_source:
+        case 'cache':
+            register_cache_tables(conn, namespace.cache_dir)
+        case 'parquet':
+            if not namespace.output_path:
+                logger.error('An output path must be specified to query Parquet datasets')
+                exit(1)
+            register_parquet_tables(conn, namespace.output_path)
+        case 'sqlite':
+            if not namespace.sqlite_path or not os.path.exists(namespace.sqlite_path):
+                logger.error('An existing SQLite path must be specified to query SQLite')
+                exit(1)
+            register_sqlite_tables(conn, namespace.sqlite_path)
+    logger.debug('Loaded tables in %.3fs', time.perf_counter() - started_at)
+
+    started_at = time.perf_counter()
+    try:
+        relation = conn.sql(sql)
+    except duckdb.Error as err:
+        logger.error('Unable to run the query: %s', err)
+        logger.error(ERROR_MESSAGE_FATAL)
+        exit(1)
+
+    if relation is not None:
+        print_result(relation, namespace.output_format)
+    logger.debug('Ran the query in %.3fs', time.perf_counter() - started_at)
+    conn.close()
@@ -0,0 +1,172 @@
+"""Reconciles orders with their updates and cancellations across runs.
+
+An update or a cancellation is often extracted in a later run than its order (eg when
+only new emails are extracted, or when the update arrives first). So every order, update
+and cancellation that's extracted is kept in a SQLite database (``reconciliation.sqlite``
+in the cache directory). When new records are extracted, the orders that they belong to
+are reconciled again with every record of those orders that has been extracted so far,
+and updates and cancellations of unknown orders are kept until their order is extracted.
+"""
+
+import os
+import json
+import sqlite3
+import logging
+from pathlib import Path
+from datetime import timedelta
+
+from grubhub_dl import models, process, tracing
+from grubhub_dl.models.records import EPOCH, TimestampColumn
+
+logger = logging.getLogger(__name__)
+
+RECONCILIATION_FILE_NAME = 'reconciliation.sqlite'
+
+# Tables that are reconciled into ``reconciled_orders``, by ``order_number``
+RECONCILED_TABLES = ['orders', 'order_updates', 'order_cancellations']
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS records (
+    table_name          TEXT,
+    email_id            TEXT,
+    order_number        TEXT,
+    record              TEXT,
+    PRIMARY KEY (table_name, email_id)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS records_order_number ON records (order_number);
+'''
+
+SELECT_RECORDS = '''
+SELECT records.table_name, records.email_id, records.record
+FROM records
+JOIN temp.reconciled_order_numbers USING (order_number)
+'''
+
+
+def connect(cache_dir: str) -> sqlite3.Connection:
+    """Open the reconciliation database in the cache directory, and create its schema if
+    needed
+    """
+
+    Path(cache_dir).mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(os.path.join(cache_dir, RECONCILIATION_FILE_NAME))
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = NORMAL')
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def encode_records(batch: models.RecordBatch) -> list[str]:
+    """Serialize each record in the batch as a JSON object, with its timestamps as
+    microseconds since the UNIX epoch
+    """
+
+    columns = {}
+    for name, column in batch.columns.items():
+        if isinstance(column, TimestampColumn):
+            columns[name] = [
+                value if valid else None
+                for value, valid in zip(column.values.tolist(), column.validity)
+            ]
+        else:
+            columns[name] = column.to_list()
+    names = list(columns)
+    return [
+        json.dumps(dict(zip(names, values)), separators=(',', ':'))
+        for values in zip(*columns.values())
+    ]
+
+
+def decode_record(batch: models.RecordBatch, record: str):
+    """Deserialize a record that was serialized by ``encode_records``"""
+
+    values = json.loads(record)
+    for name, column in batch.columns.items():
+        value = values.get(name)
+        if value is not None and isinstance(column, TimestampColumn):
+            values[name] = EPOCH + timedelta(microseconds=value)
+    return batch.record_type(
+        **{name: values.get(name) for name in batch.columns}
+    )
+
+
+@tracing.traced()
+def reconcile(
+    params: models.Parameters,
+    grubhub_data: dict[str, models.RecordBatch]
+) -> dict[str, list[str]]:
+    """Reconcile every order that the extracted records belong to, with every record of
+    it that has been extracted so far, and save the extracted records for later runs
+
+    The ``reconciled_orders`` table is replaced with the reconciled orders.
+
+    :returns: The email IDs of the updates and cancellations that still reference an
+        order number that hasn't been extracted, keyed by table name
+    """
+
+    if not params.cache_dir:
+        grubhub_data['reconciled_orders'] = models.RecordBatch(models.ReconciledOrder)
+        return process.reconcile_orders(grubhub_data)
+
+    order_numbers = {
+        order_number
+        for name in RECONCILED_TABLES
+        for order_number in grubhub_data[name].column('order_number')
+        if order_number is not None
+    }
+
+    conn = connect(params.cache_dir)
+    try:
+        conn.execute(
+            'CREATE TEMP TABLE IF NOT EXISTS reconciled_order_numbers '
+            '(order_number TEXT PRIMARY KEY)'
+        )
+        conn.execute('DELETE FROM temp.reconciled_order_numbers')
+        conn.executemany(
+            'INSERT INTO temp.reconciled_order_numbers VALUES (?)',
+            ((order_number,) for order_number in order_numbers)
+        )
+
+        # The records that were extracted before, followed by the new ones (which replace
+        # the ones that were extracted from the same emails)
+        orders_data = {
+            name: models.RecordBatch(models.GRUBHUB_TABLES[name])
+            for name in RECONCILED_TABLES + ['reconciled_orders']
+        }
+        new_email_ids = {
+            name: set(grubhub_data[name].column('email_id'))
+            for name in RECONCILED_TABLES
+        }
+        for name, email_id, record in conn.execute(SELECT_RECORDS):
+            if name in orders_data and email_id not in new_email_ids[name]:
+                orders_data[name].append(decode_record(orders_data[name], record))
+        for name in RECONCILED_TABLES:
+            orders_data[name].extend(grubhub_data[name])
+
+        unmatched = process.reconcile_orders(orders_data)
+        grubhub_data['reconciled_orders'] = orders_data['reconciled_orders']
+
+        with conn:
+            for name in RECONCILED_TABLES:
+                batch = grubhub_data[name]
+                conn.executemany(
+                    'INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?)',
+                    zip(
+                        [name] * len(batch),
+                        batch.column('email_id'),
+                        batch.column('order_number'),
+                        encode_records(batch)
+                    )
+                )
+    finally:
+        conn.close()
+
+    kept = sum(len(email_ids) for email_ids in unmatched.values())
+    if kept:
+        logger.info(
+            'Kept %s updates and cancellations of unknown orders, to reconcile them when '
+            'their orders are extracted',
+            kept
+        )
+    return unmatched
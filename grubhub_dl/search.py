@@ -0,0 +1,272 @@
+"""Searches the text of the cached emails. The entrypoint for ``grubhub-dl search``.
+
+Matching emails are found with the full-text search index in ``emails.index``, and only
+those emails are extracted, so results are printed right away along with the orders,
+updates, cancellations and credits that were extracted from them. For example::
+
+    grubhub-dl search thai
+    grubhub-dl search '"pad see ew" OR curry' --limit 5
+
+Queries use the FTS5 query syntax (eg ``"exact phrase"``, ``OR``, ``NOT``, ``prefix*``).
+Words are stemmed, so ``noodle`` also matches ``noodles``.
+"""
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import logging
+
+from grubhub_dl import (
+    process,
+    models,
+    __appname__,
+    DEFAULT_CACHE_DIR,
+    DEFAULT_DATETIME_FORMAT,
+    ERROR_MESSAGE_FATAL,
+)
+from grubhub_dl.emails import cache, index
+from grubhub_dl.export.jsonl import default
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_FORMATS = ['table', 'json']
+DEFAULT_LIMIT = 20
+
+SEARCH_QUERY = '''
+SELECT
+    indexed_emails.email_id,
+    indexed_emails.cache_file,
+    indexed_emails.sent_at,
+    indexed_emails.subject,
+    snippet(email_text, 1, '[', ']', '…', 16)
+FROM email_text
+JOIN indexed_emails ON indexed_emails.id = email_text.rowid
+WHERE email_text MATCH ?
+ORDER BY rank
+LIMIT ?
+'''
+
+# The tables whose records are shown with each matching email, and the fields that are
+# shown in a table
+RECORD_FIELDS = {
+    'orders': ['order_number', 'restaurant_name', 'order_total'],
+    'order_items': ['quantity', 'item_name', 'price'],
+    'order_updates': ['order_number', 'refund_amount', 'tip_adjusted_amount'],
+    'order_cancellations': ['order_number', 'amount'],
+    'credits': ['category', 'amount'],
+}
+MONEY_FIELDS = {
+    'order_total',
+    'price',
+    'refund_amount',
+    'tip_adjusted_amount',
+    'amount',
+}
+
+
+def sync_index(params: models.Parameters, conn: sqlite3.Connection) -> int:
+    """Add the cached emails that aren't in the search index yet (eg emails that were
+    cached before the index existed), and remove the ones that are no longer cached
+
+    Cache files that aren't in the index are read, and emails that are already indexed
+    (by ``email_id``) get their new cache file instead of being indexed again.
+
+    :returns: The number of emails that were added
+    """
+
+    cache.migrate_cache(params)
+    email_file_dir = os.path.join(params.cache_dir, 'emails')
+    cache_files = {
+        entry.name
+        for entry in os.scandir(email_file_dir)
+        if entry.name.endswith('.json')
+    }
+    added = 0
+    missing = sorted(cache_files - index.indexed_cache_files(conn))
+    if missing:
+        logger.info('Adding %s cached emails to the search index', len(missing))
+        added = index.index_emails(conn, cache.json_files_to_emails(params, missing))
+
+    removed = index.remove_cache_files(
+        conn,
+        index.indexed_cache_files(conn) - cache_files
+    )
+    if removed:
+        logger.info(
+            'Removed %s emails that are no longer cached from the search index',
+            removed
+        )
+    return added
+
+
+def quote_terms(query: str) -> str:
+    """Quote each word of the query, so that it's matched literally"""
+
+    return ' '.join('"' + term.replace('"', '""') + '"' for term in query.split())
+
+
+def search_emails(conn: sqlite3.Connection, query: str, limit: int) -> list[tuple]:
+    """Get the emails that best match the query, with a snippet of the matching text
+
+    If the query isn't valid FTS5 syntax (eg it contains punctuation), its words are
+    searched for literally instead.
+    """
+
+    try:
+        return conn.execute(SEARCH_QUERY, (query, limit)).fetchall()
+    except sqlite3.OperationalError as err:
+        logger.debug('Searching for each word literally: %s', err)
+        return conn.execute(SEARCH_QUERY, (quote_terms(query), limit)).fetchall()
+
+
+def records_by_email(
+    grubhub_data: dict[str, models.RecordBatch]
+) -> dict[str, dict[str, list[dict]]]:
+    """Group the extracted records of the tables in ``RECORD_FIELDS`` by email ID
+    """
+
+    item_names = dict(zip(
+        grubhub_data['menu_items'].column('item_id'),
+        grubhub_data['menu_items'].column('item_name'),
+    ))
+    records = {}
+    for name in RECORD_FIELDS:
+        batch = grubhub_data[name]
+        for row in batch.rows():
+            record = dict(zip(batch.field_names, row))
+            if name == 'order_items':
+                record['item_name'] = item_names.get(record['item_id'])
+            records.setdefault(record['email_id'], {}).setdefault(name, []).append(record)
+    return records
+
+
+def format_value(field: str, value) -> str:
+    """Format one value of a record for display"""
+
+    if field in MONEY_FIELDS and isinstance(value, int):
+        return f'${value / 100:,.2f}'
+    return str(value)
+
+
+def print_results(results: list[tuple], records: dict, output_format: str):
+    """Print the matching emails and their records to stdout in the given format
+    """
+
+    for email_id, _, sent_at, subject, snippet in results:
+        email_records = records.get(email_id, {})
+        if output_format == 'json':
+            sys.stdout.write(json.dumps(
+                {
+                    'email_id': email_id,
+                    'sent_at': sent_at,
+                    'subject': subject,
+                    'snippet': snippet,
+                    'records': email_records,
+                },
+                default=default
+            ) + '\n')
+            continue
+
+        lines = [f'{sent_at}  {subject}', f'    {snippet}']
+        for name, fields in RECORD_FIELDS.items():
+            for record in email_records.get(name, []):
+                values = [
+                    format_value(field, record[field])
+                    for field in fields
+                    if record.get(field) is not None
+                ]
+                lines.append(f'    {name}: {"  ".join(values)}'.rstrip())
+        sys.stdout.write('\n'.join(lines) + '\n\n')
+
+
+def get_arguments(args: list = None) -> argparse.Namespace:
+    """Parse the user-provided arguments of the ``search`` command
+    """
+
+    parser = argparse.ArgumentParser(
+        prog=f'{__appname__} search',
+        description='Search the text of the cached Grubhub emails'
+    )
+    parser.add_argument(
+        'query',
+        nargs='+',
+        help='The words or FTS5 query to search for'
+    )
+    parser.add_argument(
+        '--verbose',
+        action='store_true',
+        help='Display more verbose debugging information in the output log'
+    )
+    parser.add_argument(
+        '--cache-dir',
+        action='store',
+        type=str,
+        default=DEFAULT_CACHE_DIR,
+        help='Search the emails cached in this directory'
+    )
+    parser.add_argument(
+        '--limit',
+        metavar='N',
+        action='store',
+        type=int,
+        default=DEFAULT_LIMIT,
+        help=f'Only print the N best matching emails (default: {DEFAULT_LIMIT})'
+    )
+    parser.add_argument(
+        '--format',
+        dest='output_format',
+        choices=OUTPUT_FORMATS,
+        default='table',
+        help='Print the matching emails in this format'
+    )
+    return parser.parse_args(args)
+
+
+def main(args: list = None):
+    namespace = get_arguments(args)
+
+    if namespace.verbose:
+        logging.getLogger().setLevel(logging.DEBUG)
+
+    if not os.path.isdir(os.path.join(namespace.cache_dir, 'emails')):
+        logger.error(
+            'No cached emails found in %s. Run %s to download your Grubhub emails first.',
+            namespace.cache_dir,
+            __appname__
+        )
+        logger.error(ERROR_MESSAGE_FATAL)
+        exit(1)
+
+    params = models.Parameters(
+        source=models.Source.cache,
+        cache_dir=namespace.cache_dir,
+        datetime_format=DEFAULT_DATETIME_FORMAT,
+    )
+    started_at = time.perf_counter()
+    conn = index.connect(namespace.cache_dir)
+    try:
+        sync_index(params, conn)
+        results = search_emails(conn, ' '.join(namespace.query), namespace.limit)
+    finally:
+        conn.close()
+    logger.debug('Searched the emails in %.3fs', time.perf_counter() - started_at)
+
+    if not results:
+        logger.warning('No emails matched the search')
+        return
+
+    # Only the matching emails are extracted
+    email_file_dir = os.path.join(namespace.cache_dir, 'emails')
+    emails = cache.json_files_to_emails(
+        params,
+        [
+            result[1] for result in results
+            if result[1] and os.path.exists(os.path.join(email_file_dir, result[1]))
+        ]
+    )
+    records = records_by_email(process.extract_data_from_emails(params, emails))
+    print_results(results, records, namespace.output_format)
+    logger.debug('Found %s emails in %.3fs', len(results), time.perf_counter() - started_at)
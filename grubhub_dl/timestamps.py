@@ -0,0 +1,272 @@
+"""Parses and formats the timestamps that appear in Grubhub emails and cache files.
+
+Every timestamp that ``grubhub-dl`` extracts is normalized to a timezone-aware UTC
+``datetime``, so that records can be sorted and joined without parsing them again.
+
+``datetime.strptime`` is slow, locale-sensitive, and doesn't understand timezone
+abbreviations like "EDT". So instead, each format string is compiled once into a regular
+expression that uses English month and weekday names regardless of the system locale,
+and the result of parsing each distinct string is memoized. Only the parsed value is
+memoized, not its conversion to UTC, since that can depend on the system's timezone.
+"""
+
+import re
+import logging
+from datetime import datetime, timedelta, timezone, tzinfo
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+# The format of each kind of timestamp that's found in Grubhub emails
+TEMPLATE_EMAIL_DATE_HEADER = '%a, %d %b %Y %H:%M:%S %z'
+TEMPLATE_ORDERED_AT = '%b %d, %Y %I:%M:%S%p'
+TEMPLATE_CREDIT_DOLLARS_OFF = 'Expires %B %d, %Y %I:%M%p'
+TEMPLATE_CREDIT_GUARANTEE_PERK = '%B %d, %Y %I:%M%p'
+TEMPLATE_CREDIT_DISCOUNTED = '%b %d, %Y %I:%M%p %Z'
+
+# Offsets (in hours) from UTC of the timezone names that Grubhub and mail servers use.
+# Some platforms render "%Z" as the full name of the timezone (eg "Eastern Daylight
+# Time") instead of the abbreviation, so both forms are included.
+TIMEZONE_OFFSETS = {
+    'UT':   0,
+    'UTC':  0,
+    'GMT':  0,
+    'Z':    0,
+    'EST':  -5,
+    'EDT':  -4,
+    'CST':  -6,
+    'CDT':  -5,
+    'MST':  -7,
+    'MDT':  -6,
+    'PST':  -8,
+    'PDT':  -7,
+    'AKST': -9,
+    'AKDT': -8,
+    'HST':  -10,
+    'COORDINATED UNIVERSAL TIME':   0,
+    'GREENWICH MEAN TIME':          0,
+    'EASTERN STANDARD TIME':        -5,
+    'EASTERN DAYLIGHT TIME':        -4,
+    'CENTRAL STANDARD TIME':        -6,
+    'CENTRAL DAYLIGHT TIME':        -5,
+    'MOUNTAIN STANDARD TIME':       -7,
+    'MOUNTAIN DAYLIGHT TIME':       -6,
+    'PACIFIC STANDARD TIME':        -8,
+    'PACIFIC DAYLIGHT TIME':        -7,
+    'ALASKA STANDARD TIME':         -9,
+    'ALASKA DAYLIGHT TIME':         -8,
+    'HAWAII-ALEUTIAN STANDARD TIME': -10,
+}
+TIMEZONES = {
+    name: timezone(timedelta(hours=offset))
+    for name, offset in TIMEZONE_OFFSETS.items()
+}
+
+MONTHS = {
+    name: number
+    for number, names in enumerate(
+        [
+            ('jan', 'january'),
+            ('feb', 'february'),
+            ('mar', 'march'),
+            ('apr', 'april'),
+            ('may',),
+            ('jun', 'june'),
+            ('jul', 'july'),
+            ('aug', 'august'),
+            ('sep', 'sept', 'september'),
+            ('oct', 'october'),
+            ('nov', 'november'),
+            ('dec', 'december'),
+        ],
+        start=1
+    )
+    for name in names
+}
+
+# The regular expression that each supported strftime directive is compiled into
+DIRECTIVE_PATTERNS = {
+    'a': r'(?:mon|tue|wed|thu|fri|sat|sun)[a-z]*\.?',
+    'A': r'(?:mon|tue|wed|thu|fri|sat|sun)[a-z]*',
+    'b': r'(?P<b>[a-z]{3,9})\.?',
+    'B': r'(?P<b>[a-z]{3,9})',
+    'd': r'(?P<d>\d{1,2})',
+    'm': r'(?P<m>\d{1,2})',
+    'Y': r'(?P<Y>\d{4})',
+    'y': r'(?P<y>\d{2})',
+    'H': r'(?P<H>\d{1,2})',
+    'I': r'(?P<I>\d{1,2})',
+    'M': r'(?P<M>\d{2})',
+    'S': r'(?P<S>\d{2})',
+    'f': r'(?P<f>\d{1,6})',
+    'p': r'(?P<p>[ap]\.?m\.?)',
+    'z': r'(?P<z>[+-]\d{2}:?\d{2}|z)',
+    'Z': r'(?P<Z>[a-z]{1,5}|[a-z][a-z-]*(?: [a-z][a-z-]*)* time)',
+    '%': '%',
+}
+
+# Output formats that ``datetime.isoformat`` produces (without the UTC offset) with the
+# given timespec, which is several times faster than ``strftime``
+ISO_FORMATS = {
+    '%Y-%m-%dT%H:%M:%S.%f': 'microseconds',
+    '%Y-%m-%dT%H:%M:%S': 'seconds',
+}
+
+# Mail servers sometimes append a comment to the Date header, eg "+0000 (UTC)"
+TRAILING_COMMENT = r'(?:\s*\([^)]*\))?\s*$'
+
+
+@lru_cache(maxsize=None)
+def compile_template(template: str) -> re.Pattern | None:
+    """Compile a strftime-style format string into a regular expression
+
+    :param template: The format string, eg ``'%b %d, %Y %I:%M%p'``
+    :returns: The compiled pattern, or None if the format string contains a directive
+        that isn't supported (in which case ``datetime.strptime`` should be used instead)
+    """
+
+    pattern = [r'^\s*']
+    i = 0
+    while i < len(template):
+        char = template[i]
+        if char == '%' and i + 1 < len(template):
+            directive = template[i+1]
+            if directive not in DIRECTIVE_PATTERNS:
+                logger.debug(
+                    'Directive "%%%s" is not supported, falling back to strptime',
+                    directive
+                )
+                return None
+            pattern.append(DIRECTIVE_PATTERNS[directive])
+            i += 2
+            continue
+        if char.isspace():
+            pattern.append(r'\s+')
+        else:
+            pattern.append(re.escape(char))
+        i += 1
+    pattern.append(TRAILING_COMMENT)
+
+    try:
+        return re.compile(''.join(pattern), re.IGNORECASE)
+    except re.error:
+        # The same directive was used twice in one template, which is legal in strftime
+        # but not in a regular expression with named groups
+        return None
+
+
+def get_timezone(name: str) -> tzinfo:
+    """Get the timezone identified by the given ``%z`` offset or ``%Z`` name
+
+    :param name: A UTC offset like ``-0400`` or ``+04:00``, or a timezone name like
+        ``EDT`` or ``Eastern Daylight Time``
+    :raises ValueError: If the timezone is not known
+    """
+
+    if name[0] in '+-':
+        digits = name[1:].replace(':', '')
+        offset = timedelta(hours=int(digits[:2]), minutes=int(digits[2:]))
+        return timezone(-offset if name[0] == '-' else offset)
+
+    try:
+        return TIMEZONES[name.upper()]
+    except KeyError:
+        raise ValueError(f'Unknown timezone: {name}') from None
+
+
+def to_utc(value: datetime, naive_tz: tzinfo = None) -> datetime:
+    """Normalize the given datetime to UTC
+
+    :param value: The datetime to normalize
+    :param naive_tz: The timezone that ``value`` is in, if it's naive. When this is None,
+        naive datetimes are assumed to be in the system's local timezone.
+    """
+
+    if value.tzinfo is None and naive_tz is not None:
+        value = value.replace(tzinfo=naive_tz)
+    return value.astimezone(timezone.utc)
+
+
+def parse_timestamp(value: str, template: str, naive_tz: tzinfo = None) -> datetime:
+    """Parse the given string into a UTC datetime
+
+    :param value: The string to parse
+    :param template: The strftime-style format of ``value``
+    :param naive_tz: The timezone to assume if ``value`` doesn't include one. When this is
+        None, the system's local timezone is assumed.
+    :returns: A timezone-aware datetime in UTC
+    :raises ValueError: If ``value`` doesn't match ``template``
+    """
+
+    return to_utc(parse_datetime(value, template), naive_tz)
+
+
+@lru_cache(maxsize=65536)
+def parse_datetime(value: str, template: str) -> datetime:
+    """Parse the given string into a datetime, which is naive if ``value`` doesn't
+    include a timezone
+
+    The result is memoized, because the same timestamps (especially credit expiration
+    dates) show up over and over again across thousands of emails.
+
+    :raises ValueError: If ``value`` doesn't match ``template``
+    """
+
+    pattern = compile_template(template)
+    if pattern is None:
+        return datetime.strptime(value, template)
+
+    match = pattern.match(value)
+    if not match:
+        raise ValueError(f'Timestamp "{value}" does not match format "{template}"')
+    parts = match.groupdict()
+
+    if parts.get('Y'):
+        year = int(parts['Y'])
+    elif parts.get('y'):
+        year = 2000 + int(parts['y'])
+    else:
+        year = 1900
+
+    if parts.get('b'):
+        try:
+            month = MONTHS[parts['b'].lower()]
+        except KeyError:
+            raise ValueError(f'Unknown month name in timestamp "{value}"') from None
+    else:
+        month = int(parts.get('m') or 1)
+
+    if parts.get('I'):
+        hour = int(parts['I']) % 12
+        if parts.get('p') and parts['p'][0].lower() == 'p':
+            hour += 12
+    else:
+        hour = int(parts.get('H') or 0)
+
+    result = datetime(
+        year,
+        month,
+        int(parts.get('d') or 1),
+        hour,
+        int(parts.get('M') or 0),
+        int(parts.get('S') or 0),
+        int((parts.get('f') or '0').ljust(6, '0')),
+    )
+
+    tz_name = parts.get('z') or parts.get('Z')
+    if tz_name:
+        result = result.replace(tzinfo=get_timezone(tz_name))
+    return result
+
+
+def format_timestamp(value: datetime | None, datetime_format: str) -> str | None:
+    """Format the given UTC datetime for output using the user's datetime format
+    """
+
+    if value is None:
+        return None
+    timespec = ISO_FORMATS.get(datetime_format)
+    if timespec and value.year >= 1000:
+        formatted = value.isoformat(timespec=timespec)
+        return formatted[:-6] if value.tzinfo else formatted
+    return value.strftime(datetime_format)
@@ -54,6 +54,41 @@ def validate_enum(name: str, enum_type: EnumType) -> Enum:
             name,
             ', '.join(models.VALID_DESTINATIONS)
         )
+    elif enum_type == models.Compression:
+        logger.error(
+            'Invalid compression: %s. Valid compression formats are: %s',
+            name,
+            ', '.join(models.VALID_COMPRESSIONS)
+        )
     logger.error(ERROR_MESSAGE_FATAL)
     exit(1)
 
+
+def validate_enums(names: str | list[str], enum_type: EnumType) -> list[Enum]:
+    """Get the EnumItems that have the given strings from the given EnumType, if valid
+
+    :param names: A comma-separated string, or a list of strings (which can also be
+        comma-separated), of the names of items in the given enumeration
+    :param enum_type: The enumeration that the items are expected to be in
+    :returns: The distinct EnumItems in the order they were given, or None if no names
+        were given
+    """
+
+    if names is None:
+        return None
+
+    if isinstance(names, (str, Enum)):
+        names = [names]
+
+    items = []
+    for name in names:
+        if isinstance(name, Enum):
+            parts = [name]
+        else:
+            parts = [part.strip() for part in name.split(',') if part.strip()]
+        for part in parts:
+            item = part if isinstance(part, enum_type) else validate_enum(part, enum_type)
+            if item not in items:
+                items.append(item)
+    return items or None
+
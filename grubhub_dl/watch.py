@@ -0,0 +1,350 @@
+"""Keeps running, and exports Grubhub emails as they arrive. The entrypoint for
+``grubhub-dl watch``.
+
+It takes the same parameters as a normal run, eg::
+
+    grubhub-dl watch --source gmail --email-address me@gmail.com \\
+        --email-creds-file creds.json --destination sqlite --sqlite-path grubhub.db
+
+When it starts, every email from the source is extracted and exported (skipping records
+that were already exported, like a normal run). Then it polls the source every
+``--interval`` seconds, and only extracts and exports the emails that are new:
+
+- ``gmail``: The Gmail API service is built once and kept. Emails that are already in the
+  cache aren't downloaded again. The mailbox history is checked for added messages (which
+  is cheaper than listing the messages), and only when there are some are the newest
+  messages listed.
+- ``cache``: The modification time of the cache directory is checked, and only when it
+  changes is the directory listed.
+
+New updates and cancellations are reconciled with the orders that were extracted before
+(see ``reconciliation``). Only destinations that can be exported to incrementally are
+supported, and the export state of each one is kept between exports.
+
+If exporting to any destination fails, the error is logged and the emails of that poll
+aren't marked as seen, so they're exported again on the next poll (the destinations
+that succeeded skip the records that they already have, except ``json``, which prints
+them again).
+"""
+
+import os
+import time
+import signal
+import argparse
+import logging
+import threading
+
+from grubhub_dl import (
+    aggregates,
+    process,
+    models,
+    metrics,
+    reconciliation,
+    ERROR_MESSAGE_FATAL,
+)
+from grubhub_dl.main import get_parameters, export_grubhub_data
+from grubhub_dl.export.state import ExportState
+from grubhub_dl.emails import cache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = 10
+
+# Destinations that new records can be added to. Records are only printed once to
+# ``json``, so it has no export state.
+WATCH_DESTINATIONS = [
+    models.Destination.json,
+    models.Destination.sqlite,
+    models.Destination.postgres,
+    models.Destination.parquet_file,
+]
+
+# Files can be added to a directory without changing its modification time, if they're
+# added within the resolution of the file system's timestamps (eg 2 seconds on FAT). So
+# the directory is listed anyway while its modification time is this recent.
+MTIME_RESOLUTION_NS = 2_000_000_000
+
+
+class CacheSource:
+    """Gets the emails that were added to the cache directory since the last poll (eg by
+    another ``grubhub-dl`` run)
+
+    The emails that ``poll`` returns are returned again by the next poll, until
+    ``commit`` is called.
+    """
+
+    errors = (OSError, ValueError)
+
+    def __init__(self, params: models.Parameters):
+        self.params = params
+        self.email_file_dir = os.path.join(params.cache_dir, 'emails')
+        self.mtime = None
+        self.known_files = set()
+        self.polled = None
+        cache.migrate_cache(params)
+
+    def poll(self) -> list[models.EmailMessage]:
+        self.polled = None
+        try:
+            mtime = os.stat(self.email_file_dir).st_mtime_ns
+        except FileNotFoundError:
+            return []
+        if mtime == self.mtime and time.time_ns() - mtime > MTIME_RESOLUTION_NS:
+            return []
+
+        new_files = sorted(
+            {
+                entry.name
+                for entry in os.scandir(self.email_file_dir)
+                if entry.name.endswith('.json')
+            } - self.known_files
+        )
+        emails = cache.json_files_to_emails(self.params, new_files) if new_files else []
+        self.polled = (mtime, new_files)
+        return emails
+
+    def commit(self):
+        """Mark the files of the last poll as seen"""
+
+        if self.polled:
+            self.mtime, new_files = self.polled
+            self.known_files.update(new_files)
+            self.polled = None
+
+
+class GmailSource:
+    """Gets the Grubhub emails that arrived in the user's mailbox since the last poll, and
+    caches them
+
+    The first poll also returns the emails that were already cached, instead of
+    downloading them again. The emails that ``poll`` returns are returned again by the
+    next poll, until ``commit`` is called.
+    """
+
+    def __init__(self, params: models.Parameters):
+        from grubhub_dl.emails import gmail
+        self.gmail = gmail
+        self.errors = (gmail.HttpError, OSError)
+        self.params = params
+        self.service = gmail.get_gmail_service(params)
+        self.history_id = None
+        self.cached_emails = cache.json_files_to_emails(params)
+        self.known_ids = {email.email_id for email in self.cached_emails}
+        self.polled = None
+
+    def poll(self) -> list[models.EmailMessage]:
+        gmail = self.gmail
+        self.polled = None
+        if self.history_id is None:
+            # The history ID is got first, so that emails that arrive while the messages
+            # are listed aren't missed. Every message is listed, since an older message
+            # might not have been cached (eg if a download was interrupted).
+            history_id = gmail.get_history_id(self.service)
+            messages = gmail.get_grubhub_emails(self.service)
+        else:
+            added, history_id = gmail.has_new_messages(self.service, self.history_id)
+            if not added:
+                self.history_id = history_id
+                return []
+            messages = gmail.get_grubhub_emails(self.service, known_ids=self.known_ids)
+
+        # Messages are listed newest first
+        new_ids = [
+            message['id']
+            for message in reversed(messages)
+            if message['id'] not in self.known_ids
+        ]
+        emails = [
+            gmail.get_grubhub_email_contents(self.service, message_id)
+            for message_id in new_ids
+        ]
+        metrics.inc('grubhub_dl_emails_fetched', len(emails))
+        if emails:
+            logger.info('Retrieved %s new emails from the Gmail API', len(emails))
+            cache.emails_to_json_files(self.params, emails)
+
+        self.polled = (history_id, new_ids)
+
+        if self.history_id is None:
+            cached_emails = self.cached_emails
+            if cached_emails is None:
+                # They were extracted by a poll whose export failed, and emails can't be
+                # extracted twice, so they're read again
+                cached_emails = [
+                    email for email in cache.json_files_to_emails(self.params)
+                    if email.email_id in self.known_ids
+                ]
+            self.cached_emails = None
+            emails = cached_emails + emails
+        return emails
+
+    def commit(self):
+        """Mark the emails of the last poll as seen"""
+
+        if self.polled:
+            self.history_id, new_ids = self.polled
+            self.known_ids.update(new_ids)
+            self.polled = None
+
+
+class Watcher:
+    """Extracts and exports the new emails from a source, keeping the export state of
+    each destination between polls
+    """
+
+    def __init__(self, params: models.Parameters, source: CacheSource | GmailSource):
+        self.params = params
+        self.source = source
+        self.stopped = threading.Event()
+        self.export_states = {
+            destination: ExportState.load(params, destination)
+            for destination in params.destination
+            if destination != models.Destination.json
+        }
+
+    def export_emails(self, emails: list[models.EmailMessage]) -> bool:
+        """Extract and export the emails to every destination, even if exporting to
+        another one fails
+
+        :returns: Whether every destination was exported to
+        """
+
+        params = self.params
+        grubhub_data = process.extract_data_from_emails(params, emails, reconcile=False)
+        reconciliation.reconcile(params, grubhub_data)
+        aggregates.update_aggregates(params, grubhub_data)
+
+        succeeded = True
+        for destination in params.destination:
+            try:
+                export_grubhub_data(
+                    params,
+                    destination,
+                    grubhub_data,
+                    self.export_states.get(destination)
+                )
+            except Exception as err:
+                logger.error(
+                    'Unable to export to %s, trying again later: %s',
+                    destination.name,
+                    err
+                )
+                succeeded = False
+                # The records that were selected for the failed export haven't been
+                # exported, so the saved state is reloaded
+                if destination in self.export_states:
+                    self.export_states[destination] = ExportState.load(
+                        params,
+                        destination
+                    )
+        return succeeded
+
+    def poll(self) -> int:
+        """Extract and export the new emails from the source
+
+        The source only marks the emails as seen if they were exported to every
+        destination, so that the next poll tries again.
+
+        :returns: The number of new emails that were exported
+        """
+
+        try:
+            emails = self.source.poll()
+        except self.source.errors as err:
+            logger.warning('Unable to get new emails, trying again later: %s', err)
+            return 0
+        if not emails:
+            self.source.commit()
+            return 0
+
+        succeeded = self.export_emails(emails)
+        metrics.write_textfile(self.params.cache_dir, succeeded=succeeded)
+        if not succeeded:
+            return 0
+        self.source.commit()
+        return len(emails)
+
+    def run(self, interval: float):
+        """Poll the source every ``interval`` seconds, until ``stop`` is called"""
+
+        while not self.stopped.is_set():
+            started_at = time.perf_counter()
+            count = self.poll()
+            if count:
+                logger.info(
+                    'Exported %s new emails in %.2fs',
+                    count,
+                    time.perf_counter() - started_at
+                )
+            self.stopped.wait(interval)
+
+    def stop(self):
+        self.stopped.set()
+
+
+def get_arguments(args: list = None) -> tuple[argparse.Namespace, list]:
+    """Parse the arguments that are specific to ``watch``
+
+    :returns: The parsed arguments, and the rest of the arguments (for ``get_parameters``)
+    """
+
+    parser = argparse.ArgumentParser(prog='grubhub-dl watch', add_help=False)
+    parser.add_argument(
+        '--interval',
+        metavar='SECONDS',
+        action='store',
+        type=float,
+        default=DEFAULT_INTERVAL,
+        help=f'Check for new emails every SECONDS seconds (default: {DEFAULT_INTERVAL})'
+    )
+    return parser.parse_known_args(args)
+
+
+def main(args: list = None):
+    namespace, args = get_arguments(args)
+    params = get_parameters(args)
+
+    unsupported = [
+        destination.name
+        for destination in params.destination
+        if destination not in WATCH_DESTINATIONS
+    ]
+    if unsupported:
+        logger.error(
+            'Unable to watch for new emails with the %s destination. The supported '
+            'destinations are: %s',
+            ', '.join(unsupported),
+            ', '.join(destination.name for destination in WATCH_DESTINATIONS)
+        )
+        logger.error(ERROR_MESSAGE_FATAL)
+        exit(1)
+
+    match params.source:
+        case models.Source.cache:
+            source = CacheSource(params)
+        case models.Source.gmail:
+            source = GmailSource(params)
+        case _:
+            logger.error(
+                'Unknown data source (%s). This is unexpected! Please report it!',
+                params.source
+            )
+            logger.error(ERROR_MESSAGE_FATAL)
+            exit(1)
+
+    watcher = Watcher(params, source)
+    signal.signal(signal.SIGTERM, lambda signum, frame: watcher.stop())
+    logger.info(
+        'Watching for new emails from %s every %ss',
+        params.source.name,
+        namespace.interval
+    )
+
+    succeeded = False
+    try:
+        watcher.run(namespace.interval)
+        succeeded = True
+    except KeyboardInterrupt:
+        logger.warning('Received Ctrl-C from user. Quitting...')
+    finally:
+        metrics.write_textfile(params.cache_dir, succeeded)
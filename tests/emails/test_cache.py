@@ -0,0 +1,88 @@
+"""Tests caching emails, and converting emails that were cached by older versions."""
+
+import os
+import json
+import time
+from dataclasses import asdict
+from datetime import datetime, timezone
+
+import pytest
+
+from grubhub_dl import models
+from grubhub_dl.emails import cache
+from tools.corpus import generate_emails
+
+LEGACY_DATETIME_FORMAT = '%d %b %Y %H:%M'
+
+
+@pytest.fixture
+def eastern_time(monkeypatch):
+    # Legacy timestamps don't depend on the system's timezone
+    monkeypatch.setenv('TZ', 'America/New_York')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def write_legacy_email(email_file_dir: str, email: models.EmailMessage, sent_at: str):
+    """Cache the email the way that older versions did"""
+
+    file_name = f'{sent_at}_{email.subject}.json'
+    with open(os.path.join(email_file_dir, file_name), 'w', encoding='utf-8') as file:
+        json.dump(asdict(email) | {'sent_at': sent_at, 'cache_file': file_name}, file)
+
+
+def test_cache_round_trip(tmp_path):
+    params = models.Parameters(cache_dir=str(tmp_path))
+    emails = [corpus_email.email for corpus_email in generate_emails(5)]
+    sent_at = [email.sent_at for email in emails]
+
+    cache.emails_to_json_files(params, emails)
+    cache.emails_to_json_files(params, emails)
+    cached = sorted(cache.json_files_to_emails(params), key=lambda email: email.sent_at)
+
+    assert len(os.listdir(tmp_path / 'emails')) == 6
+    assert [email.email_id for email in cached] == [email.email_id for email in emails]
+    assert [email.sent_at for email in cached] == sent_at
+    assert all(email.sent_at.tzinfo == timezone.utc for email in cached)
+
+
+def test_legacy_emails_are_migrated(tmp_path, eastern_time):
+    params = models.Parameters(
+        cache_dir=str(tmp_path),
+        datetime_format=LEGACY_DATETIME_FORMAT
+    )
+    email_file_dir = tmp_path / 'emails'
+    email_file_dir.mkdir()
+    emails = [corpus_email.email for corpus_email in generate_emails(2)]
+    for email in emails:
+        email.sent_at = email.sent_at.replace(second=0, microsecond=0)
+        legacy_sent_at = email.sent_at.strftime(LEGACY_DATETIME_FORMAT)
+        write_legacy_email(str(email_file_dir), email, legacy_sent_at)
+    # The first email was fetched again after the cache format changed
+    cache.write_email_file(str(email_file_dir), emails[0])
+
+    cached = cache.json_files_to_emails(params)
+
+    assert sorted(email.email_id for email in cached) == sorted(
+        email.email_id for email in emails
+    )
+    assert {email.email_id: email.sent_at for email in cached} == {
+        email.email_id: email.sent_at for email in emails
+    }
+    assert sorted(email.cache_file for email in cached) == sorted(
+        f'{email.sent_at:%Y-%m-%dT%H:%M:%S.%f}_{email.subject}.json' for email in emails
+    )
+    file_names = sorted(os.listdir(email_file_dir))
+    assert file_names == sorted(
+        [cache.VERSION_FILE_NAME] + [email.cache_file for email in cached]
+    )
+    for file_name in file_names[1:]:
+        data = json.loads((email_file_dir / file_name).read_text())
+        assert data['cache_version'] == cache.CACHE_VERSION
+        assert data['cache_file'] == file_name
+
+    # The migration only runs once, and later writes don't duplicate emails
+    cache.emails_to_json_files(params, emails)
+    assert sorted(os.listdir(email_file_dir)) == file_names
@@ -0,0 +1,227 @@
+"""Tests getting emails from the Gmail API, against the fake Gmail API in
+``tools.fake_gmail``.
+"""
+
+import json
+import datetime as dt
+
+import pytest
+
+from grubhub_dl import metrics, models
+from tools.corpus import generate_emails
+from tools.fake_gmail import FakeGmail, build_service
+
+gmail = pytest.importorskip('grubhub_dl.emails.gmail')
+errors = pytest.importorskip('googleapiclient.errors')
+
+TOKEN = {
+    'token': 'access-token',
+    'refresh_token': 'refresh-token',
+    'client_id': 'client-id',
+    'client_secret': 'client-secret',
+    'token_uri': 'https://oauth2.googleapis.com/token',
+}
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    # Retries back off exponentially, which would make these tests take minutes
+    monkeypatch.setattr('googleapiclient.http.time.sleep', lambda seconds: None)
+
+
+@pytest.fixture
+def corpus():
+    return [corpus_email.email for corpus_email in generate_emails(25)]
+
+
+def test_get_grubhub_emails_pages(corpus, monkeypatch):
+    monkeypatch.setattr('tools.fake_gmail.DEFAULT_PAGE_SIZE', 10)
+    fake_gmail = FakeGmail(corpus)
+
+    messages = gmail.get_grubhub_emails(build_service(fake_gmail))
+
+    assert [message['id'] for message in messages] == [
+        email.email_id for email in reversed(corpus)
+    ]
+    assert fake_gmail.stats['messages.list'] == 3
+
+
+def test_get_grubhub_email_contents(corpus):
+    service = build_service(FakeGmail(corpus))
+
+    for email in corpus:
+        content = gmail.get_grubhub_email_contents(service, email.email_id)
+        assert content.subject == email.subject
+        assert content.sent_by == email.sent_by
+        assert content.sent_at == email.sent_at.replace(microsecond=0)
+        assert content.body == email.body
+
+
+def test_retries_rate_limited_and_failed_requests(corpus):
+    metrics.reset()
+    fake_gmail = FakeGmail(corpus)
+    service = build_service(fake_gmail)
+    fake_gmail.fail_next(429, count=2)
+    fake_gmail.fail_next(503)
+
+    content = gmail.get_grubhub_email_contents(service, corpus[0].email_id)
+
+    assert content.email_id == corpus[0].email_id
+    assert fake_gmail.stats['errors.429'] == 2
+    assert fake_gmail.stats['errors.503'] == 1
+    assert fake_gmail.stats['messages.get'] == 4
+    assert metrics.value('grubhub_dl_gmail_api_calls', method='messages.get') == 1
+    assert metrics.value('grubhub_dl_gmail_api_retries') == 3
+
+
+def test_gives_up_after_retrying(corpus):
+    fake_gmail = FakeGmail(corpus)
+    fake_gmail.fail_next(500, count=gmail.NUM_RETRIES + 1)
+
+    with pytest.raises(errors.HttpError) as err:
+        gmail.get_grubhub_email_contents(build_service(fake_gmail), corpus[0].email_id)
+
+    assert err.value.status_code == 500
+
+
+def test_quota_is_enforced(corpus):
+    now = [0.0]
+    fake_gmail = FakeGmail(corpus, quota_per_second=10, clock=lambda: now[0])
+    request = build_service(fake_gmail).users().messages().get(
+        userId='me',
+        id=corpus[0].email_id
+    )
+
+    request.execute()
+    request.execute()
+    with pytest.raises(errors.HttpError) as err:
+        request.execute()
+    assert err.value.status_code == 429
+
+    now[0] += 1
+    request.execute()
+
+
+def test_batch_get(corpus):
+    fake_gmail = FakeGmail(corpus)
+    fake_gmail.fail_next(404)
+    service = build_service(fake_gmail)
+    responses = {}
+    failures = {}
+
+    def callback(request_id, response, exception):
+        if exception:
+            failures[request_id] = exception
+        else:
+            responses[request_id] = response
+
+    batch = service.new_batch_http_request(callback=callback)
+    for email in corpus[:5]:
+        batch.add(
+            service.users().messages().get(userId='me', id=email.email_id, format='minimal'),
+            request_id=email.email_id
+        )
+    batch.execute()
+
+    assert list(failures) == [corpus[0].email_id]
+    assert sorted(responses) == sorted(email.email_id for email in corpus[1:5])
+    assert fake_gmail.stats['batches'] == 1
+
+
+def test_history_lists_added_messages(corpus):
+    fake_gmail = FakeGmail(corpus[:20])
+    service = build_service(fake_gmail)
+    history_id = service.users().getProfile(userId='me').execute()['historyId']
+
+    for email in corpus[20:]:
+        fake_gmail.add_email(email)
+    response = service.users().history().list(
+        userId='me',
+        startHistoryId=history_id,
+        historyTypes='messageAdded'
+    ).execute()
+
+    assert [
+        added['message']['id']
+        for record in response['history']
+        for added in record['messagesAdded']
+    ] == [email.email_id for email in corpus[20:]]
+    assert response['historyId'] == str(int(history_id) + 5)
+
+
+@pytest.fixture
+def fake_keyring(monkeypatch):
+    passwords = {}
+    monkeypatch.setattr(
+        gmail.keyring,
+        'get_password',
+        lambda service, username: passwords.get((service, username))
+    )
+    monkeypatch.setattr(
+        gmail.keyring,
+        'set_password',
+        lambda service, username, password: passwords.__setitem__(
+            (service, username),
+            password
+        )
+    )
+    return passwords
+
+
+@pytest.fixture
+def refreshes(monkeypatch):
+    refreshes = []
+
+    def refresh(creds, request):
+        refreshes.append(creds.token)
+        creds.token = 'refreshed-token'
+        # google-auth keeps the expiry as a naive datetime in UTC
+        now = dt.datetime.now(dt.timezone.utc).replace(tzinfo=None)
+        creds.expiry = now + dt.timedelta(hours=1)
+
+    monkeypatch.setattr(gmail.Credentials, 'refresh', refresh)
+    return refreshes
+
+
+def test_discovery_document_is_cached(tmp_path, monkeypatch):
+    document = gmail.get_discovery_document(str(tmp_path))
+    monkeypatch.setattr(gmail.discovery_cache, 'get_static_doc', lambda *args: None)
+    monkeypatch.setattr(gmail.httplib2, 'Http', None)
+
+    assert document['name'] == 'gmail'
+    assert gmail.get_discovery_document(str(tmp_path)) == document
+
+
+def test_expired_token_is_refreshed_and_saved(tmp_path, fake_keyring, refreshes):
+    params = models.Parameters(
+        cache_dir=str(tmp_path),
+        keyring_service='service',
+        keyring_username='username'
+    )
+    expiry = dt.datetime.now(dt.timezone.utc) - dt.timedelta(minutes=1)
+    fake_keyring[('service', 'username')] = json.dumps(
+        TOKEN | {'expiry': expiry.strftime('%Y-%m-%dT%H:%M:%SZ')}
+    )
+
+    service = gmail.get_gmail_service(params)
+
+    assert refreshes == ['access-token']
+    assert service._http.credentials.token == 'refreshed-token'
+    saved = json.loads(fake_keyring[('service', 'username')])
+    assert saved['token'] == 'refreshed-token'
+    assert saved['refresh_token'] == 'refresh-token'
+
+
+def test_valid_token_is_not_refreshed(tmp_path, fake_keyring, refreshes):
+    params = models.Parameters(cache_dir=str(tmp_path))
+    expiry = dt.datetime.now(dt.timezone.utc) + dt.timedelta(hours=1)
+    token = json.dumps(TOKEN | {'expiry': expiry.strftime('%Y-%m-%dT%H:%M:%SZ')})
+    fake_keyring[(gmail.DEFAULT_KEYRING_SERVICE, gmail.DEFAULT_KEYRING_USERNAME)] = token
+
+    service = gmail.get_gmail_service(params)
+
+    assert refreshes == []
+    assert service._http.credentials.token == 'access-token'
+    assert fake_keyring[
+        (gmail.DEFAULT_KEYRING_SERVICE, gmail.DEFAULT_KEYRING_USERNAME)
+    ] == token
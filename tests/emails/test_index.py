@@ -0,0 +1,79 @@
+"""Tests the full-text search index of the cached emails."""
+
+import pytest
+
+from grubhub_dl import models
+from grubhub_dl.emails import index
+from grubhub_dl.search import search_emails
+
+BODY = '''<html><head><title>Your order</title><style>.gh { color: red; }</style></head>
+<body><p>Thanks for ordering from <b>Noodle&nbsp;House</b>!</p><table><tr><td>2x Pad See
+Ew</td><td>$24.00</td></tr></table></body></html>'''
+
+
+def make_email(
+    email_id: str,
+    cache_file: str,
+    body: str = BODY,
+    subject: str = 'Your order from Noodle House'
+) -> models.EmailMessage:
+    return models.EmailMessage(
+        email_id=email_id,
+        subject=subject,
+        sent_by='Grubhub <orders@eat.grubhub.com>',
+        sent_at=None,
+        body=body,
+        cache_file=cache_file,
+    )
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = index.connect(str(tmp_path))
+    yield conn
+    conn.close()
+
+
+def test_html_to_text():
+    assert index.html_to_text(BODY) == (
+        'Thanks for ordering from Noodle House! 2x Pad See Ew $24.00'
+    )
+    assert index.html_to_text(None) == ''
+
+
+def test_emails_are_indexed_once(conn):
+    emails = [make_email('1', 'a.json'), make_email('2', 'b.json')]
+    assert index.index_emails(conn, emails) == 2
+    assert index.index_emails(conn, [make_email('1', 'a.json')]) == 0
+
+    assert conn.execute('SELECT count(*) FROM email_text').fetchone() == (2,)
+    assert index.indexed_cache_files(conn) == {'a.json', 'b.json'}
+
+
+def test_cache_files_of_indexed_emails_are_updated(conn):
+    index.index_emails(conn, [make_email('1', 'a.json'), make_email('2', 'b.json')])
+
+    assert index.index_emails(conn, [make_email('1', 'renamed.json')]) == 0
+    assert index.indexed_cache_files(conn) == {'renamed.json', 'b.json'}
+
+    assert index.remove_cache_files(conn, {'renamed.json'}) == 1
+    assert index.indexed_cache_files(conn) == {'b.json'}
+    assert conn.execute('SELECT count(*) FROM email_text').fetchone() == (1,)
+
+
+def test_search(conn):
+    index.index_emails(
+        conn,
+        [
+            make_email('1', 'a.json'),
+            make_email('2', 'b.json', '<p>Tacos</p>', 'Your order from Taco Stand'),
+        ]
+    )
+
+    # Words are stemmed, and markup isn't indexed
+    assert [row[0] for row in search_emails(conn, 'noodles', 10)] == ['1']
+    assert [row[0] for row in search_emails(conn, 'taco', 10)] == ['2']
+    assert search_emails(conn, 'color', 10) == []
+    # Queries that aren't valid FTS5 syntax are searched for literally
+    assert [row[0] for row in search_emails(conn, 'see ew!', 10)] == ['1']
+    assert '[' in search_emails(conn, 'pad', 10)[0][4]
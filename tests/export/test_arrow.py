@@ -0,0 +1,74 @@
+"""Tests converting extracted Grubhub data to Arrow, and the Arrow IPC file export."""
+
+from datetime import datetime, timezone
+
+import pytest
+
+from grubhub_dl import models, process
+from tools.corpus import generate_emails
+
+pa = pytest.importorskip('pyarrow')
+arrow = pytest.importorskip('grubhub_dl.export.arrow')
+
+
+@pytest.fixture(scope='module')
+def grubhub_data():
+    emails = [corpus_email.email for corpus_email in generate_emails(50)]
+    return process.extract_data_from_emails(models.Parameters(), emails)
+
+
+def test_arrow_schema():
+    schema = arrow.arrow_schema(models.ReconciledOrder)
+
+    assert schema.names == models.RecordBatch(models.ReconciledOrder).field_names
+    assert schema.field('sent_at').type == pa.timestamp('us', tz='UTC')
+    assert schema.field('restaurant_id').type == pa.int64()
+    assert schema.field('is_canceled').type == pa.bool_()
+    assert schema.field('update_email_ids').type == pa.list_(pa.string())
+    assert schema.field('restaurant_name').type == pa.dictionary(pa.int32(), pa.string())
+    assert schema.field('order_number').type == pa.string()
+
+
+def test_enum_fields_are_strings():
+    schema = arrow.arrow_schema(models.EmailMessage)
+
+    assert schema.field('category').type == pa.dictionary(pa.int32(), pa.string())
+    assert schema.field('sent_by').type == pa.dictionary(pa.int32(), pa.string())
+    assert schema.field('body').type == pa.string()
+
+
+def test_record_batch_to_arrow(grubhub_data):
+    for name, batch in grubhub_data.items():
+        arrow_batch = arrow.record_batch_to_arrow(batch)
+        arrow_batch.validate(full=True)
+
+        assert arrow_batch.schema == arrow.arrow_schema(batch.record_type)
+        assert arrow_batch.to_pydict() == batch.to_pydict(), name
+
+
+def test_nulls_and_timestamps():
+    batch = models.RecordBatch(models.ReconciledOrder)
+    sent_at = datetime(2024, 6, 4, 22, 30, 0, 1500, tzinfo=timezone.utc)
+    batch.append(
+        models.ReconciledOrder(sent_at=sent_at, order_total=100, is_canceled=True)
+    )
+    batch.append(models.ReconciledOrder())
+
+    arrow_batch = arrow.record_batch_to_arrow(batch)
+
+    assert arrow_batch.column('sent_at').to_pylist() == [sent_at, None]
+    assert arrow_batch.column('order_total').null_count == 1
+    assert arrow_batch.column('is_canceled').to_pylist() == [True, None]
+    assert arrow_batch.column('restaurant_name').to_pylist() == [None, None]
+
+
+def test_arrow_file(tmp_path, grubhub_data):
+    params = models.Parameters(output_path=str(tmp_path))
+
+    arrow.grubhub_data_to_arrow_file(params, grubhub_data)
+
+    for name, batch in grubhub_data.items():
+        with pa.memory_map(str(tmp_path / f'{name}.arrow')) as source:
+            table = pa.ipc.open_file(source).read_all()
+        assert table.num_rows == len(batch)
+        assert table.column_names == batch.field_names
@@ -0,0 +1,87 @@
+"""Tests the contents of the CSV export, with each compression."""
+
+import io
+import csv
+import gzip
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+from grubhub_dl import models, process, DEFAULT_DATETIME_FORMAT
+from grubhub_dl.export import csv_file
+from grubhub_dl.export.files import output_file_path
+from grubhub_dl.timestamps import format_timestamp
+from tools.corpus import generate_emails
+
+
+@pytest.fixture(scope='module')
+def grubhub_data():
+    emails = [corpus_email.email for corpus_email in generate_emails(50)]
+    return process.extract_data_from_emails(models.Parameters(), emails)
+
+
+def read_csv(path: str, compression: models.Compression) -> list[list[str]]:
+    match compression:
+        case models.Compression.gzip:
+            data = gzip.decompress(open(path, 'rb').read())
+        case models.Compression.zstd:
+            zstandard = pytest.importorskip('zstandard')
+            with zstandard.open(path, 'rb') as file:
+                data = file.read()
+        case _:
+            data = open(path, 'rb').read()
+    return list(csv.reader(io.StringIO(data.decode('utf-8'), newline='')))
+
+
+def csv_value(value) -> str:
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return str(int(value))
+    if isinstance(value, datetime):
+        return format_timestamp(value, DEFAULT_DATETIME_FORMAT)
+    if isinstance(value, list):
+        return json.dumps(value)
+    return str(getattr(value, 'name', value))
+
+
+@pytest.mark.parametrize('compression', list(models.Compression))
+def test_csv_files(tmp_path, grubhub_data, compression):
+    params = models.Parameters(output_path=str(tmp_path), compression=compression)
+
+    csv_file.grubhub_data_to_csv_file(params, grubhub_data)
+
+    for name, batch in grubhub_data.items():
+        header, *rows = read_csv(output_file_path(params, name, '.csv'), compression)
+        assert header == batch.field_names, name
+        assert rows == [list(map(csv_value, row)) for row in batch.rows()], name
+    assert not list(tmp_path.glob('*.tmp'))
+
+
+def test_values_that_need_quoting(tmp_path):
+    sent_at = datetime(2025, 3, 8, 14, 22, tzinfo=timezone.utc)
+    batch = models.RecordBatch(models.ReconciledOrder)
+    batch.append(
+        models.ReconciledOrder(
+            order_number='12345678-9012345',
+            email_id='email-1',
+            sent_at=sent_at,
+            restaurant_name='Pizza, "Pasta"\nand more',
+            is_canceled=True,
+            update_email_ids=['email-2', 'email-3'],
+        )
+    )
+    params = models.Parameters(output_path=str(tmp_path))
+
+    csv_file.grubhub_data_to_csv_file(params, {'reconciled_orders': batch})
+
+    header, row = read_csv(
+        output_file_path(params, 'reconciled_orders', '.csv'),
+        models.Compression.none
+    )
+    record = dict(zip(header, row))
+    assert record['restaurant_name'] == 'Pizza, "Pasta"\nand more'
+    assert record['is_canceled'] == '1'
+    assert record['update_email_ids'] == '["email-2", "email-3"]'
+    assert record['sent_at'] == format_timestamp(sent_at, DEFAULT_DATETIME_FORMAT)
@@ -0,0 +1,65 @@
+"""Tests the Excel workbook export, including strings that are too long for a cell."""
+
+import logging
+from datetime import datetime, timezone
+
+import pytest
+
+from grubhub_dl import models
+
+pytest.importorskip('xlsxwriter')
+openpyxl = pytest.importorskip('openpyxl')
+excel = pytest.importorskip('grubhub_dl.export.excel')
+
+# The most characters that an Excel cell can hold
+MAX_CELL_LENGTH = 32_767
+
+
+def make_emails(*bodies: str) -> models.RecordBatch:
+    batch = models.RecordBatch(models.EmailMessage)
+    for i, body in enumerate(bodies):
+        batch.append(
+            models.EmailMessage(
+                email_id=f'email-{i}',
+                subject='Your order is confirmed',
+                sent_by='Grubhub <orders@eat.grubhub.com>',
+                sent_at=datetime(2025, 3, 8, 14, 22, tzinfo=timezone.utc),
+                body=body,
+            )
+        )
+    return batch
+
+
+def test_excel_file(tmp_path):
+    params = models.Parameters(output_path=str(tmp_path))
+
+    excel.grubhub_data_to_excel_file(params, {'emails': make_emails('<p>Hi</p>')})
+
+    workbook = openpyxl.load_workbook(tmp_path / excel.WORKBOOK_FILE_NAME)
+    rows = list(workbook['emails'].values)
+    assert rows[0] == tuple(models.RecordBatch(models.EmailMessage).field_names)
+    record = dict(zip(rows[0], rows[1]))
+    assert record['email_id'] == 'email-0'
+    assert record['body'] == '<p>Hi</p>'
+    assert record['sent_at'] == datetime(2025, 3, 8, 14, 22)
+
+
+def test_truncated_cells_are_logged(tmp_path, caplog):
+    caplog.set_level(logging.WARNING)
+    params = models.Parameters(output_path=str(tmp_path))
+    long_body = 'x' * (MAX_CELL_LENGTH + 100)
+
+    excel.grubhub_data_to_excel_file(
+        params,
+        {'emails': make_emails('short', long_body, long_body)}
+    )
+
+    body_column = models.RecordBatch(models.EmailMessage).field_names.index('body')
+    column_letter = chr(ord('A') + body_column)
+    assert (
+        f'Truncated 2 cells of worksheet "emails" to 32,767 characters (the most that '
+        f'Excel allows): {column_letter}3, {column_letter}4'
+    ) in caplog.text
+
+    workbook = openpyxl.load_workbook(tmp_path / excel.WORKBOOK_FILE_NAME)
+    assert len(workbook['emails'].cell(3, body_column + 1).value) == MAX_CELL_LENGTH
@@ -0,0 +1,158 @@
+"""Tests the contents of the JSON Lines exports, to stdout and to (compressed) files."""
+
+import io
+import gzip
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+from grubhub_dl import models, process, DEFAULT_DATETIME_FORMAT
+from grubhub_dl.export import jsonl
+from grubhub_dl.timestamps import format_timestamp
+from tools.corpus import generate_emails
+
+SENT_AT = datetime(2025, 3, 8, 14, 22, tzinfo=timezone.utc)
+
+
+@pytest.fixture(scope='module')
+def grubhub_data():
+    emails = [corpus_email.email for corpus_email in generate_emails(50)]
+    return process.extract_data_from_emails(models.Parameters(), emails)
+
+
+def read_lines(path: str, compression: models.Compression) -> list[dict]:
+    match compression:
+        case models.Compression.gzip:
+            data = gzip.decompress(open(path, 'rb').read())
+        case models.Compression.zstd:
+            zstandard = pytest.importorskip('zstandard')
+            with zstandard.open(path, 'rb') as file:
+                data = file.read()
+        case _:
+            data = open(path, 'rb').read()
+    return [json.loads(line) for line in data.splitlines()]
+
+
+def expected_records(batch: models.RecordBatch) -> list[dict]:
+    return [
+        {
+            name: (
+                format_timestamp(value, DEFAULT_DATETIME_FORMAT)
+                if isinstance(value, datetime)
+                else getattr(value, 'name', value)
+            )
+            for name, value in zip(batch.field_names, row)
+        }
+        for row in batch.rows()
+    ]
+
+
+def test_record_values():
+    batch = models.RecordBatch(models.Credit)
+    batch.append(
+        models.Credit(
+            email_id='email-1',
+            sent_at=SENT_AT,
+            amount=500,
+            category=list(models.CreditCategory)[0],
+        )
+    )
+
+    lines = b''.join(jsonl.iter_json_lines(batch, DEFAULT_DATETIME_FORMAT))
+
+    assert lines.endswith(b'\n')
+    assert json.loads(lines) == {
+        'email_id': 'email-1',
+        'sent_at': format_timestamp(SENT_AT, DEFAULT_DATETIME_FORMAT),
+        'amount': 500,
+        'percent_off': None,
+        'percent_off_max_value': None,
+        'code': None,
+        'expires': None,
+        'category': list(models.CreditCategory)[0].name,
+    }
+
+
+def test_records_are_written_in_chunks(grubhub_data, monkeypatch):
+    monkeypatch.setattr(jsonl, 'CHUNK_SIZE', 7)
+    batch = grubhub_data['emails']
+
+    chunks = list(jsonl.iter_json_lines(batch, DEFAULT_DATETIME_FORMAT))
+
+    assert len(chunks) == -(-len(batch) // 7)
+    lines = b''.join(chunks).splitlines()
+    assert [json.loads(line) for line in lines] == expected_records(batch)
+
+
+@pytest.mark.parametrize('compression', list(models.Compression))
+def test_json_files(tmp_path, grubhub_data, compression):
+    params = models.Parameters(output_path=str(tmp_path), compression=compression)
+
+    jsonl.grubhub_data_to_json_file(params, grubhub_data)
+
+    for name, batch in grubhub_data.items():
+        path = jsonl.output_file_path(params, name, '.jsonl')
+        assert read_lines(path, compression) == expected_records(batch), name
+    assert not list(tmp_path.glob('*.tmp'))
+
+
+@pytest.mark.parametrize('compression', list(models.Compression))
+def test_json_files_are_appended_to(tmp_path, grubhub_data, compression):
+    params = models.Parameters(output_path=str(tmp_path), compression=compression)
+    orders = grubhub_data['orders']
+    first, second = orders.take(range(10)), orders.take(range(10, len(orders)))
+
+    jsonl.grubhub_data_to_json_file(params, {'orders': first})
+    jsonl.grubhub_data_to_json_file(
+        params,
+        {'orders': second},
+        exported={'orders': set(first.column('email_id'))}
+    )
+
+    path = jsonl.output_file_path(params, 'orders', '.jsonl')
+    assert read_lines(path, compression) == expected_records(orders)
+
+
+@pytest.mark.parametrize('compression', list(models.Compression))
+def test_json_files_with_changed_records_are_rewritten(
+    tmp_path,
+    grubhub_data,
+    compression
+):
+    params = models.Parameters(output_path=str(tmp_path), compression=compression)
+    orders = grubhub_data['orders']
+    first = orders.take(range(10))
+    jsonl.grubhub_data_to_json_file(params, {'orders': first})
+
+    # The fourth order has changed, and the rest are new
+    changes = orders.take([3] + list(range(10, len(orders))))
+    changes.columns['order_total'].values[0] += 100
+    jsonl.grubhub_data_to_json_file(
+        params,
+        {'orders': changes},
+        exported={'orders': set(first.column('email_id'))}
+    )
+
+    path = jsonl.output_file_path(params, 'orders', '.jsonl')
+    lines = read_lines(path, compression)
+    assert lines == (
+        expected_records(orders.take([0, 1, 2] + list(range(4, 10))))
+        + expected_records(changes)
+    )
+    assert len({line['email_id'] for line in lines}) == len(lines) == len(orders)
+    assert not list(tmp_path.glob('*.tmp'))
+
+
+def test_json_to_stdout(grubhub_data, monkeypatch):
+    stdout = io.TextIOWrapper(io.BytesIO())
+    monkeypatch.setattr('sys.stdout', stdout)
+
+    jsonl.grubhub_data_to_json(models.Parameters(), grubhub_data)
+
+    lines = [json.loads(line) for line in stdout.buffer.getvalue().splitlines()]
+    assert lines == [
+        {'table': name} | record
+        for name, batch in grubhub_data.items()
+        for record in expected_records(batch)
+    ]
@@ -0,0 +1,65 @@
+"""Tests that the Parquet export only rewrites the partitions of new and changed records,
+and keeps the other records in them.
+"""
+
+from datetime import datetime, timezone
+
+import pytest
+
+from grubhub_dl import models
+
+ds = pytest.importorskip('pyarrow.dataset')
+parquet = pytest.importorskip('grubhub_dl.export.parquet')
+
+
+def make_orders(*orders: tuple) -> dict[str, models.RecordBatch]:
+    batch = models.RecordBatch(models.Order)
+    for email_id, sent_at, order_total in orders:
+        batch.append(
+            models.Order(
+                email_id=email_id,
+                sent_at=sent_at,
+                order_number=f'order-{email_id}',
+                order_total=order_total,
+            )
+        )
+    return {'orders': batch}
+
+
+def exported_orders(params: models.Parameters) -> dict[str, int]:
+    table = ds.dataset(
+        f'{params.output_path}/orders',
+        format=parquet.PARQUET_FORMAT,
+        partitioning=parquet.PARTITIONING
+    ).to_table()
+    return dict(zip(table['email_id'].to_pylist(), table['order_total'].to_pylist()))
+
+
+@pytest.fixture
+def params(tmp_path):
+    return models.Parameters(output_path=str(tmp_path / 'parquet'))
+
+
+def test_changed_partitions_keep_their_other_rows(params):
+    march = datetime(2025, 3, 8, tzinfo=timezone.utc)
+    april = datetime(2025, 4, 8, tzinfo=timezone.utc)
+    parquet.grubhub_data_to_parquet(
+        params,
+        make_orders(('a', march, 1), ('b', march, 1), ('c', april, 1))
+    )
+
+    parquet.grubhub_data_to_parquet(params, make_orders(('a', march, 2), ('d', march, 1)))
+
+    assert exported_orders(params) == {'a': 2, 'b': 1, 'c': 1, 'd': 1}
+
+
+def test_rows_without_sent_at_are_merged(params):
+    march = datetime(2025, 3, 8, tzinfo=timezone.utc)
+    parquet.grubhub_data_to_parquet(
+        params,
+        make_orders(('a', None, 1), ('b', None, 1), ('c', march, 1))
+    )
+
+    parquet.grubhub_data_to_parquet(params, make_orders(('a', None, 2), ('d', None, 1)))
+
+    assert exported_orders(params) == {'a': 2, 'b': 1, 'c': 1, 'd': 1}
@@ -0,0 +1,133 @@
+"""Tests the PostgreSQL exporter against a local PostgreSQL instance.
+
+Set ``GRUBHUB_DL_TEST_POSTGRES_DSN`` to the connection string of a database that the
+tests can create tables in, eg ``host=localhost dbname=grubhub_dl_test``. The merge
+statement is also run with DuckDB (which supports the same syntax), so that it's tested
+without a server.
+"""
+
+import os
+from datetime import datetime, timezone
+
+import pytest
+
+from grubhub_dl import models
+
+psycopg = pytest.importorskip('psycopg')
+postgres = pytest.importorskip('grubhub_dl.export.postgres')
+
+POSTGRES_DSN = os.environ.get('GRUBHUB_DL_TEST_POSTGRES_DSN')
+
+requires_postgres = pytest.mark.skipif(
+    not POSTGRES_DSN,
+    reason='GRUBHUB_DL_TEST_POSTGRES_DSN is not set'
+)
+
+
+@pytest.fixture
+def params():
+    with psycopg.connect(POSTGRES_DSN, autocommit=True) as conn:
+        for name in models.GRUBHUB_TABLES:
+            conn.execute(f'DROP TABLE IF EXISTS {name}')
+    return models.Parameters(postgres_dsn=POSTGRES_DSN)
+
+
+def make_grubhub_data(order_total: int) -> dict[str, models.RecordBatch]:
+    grubhub_data = {
+        name: models.RecordBatch(record_type)
+        for name, record_type in models.GRUBHUB_TABLES.items()
+    }
+    sent_at = datetime(2025, 3, 8, 14, 22, tzinfo=timezone.utc)
+    grubhub_data['orders'].append(
+        models.Order(
+            email_id='email-1',
+            sent_at=sent_at,
+            order_number='12345678-9012345',
+            order_total=order_total,
+            order_has_promo_code=True,
+        )
+    )
+    grubhub_data['reconciled_orders'].append(
+        models.ReconciledOrder(
+            order_number='12345678-9012345',
+            email_id='email-1',
+            sent_at=sent_at,
+            order_total=order_total,
+            update_email_ids=['email-2', 'email-3'],
+        )
+    )
+    return grubhub_data
+
+
+@requires_postgres
+def test_grubhub_data_to_postgres(params):
+    postgres.grubhub_data_to_postgres(params, make_grubhub_data(order_total=1234))
+
+    with psycopg.connect(POSTGRES_DSN) as conn:
+        row = conn.execute(
+            'SELECT order_total, sent_at, order_has_promo_code FROM orders'
+        ).fetchone()
+        update_email_ids = conn.execute(
+            'SELECT update_email_ids FROM reconciled_orders'
+        ).fetchone()[0]
+
+    assert row == (1234, datetime(2025, 3, 8, 14, 22, tzinfo=timezone.utc), True)
+    assert update_email_ids == ['email-2', 'email-3']
+
+
+@requires_postgres
+def test_grubhub_data_to_postgres_is_idempotent(params):
+    postgres.grubhub_data_to_postgres(params, make_grubhub_data(order_total=1234))
+    postgres.grubhub_data_to_postgres(params, make_grubhub_data(order_total=999))
+
+    with psycopg.connect(POSTGRES_DSN) as conn:
+        rows = conn.execute('SELECT order_total FROM orders').fetchall()
+
+    assert rows == [(999,)]
+
+
+def test_merge_statement():
+    statement = postgres.merge_statement(
+        'restaurants',
+        'staging_restaurants',
+        ['restaurant_id', 'name', 'sent_at'],
+        ('restaurant_id',)
+    ).as_string(None)
+
+    assert statement == (
+        'INSERT INTO "restaurants" ("restaurant_id", "name", "sent_at") '
+        'SELECT DISTINCT ON ("restaurant_id") "restaurant_id", "name", "sent_at" '
+        'FROM "staging_restaurants" '
+        'ORDER BY "restaurant_id", "sent_at" DESC NULLS LAST '
+        'ON CONFLICT ("restaurant_id") DO UPDATE SET '
+        '"name" = excluded."name", "sent_at" = excluded."sent_at"'
+    )
+
+
+def test_merge_statement_keeps_the_newest_staging_row():
+    duckdb = pytest.importorskip('duckdb')
+    conn = duckdb.connect()
+    conn.execute(
+        'CREATE TABLE orders (order_number TEXT PRIMARY KEY, total INT, sent_at INT)'
+    )
+    conn.execute('CREATE TABLE staging_orders AS SELECT * FROM orders LIMIT 0')
+    conn.execute("INSERT INTO orders VALUES ('a', 1, 1), ('b', 1, 1)")
+    conn.execute(
+        "INSERT INTO staging_orders VALUES "
+        "('a', 3, 3), ('a', 2, 2), ('c', 1, NULL), ('c', 2, 2), ('c', 3, NULL)"
+    )
+
+    conn.execute(
+        postgres.merge_statement(
+            'orders',
+            'staging_orders',
+            ['order_number', 'total', 'sent_at'],
+            ('order_number',)
+        ).as_string(None)
+    )
+
+    assert conn.execute('SELECT * FROM orders ORDER BY order_number').fetchall() == [
+        ('a', 3, 3),
+        ('b', 1, 1),
+        ('c', 2, 2),
+    ]
@@ -0,0 +1,96 @@
+"""Tests that the SQLite export upserts records, so exporting again never duplicates
+them.
+"""
+
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+from grubhub_dl import models, process, DEFAULT_DATETIME_FORMAT
+from grubhub_dl.export import sqlite
+from tools.corpus import generate_emails
+
+
+def extract(count: int) -> dict[str, models.RecordBatch]:
+    emails = [corpus_email.email for corpus_email in generate_emails(count)]
+    return process.extract_data_from_emails(models.Parameters(), emails)
+
+
+def dump_tables(sqlite_path: str) -> dict[str, list[tuple]]:
+    conn = sqlite3.connect(sqlite_path)
+    try:
+        return {
+            name: sorted(conn.execute(f'SELECT * FROM {name}'), key=repr)
+            for name in models.GRUBHUB_TABLES
+        }
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def params(tmp_path):
+    return models.Parameters(sqlite_path=str(tmp_path / 'grubhub.sqlite'))
+
+
+def test_export(params):
+    grubhub_data = extract(40)
+
+    sqlite.grubhub_data_to_sqlite(params, grubhub_data)
+    tables = dump_tables(params.sqlite_path)
+
+    for name, batch in grubhub_data.items():
+        assert len(tables[name]) == len(batch), name
+    assert len(tables['orders']) > 0
+
+
+def test_timestamps_are_iso_utc(tmp_path):
+    params = models.Parameters(
+        sqlite_path=str(tmp_path / 'grubhub.sqlite'),
+        datetime_format='%d/%m/%Y %I:%M%p'
+    )
+    grubhub_data = extract(5)
+
+    sqlite.grubhub_data_to_sqlite(params, grubhub_data)
+
+    conn = sqlite3.connect(params.sqlite_path)
+    try:
+        rows = dict(conn.execute('SELECT email_id, sent_at FROM emails'))
+    finally:
+        conn.close()
+    emails = grubhub_data['emails']
+    for i in range(len(emails)):
+        email = emails.record(i)
+        sent_at = datetime.strptime(rows[email.email_id], DEFAULT_DATETIME_FORMAT)
+        assert sent_at == email.sent_at.replace(tzinfo=None)
+
+
+def test_second_export_is_idempotent(params):
+    sqlite.grubhub_data_to_sqlite(params, extract(40))
+    tables = dump_tables(params.sqlite_path)
+
+    sqlite.grubhub_data_to_sqlite(params, extract(40))
+
+    assert dump_tables(params.sqlite_path) == tables
+
+
+def test_changed_records_are_updated(params):
+    grubhub_data = extract(40)
+    sqlite.grubhub_data_to_sqlite(params, grubhub_data)
+
+    orders = grubhub_data['orders']
+    changed = orders.take([0])
+    changed.columns['order_total'].values[0] += 100
+    sqlite.grubhub_data_to_sqlite(params, {'orders': changed})
+
+    conn = sqlite3.connect(params.sqlite_path)
+    try:
+        rows = conn.execute(
+            'SELECT order_total FROM orders WHERE email_id = ?',
+            (orders.record(0).email_id,)
+        ).fetchall()
+        count = conn.execute('SELECT count(*) FROM orders').fetchone()[0]
+    finally:
+        conn.close()
+    assert rows == [(orders.record(0).order_total + 100,)]
+    assert count == len(orders)
@@ -0,0 +1,129 @@
+"""Tests that only new emails are extracted and only new or changed records are exported,
+and that the export state is reset when what was exported is deleted.
+"""
+
+import gzip
+import json
+import logging
+import shutil
+
+import pytest
+
+from grubhub_dl import main, models
+from grubhub_dl.emails import cache
+from grubhub_dl.export.state import ExportState, select_new_emails
+from tools.corpus import generate_emails
+
+
+@pytest.fixture
+def corpus():
+    return [corpus_email.email for corpus_email in generate_emails(60)]
+
+
+def get_params(tmp_path, destination: models.Destination, **kwargs) -> models.Parameters:
+    return models.Parameters(
+        source=models.Source.cache,
+        destination=[destination],
+        output_path=str(tmp_path / 'output'),
+        sqlite_path=str(tmp_path / 'grubhub.sqlite'),
+        cache_dir=str(tmp_path / 'cache'),
+        **kwargs
+    )
+
+
+def read_json_lines(path) -> list[dict]:
+    opener = gzip.open if str(path).endswith('.gz') else open
+    with opener(path, 'rb') as file:
+        return [json.loads(line) for line in file]
+
+
+def exported_state(emails: list[models.EmailMessage]) -> ExportState:
+    return ExportState(
+        'unused',
+        high_water_mark=max(email.sent_at for email in emails),
+        fingerprints={'emails': {email.email_id: 0 for email in emails}}
+    )
+
+
+def test_exported_emails_are_skipped(corpus):
+    emails = sorted(corpus, key=lambda email: email.sent_at)
+    state = exported_state(emails[:30])
+
+    assert select_new_emails(emails, [state]) == emails[30:]
+    assert select_new_emails(emails, [state, ExportState('unused')]) == emails
+    assert select_new_emails(emails, [state, exported_state(emails[:20])]) == emails[20:]
+    assert select_new_emails(emails, []) == emails
+
+
+def test_older_emails_that_werent_exported_are_kept(corpus):
+    emails = sorted(corpus, key=lambda email: email.sent_at)
+    # The 10th email was fetched after newer ones had been exported
+    state = exported_state(emails[:10] + emails[11:30])
+
+    assert select_new_emails(emails, [state]) == [emails[10]] + emails[30:]
+
+
+def test_second_run_only_extracts_new_emails(tmp_path, corpus, caplog):
+    caplog.set_level(logging.INFO)
+    params = get_params(tmp_path, models.Destination.sqlite)
+    cache.emails_to_json_files(params, corpus[:40])
+    main.get_grubhub_data(params)
+
+    assert main.get_grubhub_data(params) is None
+    assert 'No new emails since the last export' in caplog.text
+
+    # Older emails that weren't exported yet are extracted too
+    cache.emails_to_json_files(params, corpus[40:])
+    caplog.clear()
+    main.get_grubhub_data(params)
+    assert 'Skipping 40 emails' in caplog.text
+    state = ExportState.load(params, models.Destination.sqlite)
+    assert set(state.fingerprints['emails']) == {email.email_id for email in corpus}
+
+
+def test_json_file_has_one_line_per_record(tmp_path, corpus):
+    params = get_params(
+        tmp_path,
+        models.Destination.json_file,
+        compression=models.Compression.gzip
+    )
+    cache.emails_to_json_files(params, corpus[:40])
+    main.get_grubhub_data(params)
+    emails_path = tmp_path / 'output' / 'emails.jsonl.gz'
+    first_lines = read_json_lines(emails_path)
+
+    cache.emails_to_json_files(params, corpus[40:])
+    main.get_grubhub_data(params)
+    lines = read_json_lines(emails_path)
+
+    assert lines[:len(first_lines)] == first_lines
+    email_ids = [line['email_id'] for line in lines]
+    assert len(email_ids) == len(set(email_ids)) == 60
+    # Reconciled orders change when updates to them arrive, so their file is rewritten
+    reconciled = read_json_lines(tmp_path / 'output' / 'reconciled_orders.jsonl.gz')
+    order_numbers = [line['order_number'] for line in reconciled]
+    assert len(order_numbers) == len(set(order_numbers))
+    state = ExportState.load(params, models.Destination.json_file)
+    assert len(reconciled) == len(state.fingerprints['reconciled_orders'])
+
+
+def test_state_is_reset_when_the_target_is_deleted(tmp_path, corpus):
+    for destination in (models.Destination.sqlite, models.Destination.json_file):
+        params = get_params(tmp_path, destination)
+        cache.emails_to_json_files(params, corpus)
+        main.get_grubhub_data(params)
+
+        state = ExportState.load(params, destination)
+        assert state.high_water_mark is not None
+        assert state.fingerprints['emails']
+
+        if destination == models.Destination.sqlite:
+            (tmp_path / 'grubhub.sqlite').unlink()
+        else:
+            shutil.rmtree(tmp_path / 'output')
+        state = ExportState.load(params, destination)
+        assert state.high_water_mark is None
+        assert not state.fingerprints
+
+        main.get_grubhub_data(params)
+        assert ExportState.load(params, destination).fingerprints['emails']
@@ -0,0 +1,121 @@
+"""Tests the order, the limit and the paging of the terminal table."""
+
+import os
+import io
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from grubhub_dl import models
+from grubhub_dl.export import table
+
+SENT_AT = datetime(2025, 3, 8, 14, 22, tzinfo=timezone.utc)
+
+
+class Terminal(io.StringIO):
+    def isatty(self) -> bool:
+        return True
+
+
+@pytest.fixture
+def reconciled_orders() -> models.RecordBatch:
+    batch = models.RecordBatch(models.ReconciledOrder)
+    for i, order_total in enumerate([1500, None, 3000, 500, 2000, 1000, 2500]):
+        batch.append(
+            models.ReconciledOrder(
+                order_number=f'order-{i}',
+                email_id=f'email-{i}',
+                sent_at=SENT_AT + timedelta(days=i),
+                restaurant_name='Pizza Place',
+                order_total=order_total,
+            )
+        )
+    return batch
+
+
+def use_terminal(monkeypatch) -> Terminal:
+    # Patched in the test itself, since pytest replaces stdout again after the fixtures
+    # are set up
+    stdout = Terminal()
+    monkeypatch.setattr('sys.stdout', stdout)
+    monkeypatch.setattr('sys.stdin', Terminal())
+    # Pages of 5 rows
+    monkeypatch.setattr(
+        table.shutil,
+        'get_terminal_size',
+        lambda: os.terminal_size((120, 8))
+    )
+    return stdout
+
+
+def order_numbers(lines: list[str]) -> list[str]:
+    return [line.split()[2] for line in lines if 'order-' in line]
+
+
+def print_table(reconciled_orders: models.RecordBatch, **kwargs):
+    table.grubhub_data_to_table(
+        models.Parameters(**kwargs),
+        {'reconciled_orders': reconciled_orders}
+    )
+
+
+@pytest.mark.parametrize('sort_by, expected', [
+    ('sent_at', [6, 5, 4, 3, 2, 1, 0]),
+    ('order_total', [2, 6, 4, 0, 5, 3, 1]),
+])
+def test_sort_by(reconciled_orders, sort_by, expected):
+    assert table.sorted_indexes(reconciled_orders, sort_by) == expected
+    for limit in (1, 3, 7, 10):
+        assert table.sorted_indexes(reconciled_orders, sort_by, limit) == expected[:limit]
+
+
+def test_limit(reconciled_orders, capsys):
+    print_table(reconciled_orders, sort_by='order_total', limit=2)
+
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0].split()[:3] == ['sent_at', 'order_number', 'restaurant_name']
+    assert order_numbers(lines) == ['order-2', 'order-6']
+
+
+def test_table_is_not_paged_when_stdout_is_not_a_terminal(reconciled_orders, capsys):
+    print_table(reconciled_orders)
+
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 2 + len(reconciled_orders)
+
+
+def test_table_is_paged_in_a_terminal(reconciled_orders, monkeypatch):
+    terminal = use_terminal(monkeypatch)
+    prompts = []
+    monkeypatch.setattr('builtins.input', lambda prompt: prompts.append(prompt) or '')
+
+    print_table(reconciled_orders)
+
+    lines = terminal.getvalue().splitlines()
+    assert len(prompts) == 1
+    # The header is repeated on each page
+    assert lines[0] == lines[7]
+    assert order_numbers(lines) == [f'order-{i}' for i in range(6, -1, -1)]
+
+
+def test_quitting_stops_paging(reconciled_orders, monkeypatch):
+    terminal = use_terminal(monkeypatch)
+    monkeypatch.setattr('builtins.input', lambda prompt: 'q')
+
+    print_table(reconciled_orders)
+
+    assert len(order_numbers(terminal.getvalue().splitlines())) == 5
+
+
+def test_table_is_not_paged_from_another_thread(reconciled_orders, monkeypatch):
+    terminal = use_terminal(monkeypatch)
+    def input(prompt):
+        raise AssertionError('The user was asked for the next page')
+
+    monkeypatch.setattr('builtins.input', input)
+    thread = threading.Thread(target=print_table, args=(reconciled_orders,))
+    thread.start()
+    thread.join()
+
+    assert len(order_numbers(terminal.getvalue().splitlines())) == len(reconciled_orders)
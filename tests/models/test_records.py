@@ -0,0 +1,116 @@
+"""Tests that records survive being stored in the columns of a ``RecordBatch``."""
+
+from datetime import datetime, timedelta, timezone
+
+from grubhub_dl import models
+from grubhub_dl.models.records import (
+    Column,
+    IntColumn,
+    BoolColumn,
+    TimestampColumn,
+    KEY_BITS,
+    stable_key,
+)
+
+EDT = timezone(timedelta(hours=-4))
+
+RECORDS = [
+    models.ReconciledOrder(
+        order_number='12345678-9012',
+        email_id='a',
+        sent_at=datetime(2024, 6, 4, 22, 30, 0, 1500, tzinfo=timezone.utc),
+        ordered_at=datetime(2024, 6, 4, 18, 0, tzinfo=EDT),
+        restaurant_id=stable_key('Thai Palace'),
+        restaurant_name='Thai Palace',
+        order_total=2599,
+        order_delivery_tip=400,
+        refunded_amount=0,
+        net_paid=2599,
+        is_canceled=False,
+        update_email_ids=['b', 'c'],
+    ),
+    models.ReconciledOrder(),
+    models.ReconciledOrder(
+        order_number='98765432-1098',
+        sent_at=datetime(1969, 12, 31, 23, 59, 59, tzinfo=timezone.utc),
+        order_total=-100,
+        is_canceled=True,
+        update_email_ids=[],
+    ),
+]
+
+
+def make_batch() -> models.RecordBatch:
+    batch = models.RecordBatch(models.ReconciledOrder)
+    for record in RECORDS:
+        batch.append(record)
+    return batch
+
+
+def test_columns_are_typed():
+    columns = make_batch().columns
+
+    assert type(columns['order_number']) is Column
+    assert type(columns['restaurant_id']) is IntColumn
+    assert type(columns['is_canceled']) is BoolColumn
+    assert type(columns['sent_at']) is TimestampColumn
+    assert columns['order_total'].null_count == 1
+    assert list(columns['order_total'].validity) == [1, 0, 1]
+
+
+def test_round_trip():
+    batch = make_batch()
+
+    assert len(batch) == 3
+    assert list(batch) == RECORDS
+    assert [batch.record(i) for i in range(3)] == RECORDS
+    assert batch.record(0).ordered_at.tzinfo == timezone.utc
+    assert batch.column('is_canceled') == [False, None, True]
+    assert list(batch.rows(1, 2)) == [tuple([None] * len(batch.field_names))]
+
+
+def test_take():
+    batch = make_batch().take([2, 1, 2])
+
+    assert len(batch) == 3
+    assert list(batch) == [RECORDS[2], RECORDS[1], RECORDS[2]]
+    assert batch.columns['order_total'].null_count == 1
+
+    batch.append(RECORDS[0])
+    assert batch.record(3) == RECORDS[0]
+
+
+def test_to_pydict():
+    data = make_batch().to_pydict()
+
+    assert list(data) == make_batch().field_names
+    assert data['order_total'] == [2599, None, -100]
+    assert data['update_email_ids'] == [['b', 'c'], None, []]
+    assert data['sent_at'] == [record.sent_at for record in RECORDS]
+
+
+def test_empty_batch():
+    batch = models.RecordBatch(models.ReconciledOrder)
+
+    assert len(batch) == 0
+    assert list(batch) == []
+    assert batch.take([]).to_pydict() == {name: [] for name in batch.field_names}
+
+
+def test_dimension_interns_values():
+    batch = models.RecordBatch(models.Restaurant)
+    restaurants = models.Dimension(batch)
+
+    key = restaurants.intern('Thai Palace')
+
+    assert restaurants.intern('Thai Palace') == key == stable_key('Thai Palace')
+    assert restaurants.intern('Curry House') != key
+    assert len(restaurants) == len(batch) == 2
+
+
+def test_stable_keys_are_exact_as_doubles():
+    keys = [stable_key(f'Restaurant {i}', 'Item') for i in range(1000)]
+
+    assert all(0 <= key < 2**KEY_BITS for key in keys)
+    assert all(int(float(key)) == key for key in keys)
+    assert len(set(keys)) == len(keys)
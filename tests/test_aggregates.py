@@ -0,0 +1,162 @@
+"""Tests that the rollups that are updated incrementally (eg when a refund arrives after
+its order was rolled up) match the rollups of every record at once.
+"""
+
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from grubhub_dl import aggregates, models, process, reconciliation
+from tools.corpus import generate_emails
+
+SENT_AT = datetime(2024, 6, 4, 22, 30, tzinfo=timezone.utc)
+ROLLUP_TABLES = ['monthly_spending', 'restaurant_spending', 'monthly_credits']
+
+
+def make_data(*records) -> dict[str, models.RecordBatch]:
+    grubhub_data = {
+        name: models.RecordBatch(record_type)
+        for name, record_type in models.GRUBHUB_TABLES.items()
+    }
+    tables = {record_type: name for name, record_type in models.GRUBHUB_TABLES.items()}
+    for record in records:
+        grubhub_data[tables[type(record)]].append(record)
+    return grubhub_data
+
+
+def order(order_number: str, days: int = 0, **fields) -> models.Order:
+    return models.Order(**{
+        'email_id': f'order-{order_number}',
+        'sent_at': SENT_AT + timedelta(days=days),
+        'order_number': order_number,
+        'restaurant_name': 'Pizza Place',
+        'order_total': 2500,
+        'order_service_fee_actual': 150,
+        'order_delivery_fee_actual': 299,
+        'order_sales_tax': 210,
+        'order_delivery_tip': 400,
+    } | fields)
+
+
+def roll_up(cache_dir: str, *runs: dict[str, models.RecordBatch]) -> dict[str, list]:
+    """Reconcile and roll up each run's records in turn, and get the rollups"""
+
+    params = models.Parameters(cache_dir=cache_dir)
+    for grubhub_data in runs:
+        reconciliation.reconcile(params, grubhub_data)
+        aggregates.update_aggregates(params, grubhub_data)
+
+    conn = aggregates.connect(cache_dir)
+    try:
+        return {
+            table: conn.execute(f'SELECT * FROM {table} ORDER BY 1, 2').fetchall()
+            for table in ROLLUP_TABLES
+        }
+    finally:
+        conn.close()
+
+
+def test_refund_after_its_order(tmp_path):
+    records = [
+        order('1'),
+        order('2', restaurant_name='Taco Stand'),
+        models.OrderUpdate(
+            email_id='update-1',
+            sent_at=SENT_AT + timedelta(days=40),
+            order_number='1',
+            refund_amount=700,
+        ),
+    ]
+
+    incremental = roll_up(
+        str(tmp_path / 'incremental'),
+        make_data(*records[:2]),
+        make_data(records[2])
+    )
+
+    assert incremental == roll_up(str(tmp_path / 'from_scratch'), make_data(*records))
+    month, order_count, _, order_total, refunded, net_paid, service_fees, *_ = (
+        incremental['monthly_spending'][0]
+    )
+    assert (month, order_count, order_total, refunded, service_fees) == (
+        '2024-06', 2, 5000, 700, 300
+    )
+    assert dict(
+        (row[0], row[4]) for row in incremental['restaurant_spending']
+    ) == {'Pizza Place': 700, 'Taco Stand': 0}
+
+
+def test_cancellation_after_its_order(tmp_path):
+    records = [
+        order('1'),
+        order('2', days=30),
+        models.OrderCancellation(
+            email_id='cancellation-1',
+            sent_at=SENT_AT + timedelta(hours=1),
+            order_number='1',
+            amount=2500,
+        ),
+    ]
+
+    incremental = roll_up(
+        str(tmp_path / 'incremental'),
+        make_data(*records[:2]),
+        make_data(records[2])
+    )
+
+    assert incremental == roll_up(str(tmp_path / 'from_scratch'), make_data(*records))
+    canceled_counts = {row[0]: row[2] for row in incremental['monthly_spending']}
+    assert canceled_counts == {'2024-06': 1, '2024-07': 0}
+
+
+def test_updates_before_their_orders(tmp_path):
+    records = [
+        models.OrderUpdate(
+            email_id='update-1',
+            sent_at=SENT_AT + timedelta(days=1),
+            order_number='1',
+            refund_amount=700,
+        ),
+        order('1'),
+    ]
+
+    assert roll_up(
+        str(tmp_path / 'incremental'),
+        make_data(records[0]),
+        make_data(records[1])
+    ) == roll_up(str(tmp_path / 'from_scratch'), make_data(*records))
+
+
+@pytest.mark.parametrize('runs', [2, 5])
+def test_corpus_in_several_runs(tmp_path, runs):
+    emails = sorted(
+        (corpus_email.email for corpus_email in generate_emails(200)),
+        key=lambda email: email.sent_at
+    )
+    params = models.Parameters()
+    size = -(-len(emails) // runs)
+
+    # Emails can only be extracted once, so each run's emails are extracted separately
+    incremental = roll_up(
+        str(tmp_path / 'incremental'),
+        *(
+            process.extract_data_from_emails(
+                params,
+                emails[start:start + size],
+                reconcile=False
+            )
+            for start in range(0, len(emails), size)
+        )
+    )
+    from_scratch = roll_up(
+        str(tmp_path / 'from_scratch'),
+        process.extract_data_from_emails(
+            params,
+            [corpus_email.email for corpus_email in generate_emails(200)],
+            reconcile=False
+        )
+    )
+
+    assert incremental == from_scratch
+    assert any(row[4] for row in from_scratch['monthly_spending'])
@@ -0,0 +1,102 @@
+"""Tests the extractors against the synthetic email corpus in ``tools.corpus``.
+
+Every email in the corpus comes with the records that should be extracted from it, so
+these tests check that each email body layout is extracted completely and correctly.
+"""
+
+from dataclasses import asdict
+
+import pytest
+
+from grubhub_dl import models
+from tools.corpus import VARIANT_WEIGHTS, generate_emails, generate_every_variant
+
+process = pytest.importorskip('grubhub_dl.process')
+
+EXPECTED_CATEGORIES = {
+    'order_confirmation': models.EmailCategory.order_confirmation,
+    'order_updated': models.EmailCategory.order_updated,
+    'order_canceled': models.EmailCategory.order_canceled,
+    'credit_dollars_off': models.EmailCategory.credit_dollars_off,
+    'credit_guarantee_perk': models.EmailCategory.credit_guarantee_perk,
+    'credit_discounted': models.EmailCategory.credit_discounted,
+    'uncategorized': models.EmailCategory.uncategorized,
+}
+
+
+def extracted_records(grubhub_data: dict[str, models.RecordBatch]) -> dict[str, dict]:
+    """Group the extracted records by table and email ID, in the same form as the
+    records that the corpus expects
+    """
+
+    item_names = dict(zip(
+        grubhub_data['menu_items'].column('item_id'),
+        grubhub_data['menu_items'].column('item_name'),
+    ))
+    records = {}
+    for name in ['orders', 'order_updates', 'order_cancellations', 'credits']:
+        for record in grubhub_data[name]:
+            # Restaurant IDs are assigned during extraction, so they're not expected
+            fields = {k: v for k, v in asdict(record).items() if k != 'restaurant_id'}
+            records.setdefault(name, {}).setdefault(record.email_id, []).append(
+                type(record)(**fields)
+            )
+    for item in grubhub_data['order_items']:
+        records.setdefault('order_items', {}).setdefault(item.email_id, []).append(
+            models.LineItem(
+                item_name=item_names[item.item_id],
+                quantity=item.quantity,
+                options=item.options,
+                price=item.price,
+            )
+        )
+    return records
+
+
+@pytest.mark.parametrize('corpus_email', generate_every_variant(), ids=list(VARIANT_WEIGHTS))
+def test_categorize_email(corpus_email):
+    email = process.categorize_email(corpus_email.email)
+
+    expected = next(
+        category
+        for prefix, category in EXPECTED_CATEGORIES.items()
+        if corpus_email.variant.startswith(prefix)
+    )
+    assert email.category == expected
+
+
+@pytest.mark.parametrize('corpus_email', generate_every_variant(), ids=list(VARIANT_WEIGHTS))
+def test_extract_variant(corpus_email):
+    grubhub_data = process.extract_data_from_emails(
+        models.Parameters(),
+        [corpus_email.email]
+    )
+    records = extracted_records(grubhub_data)
+
+    for name, expected in corpus_email.expected.items():
+        assert records[name][corpus_email.email.email_id] == expected
+    if corpus_email.variant == 'uncategorized':
+        assert not records
+
+
+def test_extract_corpus():
+    corpus = list(generate_emails(1000, seed=1))
+    grubhub_data = process.extract_data_from_emails(
+        models.Parameters(),
+        [corpus_email.email for corpus_email in corpus]
+    )
+    records = extracted_records(grubhub_data)
+
+    for corpus_email in corpus:
+        for name in ['orders', 'order_items', 'order_updates', 'order_cancellations',
+                     'credits']:
+            assert (
+                records.get(name, {}).get(corpus_email.email.email_id, [])
+                == corpus_email.expected.get(name, [])
+            ), f'{corpus_email.variant} {name}'
+
+    # Every update and cancellation refers to an order in the corpus
+    order_count = sum(
+        1 for corpus_email in corpus if corpus_email.variant.startswith('order_confirmation')
+    )
+    assert len(grubhub_data['reconciled_orders']) == order_count
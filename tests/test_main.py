@@ -0,0 +1,148 @@
+"""Tests that the CLI starts quickly, by only importing the dependencies that take a long
+time to import when they're used, and that it checks its parameters.
+"""
+
+import sys
+import json
+import threading
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from grubhub_dl import main, models
+from grubhub_dl.emails import cache
+from tools.corpus import generate_emails
+
+ROOT_DIR = Path(__file__).parents[1]
+
+# Only the sources, destinations and commands that use these should import them
+HEAVY_MODULES = {
+    'pandas',
+    'pyarrow',
+    'duckdb',
+    'googleapiclient',
+    'google_auth_oauthlib',
+    'keyring',
+    'openpyxl',
+    'xlsxwriter',
+    'psycopg',
+}
+
+# How long importing ``grubhub_dl.main`` may take, in seconds
+IMPORT_TIME_BUDGET = 0.5
+
+
+def run_python(code: str) -> str:
+    return subprocess.run(
+        [sys.executable, '-c', code],
+        cwd=ROOT_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+
+
+def test_import_time():
+    code = (
+        'import time\n'
+        'started_at = time.perf_counter()\n'
+        'import grubhub_dl.main\n'
+        'print(time.perf_counter() - started_at)\n'
+    )
+    # The fastest of a few runs, so that a busy machine doesn't fail the test
+    seconds = min(float(run_python(code)) for _ in range(3))
+    assert seconds < IMPORT_TIME_BUDGET
+
+
+def test_cache_to_jsonl_run_does_not_import_heavy_modules(tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    params = models.Parameters(cache_dir=cache_dir)
+    cache.emails_to_json_files(
+        params,
+        [corpus_email.email for corpus_email in generate_emails(10)]
+    )
+
+    modules_file = tmp_path / 'modules.json'
+    run_python(
+        'import sys, json\n'
+        'from grubhub_dl import main\n'
+        f'main.main(["--source", "cache", "--cache-dir", {cache_dir!r}])\n'
+        f'with open({str(modules_file)!r}, "w") as file:\n'
+        '    json.dump(sorted(sys.modules), file)\n'
+    )
+
+    imported = {name.split('.')[0] for name in json.loads(modules_file.read_text())}
+    assert 'bs4' in imported
+    assert not HEAVY_MODULES & imported
+
+
+def test_config_file_without_postgres_dsn_is_rejected(tmp_path):
+    config_file = tmp_path / 'config.ini'
+    config_file.write_text('[grubhub-dl]\ndestination = postgres\n')
+
+    with pytest.raises(SystemExit):
+        main.get_parameters(['--config-file', str(config_file)])
+
+    config_file.write_text(
+        '[grubhub-dl]\ndestination = postgres\n[postgres]\nhost = localhost\n'
+    )
+    params = main.get_parameters(['--config-file', str(config_file)])
+    assert params.postgres_dsn == "host='localhost'"
+
+
+def export_to(tmp_path, destinations: list[models.Destination]) -> models.Parameters:
+    params = models.Parameters(
+        source=models.Source.cache,
+        destination=destinations,
+        cache_dir=str(tmp_path / 'cache'),
+        sqlite_path=str(tmp_path / 'grubhub.sqlite'),
+        postgres_dsn='host=localhost',
+        full_export=True,
+    )
+    cache.emails_to_json_files(
+        params,
+        [corpus_email.email for corpus_email in generate_emails(10)]
+    )
+    return params
+
+
+def test_stdout_destinations_are_exported_on_the_main_thread(tmp_path, monkeypatch):
+    params = export_to(
+        tmp_path,
+        [models.Destination.json, models.Destination.sqlite, models.Destination.table]
+    )
+    threads = {}
+    monkeypatch.setattr(
+        main,
+        'export_grubhub_data',
+        lambda params, destination, *args: threads.update(
+            {destination: threading.current_thread()}
+        )
+    )
+
+    main.get_grubhub_data(params)
+
+    assert threads[models.Destination.json] is threading.main_thread()
+    assert threads[models.Destination.table] is threading.main_thread()
+    assert threads[models.Destination.sqlite] is not threading.main_thread()
+
+
+def test_every_export_error_is_reported(tmp_path, monkeypatch, caplog):
+    params = export_to(
+        tmp_path,
+        [models.Destination.json, models.Destination.sqlite, models.Destination.postgres]
+    )
+
+    def export_grubhub_data(params, destination, *args):
+        if destination != models.Destination.sqlite:
+            raise RuntimeError(f'{destination.name} failed')
+
+    monkeypatch.setattr(main, 'export_grubhub_data', export_grubhub_data)
+
+    with pytest.raises(ExceptionGroup) as error:
+        main.get_grubhub_data(params)
+
+    assert sorted(map(str, error.value.exceptions)) == ['json failed', 'postgres failed']
+    assert 'Unable to export to json: json failed' in caplog.text
+    assert 'Unable to export to postgres: postgres failed' in caplog.text
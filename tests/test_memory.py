@@ -0,0 +1,34 @@
+"""Tests the memory profile of each stage of the pipeline."""
+
+import json
+import logging
+
+from grubhub_dl import memory
+
+
+def test_stages_are_not_profiled_by_default():
+    assert not memory.is_enabled()
+    assert memory.stage('extract') is memory.NULL_STAGE
+
+
+def test_profile_memory(caplog):
+    caplog.set_level(logging.INFO, logger='grubhub_dl.memory')
+    document = json.dumps([{'body': 'x' * 1000} for _ in range(1000)])
+
+    memory.start()
+    try:
+        with memory.stage('get_emails'):
+            bodies = json.loads(document)
+        with memory.stage('extract'):
+            pass
+    finally:
+        memory.stop()
+
+    assert not memory.is_enabled()
+    report = caplog.messages
+    assert report[0].startswith('Memory profile')
+    assert report[2].startswith('get_emails')
+    assert report[3].startswith('extract')
+    kinds = report[report.index('Memory still allocated after "get_emails", by kind:') + 1]
+    assert kinds.split()[0] == 'bodies'
+    assert len(bodies) == 1000
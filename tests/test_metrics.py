@@ -0,0 +1,78 @@
+"""Tests the run metrics, and the Prometheus textfile that they're written to."""
+
+import os
+
+import pytest
+
+from grubhub_dl import metrics, models
+from tools.corpus import generate_every_variant
+
+process = pytest.importorskip('grubhub_dl.process')
+
+
+@pytest.fixture(autouse=True)
+def reset_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def test_to_prometheus():
+    metrics.inc('grubhub_dl_emails_read', 3)
+    metrics.inc('grubhub_dl_extraction_failures', field='say "hi"\n')
+    metrics.observe('grubhub_dl_stage_duration_seconds', 0.2, stage='extract')
+    metrics.observe('grubhub_dl_stage_duration_seconds', 7, stage='extract')
+
+    lines = metrics.to_prometheus().splitlines()
+
+    help_text = metrics.METRICS['grubhub_dl_emails_read'].help
+    assert lines[:3] == [
+        f'# HELP grubhub_dl_emails_read_total {help_text}',
+        '# TYPE grubhub_dl_emails_read_total counter',
+        'grubhub_dl_emails_read_total 3',
+    ]
+    assert '# TYPE grubhub_dl_stage_duration_seconds histogram' in lines
+    assert 'grubhub_dl_extraction_failures_total{field="say \\"hi\\"\\n"} 1' in lines
+    assert 'grubhub_dl_stage_duration_seconds_bucket{stage="extract",le="0.1"} 0' in lines
+    assert 'grubhub_dl_stage_duration_seconds_bucket{stage="extract",le="0.5"} 1' in lines
+    assert 'grubhub_dl_stage_duration_seconds_bucket{stage="extract",le="+Inf"} 2' in lines
+    assert 'grubhub_dl_stage_duration_seconds_count{stage="extract"} 2' in lines
+    assert 'grubhub_dl_stage_duration_seconds_sum{stage="extract"} 7.2' in lines
+    assert not any(line.startswith('# TYPE grubhub_dl_emails_fetched') for line in lines)
+    assert '# EOF' not in lines
+
+
+def test_histograms_only_keep_bucket_counts():
+    for _ in range(1000):
+        metrics.observe('grubhub_dl_stage_duration_seconds', 0.5, stage='extract')
+    metrics.observe('grubhub_dl_stage_duration_seconds', 5000, stage='extract')
+
+    histogram = metrics.value('grubhub_dl_stage_duration_seconds', stage='extract')
+
+    assert len(histogram.counts) == len(metrics.DURATION_BUCKETS) + 1
+    assert histogram.counts[metrics.DURATION_BUCKETS.index(0.5)] == 1000
+    assert histogram.counts[-1] == 1
+    assert histogram.count == 1001
+    assert histogram.sum == 5500
+
+
+def test_extraction_is_counted(tmp_path):
+    emails = [corpus_email.email for corpus_email in generate_every_variant()]
+
+    process.extract_data_from_emails(models.Parameters(), emails)
+    metrics.write_textfile(str(tmp_path), succeeded=True)
+
+    assert metrics.value(
+        'grubhub_dl_emails_categorized',
+        category='order_confirmation'
+    ) >= 2
+    assert metrics.value(
+        'grubhub_dl_extractor_strategies',
+        extractor='orders.extract_order_total',
+        strategy='1',
+        result='ok'
+    )
+    assert metrics.value('grubhub_dl_stage_duration_seconds', stage='extract').count == 1
+    assert os.listdir(tmp_path) == [metrics.METRICS_FILE_NAME]
+    text = (tmp_path / metrics.METRICS_FILE_NAME).read_text()
+    assert 'grubhub_dl_last_run_success 1\n' in text
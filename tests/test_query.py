@@ -0,0 +1,110 @@
+"""Tests that ``grubhub-dl query`` gives the same results from each source, with
+timestamps that can be used in date functions.
+"""
+
+import json
+from collections import Counter
+
+import pytest
+
+from grubhub_dl import models, process
+from grubhub_dl.emails import cache
+from grubhub_dl.export import sqlite
+from tools.corpus import generate_emails
+
+pytest.importorskip('duckdb')
+query = pytest.importorskip('grubhub_dl.query')
+
+MONTHLY_ORDERS = '''
+SELECT strftime(date_trunc('month', sent_at), '%Y-%m') AS month, count(*) AS orders
+FROM reconciled_orders
+GROUP BY ALL
+ORDER BY month
+'''
+
+
+@pytest.fixture(scope='module')
+def grubhub_data():
+    return process.extract_data_from_emails(models.Parameters(), generate_corpus())
+
+
+def generate_corpus() -> list[models.EmailMessage]:
+    return [corpus_email.email for corpus_email in generate_emails(60)]
+
+
+def expected_monthly_orders(grubhub_data) -> list[dict]:
+    months = Counter(
+        sent_at.strftime('%Y-%m')
+        for sent_at in grubhub_data['reconciled_orders'].column('sent_at')
+    )
+    return [{'month': month, 'orders': count} for month, count in sorted(months.items())]
+
+
+def run_query(capsys, sql: str, *args: str) -> list[dict]:
+    capsys.readouterr()
+    query.main([sql, '--format', 'json', *args])
+    return [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+
+@pytest.mark.parametrize('datetime_format', [None, '%d %b %Y %H:%M:%S'])
+def test_query_sqlite(tmp_path, capsys, grubhub_data, datetime_format):
+    sqlite_path = str(tmp_path / 'grubhub.sqlite')
+    sqlite.grubhub_data_to_sqlite(
+        models.Parameters(sqlite_path=sqlite_path, datetime_format=datetime_format),
+        grubhub_data
+    )
+    # SQLite timestamps are ISO 8601 regardless of the export's datetime format
+    args = ['--from', 'sqlite', '--sqlite-path', sqlite_path]
+
+    assert run_query(capsys, MONTHLY_ORDERS, *args) == (
+        expected_monthly_orders(grubhub_data)
+    )
+    assert run_query(
+        capsys,
+        "SELECT typeof(sent_at) AS type FROM orders LIMIT 1",
+        *args
+    ) == [{'type': 'TIMESTAMP'}]
+
+
+def test_query_cache(tmp_path, capsys, grubhub_data, monkeypatch):
+    params = models.Parameters(cache_dir=str(tmp_path / 'cache'))
+    corpus = generate_corpus()
+    cache.emails_to_json_files(params, corpus[:40])
+    args = ['--from', 'cache', '--cache-dir', params.cache_dir]
+    extract_data_from_emails = process.extract_data_from_emails
+    extracted = []
+
+    def count_extracted_emails(params, emails):
+        extracted.append(len(emails))
+        return extract_data_from_emails(params, emails)
+
+    monkeypatch.setattr(process, 'extract_data_from_emails', count_extracted_emails)
+
+    first_result = run_query(capsys, MONTHLY_ORDERS, *args)
+    # The tables are loaded from the snapshot until emails are added to the cache
+    assert run_query(capsys, MONTHLY_ORDERS, *args) == first_result
+    assert extracted == [40]
+
+    cache.emails_to_json_files(params, corpus[40:])
+    assert run_query(capsys, MONTHLY_ORDERS, *args) == (
+        expected_monthly_orders(grubhub_data)
+    )
+    assert run_query(capsys, MONTHLY_ORDERS, *args) == (
+        expected_monthly_orders(grubhub_data)
+    )
+    assert extracted == [40, 60]
+
+
+def test_query_parquet(tmp_path, capsys, grubhub_data):
+    parquet = pytest.importorskip('grubhub_dl.export.parquet')
+    output_path = str(tmp_path / 'parquet')
+    parquet.grubhub_data_to_parquet(
+        models.Parameters(output_path=output_path),
+        grubhub_data
+    )
+
+    assert run_query(
+        capsys,
+        MONTHLY_ORDERS,
+        '--from', 'parquet', '--output-path', output_path
+    ) == expected_monthly_orders(grubhub_data)
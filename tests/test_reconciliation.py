@@ -0,0 +1,158 @@
+"""Tests reconciling orders with their updates and cancellations, within one extraction
+and across runs.
+"""
+
+import logging
+from datetime import datetime, timedelta, timezone
+
+from grubhub_dl import models, process, reconciliation
+
+SENT_AT = datetime(2024, 6, 4, 22, 30, tzinfo=timezone.utc)
+
+
+def make_data(
+    orders: list = (),
+    order_updates: list = (),
+    order_cancellations: list = ()
+) -> dict[str, models.RecordBatch]:
+    grubhub_data = {
+        name: models.RecordBatch(record_type)
+        for name, record_type in models.GRUBHUB_TABLES.items()
+    }
+    grubhub_data['orders'].extend(orders)
+    grubhub_data['order_updates'].extend(order_updates)
+    grubhub_data['order_cancellations'].extend(order_cancellations)
+    return grubhub_data
+
+
+def order(order_number: str, **fields) -> models.Order:
+    return models.Order(
+        email_id=f'order-{order_number}',
+        sent_at=SENT_AT,
+        order_number=order_number,
+        **fields
+    )
+
+
+def update(email_id: str, order_number: str, days: int = 1, **fields):
+    return models.OrderUpdate(
+        email_id=email_id,
+        sent_at=SENT_AT + timedelta(days=days),
+        order_number=order_number,
+        **fields
+    )
+
+
+def cancellation(email_id: str, order_number: str, **fields):
+    return models.OrderCancellation(
+        email_id=email_id,
+        sent_at=SENT_AT + timedelta(days=1),
+        order_number=order_number,
+        **fields
+    )
+
+
+def reconciled_by_number(grubhub_data: dict) -> dict[str, models.ReconciledOrder]:
+    return {
+        reconciled.order_number: reconciled
+        for reconciled in grubhub_data['reconciled_orders']
+    }
+
+
+def test_reconcile_orders_totals():
+    grubhub_data = make_data(
+        orders=[
+            order('1', order_total=3000, order_delivery_tip=500),
+            order('2', order_total=2000),
+            order('3'),
+        ],
+        order_updates=[
+            update('u2', '1', days=2, refund_amount=250, tip_adjusted_amount=800),
+            update('u1', '1', days=1, refund_amount=100, tip_adjusted_amount=700),
+        ],
+        order_cancellations=[cancellation('c1', '2', amount=2000)],
+    )
+
+    unmatched = process.reconcile_orders(grubhub_data)
+    reconciled = reconciled_by_number(grubhub_data)
+
+    assert unmatched == {'order_updates': [], 'order_cancellations': []}
+    assert reconciled['1'].refunded_amount == 350
+    assert reconciled['1'].net_paid == 2650
+    # The tip of the latest update replaces the original tip
+    assert reconciled['1'].tip_adjusted_amount == 800
+    assert reconciled['1'].tip_adjusted_total == 2650 + 800 - 500
+    assert reconciled['1'].update_email_ids == ['u1', 'u2']
+    assert reconciled['1'].is_canceled is False
+    assert reconciled['2'].is_canceled is True
+    assert reconciled['2'].cancellation_email_id == 'c1'
+    assert reconciled['2'].net_paid == 0
+    assert reconciled['3'].net_paid is None
+    assert reconciled['3'].refunded_amount == 0
+
+
+def test_reconcile_orders_reports_unknown_orders(caplog):
+    grubhub_data = make_data(
+        orders=[order('1', order_total=1000), order('1', order_total=1000)],
+        order_updates=[update('u1', '9', refund_amount=100)],
+        order_cancellations=[cancellation('c1', '8'), cancellation('c2', '8')],
+    )
+
+    with caplog.at_level(logging.WARNING):
+        unmatched = process.reconcile_orders(grubhub_data)
+
+    assert unmatched == {'order_updates': ['u1'], 'order_cancellations': ['c1', 'c2']}
+    assert len(grubhub_data['reconciled_orders']) == 1
+    assert 'Found 1 order_updates that reference an unknown order' in caplog.messages
+
+
+def test_updates_are_reconciled_with_orders_from_earlier_runs(tmp_path):
+    params = models.Parameters(cache_dir=str(tmp_path))
+
+    first_run = make_data(
+        orders=[order('1', order_total=3000), order('2', order_total=1000)],
+        order_updates=[update('u1', '1', refund_amount=100)],
+    )
+    reconciliation.reconcile(params, first_run)
+    assert reconciled_by_number(first_run)['1'].net_paid == 2900
+
+    # An update of an earlier order, and an update whose order hasn't been extracted
+    second_run = make_data(
+        order_updates=[
+            update('u2', '1', days=2, refund_amount=500),
+            update('u3', '3', refund_amount=300),
+        ],
+    )
+    unmatched = reconciliation.reconcile(params, second_run)
+    reconciled = reconciled_by_number(second_run)
+    assert list(reconciled) == ['1']
+    assert reconciled['1'].net_paid == 2400
+    assert reconciled['1'].update_email_ids == ['u1', 'u2']
+    assert reconciled['1'].sent_at == SENT_AT
+    assert unmatched['order_updates'] == ['u3']
+
+    # The update that arrived first is reconciled once its order is extracted
+    third_run = make_data(orders=[order('3', order_total=2000)])
+    assert reconciliation.reconcile(params, third_run) == {
+        'order_updates': [],
+        'order_cancellations': [],
+    }
+    assert reconciled_by_number(third_run)['3'].net_paid == 1700
+
+
+def test_records_extracted_again_replace_the_saved_ones(tmp_path):
+    params = models.Parameters(cache_dir=str(tmp_path))
+    reconciliation.reconcile(
+        params,
+        make_data(
+            orders=[order('1', order_total=3000)],
+            order_updates=[update('u1', '1')]
+        )
+    )
+
+    grubhub_data = make_data(order_updates=[update('u1', '1', refund_amount=100)])
+    reconciliation.reconcile(params, grubhub_data)
+
+    reconciled = reconciled_by_number(grubhub_data)['1']
+    assert reconciled.update_email_ids == ['u1']
+    assert reconciled.net_paid == 2900
@@ -0,0 +1,84 @@
+"""Tests that the search index is kept in sync with the cached emails."""
+
+import os
+
+import pytest
+
+from grubhub_dl import models, search
+from grubhub_dl.emails import cache, index
+from tools.corpus import generate_emails
+
+
+@pytest.fixture
+def params(tmp_path):
+    params = models.Parameters(cache_dir=str(tmp_path / 'cache'))
+    cache.emails_to_json_files(
+        params,
+        [corpus_email.email for corpus_email in generate_emails(30)]
+    )
+    return params
+
+
+@pytest.fixture
+def read_files(monkeypatch):
+    """The names of the cache files that are read"""
+
+    read_files = []
+    json_files_to_emails = cache.json_files_to_emails
+
+    def record_read_files(params, file_names=None):
+        read_files.extend(file_names)
+        return json_files_to_emails(params, file_names)
+
+    monkeypatch.setattr(cache, 'json_files_to_emails', record_read_files)
+    return read_files
+
+
+def cache_files(params: models.Parameters) -> set[str]:
+    return {
+        name for name in os.listdir(os.path.join(params.cache_dir, 'emails'))
+        if name.endswith('.json')
+    }
+
+
+def test_emails_are_indexed_when_cached(params, read_files):
+    conn = index.connect(params.cache_dir)
+    try:
+        assert index.indexed_cache_files(conn) == cache_files(params)
+        assert search.sync_index(params, conn) == 0
+    finally:
+        conn.close()
+    assert read_files == []
+
+
+def test_sync_adds_emails_cached_before_the_index(params, read_files):
+    os.remove(os.path.join(params.cache_dir, index.INDEX_FILE_NAME))
+    conn = index.connect(params.cache_dir)
+    try:
+        assert search.sync_index(params, conn) == 30
+        assert search.sync_index(params, conn) == 0
+        assert index.indexed_cache_files(conn) == cache_files(params)
+    finally:
+        conn.close()
+    assert len(read_files) == 30
+
+
+def test_sync_follows_renamed_and_removed_cache_files(params, read_files):
+    email_file_dir = os.path.join(params.cache_dir, 'emails')
+    renamed, removed = sorted(cache_files(params))[:2]
+    os.rename(
+        os.path.join(email_file_dir, renamed),
+        os.path.join(email_file_dir, f'renamed_{renamed}')
+    )
+    os.remove(os.path.join(email_file_dir, removed))
+
+    conn = index.connect(params.cache_dir)
+    try:
+        assert search.sync_index(params, conn) == 0
+        assert index.indexed_cache_files(conn) == cache_files(params)
+        assert conn.execute('SELECT count(*) FROM indexed_emails').fetchone() == (29,)
+        assert search.sync_index(params, conn) == 0
+    finally:
+        conn.close()
+    # Only the renamed file is read, and only once
+    assert read_files == [f'renamed_{renamed}']
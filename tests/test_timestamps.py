@@ -0,0 +1,114 @@
+"""Tests parsing timestamps in each format that Grubhub emails use, and normalizing them
+to UTC.
+"""
+
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from grubhub_dl.timestamps import (
+    parse_timestamp,
+    format_timestamp,
+    to_utc,
+    TEMPLATE_EMAIL_DATE_HEADER,
+    TEMPLATE_ORDERED_AT,
+    TEMPLATE_CREDIT_DISCOUNTED,
+)
+
+EDT = timezone(timedelta(hours=-4))
+
+
+@pytest.mark.parametrize('value, template, expected', [
+    (
+        'Tue, 04 Jun 2024 18:30:00 -0400',
+        TEMPLATE_EMAIL_DATE_HEADER,
+        datetime(2024, 6, 4, 22, 30, tzinfo=timezone.utc),
+    ),
+    (
+        'Tue, 04 Jun 2024 22:30:00 +0000 (UTC)',
+        TEMPLATE_EMAIL_DATE_HEADER,
+        datetime(2024, 6, 4, 22, 30, tzinfo=timezone.utc),
+    ),
+    (
+        'Wed, 01 Jan 2025 01:15:00 +05:30',
+        TEMPLATE_EMAIL_DATE_HEADER,
+        datetime(2024, 12, 31, 19, 45, tzinfo=timezone.utc),
+    ),
+    (
+        'Jun 4, 2024 12:05:09AM',
+        TEMPLATE_ORDERED_AT,
+        datetime(2024, 6, 4, 0, 5, 9, tzinfo=timezone.utc),
+    ),
+    (
+        'Jun 4, 2024 11:59PM EDT',
+        TEMPLATE_CREDIT_DISCOUNTED,
+        datetime(2024, 6, 5, 3, 59, tzinfo=timezone.utc),
+    ),
+    (
+        'Jun 4, 2024 11:59PM Eastern Daylight Time',
+        TEMPLATE_CREDIT_DISCOUNTED,
+        datetime(2024, 6, 5, 3, 59, tzinfo=timezone.utc),
+    ),
+])
+def test_parse_timestamp(value, template, expected):
+    assert parse_timestamp(value, template, naive_tz=timezone.utc) == expected
+
+
+def test_naive_timestamps_are_in_the_given_timezone():
+    value = parse_timestamp('Jun 4, 2024 08:00:00PM', TEMPLATE_ORDERED_AT, naive_tz=EDT)
+
+    assert value == datetime(2024, 6, 5, 0, 0, tzinfo=timezone.utc)
+
+
+def test_naive_timestamps_follow_the_system_timezone(monkeypatch):
+    value = 'Jun 4, 2024 08:00:00PM'
+    monkeypatch.setenv('TZ', 'UTC')
+    time.tzset()
+    try:
+        assert parse_timestamp(value, TEMPLATE_ORDERED_AT) == (
+            datetime(2024, 6, 4, 20, 0, tzinfo=timezone.utc)
+        )
+        # Parsing the same string again isn't answered from the memoized result
+        monkeypatch.setenv('TZ', 'America/New_York')
+        time.tzset()
+        assert parse_timestamp(value, TEMPLATE_ORDERED_AT) == (
+            datetime(2024, 6, 5, 0, 0, tzinfo=timezone.utc)
+        )
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+
+
+def test_parse_timestamp_errors():
+    with pytest.raises(ValueError):
+        parse_timestamp('yesterday', TEMPLATE_ORDERED_AT)
+    with pytest.raises(ValueError):
+        parse_timestamp('Jun 4, 2024 11:59PM XYZ', TEMPLATE_CREDIT_DISCOUNTED)
+
+
+def test_unsupported_directives_fall_back_to_strptime():
+    assert parse_timestamp('2024-156 10:00', '%Y-%j %H:%M', naive_tz=timezone.utc) == (
+        datetime(2024, 6, 4, 10, 0, tzinfo=timezone.utc)
+    )
+
+
+def test_to_utc():
+    aware = datetime(2024, 6, 4, 18, 30, tzinfo=EDT)
+    naive = datetime(2024, 6, 4, 18, 30)
+
+    assert to_utc(aware) == datetime(2024, 6, 4, 22, 30, tzinfo=timezone.utc)
+    assert to_utc(aware, naive_tz=timezone.utc).tzinfo == timezone.utc
+    assert to_utc(naive, naive_tz=EDT) == datetime(2024, 6, 4, 22, 30, tzinfo=timezone.utc)
+    assert to_utc(naive) == naive.astimezone().astimezone(timezone.utc)
+
+
+def test_format_timestamp():
+    value = datetime(2024, 6, 4, 22, 30, 0, 1500, tzinfo=timezone.utc)
+
+    assert format_timestamp(value, '%Y-%m-%dT%H:%M:%S.%f') == (
+        '2024-06-04T22:30:00.001500'
+    )
+    assert format_timestamp(value, '%Y-%m-%dT%H:%M:%S') == '2024-06-04T22:30:00'
+    assert format_timestamp(value, '%d/%m/%Y') == '04/06/2024'
+    assert format_timestamp(None, '%d/%m/%Y') is None
@@ -0,0 +1,42 @@
+"""Tests that extraction is traced as a Chrome trace, and isn't traced by default."""
+
+import json
+
+import pytest
+
+from grubhub_dl import models, tracing
+from tools.corpus import generate_every_variant
+
+process = pytest.importorskip('grubhub_dl.process')
+
+
+def test_spans_are_not_recorded_by_default():
+    assert not tracing.is_enabled()
+    assert tracing.span('process.extract_email') is tracing.NULL_SPAN
+
+
+def test_extraction_is_traced(tmp_path):
+    trace_file = tmp_path / 'trace.json'
+    emails = [corpus_email.email for corpus_email in generate_every_variant()]
+
+    tracing.start()
+    try:
+        process.extract_data_from_emails(models.Parameters(), emails)
+        with pytest.raises(ValueError):
+            with tracing.span('test.failure', detail='x'):
+                raise ValueError
+    finally:
+        tracing.stop(str(trace_file))
+
+    assert not tracing.is_enabled()
+    events = json.loads(trace_file.read_text())['traceEvents']
+    spans = {event['name']: event for event in events if event['ph'] == 'X'}
+    assert 'process.extract_data_from_emails' in spans
+    assert 'process.reconcile_orders' in spans
+    assert 'orders.parse_html' in spans
+    assert 'orders.extract_order_total #1' in spans
+    assert spans['process.extract_email']['args']['category']
+    assert spans['test.failure']['cat'] == 'test'
+    assert spans['test.failure']['args'] == {'detail': 'x', 'error': 'ValueError'}
+    assert all(event['dur'] >= 0 for event in spans.values())
+    assert any(event['ph'] == 'M' for event in events)
@@ -0,0 +1,142 @@
+"""Tests that ``watch`` only exports new emails, and reconciles them with the orders that
+were exported before, as if every email had been exported at once.
+"""
+
+import sqlite3
+
+import pytest
+
+from grubhub_dl import models, process, watch
+from grubhub_dl.emails import cache
+from tools.corpus import generate_emails
+from tools.fake_gmail import FakeGmail, build_service
+
+RECONCILED_FIELDS = ['order_number', 'refunded_amount', 'net_paid', 'is_canceled']
+
+
+@pytest.fixture
+def corpus():
+    return [corpus_email.email for corpus_email in generate_emails(60)]
+
+
+def get_params(tmp_path, source: models.Source) -> models.Parameters:
+    return models.Parameters(
+        source=source,
+        destination=[models.Destination.sqlite],
+        sqlite_path=str(tmp_path / 'grubhub.sqlite'),
+        cache_dir=str(tmp_path / 'cache'),
+    )
+
+
+def exported_reconciled_orders(params: models.Parameters) -> set[tuple]:
+    conn = sqlite3.connect(params.sqlite_path)
+    try:
+        return set(conn.execute(
+            f'SELECT {", ".join(RECONCILED_FIELDS)} FROM reconciled_orders'
+        ))
+    finally:
+        conn.close()
+
+
+def fail_first_export(monkeypatch) -> list[tuple]:
+    """Make the first export raise an error, and record the arguments of every export"""
+
+    export_grubhub_data = watch.export_grubhub_data
+    calls = []
+
+    def fail_once(*args):
+        calls.append(args)
+        if len(calls) == 1:
+            raise sqlite3.OperationalError('database is locked')
+        return export_grubhub_data(*args)
+
+    monkeypatch.setattr(watch, 'export_grubhub_data', fail_once)
+    return calls
+
+
+def use_fake_gmail(monkeypatch, fake_gmail: FakeGmail):
+    gmail = pytest.importorskip('grubhub_dl.emails.gmail')
+    monkeypatch.setattr(
+        gmail,
+        'get_gmail_service',
+        lambda params: build_service(fake_gmail)
+    )
+
+
+def exported_email_count(params: models.Parameters) -> int:
+    conn = sqlite3.connect(params.sqlite_path)
+    try:
+        return conn.execute('SELECT count(*) FROM emails').fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_cache_source_exports_new_emails(tmp_path, corpus):
+    params = get_params(tmp_path, models.Source.cache)
+    cache.emails_to_json_files(params, corpus[:40])
+    watcher = watch.Watcher(params, watch.CacheSource(params))
+
+    assert watcher.poll() == 40
+    assert watcher.poll() == 0
+    cache.emails_to_json_files(params, corpus[40:])
+    assert watcher.poll() == 20
+
+    expected = process.extract_data_from_emails(params, cache.json_files_to_emails(params))
+    reconciled = expected['reconciled_orders']
+    assert any(reconciled.column('refunded_amount'))
+    assert exported_reconciled_orders(params) == set(
+        zip(*(
+            [int(value) if isinstance(value, bool) else value for value in column]
+            for column in map(reconciled.column, RECONCILED_FIELDS)
+        ))
+    )
+
+
+def test_failed_exports_are_retried(tmp_path, corpus, monkeypatch, caplog):
+    params = get_params(tmp_path, models.Source.cache)
+    cache.emails_to_json_files(params, corpus[:40])
+    watcher = watch.Watcher(params, watch.CacheSource(params))
+    calls = fail_first_export(monkeypatch)
+
+    assert watcher.poll() == 0
+    assert 'Unable to export to sqlite, trying again later' in caplog.text
+    assert watcher.poll() == 40
+    assert watcher.poll() == 0
+    assert len(calls) == 2
+    assert exported_email_count(params) == 40
+
+
+def test_gmail_source_polls_history(tmp_path, corpus, monkeypatch):
+    params = get_params(tmp_path, models.Source.gmail)
+    # Emails that were cached by an earlier run aren't downloaded again
+    cache.emails_to_json_files(params, corpus[:30])
+    fake_gmail = FakeGmail(corpus[:40])
+    use_fake_gmail(monkeypatch, fake_gmail)
+    watcher = watch.Watcher(params, watch.GmailSource(params))
+
+    assert watcher.poll() == 40
+    assert watcher.poll() == 0
+    assert fake_gmail.stats['messages.list'] == 1
+    assert fake_gmail.stats['messages.get'] == 10
+    assert fake_gmail.stats['history.list'] == 1
+
+    for email in corpus[40:]:
+        fake_gmail.add_email(email)
+    assert watcher.poll() == 20
+    assert fake_gmail.stats['messages.list'] == 2
+    assert fake_gmail.stats['messages.get'] == 30
+    assert len(cache.json_files_to_emails(params)) == 60
+
+
+def test_gmail_source_retries_failed_exports(tmp_path, corpus, monkeypatch):
+    params = get_params(tmp_path, models.Source.gmail)
+    cache.emails_to_json_files(params, corpus[:30])
+    fake_gmail = FakeGmail(corpus[:40])
+    use_fake_gmail(monkeypatch, fake_gmail)
+    watcher = watch.Watcher(params, watch.GmailSource(params))
+    fail_first_export(monkeypatch)
+
+    assert watcher.poll() == 0
+    assert watcher.poll() == 40
+    assert watcher.poll() == 0
+    assert exported_email_count(params) == 40
@@ -0,0 +1,385 @@
+"""Benchmark each stage of the extraction pipeline on a synthetic email corpus.
+
+The corpus is generated with ``tools.corpus``, and each stage is timed on its own: loading
+the cache, categorizing the emails, each extractor, cleaning the records, reconciling the
+orders, and each file exporter. The throughput and the peak memory allocated by each
+stage are printed, and can be saved as JSON to compare against later runs.
+
+Example
+=======
+.. code-block:: bash
+
+    python -m tools.benchmark --count 100000 --output baseline.json
+    # ... make some changes ...
+    python -m tools.benchmark --count 100000 --compare baseline.json
+
+"""
+
+import gc
+import os
+import sys
+import copy
+import json
+import time
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+import importlib
+import subprocess
+import tracemalloc
+import typing as t
+from dataclasses import dataclass, replace
+from datetime import datetime, timezone
+
+from grubhub_dl import models, process, timestamps, DEFAULT_DATETIME_FORMAT
+from grubhub_dl.emails import cache
+from grubhub_dl.extractors import cancellations, credits, orders, updates
+from tools.corpus import DEFAULT_SEED, generate_emails
+
+RESULTS_VERSION = 1
+
+# The extractors that ``process.extract_data_from_emails`` applies to every email
+EXTRACTORS = {
+    'extract_order_confirmation': orders.extract_order_confirmation,
+    'extract_order_items': orders.extract_order_items,
+    'extract_order_updates': updates.extract_order_updates,
+    'extract_order_cancellation': cancellations.extract_order_cancellation,
+    'extract_credit_dollars_off': credits.extract_credit_dollars_off,
+    'extract_credit_guarantee_perk': credits.extract_credit_guarantee_perk,
+    'extract_credit_discounted': credits.extract_credit_discounted,
+}
+
+# The file exporters that are benchmarked, as (module, function). Exporters whose
+# dependencies aren't installed are skipped.
+EXPORTERS = {
+    'export_json_file': ('grubhub_dl.export.jsonl', 'grubhub_data_to_json_file'),
+    'export_csv_file': ('grubhub_dl.export.csv_file', 'grubhub_data_to_csv_file'),
+    'export_sqlite': ('grubhub_dl.export.sqlite', 'grubhub_data_to_sqlite'),
+    'export_parquet_file': ('grubhub_dl.export.parquet', 'grubhub_data_to_parquet'),
+    'export_excel_file': ('grubhub_dl.export.excel', 'grubhub_data_to_excel_file'),
+}
+
+
+@dataclass
+class Stage:
+    """A stage of the pipeline
+
+    ``prepare`` returns the arguments of ``run``, and isn't timed. It's called before
+    every run, since some stages change their inputs.
+    """
+    name: str
+    prepare: t.Callable[[], tuple]
+    run: t.Callable
+    items: int
+
+
+@dataclass
+class StageResult:
+    seconds: float
+    items: int
+    items_per_second: float
+    peak_memory_bytes: int | None
+
+
+def clear_caches():
+    """Clear the caches that would make repeated runs faster than the first one"""
+
+    orders.get_soup.cache_clear()
+    timestamps.parse_datetime.cache_clear()
+
+
+def measure(stage: Stage, repeat: int, trace_memory: bool) -> StageResult:
+    """Run the stage ``repeat`` times and keep the fastest time, then run it once more
+    with ``tracemalloc`` to get the peak memory that it allocated
+    """
+
+    seconds = float('inf')
+    for _ in range(repeat):
+        args = stage.prepare()
+        clear_caches()
+        gc.collect()
+        started_at = time.perf_counter()
+        stage.run(*args)
+        seconds = min(seconds, time.perf_counter() - started_at)
+
+    peak_memory = None
+    if trace_memory:
+        args = stage.prepare()
+        clear_caches()
+        gc.collect()
+        tracemalloc.start()
+        try:
+            stage.run(*args)
+            peak_memory = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    return StageResult(
+        seconds=seconds,
+        items=stage.items,
+        items_per_second=stage.items / seconds if seconds else 0,
+        peak_memory_bytes=peak_memory,
+    )
+
+
+def fresh_emails(emails: list[models.EmailMessage]) -> list[models.EmailMessage]:
+    """Copy the emails, without their categories"""
+
+    return [replace(email, category=None) for email in emails]
+
+
+def build_stages(params: models.Parameters, count: int, work_dir: str) -> list[Stage]:
+    """Build the stages of the pipeline, and the inputs that each one needs"""
+
+    emails = cache.json_files_to_emails(params)
+    categorized = [process.categorize_email(email) for email in fresh_emails(emails)]
+
+    extracted = []
+    for email in categorized:
+        for extractor in EXTRACTORS.values():
+            record = extractor(email)
+            if record and not isinstance(record, list):
+                extracted.append(record)
+
+    grubhub_data = process.extract_data_from_emails(params, fresh_emails(emails))
+    record_count = sum(len(batch) for batch in grubhub_data.values())
+
+    def run_extractor(extractor, emails):
+        for email in emails:
+            extractor(email)
+
+    def clean(records):
+        for record in records:
+            process.clean_dataclass_fields(params, record)
+
+    def prepare_reconcile():
+        data = dict(grubhub_data)
+        data['reconciled_orders'] = models.RecordBatch(models.ReconciledOrder)
+        return (data,)
+
+    stages = [
+        Stage('cache_load', lambda: (params,), cache.json_files_to_emails, count),
+        Stage(
+            'categorize',
+            lambda: (fresh_emails(emails),),
+            lambda emails: [process.categorize_email(email) for email in emails],
+            count
+        ),
+    ]
+    stages += [
+        Stage(
+            name,
+            lambda extractor=extractor: (extractor, categorized),
+            run_extractor,
+            count
+        )
+        for name, extractor in EXTRACTORS.items()
+    ]
+    stages += [
+        Stage(
+            'clean',
+            lambda: ([copy.copy(record) for record in extracted],),
+            clean,
+            len(extracted)
+        ),
+        Stage('reconcile', prepare_reconcile, process.reconcile_orders, count),
+        Stage(
+            'extract_data_from_emails',
+            lambda: (params, fresh_emails(emails)),
+            process.extract_data_from_emails,
+            count
+        ),
+    ]
+
+    for name, (module_name, function_name) in EXPORTERS.items():
+        try:
+            exporter = getattr(importlib.import_module(module_name), function_name)
+        except ImportError as err:
+            logging.warning('Skipping %s: %s', name, err)
+            continue
+
+        def prepare_export(name=name):
+            output_path = os.path.join(work_dir, name)
+            shutil.rmtree(output_path, ignore_errors=True)
+            export_params = copy.copy(params)
+            export_params.output_path = output_path
+            export_params.sqlite_path = os.path.join(output_path, 'grubhub_data.sqlite')
+            export_params.full_export = True
+            os.makedirs(output_path)
+            return (export_params, grubhub_data)
+
+        stages.append(Stage(name, prepare_export, exporter, record_count))
+
+    return stages
+
+
+def get_metadata(namespace: argparse.Namespace) -> dict:
+    """Describe the run, so that results from different runs can be compared"""
+
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        'version': RESULTS_VERSION,
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'count': namespace.count,
+        'seed': namespace.seed,
+        'repeat': namespace.repeat,
+    }
+
+
+def format_memory(value: int | None) -> str:
+    return '' if value is None else f'{value / 2**20:,.1f} MiB'
+
+
+def print_results(results: dict[str, StageResult], baseline: dict = None):
+    """Print the results, and how they compare to the baseline results"""
+
+    header = f'{"stage":<30} {"seconds":>10} {"items/s":>12} {"peak memory":>14}'
+    if baseline:
+        header += f' {"time":>9} {"memory":>9}'
+    print(header)
+    print('-' * len(header))
+    for name, result in results.items():
+        line = (
+            f'{name:<30} {result.seconds:>10.3f} {result.items_per_second:>12,.0f} '
+            f'{format_memory(result.peak_memory_bytes):>14}'
+        )
+        if baseline and name in baseline:
+            line += f' {change(baseline[name]["seconds"], result.seconds):>9}'
+            line += (
+                f' {change(baseline[name]["peak_memory_bytes"], result.peak_memory_bytes):>9}'
+            )
+        print(line)
+
+
+def change(before: float | None, after: float | None) -> str:
+    if not before or after is None:
+        return ''
+    return f'{(after - before) / before:+.1%}'
+
+
+def regressions(
+    results: dict[str, StageResult],
+    baseline: dict,
+    threshold: float
+) -> list[str]:
+    """Get the stages that are slower than in the baseline by more than ``threshold``
+    """
+
+    return [
+        name
+        for name, result in results.items()
+        if name in baseline
+        and baseline[name]['seconds']
+        and (result.seconds - baseline[name]['seconds']) / baseline[name]['seconds']
+            > threshold
+    ]
+
+
+def get_arguments(args: list = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description='Benchmark each stage of the extraction pipeline'
+    )
+    parser.add_argument('--count', type=int, default=10000, help='The number of emails')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument(
+        '--repeat',
+        type=int,
+        default=1,
+        help='Run each stage this many times, and keep the fastest time'
+    )
+    parser.add_argument(
+        '--stage',
+        action='append',
+        help='Only run the stages whose name starts with this (can be repeated)'
+    )
+    parser.add_argument(
+        '--no-memory',
+        action='store_true',
+        help=("Don't measure the peak memory of each stage (which runs each stage "
+              "again, several times slower)")
+    )
+    parser.add_argument('--output', help='Save the results to this JSON file')
+    parser.add_argument('--compare', help='Compare the results to this JSON file')
+    parser.add_argument(
+        '--threshold',
+        type=float,
+        default=0.2,
+        help=('Exit with an error if a stage is slower than in --compare by more than '
+              'this fraction (default: 0.2)')
+    )
+    parser.add_argument('--verbose', action='store_true')
+    return parser.parse_args(args)
+
+
+def main(args: list = None):
+    namespace = get_arguments(args)
+    logging.basicConfig(level=logging.DEBUG if namespace.verbose else logging.WARNING)
+
+    baseline = None
+    if namespace.compare:
+        with open(namespace.compare, encoding='utf-8') as file:
+            baseline = json.load(file)['stages']
+
+    with tempfile.TemporaryDirectory(prefix='grubhub-dl-benchmark-') as work_dir:
+        params = models.Parameters(
+            source=models.Source.cache,
+            cache_dir=os.path.join(work_dir, 'cache'),
+            datetime_format=DEFAULT_DATETIME_FORMAT,
+            compression=models.Compression.none,
+        )
+        print(f'Generating {namespace.count:,} emails...', file=sys.stderr)
+        cache.emails_to_json_files(
+            params,
+            [
+                corpus_email.email
+                for corpus_email in generate_emails(namespace.count, namespace.seed)
+            ]
+        )
+        stages = build_stages(params, namespace.count, work_dir)
+
+        results = {}
+        for stage in stages:
+            if namespace.stage and not stage.name.startswith(tuple(namespace.stage)):
+                continue
+            print(f'Running {stage.name}...', file=sys.stderr)
+            results[stage.name] = measure(stage, namespace.repeat, not namespace.no_memory)
+
+    print_results(results, baseline)
+
+    if namespace.output:
+        with open(namespace.output, 'w', encoding='utf-8') as file:
+            json.dump(
+                {
+                    'metadata': get_metadata(namespace),
+                    'stages': {
+                        name: vars(result) for name, result in results.items()
+                    },
+                },
+                file,
+                indent=2
+            )
+
+    if baseline:
+        slower = regressions(results, baseline, namespace.threshold)
+        if slower:
+            print(f'Slower than the baseline: {", ".join(slower)}', file=sys.stderr)
+            exit(1)
+
+
+if __name__ == '__main__':
+    main()
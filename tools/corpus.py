@@ -0,0 +1,657 @@
+"""Generate a synthetic corpus of Grubhub emails, for benchmarks and tests.
+
+Every ``EmailCategory`` is generated, in each of the email body layouts that the
+extractors in ``grubhub_dl.extractors`` know about. Each email comes with the records that
+should be extracted from it, so the corpus can also be used to check the extractors.
+
+The corpus is generated from a seed, so the same seed always produces the same emails.
+Emails are generated one at a time, so corpora of 100k+ emails don't have to fit in
+memory.
+
+Example
+=======
+.. code-block:: bash
+
+    # Cache 100,000 emails, which can then be extracted with --source cache
+    python -m tools.corpus --count 100000 --cache-dir /tmp/grubhub-corpus
+
+"""
+
+import random
+import argparse
+import typing as t
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+
+from grubhub_dl import models
+from grubhub_dl.timestamps import to_utc
+
+SENT_BY = 'Grubhub <orders@eat.grubhub.com>'
+DEFAULT_SEED = 0
+DEFAULT_START = datetime(2019, 1, 1, tzinfo=timezone.utc)
+
+# Restaurants and their menus (item name, price in cents). Item names and options are
+# kept clear of the words the order summary is searched for (eg "tip", "fee" and "tax").
+RESTAURANTS = {
+    'Thai Basil': [
+        ('Pad Thai', 1295), ('Pad See Ew', 1395), ('Green Curry', 1495),
+        ('Spring Rolls', 595), ('Tom Yum Soup', 695), ('Mango Sticky Rice', 750),
+    ],
+    'Luigi\'s Pizzeria': [
+        ('Large Cheese Pizza', 1899), ('Pepperoni Slice', 399), ('Garlic Knots', 599),
+        ('Caesar Salad', 899), ('Chicken Parm Hero', 1249), ('Cannoli', 450),
+    ],
+    'Golden Dragon': [
+        ('General Tso\'s Chicken', 1395), ('Beef Lo Mein', 1195), ('Pork Dumplings', 795),
+        ('Hot and Sour Soup', 495), ('Vegetable Fried Rice', 995),
+    ],
+    'Taqueria El Sol': [
+        ('Carnitas Burrito', 1150), ('Al Pastor Tacos', 995), ('Chips and Guacamole', 650),
+        ('Horchata', 350), ('Chicken Quesadilla', 1050),
+    ],
+    'Bombay Kitchen': [
+        ('Chicken Tikka Masala', 1695), ('Garlic Naan', 395), ('Saag Paneer', 1495),
+        ('Vegetable Samosas', 695), ('Mango Lassi', 495),
+    ],
+    'Burger Barn': [
+        ('Double Cheeseburger', 1095), ('Onion Rings', 495), ('Chocolate Shake', 595),
+        ('Crispy Chicken Sandwich', 995), ('Sweet Potato Fries', 450),
+    ],
+    'Sakura Sushi': [
+        ('Spicy Tuna Roll', 895), ('Salmon Nigiri', 695), ('Dragon Roll', 1495),
+        ('Miso Soup', 350), ('Chicken Teriyaki Bento', 1595),
+    ],
+    'Pho Saigon': [
+        ('Pho Dac Biet', 1450), ('Banh Mi', 895), ('Summer Rolls', 650),
+        ('Vermicelli Bowl', 1295), ('Thai Iced Coffee', 450),
+    ],
+}
+OPTIONS = [
+    'Extra spicy', 'Mild', 'No onions', 'Add chicken', 'Gluten free', 'Large',
+    'Sauce on the side', 'Brown rice',
+]
+FIRST_NAMES = ['Alex', 'Sam', 'Jordan', 'Taylor', 'Casey', 'Morgan', 'Riley', 'Jamie']
+STREETS = ['Main St', 'Oak Ave', 'Maple Dr', 'Broadway', 'Elm St', 'Park Pl']
+CARDS = ['Visa ending in 4242', 'Mastercard ending in 4444', 'Amex ending in 0005']
+UPDATE_REASONS = ['Item unavailable', 'Missing item', 'Incorrect item', 'Late delivery']
+CANCELLATION_REASONS = [
+    'Restaurant closed', 'Restaurant too busy', 'Canceled at your request',
+    'Unable to deliver',
+]
+# How the timezone of an expiration date is written, depending on the platform
+TIMEZONE_NAMES = [('EDT', -4), ('Eastern Daylight Time', -4), ('PST', -8)]
+
+# The relative frequency of each email body layout
+VARIANT_WEIGHTS = {
+    'order_confirmation_v1': 40,
+    'order_confirmation_v2': 20,
+    'order_updated_item_refund': 6,
+    'order_updated_tip_adjustment': 3,
+    'order_canceled_v1': 3,
+    'order_canceled_v2': 2,
+    'credit_dollars_off': 5,
+    'credit_guarantee_perk': 3,
+    'credit_discounted_amount': 3,
+    'credit_discounted_percent': 2,
+    'uncategorized': 13,
+}
+
+# Real emails carry a lot of markup that the extractors have to parse through
+STYLE = '<style>' + ''.join(
+    f'.gh-{i} {{ font-family: Helvetica, Arial, sans-serif; color: #{i:06x}; '
+    f'padding: {i % 12}px; margin: 0; line-height: 1.{i % 10}; }}\n'
+    for i in range(80)
+) + '</style>'
+CELL = '<td style="padding: 4px 8px; font-size: 14px; color: #2e2e2e;" class="gh-cell">'
+TABLE = (
+    '<table role="presentation" cellpadding="0" cellspacing="0" border="0" '
+    'width="100%" style="max-width: 600px;">'
+)
+
+
+@dataclass
+class CorpusEmail:
+    """A generated email, and the records that should be extracted from it
+
+    The expected records are keyed by table name, and are in their cleaned form (eg
+    order numbers are normalized, and timestamps are in UTC). Line items are expected in
+    the ``order_items`` table, as ``LineItem``s.
+    """
+    email: models.EmailMessage
+    variant: str
+    expected: dict[str, list] = field(default_factory=dict)
+
+
+def money(cents: int) -> str:
+    return f'${cents // 100}.{cents % 100:02d}'
+
+
+def cell(text: str) -> str:
+    return f'{CELL}{text}</td>'
+
+
+def row(*cells: str) -> str:
+    return '<tr>' + ''.join(cell(text) for text in cells) + '</tr>'
+
+
+def table(*rows: str) -> str:
+    return TABLE + ''.join(rows) + '</table>'
+
+
+def filler_table(rng: random.Random) -> str:
+    return table(row(rng.choice([
+        'Questions about your order? Visit our help center.',
+        'Download the app to track your order in real time.',
+        'Follow us for deals and updates.',
+        'You are receiving this email because you placed an order.',
+    ])))
+
+
+def html(*tables: str) -> str:
+    return (
+        '<!DOCTYPE html><html><head><meta charset="utf-8">'
+        f'{STYLE}</head><body>{"".join(tables)}</body></html>'
+    )
+
+
+def format_ordered_at(value: datetime) -> str:
+    # TEMPLATE_ORDERED_AT
+    return value.strftime('%b %d, %Y %I:%M:%S%p')
+
+
+def format_expires(value: datetime) -> str:
+    # TEMPLATE_CREDIT_GUARANTEE_PERK (and TEMPLATE_CREDIT_DOLLARS_OFF, after "Expires ")
+    return value.strftime('%B %d, %Y %I:%M%p')
+
+
+class CorpusGenerator:
+    """Generates emails in ``VARIANT_WEIGHTS`` proportions, starting at ``start`` and a
+    few hours apart
+
+    Updates and cancellations refer to orders that were generated before them.
+    """
+
+    def __init__(self, seed: int = DEFAULT_SEED, start: datetime = DEFAULT_START):
+        self.rng = random.Random(seed)
+        self.sent_at = start
+        self.order_numbers = []
+        self.variants = list(VARIANT_WEIGHTS)
+        self.weights = list(VARIANT_WEIGHTS.values())
+
+    def __iter__(self) -> t.Iterator[CorpusEmail]:
+        while True:
+            yield self.generate()
+
+    def generate(self, variant: str = None) -> CorpusEmail:
+        """Generate the next email, in the given layout or a random one"""
+
+        rng = self.rng
+        if variant is None:
+            variant = rng.choices(self.variants, self.weights)[0]
+        if variant.startswith(('order_updated', 'order_canceled')) and not self.order_numbers:
+            variant = 'order_confirmation_v1'
+
+        self.sent_at += timedelta(minutes=rng.randint(30, 600), seconds=rng.randint(0, 59))
+        email = models.EmailMessage(
+            email_id=f'{rng.getrandbits(64):016x}',
+            subject='',
+            sent_by=SENT_BY,
+            sent_at=self.sent_at,
+            body='',
+        )
+        corpus_email = CorpusEmail(email=email, variant=variant)
+        getattr(self, variant)(corpus_email)
+        return corpus_email
+
+    def order_data(self) -> dict:
+        """Generate an order, and remember its number for later updates/cancellations"""
+
+        rng = self.rng
+        restaurant_name = rng.choice(list(RESTAURANTS))
+        line_items = []
+        for menu_item, price in rng.sample(RESTAURANTS[restaurant_name], rng.randint(1, 4)):
+            quantity = rng.choice([1, 1, 1, 2, 3])
+            options = rng.sample(OPTIONS, rng.choice([0, 0, 1, 2]))
+            line_items.append(models.LineItem(
+                item_name=menu_item,
+                quantity=quantity,
+                options='; '.join(options) or None,
+                price=price * quantity,
+            ))
+
+        subtotal = sum(line_item.price for line_item in line_items)
+        free_delivery = rng.random() < 0.3
+        delivery_fee_original = rng.choice([199, 299, 399])
+        delivery_fee = 0 if free_delivery else delivery_fee_original
+        service_fee_original = max(100, subtotal // 10)
+        service_fee = service_fee_original // 2 if rng.random() < 0.2 else service_fee_original
+        sales_tax = subtotal * 8875 // 100000
+        tip = rng.choice([0, 200, 300, 500, subtotal // 5])
+        promo = rng.choice([0, 0, 0, 0, 500])
+        order_number = f'{rng.randint(10**7, 10**8 - 1)}{rng.randint(10**6, 10**7 - 1)}'
+        self.order_numbers.append(order_number)
+        return {
+            'restaurant_name': restaurant_name,
+            'restaurant_phone': f'({rng.randint(200, 999)}) {rng.randint(200, 999)}-'
+                                f'{rng.randint(0, 9999):04d}',
+            'ordered_at': (self.sent_at - timedelta(minutes=rng.randint(0, 2)))
+                          .astimezone(timezone(timedelta(hours=-5)))
+                          .replace(tzinfo=None, microsecond=0),
+            'order_number': order_number,
+            'line_items': line_items,
+            'subtotal': subtotal,
+            'free_delivery': free_delivery,
+            'delivery_fee_original': delivery_fee_original,
+            'delivery_fee': delivery_fee,
+            'service_fee_original': service_fee_original,
+            'service_fee': service_fee,
+            'sales_tax': sales_tax,
+            'tip': tip,
+            'promo': promo,
+            'total': subtotal + delivery_fee + service_fee + sales_tax + tip - promo,
+        }
+
+    def order_confirmation_v1(self, corpus_email: CorpusEmail):
+        """The layout where the whole order is in the second table, one value per cell
+        """
+
+        rng = self.rng
+        data = self.order_data()
+        email = corpus_email.email
+        email.subject = f'Your order from {data["restaurant_name"]}'
+
+        payment_method = f'Payment Method: {rng.choice(CARDS)} {money(data["total"])}'
+        if data['promo']:
+            payment_method = f'Promo code SAVE5 {money(data["promo"])}, ' + payment_method
+        if data['free_delivery']:
+            payment_method = 'GH+ $0 delivery, ' + payment_method
+
+        delivery_fee = money(data['delivery_fee'])
+        if data['free_delivery']:
+            delivery_fee = f'{money(data["delivery_fee_original"])} {delivery_fee}'
+        service_fee = money(data['service_fee'])
+        if data['service_fee'] != data['service_fee_original']:
+            service_fee = f'{money(data["service_fee_original"])} {service_fee}'
+
+        rows = [
+            row('Your order is confirmed'),
+            row(f'Thanks for your order, {rng.choice(FIRST_NAMES)}!'),
+            row(f'{data["restaurant_name"]} is preparing your food.'),
+            row('Estimated arrival', f'{rng.randint(25, 60)} minutes'),
+            row('Track your order'),
+            row('Order summary'),
+            row(data['restaurant_name']),
+            row(f'Total: {money(data["total"])}'),
+            row(f'Ordered: {format_ordered_at(data["ordered_at"])}'),
+            row(f'Order: Delivery  #{data["order_number"]}  '
+                f'Contact: {data["restaurant_phone"]}'),
+            row('Deliver to', f'{rng.randint(1, 999)} {rng.choice(STREETS)}'),
+        ]
+        for line_item in data['line_items']:
+            item_lines = [line_item.item_name] + (line_item.options or '').split('; ')
+            rows.append(row(
+                str(line_item.quantity),
+                '<br>'.join(line for line in item_lines if line),
+                money(line_item.price),
+            ))
+        rows += [
+            row('Items subtotal', money(data['subtotal'])),
+            row('Delivery fee', delivery_fee),
+            row('Service fee', service_fee),
+            row('Sales tax', money(data['sales_tax'])),
+            row('Tip', money(data['tip'])),
+            row('Total', money(data['total'])),
+            row(payment_method),
+        ]
+        email.body = html(table(row('<img src="logo.png" alt="Grubhub">')), table(*rows))
+
+        corpus_email.expected = {
+            'orders': [models.Order(
+                email_id=email.email_id,
+                sent_at=email.sent_at,
+                restaurant_name=data['restaurant_name'],
+                restaurant_phone=data['restaurant_phone'],
+                ordered_at=to_utc(data['ordered_at']),
+                order_number=normalize_order_number(data['order_number']),
+                order_subtotal=data['subtotal'],
+                order_total=data['total'],
+                order_service_fee_original=(
+                    data['service_fee_original']
+                    if data['service_fee'] != data['service_fee_original'] else None
+                ),
+                order_service_fee_actual=data['service_fee'],
+                order_delivery_fee_original=(
+                    data['delivery_fee_original'] if data['free_delivery'] else None
+                ),
+                order_delivery_fee_actual=data['delivery_fee'],
+                order_sales_tax=data['sales_tax'],
+                order_delivery_tip=data['tip'],
+                order_payment_method=payment_method,
+                order_has_free_delivery=True if data['free_delivery'] else None,
+                order_has_promo_code=True if data['promo'] else None,
+            )],
+            'order_items': data['line_items'],
+        }
+
+    def order_confirmation_v2(self, corpus_email: CorpusEmail):
+        """The layout where the order is split across many small tables, and each line
+        item is a single cell like "2x Pad Thai $25.90"
+
+        The extractors don't get the order summary or the payment method from this
+        layout, so they aren't expected.
+        """
+
+        rng = self.rng
+        data = self.order_data()
+        email = corpus_email.email
+        email.subject = f'Thanks for your {data["restaurant_name"]} order!'
+        ordered_at = format_ordered_at(data['ordered_at'])
+        order_number = data['order_number']
+        order_number = f'{order_number[:8]}-{order_number[8:]}'
+
+        item_rows = []
+        for line_item in data['line_items']:
+            options = f'<br>{line_item.options.replace("; ", "<br>")}' if line_item.options else ''
+            item_rows.append(row(
+                f'{line_item.quantity}x {line_item.item_name}{options} '
+                f'{money(line_item.price)}'
+            ))
+
+        tables = [
+            table(row('<img src="logo.png" alt="Grubhub">')),
+            table(row('Thanks for your order!')),
+            filler_table(rng),
+            filler_table(rng),
+            table(row(f'Hi {rng.choice(FIRST_NAMES)}, your order is on its way.')),
+            filler_table(rng),
+            table(row(
+                data['restaurant_name'],
+                f'{rng.randint(1, 999)} {rng.choice(STREETS)}',
+                f'Ordered: {ordered_at}',
+                f'Contact Restaurant: {data["restaurant_phone"]}',
+            )),
+            filler_table(rng),
+            filler_table(rng),
+            filler_table(rng),
+            table(row('Your order')),
+            table(row(f'Order Details {ordered_at} #{order_number}')),
+            table(*item_rows),
+            filler_table(rng),
+            table(
+                row('Items subtotal', money(data['subtotal'])),
+                row('Delivery fee', money(data['delivery_fee'])),
+                row('Service fee', money(data['service_fee'])),
+                row('Sales tax', money(data['sales_tax'])),
+                row('Tip', money(data['tip'])),
+            ),
+            table(row('Total', money(data['total']))),
+        ]
+        email.body = html(*tables)
+
+        corpus_email.expected = {
+            'orders': [models.Order(
+                email_id=email.email_id,
+                sent_at=email.sent_at,
+                restaurant_name=data['restaurant_name'],
+                restaurant_phone=data['restaurant_phone'],
+                ordered_at=to_utc(data['ordered_at']),
+                order_number=normalize_order_number(data['order_number']),
+                order_total=data['total'],
+            )],
+            'order_items': data['line_items'],
+        }
+
+    def order_updated(self, corpus_email: CorpusEmail, adjust_tip: bool):
+        rng = self.rng
+        email = corpus_email.email
+        email.subject = 'Your order was updated'
+        order_number = rng.choice(self.order_numbers[-50:])
+        update = models.OrderUpdate(
+            email_id=email.email_id,
+            sent_at=email.sent_at,
+            order_number=normalize_order_number(order_number),
+        )
+
+        tables = [table(
+            row('Your order was updated'),
+            row(f'Regarding order #{order_number}'),
+        )]
+        refund = 0
+        if adjust_tip:
+            update.tip_adjusted_amount = rng.choice([0, 100, 500, 800])
+            tables.append(table(row('Adjusted tip', money(update.tip_adjusted_amount))))
+        else:
+            for menu_item, price in rng.sample(RESTAURANTS['Thai Basil'], rng.randint(1, 2)):
+                tables.append(table(
+                    row('Item', menu_item),
+                    row('Reason', rng.choice(UPDATE_REASONS)),
+                    row('Refund', money(price)),
+                ))
+                refund += price
+            update.refund_fees_amount = refund * 8875 // 100000
+            refund += update.refund_fees_amount
+            update.refund_amount = refund
+            tables.append(table(
+                row('Fees &amp; taxes', money(update.refund_fees_amount)),
+                row(rng.choice(['Refund total', 'Total refund']), money(refund)),
+            ))
+        tables.append(filler_table(rng))
+        email.body = html(*tables)
+        corpus_email.expected = {'order_updates': [update]}
+
+    def order_updated_item_refund(self, corpus_email: CorpusEmail):
+        self.order_updated(corpus_email, adjust_tip=False)
+
+    def order_updated_tip_adjustment(self, corpus_email: CorpusEmail):
+        self.order_updated(corpus_email, adjust_tip=True)
+
+    def order_canceled(self, corpus_email: CorpusEmail, layout: int):
+        rng = self.rng
+        email = corpus_email.email
+        email.subject = 'Your order was canceled'
+        order_number = rng.choice(self.order_numbers[-50:])
+        cancellation = models.OrderCancellation(
+            email_id=email.email_id,
+            sent_at=email.sent_at,
+            order_number=normalize_order_number(order_number),
+            amount=rng.randint(1000, 8000),
+            reason=rng.choice(CANCELLATION_REASONS),
+        )
+
+        details = [
+            row('Order', order_number),
+            row('Reason', cancellation.reason),
+            row('Refund', money(cancellation.amount)),
+        ]
+        if layout == 1:
+            tables = [filler_table(rng) for _ in range(5)] + [table(*details)]
+        else:
+            tables = [filler_table(rng) for _ in range(3)] + [
+                table(row('Cancellation details'), *details)
+            ]
+        email.body = html(*tables)
+        corpus_email.expected = {'order_cancellations': [cancellation]}
+
+    def order_canceled_v1(self, corpus_email: CorpusEmail):
+        self.order_canceled(corpus_email, layout=1)
+
+    def order_canceled_v2(self, corpus_email: CorpusEmail):
+        self.order_canceled(corpus_email, layout=2)
+
+    def expiration(self) -> datetime:
+        """An expiration date a few weeks after the email was sent, to the minute"""
+
+        return (
+            self.sent_at + timedelta(days=self.rng.randint(7, 60))
+        ).replace(second=0, microsecond=0, tzinfo=None)
+
+    def credit_dollars_off(self, corpus_email: CorpusEmail):
+        rng = self.rng
+        email = corpus_email.email
+        amount = rng.choice([300, 500, 700, 1000])
+        expires = self.expiration()
+        email.subject = f'Enjoy {money(amount)} off your next order'
+        email.body = html(table(
+            row('<img src="logo.png" alt="Grubhub">'),
+            row(f'Enjoy {money(amount)} off'),
+            row('A little something for your next order.'),
+            row(f'{money(amount)} off your next order'),
+            row(f'Expires {format_expires(expires)}'),
+            row('Order now'),
+        ))
+        corpus_email.expected = {'credits': [models.Credit(
+            email_id=email.email_id,
+            sent_at=email.sent_at,
+            amount=amount,
+            expires=to_utc(expires),
+            category=models.CreditCategory.dollars_off.name,
+        )]}
+
+    def credit_guarantee_perk(self, corpus_email: CorpusEmail):
+        rng = self.rng
+        email = corpus_email.email
+        amount = rng.choice([300, 500])
+        code = f'GUARANTEE{rng.randint(1000, 9999)}'
+        expires = self.expiration()
+        email.subject = "You're approved for a Grubhub Guarantee perk"
+        email.body = html(*[filler_table(rng) for _ in range(6)], table(
+            row('Grubhub Guarantee'),
+            row('Your perk'),
+            row(f'{money(amount)}*'),
+            row('Promo code'),
+            row(code),
+            row('Apply it at checkout'),
+            row('*Terms apply'),
+            row('Expires'),
+            row(format_expires(expires)),
+        ))
+        corpus_email.expected = {'credits': [models.Credit(
+            email_id=email.email_id,
+            sent_at=email.sent_at,
+            amount=amount,
+            code=code,
+            expires=to_utc(expires),
+            category=models.CreditCategory.guarantee_perk.name,
+        )]}
+
+    def credit_discounted(self, corpus_email: CorpusEmail, percent: bool):
+        """A credit whose details are lines of text, eg "Code: ABC123" """
+
+        rng = self.rng
+        email = corpus_email.email
+        email.subject = 'You can now enjoy a discounted order'
+        code = f'SAVE{rng.randint(1000, 9999)}'
+        expires = self.expiration()
+        tz_name, offset = rng.choice(TIMEZONE_NAMES)
+        hour = expires.hour % 12 or 12
+        expires_text = (
+            f'{expires:%b %d, %Y} {hour}:{expires:%M}{"am" if expires.hour < 12 else "pm"} '
+            f'{tz_name}'
+        )
+        credit = models.Credit(
+            email_id=email.email_id,
+            sent_at=email.sent_at,
+            code=code,
+            expires=to_utc(expires, timezone(timedelta(hours=offset))),
+            category=models.CreditCategory.discount.name,
+        )
+
+        lines = ['Here are the details of your discount:']
+        if percent:
+            credit.percent_off = rng.choice([10, 15, 20, 25])
+            credit.percent_off_max_value = rng.choice([500, 1000])
+            lines.append(
+                f'Percent Off: {credit.percent_off}% off up to '
+                f'{money(credit.percent_off_max_value)} *'
+            )
+        else:
+            credit.amount = rng.choice([500, 1000])
+            lines.append(f'Amount: {money(credit.amount)}*')
+        lines += [
+            f'Code: {code}',
+            f'{rng.choice(["Expires", "Expiration Date"])}: {expires_text}',
+        ]
+        email.body = html(
+            table(row('<img src="logo.png" alt="Grubhub">')),
+            '\n' + '\n'.join(f'<p>{line}</p>' for line in lines) + '\n',
+        )
+        corpus_email.expected = {'credits': [credit]}
+
+    def credit_discounted_amount(self, corpus_email: CorpusEmail):
+        self.credit_discounted(corpus_email, percent=False)
+
+    def credit_discounted_percent(self, corpus_email: CorpusEmail):
+        self.credit_discounted(corpus_email, percent=True)
+
+    def uncategorized(self, corpus_email: CorpusEmail):
+        rng = self.rng
+        email = corpus_email.email
+        email.subject = rng.choice([
+            'Rate your recent order',
+            'New restaurants near you',
+            'Your weekly deals are here',
+        ])
+        email.body = html(*[filler_table(rng) for _ in range(rng.randint(2, 6))])
+
+
+def normalize_order_number(order_number: str) -> str:
+    """The order number as ``process.clean_dataclass_fields`` normalizes it"""
+
+    order_number = order_number.replace('#', '')
+    if '-' not in order_number:
+        order_number = order_number[:8] + '-' + order_number[8:]
+    return order_number
+
+
+def generate_emails(
+    count: int,
+    seed: int = DEFAULT_SEED,
+    start: datetime = DEFAULT_START
+) -> t.Iterator[CorpusEmail]:
+    """Generate ``count`` emails"""
+
+    generator = CorpusGenerator(seed, start)
+    for _ in range(count):
+        yield generator.generate()
+
+
+def generate_every_variant(seed: int = DEFAULT_SEED) -> list[CorpusEmail]:
+    """Generate one email in each layout (after an order, for the updates and
+    cancellations to refer to)
+    """
+
+    generator = CorpusGenerator(seed)
+    return [generator.generate(variant) for variant in VARIANT_WEIGHTS]
+
+
+def get_arguments(args: list = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description='Generate a synthetic corpus of Grubhub emails in a cache directory'
+    )
+    parser.add_argument('--count', type=int, default=10000, help='The number of emails')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument(
+        '--cache-dir',
+        required=True,
+        help='Cache the emails in this directory, to be extracted with --source cache'
+    )
+    return parser.parse_args(args)
+
+
+def main(args: list = None):
+    from grubhub_dl.emails import cache
+
+    namespace = get_arguments(args)
+    params = models.Parameters(cache_dir=namespace.cache_dir)
+    batch = []
+    for corpus_email in generate_emails(namespace.count, namespace.seed):
+        batch.append(corpus_email.email)
+        if len(batch) == 10000:
+            cache.emails_to_json_files(params, batch)
+            batch = []
+    if batch:
+        cache.emails_to_json_files(params, batch)
+
+
+if __name__ == '__main__':
+    main()
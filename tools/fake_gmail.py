@@ -0,0 +1,457 @@
+"""A local stand-in for the Gmail API, for testing and benchmarking ``emails.gmail``
+offline.
+
+``FakeGmail`` is an httplib2-compatible transport, so it's passed to ``build`` in place
+of an authorized ``Http`` object. It serves a mailbox of generated emails (see
+``tools.corpus``), and implements the parts of the Gmail API that grubhub-dl uses:
+
+- ``users.messages.list``, with paging (every message matches the query)
+- ``users.messages.get``, in the ``full``, ``metadata``, ``minimal`` and ``raw`` formats
+- ``users.history.list``, with ``messagesAdded`` records for the messages added with
+  ``add_email``
+- ``users.getProfile``
+- Batch requests
+
+It can be made to respond slowly (``latency``), to fail with 429 and 5xx errors at random
+(``error_rate``) or on demand (``fail_next``), and to enforce a per-user quota like the
+real API does (``quota_per_second``, in quota units). Every request is counted in
+``stats``.
+
+Example
+=======
+.. code-block:: bash
+
+    # Time how long it takes to fetch 1000 emails with 50ms of latency per request,
+    # when 5% of requests fail
+    python -m tools.fake_gmail --count 1000 --latency 0.05 --error-rate 0.05
+
+"""
+
+import json
+import time
+import base64
+import random
+import argparse
+import threading
+import email.policy
+import typing as t
+import urllib.parse
+from collections import Counter, deque
+from email.message import EmailMessage as MIMEMessage
+from email.parser import Parser
+from email.utils import format_datetime
+
+import httplib2
+
+from grubhub_dl import models
+from tools.corpus import DEFAULT_SEED, generate_emails
+
+# The quota units that each method costs
+# https://developers.google.com/gmail/api/reference/quota
+QUOTA_UNITS = {
+    'messages.list': 5,
+    'messages.get': 5,
+    'history.list': 2,
+    'getProfile': 1,
+}
+# The real API allows 250 quota units per user per second
+DEFAULT_QUOTA_PER_SECOND = 250
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+MAX_BATCH_SIZE = 100
+
+ERROR_REASONS = {
+    400: ('invalidArgument', 'INVALID_ARGUMENT'),
+    404: ('notFound', 'NOT_FOUND'),
+    429: ('rateLimitExceeded', 'RESOURCE_EXHAUSTED'),
+    500: ('backendError', 'INTERNAL'),
+    503: ('backendError', 'UNAVAILABLE'),
+}
+
+ApiResponse = tuple[int, dict]
+
+
+class FakeGmail:
+    """A fake Gmail mailbox and API server
+
+    :param emails: The emails in the mailbox, oldest first
+    :param latency: Seconds to wait before responding to each request (and each batch)
+    :param latency_jitter: Up to this many more seconds are added to the latency at random
+    :param error_rate: The fraction of requests (and of the parts of batch requests) that
+        fail with one of ``error_statuses``
+    :param error_statuses: The statuses of randomly failed requests
+    :param quota_per_second: The quota units that can be used per second. Requests that
+        would exceed it fail with a 429 error. None means unlimited.
+    :param seed: Seeds the random latency and errors
+    :param clock: Returns the current time in seconds, for the quota
+    """
+
+    def __init__(
+        self,
+        emails: t.Iterable[models.EmailMessage] = (),
+        latency: float = 0,
+        latency_jitter: float = 0,
+        error_rate: float = 0,
+        error_statuses: tuple[int] = (429, 500, 503),
+        quota_per_second: int | None = None,
+        seed: int = DEFAULT_SEED,
+        clock: t.Callable[[], float] = time.monotonic,
+    ):
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.error_statuses = error_statuses
+        self.quota_per_second = quota_per_second
+        self.clock = clock
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = Counter()
+
+        self.messages = {}
+        # Message IDs, newest first, which is the order that messages are listed in
+        self.message_ids = []
+        # (history ID, message ID) of each message added after the mailbox was created
+        self.history = []
+        self.history_id = 1000
+        self.scheduled_errors = deque()
+        self.quota_available = quota_per_second
+        self.quota_updated_at = clock()
+
+        for message in emails:
+            self.add_email(message, record_history=False)
+
+    # Mailbox
+
+    def add_email(self, message: models.EmailMessage, record_history: bool = True) -> str:
+        """Add an email to the mailbox, as if it was just received
+
+        :returns: The ID of the new message
+        """
+
+        with self.lock:
+            self.history_id += 1
+            message_id = message.email_id
+            self.messages[message_id] = {
+                'email': message,
+                'historyId': str(self.history_id),
+            }
+            self.message_ids.insert(0, message_id)
+            if record_history:
+                self.history.append((self.history_id, message_id))
+        return message_id
+
+    def fail_next(self, status: int, count: int = 1):
+        """Make the next ``count`` requests (or parts of batch requests) fail"""
+
+        with self.lock:
+            self.scheduled_errors.extend([status] * count)
+
+    # Transport
+
+    def request(
+        self,
+        uri: str,
+        method: str = 'GET',
+        body: str = None,
+        headers: dict = None,
+        redirections: int = httplib2.DEFAULT_MAX_REDIRECTS,
+        connection_type=None,
+    ) -> tuple[httplib2.Response, bytes]:
+        """Respond to a request, like ``httplib2.Http.request``"""
+
+        self.wait()
+        parts = urllib.parse.urlsplit(uri)
+        if parts.path.split('/')[1] == 'batch':
+            return self.batch(body, headers or {})
+
+        status, content = self.handle(method, parts.path, parts.query)
+        return (
+            httplib2.Response({'status': status, 'content-type': 'application/json'}),
+            json.dumps(content).encode('utf-8'),
+        )
+
+    def wait(self):
+        if self.latency or self.latency_jitter:
+            with self.lock:
+                jitter = self.rng.uniform(0, self.latency_jitter)
+            time.sleep(self.latency + jitter)
+
+    def batch(self, body: str, headers: dict) -> tuple[httplib2.Response, bytes]:
+        """Respond to each request of a ``multipart/mixed`` batch request"""
+
+        with self.lock:
+            self.stats['batches'] += 1
+            boundary = f'batch_{self.rng.getrandbits(64):016x}'
+        content_type = headers.get('content-type') or headers.get('Content-Type')
+        batch = Parser().parsestr(f'content-type: {content_type}\r\n\r\n{body}')
+        requests = batch.get_payload()
+
+        if len(requests) > MAX_BATCH_SIZE:
+            status, content = error_response(
+                400,
+                f'Too many requests in the batch (the limit is {MAX_BATCH_SIZE})'
+            )
+            return (
+                httplib2.Response({'status': status, 'content-type': 'application/json'}),
+                json.dumps(content).encode('utf-8'),
+            )
+
+        lines = []
+        for request in requests:
+            request_line = request.get_payload().split('\n', 1)[0].strip()
+            method, path = request_line.split(' ')[:2]
+            parts = urllib.parse.urlsplit(path)
+            status, content = self.handle(method, parts.path, parts.query)
+            content_id = request['Content-ID']
+            lines += [
+                f'--{boundary}',
+                'Content-Type: application/http',
+                f'Content-ID: <response-{content_id[1:]}',
+                '',
+                f'HTTP/1.1 {status} {"OK" if status == 200 else "Error"}',
+                'Content-Type: application/json; charset=UTF-8',
+                '',
+                json.dumps(content),
+            ]
+        lines.append(f'--{boundary}--')
+        return (
+            httplib2.Response({
+                'status': 200,
+                'content-type': f'multipart/mixed; boundary={boundary}',
+            }),
+            '\r\n'.join(lines).encode('utf-8'),
+        )
+
+    # API
+
+    def handle(self, method: str, path: str, query: str) -> ApiResponse:
+        """Route a request to the method that handles it"""
+
+        query = {
+            name: values if len(values) > 1 else values[0]
+            for name, values in urllib.parse.parse_qs(query).items()
+        }
+        segments = path.strip('/').split('/')
+        # eg gmail/v1/users/me/messages/<id>
+        if segments[:3] != ['gmail', 'v1', 'users'] or len(segments) < 5:
+            return error_response(404, f'Unknown path: {path}')
+        resource = segments[4:]
+
+        if method == 'GET' and resource == ['messages']:
+            api_method, handler = 'messages.list', self.list_messages
+        elif method == 'GET' and resource[0] == 'messages' and len(resource) == 2:
+            api_method = 'messages.get'
+            handler = lambda query: self.get_message(resource[1], query)
+        elif method == 'GET' and resource == ['history']:
+            api_method, handler = 'history.list', self.list_history
+        elif method == 'GET' and resource == ['profile']:
+            api_method, handler = 'getProfile', self.get_profile
+        else:
+            return error_response(404, f'Unknown method: {method} {path}')
+
+        with self.lock:
+            self.stats['requests'] += 1
+            self.stats[api_method] += 1
+            status = self.injected_error(QUOTA_UNITS[api_method])
+            if status:
+                self.stats[f'errors.{status}'] += 1
+                return error_response(status, 'Injected error')
+            return handler(query)
+
+    def injected_error(self, units: int) -> int | None:
+        """Get the status of the error that the current request should fail with, if any
+        """
+
+        if self.scheduled_errors:
+            return self.scheduled_errors.popleft()
+        if self.error_rate and self.rng.random() < self.error_rate:
+            return self.rng.choice(self.error_statuses)
+
+        if self.quota_per_second is not None:
+            now = self.clock()
+            self.quota_available = min(
+                self.quota_per_second,
+                self.quota_available + (now - self.quota_updated_at) * self.quota_per_second
+            )
+            self.quota_updated_at = now
+            if units > self.quota_available:
+                return 429
+            self.quota_available -= units
+        self.stats['quota_units'] += units
+        return None
+
+    def list_messages(self, query: dict) -> ApiResponse:
+        page_size = min(int(query.get('maxResults', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+        start = int(query.get('pageToken', 0))
+        page = self.message_ids[start:start + page_size]
+
+        content = {'resultSizeEstimate': len(self.message_ids)}
+        if page:
+            content['messages'] = [
+                {'id': message_id, 'threadId': message_id} for message_id in page
+            ]
+        if start + page_size < len(self.message_ids):
+            content['nextPageToken'] = str(start + page_size)
+        return 200, content
+
+    def get_message(self, message_id: str, query: dict) -> ApiResponse:
+        if message_id not in self.messages:
+            return error_response(404, 'Requested entity was not found.')
+
+        message = self.messages[message_id]
+        email_message = message['email']
+        body = (email_message.body or '').encode('utf-8')
+        resource = {
+            'id': message_id,
+            'threadId': message_id,
+            'labelIds': ['INBOX', 'CATEGORY_UPDATES'],
+            'snippet': email_message.subject,
+            'historyId': message['historyId'],
+            'internalDate': str(int(email_message.sent_at.timestamp() * 1000)),
+            'sizeEstimate': len(body),
+        }
+        headers = [
+            {'name': 'From', 'value': email_message.sent_by},
+            {'name': 'Subject', 'value': email_message.subject},
+            {'name': 'Date', 'value': format_datetime(email_message.sent_at)},
+            {'name': 'Content-Type', 'value': 'text/html; charset="UTF-8"'},
+        ]
+
+        message_format = query.get('format', 'full')
+        if message_format == 'raw':
+            mime_message = MIMEMessage(policy=email.policy.SMTP)
+            for header in headers[:3]:
+                mime_message[header['name']] = header['value']
+            mime_message.set_content(email_message.body or '', subtype='html')
+            resource['raw'] = base64.urlsafe_b64encode(mime_message.as_bytes()).decode()
+        elif message_format == 'metadata':
+            names = query.get('metadataHeaders')
+            if names is not None:
+                names = {name.lower() for name in ([names] if isinstance(names, str) else names)}
+                headers = [header for header in headers if header['name'].lower() in names]
+            resource['payload'] = {'mimeType': 'text/html', 'headers': headers}
+        elif message_format == 'full':
+            resource['payload'] = {
+                'partId': '',
+                'mimeType': 'text/html',
+                'filename': '',
+                'headers': headers,
+                'body': {
+                    'size': len(body),
+                    'data': base64.urlsafe_b64encode(body).decode(),
+                },
+            }
+        elif message_format != 'minimal':
+            return error_response(400, f'Invalid format: {message_format}')
+        return 200, resource
+
+    def list_history(self, query: dict) -> ApiResponse:
+        if 'startHistoryId' not in query:
+            return error_response(400, 'startHistoryId is required')
+        start_history_id = int(query['startHistoryId'])
+        # Like the real API, history that's older than the mailbox's can't be listed
+        oldest_history_id = self.history[0][0] if self.history else self.history_id
+        if start_history_id < oldest_history_id - 1:
+            return error_response(404, 'Requested entity was not found.')
+
+        page_size = min(int(query.get('maxResults', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+        records = [
+            (history_id, message_id)
+            for history_id, message_id in self.history
+            if history_id > start_history_id
+        ]
+        start = int(query.get('pageToken', 0))
+        page = records[start:start + page_size]
+
+        content = {'historyId': str(self.history_id)}
+        if page:
+            content['history'] = [
+                {
+                    'id': str(history_id),
+                    'messages': [{'id': message_id, 'threadId': message_id}],
+                    'messagesAdded': [
+                        {'message': {
+                            'id': message_id,
+                            'threadId': message_id,
+                            'labelIds': ['INBOX', 'CATEGORY_UPDATES'],
+                        }}
+                    ],
+                }
+                for history_id, message_id in page
+            ]
+        if start + page_size < len(records):
+            content['nextPageToken'] = str(start + page_size)
+        return 200, content
+
+    def get_profile(self, query: dict) -> ApiResponse:
+        return 200, {
+            'emailAddress': 'user@example.com',
+            'messagesTotal': len(self.messages),
+            'threadsTotal': len(self.messages),
+            'historyId': str(self.history_id),
+        }
+
+
+def error_response(status: int, message: str) -> ApiResponse:
+    """An error response in the format of the Google APIs"""
+
+    reason, error_status = ERROR_REASONS.get(status, ('backendError', 'UNKNOWN'))
+    return status, {
+        'error': {
+            'code': status,
+            'message': message,
+            'errors': [{'message': message, 'domain': 'global', 'reason': reason}],
+            'status': error_status,
+        }
+    }
+
+
+def build_service(fake_gmail: FakeGmail):
+    """Build a Gmail API service that sends its requests to ``fake_gmail``"""
+
+    from googleapiclient.discovery import build
+
+    return build('gmail', 'v1', http=fake_gmail, static_discovery=True)
+
+
+def get_arguments(args: list = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description='Benchmark fetching emails from a fake Gmail API'
+    )
+    parser.add_argument('--count', type=int, default=1000, help='The number of emails')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds per request')
+    parser.add_argument('--latency-jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--quota-per-second', type=int)
+    return parser.parse_args(args)
+
+
+def main(args: list = None):
+    from grubhub_dl.emails import gmail
+
+    namespace = get_arguments(args)
+    fake_gmail = FakeGmail(
+        (corpus_email.email for corpus_email in generate_emails(namespace.count, namespace.seed)),
+        latency=namespace.latency,
+        latency_jitter=namespace.latency_jitter,
+        error_rate=namespace.error_rate,
+        quota_per_second=namespace.quota_per_second,
+        seed=namespace.seed,
+    )
+    service = build_service(fake_gmail)
+
+    started_at = time.perf_counter()
+    messages = gmail.get_grubhub_emails(service)
+    for message in messages:
+        gmail.get_grubhub_email_contents(service, message['id'])
+    seconds = time.perf_counter() - started_at
+
+    print(f'Fetched {len(messages):,} emails in {seconds:.2f}s '
+          f'({len(messages) / seconds:,.0f} emails/s)')
+    for name, value in sorted(fake_gmail.stats.items()):
+        print(f'  {name:<20} {value:>10,}')
+
+
+if __name__ == '__main__':
+    main()